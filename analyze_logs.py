@@ -17,13 +17,29 @@ Usage:
     python analyze_logs.py session <id>     # Show session details
     python analyze_logs.py context          # Generate AI learning context
     python analyze_logs.py export           # Export full analysis to JSON
+    python analyze_logs.py rebuild          # Recompute the analysis counters from all logs
+    python analyze_logs.py all              # All reports
+
+Report options (summary, errors, recommendations, export, all):
+    --since YYYY-MM-DD / --until YYYY-MM-DD
+                      Only logs from these days (inclusive)
+    --archive DIR     Analyze a JSON log tree (failures|successes/YYYY-MM-DD/*.json)
+                      instead of the log store
+    --workers N       Processes parsing an archive (default: CPU count)
+    --no-cache        Recompute instead of using logs/analysis/cache/
+
+The reports of one invocation come from a single analysis. Without options it
+is read from the log store's counters; with a date range or an archive, the
+logs are read once in a single pass (see backend/log_scan.py) and the result
+is cached until the logs change.
 """
 
 import sys
 import json
 import pathlib
-from datetime import datetime
-from typing import Optional
+import argparse
+from datetime import date, datetime
+from typing import Any, Dict, Optional
 
 # Ensure Windows consoles don't crash on unicode output (✓/✗ etc.)
 try:
@@ -36,6 +52,8 @@ except Exception:
 sys.path.insert(0, str(pathlib.Path(__file__).parent / "backend"))
 
 from log_analyzer import LogAnalyzer
+from log_scan import archive_cache_key, cached_report, scan_archive, scan_store
+from log_store import get_log_store
 from script_logger import ScriptLogger
 
 
@@ -46,11 +64,10 @@ def print_section(title: str, char: str = "="):
     print(f"{char * 70}\n")
 
 
-def print_summary(analyzer: LogAnalyzer):
+def print_summary(analysis: Dict[str, Any]):
     """Print summary statistics"""
     print_section("SCRIPT EXECUTION SUMMARY")
     
-    analysis = analyzer.analyze_all()
     summary = analysis["summary"]
     
     print(f"Total Failures:       {summary['total_failures']:>6}")
@@ -64,11 +81,10 @@ def print_summary(analyzer: LogAnalyzer):
     print()
 
 
-def print_error_patterns(analyzer: LogAnalyzer):
+def print_error_patterns(analysis: Dict[str, Any]):
     """Print common error patterns"""
     print_section("COMMON ERROR PATTERNS")
-    
-    analysis = analyzer.analyze_all()
+
     patterns = analysis["error_patterns"]
     
     if not patterns:
@@ -85,11 +101,10 @@ def print_error_patterns(analyzer: LogAnalyzer):
         print()
 
 
-def print_common_errors(analyzer: LogAnalyzer):
+def print_common_errors(analysis: Dict[str, Any]):
     """Print most common specific errors"""
     print_section("MOST COMMON SPECIFIC ERRORS")
-    
-    analysis = analyzer.analyze_all()
+
     common_errors = analysis["common_errors"]
     
     if not common_errors:
@@ -103,11 +118,10 @@ def print_common_errors(analyzer: LogAnalyzer):
         print()
 
 
-def print_library_issues(analyzer: LogAnalyzer):
+def print_library_issues(analysis: Dict[str, Any]):
     """Print library-specific issues"""
     print_section("LIBRARY-SPECIFIC ISSUES")
-    
-    analysis = analyzer.analyze_all()
+
     library_issues = analysis["library_issues"]["libraries_with_issues"]
     
     if not library_issues:
@@ -125,11 +139,10 @@ def print_library_issues(analyzer: LogAnalyzer):
         print()
 
 
-def print_mapbridge_issues(analyzer: LogAnalyzer):
+def print_mapbridge_issues(analysis: Dict[str, Any]):
     """Print MapsBridge-specific issues"""
     print_section("MAPBRIDGE-SPECIFIC ISSUES")
-    
-    analysis = analyzer.analyze_all()
+
     mb_issues = analysis["mapbridge_issues"]
     
     print(f"Request Type Errors:    {mb_issues['request_type_errors']}")
@@ -147,11 +160,10 @@ def print_mapbridge_issues(analyzer: LogAnalyzer):
         print()
 
 
-def print_recommendations(analyzer: LogAnalyzer):
+def print_recommendations(analysis: Dict[str, Any]):
     """Print recommendations for improvement"""
     print_section("RECOMMENDATIONS FOR IMPROVEMENT")
-    
-    analysis = analyzer.analyze_all()
+
     recommendations = analysis["recommendations"]
     
     if not recommendations:
@@ -163,11 +175,10 @@ def print_recommendations(analyzer: LogAnalyzer):
         print()
 
 
-def print_ai_summary(analyzer: LogAnalyzer):
+def print_ai_summary(analysis: Dict[str, Any]):
     """Print AI learning summary"""
     print_section("AI LEARNING SUMMARY")
-    
-    analysis = analyzer.analyze_all()
+
     ai_summary = analysis["ai_learning_summary"]
     
     print(ai_summary)
@@ -254,12 +265,10 @@ def print_context(analyzer: LogAnalyzer, max_examples: int = 10):
     print()
 
 
-def export_analysis(analyzer: LogAnalyzer, output_file: str = "analysis_export.json"):
+def export_analysis(analysis: Dict[str, Any], output_file: str = "analysis_export.json"):
     """Export full analysis to JSON file"""
     print_section("EXPORTING ANALYSIS")
     
-    analysis = analyzer.analyze_all()
-    
     output_path = pathlib.Path(output_file)
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(analysis, f, indent=2, ensure_ascii=False)
@@ -269,69 +278,115 @@ def export_analysis(analyzer: LogAnalyzer, output_file: str = "analysis_export.j
     print()
 
 
+def _date(value: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value}")
+
+
+def load_analysis(logs_dir: pathlib.Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """The analysis for this invocation: store counters, or one cached scan"""
+    if not (args.archive or args.since or args.until):
+        return LogAnalyzer(logs_dir).analyze_all()
+    
+    cache_dir = logs_dir / "analysis" / "cache"
+    if args.archive:
+        archive = pathlib.Path(args.archive)
+        if not archive.is_dir():
+            raise FileNotFoundError(f"Archive directory not found: {archive}")
+        key = ["archive", args.since, args.until] + archive_cache_key(archive, args.since, args.until)
+        scan = lambda: scan_archive(archive, args.since, args.until, workers=args.workers)
+    else:
+        store = get_log_store(logs_dir)
+        key = ["store", str(store.db_path.resolve()), args.since, args.until, store.state_token()]
+        scan = lambda: scan_store(store, args.since, args.until)
+    
+    compute = lambda: LogAnalyzer(logs_dir, source=scan()).analyze_all(save=False)
+    if args.no_cache:
+        return compute()
+    return cached_report(cache_dir, key, compute)
+
+
 def main():
     """Main CLI entry point"""
+    parser = argparse.ArgumentParser(
+        description="Analyze script execution logs",
+        usage="python analyze_logs.py <command> [arg] [options]",
+    )
+    parser.add_argument("command", nargs="?")
+    parser.add_argument("arg", nargs="?")
+    parser.add_argument("--since", type=_date)
+    parser.add_argument("--until", type=_date)
+    parser.add_argument("--archive")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    
     # Setup paths
     base_dir = pathlib.Path(__file__).parent
     logs_dir = base_dir / "logs"
     
-    if not logs_dir.exists():
+    if not logs_dir.exists() and not args.archive:
         print(f"Error: Logs directory not found at {logs_dir}")
         print("Have you run any scripts yet?")
         sys.exit(1)
     
-    # Initialize analyzer and logger
-    analyzer = LogAnalyzer(logs_dir)
-    logger = ScriptLogger(logs_dir)
-    
     # Parse command
-    if len(sys.argv) < 2:
+    if not args.command:
         print(__doc__)
         sys.exit(1)
     
-    command = sys.argv[1].lower()
+    command = args.command.lower()
     
     try:
+        if command in ("summary", "errors", "recommendations", "export", "all"):
+            analysis = load_analysis(logs_dir, args)
+        
         if command == "summary":
-            print_summary(analyzer)
+            print_summary(analysis)
             
         elif command == "errors":
-            print_error_patterns(analyzer)
-            print_common_errors(analyzer)
-            print_library_issues(analyzer)
-            print_mapbridge_issues(analyzer)
+            print_error_patterns(analysis)
+            print_common_errors(analysis)
+            print_library_issues(analysis)
+            print_mapbridge_issues(analysis)
             
         elif command == "recommendations":
-            print_recommendations(analyzer)
-            print_ai_summary(analyzer)
+            print_recommendations(analysis)
+            print_ai_summary(analysis)
             
         elif command == "unfixed":
-            print_unfixed_failures(logger)
+            print_unfixed_failures(ScriptLogger(logs_dir))
             
         elif command == "session":
-            if len(sys.argv) < 3:
+            if not args.arg:
                 print("Usage: python analyze_logs.py session <session_id>")
                 sys.exit(1)
-            session_id = sys.argv[2]
-            print_session(logger, session_id)
+            print_session(ScriptLogger(logs_dir), args.arg)
             
         elif command == "context":
-            max_examples = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-            print_context(analyzer, max_examples)
+            max_examples = int(args.arg) if args.arg else 10
+            print_context(LogAnalyzer(logs_dir), max_examples)
             
         elif command == "export":
-            output_file = sys.argv[2] if len(sys.argv) > 2 else "analysis_export.json"
-            export_analysis(analyzer, output_file)
+            export_analysis(analysis, args.arg or "analysis_export.json")
+            
+        elif command == "rebuild":
+            analyzer = LogAnalyzer(logs_dir)
+            analyzer.rebuild()
+            print("✓ Analysis counters rebuilt from all logs")
+            print_summary(analyzer.analyze_all())
             
         elif command == "all":
             # Print everything
-            print_summary(analyzer)
-            print_error_patterns(analyzer)
-            print_common_errors(analyzer)
-            print_library_issues(analyzer)
-            print_mapbridge_issues(analyzer)
-            print_recommendations(analyzer)
-            print_unfixed_failures(logger)
+            print_summary(analysis)
+            print_error_patterns(analysis)
+            print_common_errors(analysis)
+            print_library_issues(analysis)
+            print_mapbridge_issues(analysis)
+            print_recommendations(analysis)
+            print_unfixed_failures(ScriptLogger(logs_dir))
             
         else:
             print(f"Unknown command: {command}")
@@ -347,4 +402,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -1,7 +1,8 @@
-import os, uuid, shutil, json, pathlib, subprocess, traceback, io, time
-from datetime import datetime
+import os, uuid, shutil, json, pathlib, subprocess, traceback, time
+from datetime import datetime, timedelta
 from typing import Optional, List
 import threading
+import sqlite3
 
 _start_time = time.time()
 def _log_import(module_name: str):
@@ -9,9 +10,8 @@ def _log_import(module_name: str):
     print(f"[Startup] {elapsed:.2f}s - Importing {module_name}...")
 
 _log_import("FastAPI")
-from fastapi import FastAPI, UploadFile, File, Form, Response, HTTPException, Depends, Header
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Form, Response, HTTPException, Depends, Header, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 import re
@@ -32,14 +32,16 @@ from sqlalchemy import desc
 try:
     from backend.script_logger import ScriptLogger
     from backend.log_analyzer import LogAnalyzer
-    from backend.database import get_db, init_database, reset_database
-    from backend.models import User, UserScript, LibraryImage, UserImage, LibraryScript, ExecutionSession, ScriptRating, PasswordResetToken
+    from backend.log_store import get_log_store
+    from backend.database import get_db, get_db_session, init_database, reset_database, SessionLocal
+    from backend.models import User, UserScript, LibraryImage, UserImage, LibraryScript, ExecutionSession, ExecutionJob, ScriptRating, PasswordResetToken
 except ImportError:
     # When running from backend/ directory
     from script_logger import ScriptLogger
     from log_analyzer import LogAnalyzer
-    from database import get_db, init_database, reset_database
-    from models import User, UserScript, LibraryImage, UserImage, LibraryScript, ExecutionSession, ScriptRating, PasswordResetToken
+    from log_store import get_log_store
+    from database import get_db, get_db_session, init_database, reset_database, SessionLocal
+    from models import User, UserScript, LibraryImage, UserImage, LibraryScript, ExecutionSession, ExecutionJob, ScriptRating, PasswordResetToken
 
 # Initialize script execution runtime (auto-detects Docker or Kubernetes)
 _log_import("Script execution runtime")
@@ -63,6 +65,17 @@ if _execution_runtime == "kubernetes":
         print("  Falling back to Docker runtime...")
         _execution_runtime = "docker"
 
+if _execution_runtime == "docker-pool":
+    try:
+        from backend.warm_pool_runner import get_runner as get_warm_pool_runner
+        script_runner = get_warm_pool_runner()
+        print("✓ Using warm Docker worker pool for script execution")
+    except Exception as e:
+        print(f"⚠ WARNING: Failed to initialize warm pool runner: {e}")
+        traceback.print_exc()
+        print("  Falling back to Docker runtime...")
+        _execution_runtime = "docker"
+
 if _execution_runtime == "docker":
     try:
         from backend.docker_runner import get_runner as get_docker_runner
@@ -73,6 +86,38 @@ if _execution_runtime == "docker":
         traceback.print_exc()
         raise RuntimeError("No script execution runtime available. Cannot start backend.") from e
 
+try:
+    from backend.execution_limits import get_limiter, ExecutionLimitExceeded
+    from backend.job_queue import create_scheduler as create_job_scheduler, JobQueueFull, TERMINAL_STATUSES as JOB_TERMINAL_STATUSES, job_events
+    from backend.output_stream import JobOutputLog
+    from backend.input_cache import get_input_cache, normalize_extension
+    from backend.image_reader import read_header
+    from backend.upload_stream import get_upload_store, UploadError
+    from backend.blob_store import BlobStore
+    from backend.tile_pyramid import get_tile_pyramids, dzi_descriptor
+    from backend.thumbnail_worker import get_thumbnail_pipeline, pregenerate_enabled
+    from backend.derived_cache import get_derived_cache, serve_file, tiff_display_png, output_tiff_png, strip_exif
+    from backend.result_cache import get_result_cache
+    from backend.tile_fanout import run_tile_fanout, requested_workers, MAX_TILE_WORKERS
+    from backend.output_manifest import read_manifest, output_metadata, is_manifest_path
+    from backend.static_assets import frontend_static_files, is_production as static_production
+except ImportError:
+    from execution_limits import get_limiter, ExecutionLimitExceeded
+    from job_queue import create_scheduler as create_job_scheduler, JobQueueFull, TERMINAL_STATUSES as JOB_TERMINAL_STATUSES, job_events
+    from output_stream import JobOutputLog
+    from input_cache import get_input_cache, normalize_extension
+    from image_reader import read_header
+    from upload_stream import get_upload_store, UploadError
+    from blob_store import BlobStore
+    from tile_pyramid import get_tile_pyramids, dzi_descriptor
+    from thumbnail_worker import get_thumbnail_pipeline, pregenerate_enabled
+    from derived_cache import get_derived_cache, serve_file, tiff_display_png, output_tiff_png, strip_exif
+    from result_cache import get_result_cache
+    from tile_fanout import run_tile_fanout, requested_workers, MAX_TILE_WORKERS
+    from output_manifest import read_manifest, output_metadata, is_manifest_path
+    from static_assets import frontend_static_files, is_production as static_production
+execution_limiter = get_limiter()
+
 _import_time = time.time() - _start_time
 print(f"[Startup] {_import_time:.2f}s - All imports complete")
 
@@ -333,30 +378,25 @@ def _get_recent_missing_modules_from_logs(max_modules: int = 8) -> list[tuple[st
     Extract ModuleNotFoundError names from recent failure logs.
     Returns list of (module_name, count) sorted by count desc.
     """
-    failures_dir = LOGS_DIR / "failures"
-    if not failures_dir.exists():
-        return []
-
     counts: dict[str, int] = {}
     pattern = re.compile(r"No module named ['\"]([^'\"]+)['\"]", re.IGNORECASE)
 
-    # Iterate newest date dirs first (lexicographic YYYY-MM-DD matches chronological)
-    date_dirs = [d for d in failures_dir.iterdir() if d.is_dir()]
-    for date_dir in sorted(date_dirs, reverse=True)[:7]:
-        for log_file in date_dir.glob("*.json"):
-            try:
-                data = json.loads(log_file.read_text(encoding="utf-8", errors="ignore"))
-            except Exception:
-                continue
+    try:
+        since = (datetime.now() - timedelta(days=7)).date().isoformat()
+        failures = get_log_store(LOGS_DIR).iter_logs(status="failed", since=since)
+        for data in failures:
             text = " ".join([
-                str(data.get("error_message", "")),
-                str(data.get("stderr", "")),
+                str(data.get("error_message") or ""),
+                str(data.get("stderr") or ""),
             ])
             for m in pattern.finditer(text):
                 mod = m.group(1).strip()
                 if not mod:
                     continue
                 counts[mod] = counts.get(mod, 0) + 1
+    except Exception as e:
+        print(f"Warning: Failed to read recent failures: {e}")
+        return []
 
     ranked = sorted(counts.items(), key=lambda x: (-x[1], x[0].lower()))
     return ranked[:max_modules]
@@ -447,6 +487,19 @@ LOGS_DIR.mkdir(parents=True, exist_ok=True)
 if not LIBRARY_METADATA_FILE.exists():
     LIBRARY_METADATA_FILE.write_text("{}", encoding="utf-8")
 
+# Prepared run inputs, hardlinked into job dirs (dot-dirs are skipped by the outputs cleanup)
+input_cache = get_input_cache(OUTPUTS_DIR / ".prepared")
+derived_cache = get_derived_cache(OUTPUTS_DIR / ".derived")
+thumbnail_pipeline = get_thumbnail_pipeline()
+tile_pyramids = get_tile_pyramids(OUTPUTS_DIR / ".pyramids")
+# Streamed and resumable uploads are staged here before being taken over
+upload_store = get_upload_store(OUTPUTS_DIR / ".uploads")
+# Uploaded image files, stored once per content and shared by the rows referencing them
+blob_store = BlobStore(USER_UPLOADS_DIR, LIBRARY_IMAGES_DIR, [USER_THUMBNAILS_DIR, LIBRARY_THUMBNAILS_DIR])
+# Memoized run results (None unless RESULT_CACHE_ENABLED is set); kept out of
+# outputs/ so no sandbox can reach the stored blobs
+result_cache = get_result_cache(BASE_DIR / "result_cache")
+
 # Cleanup synchronization (prevents multiple concurrent cleanups)
 CLEANUP_MUTEX = threading.Lock()
 CLEANUP_LOCK_FILE = OUTPUTS_DIR / ".cleanup.lock"
@@ -533,7 +586,6 @@ def auto_seed_database():
             print("[Init] No library images found, migrating from metadata.json...")
             try:
                 import json
-                from PIL import Image
                 from datetime import datetime
                 
                 with open(LIBRARY_METADATA_FILE, 'r', encoding='utf-8') as f:
@@ -555,8 +607,8 @@ def auto_seed_database():
                     width, height, file_size = None, None, None
                     if image_path.exists():
                         try:
-                            with Image.open(image_path) as img:
-                                width, height = img.size
+                            header = read_header(image_path)
+                            width, height = header.width, header.height
                             file_size = image_path.stat().st_size
                         except:
                             pass
@@ -636,6 +688,18 @@ def cleanup_user_previous_jobs(user_id: str):
         del user_jobs[user_id]
         save_user_jobs(user_jobs)
 
+def _pending_job_ids() -> Optional[set]:
+    """Ids of queued and running /jobs entries, or None if the database cannot be read."""
+    db = SessionLocal()
+    try:
+        return {row[0] for row in db.query(ExecutionJob.id).filter(
+            ExecutionJob.status.in_(("queued", "running")))}
+    except Exception as e:
+        print(f"Warning: Skipping output cleanup, could not list pending jobs: {e}")
+        return None
+    finally:
+        db.close()
+
 def cleanup_old_outputs(max_age_minutes: int = 30):
     """Delete output folders older than max_age_minutes.
 
@@ -645,6 +709,9 @@ def cleanup_old_outputs(max_age_minutes: int = 30):
     Safety:
     - Any job directory containing an ".active" marker is treated as "in use"
       and will not be deleted (unless the marker is stale).
+    - The workspaces of /jobs entries that are still queued or running are
+      kept however long they wait; their marker is only as old as the
+      submission.
     - A lock is used to ensure only one cleanup runs at a time per backend
       process/container.
     """
@@ -676,9 +743,14 @@ def cleanup_old_outputs(max_age_minutes: int = 30):
             current_time = time.time()
             max_age_seconds = max_age_minutes * 60
             deleted_count = 0
+            pending_jobs = _pending_job_ids()
+            if pending_jobs is None:
+                return
 
             for job_dir in OUTPUTS_DIR.iterdir():
-                if not job_dir.is_dir():
+                if not job_dir.is_dir() or job_dir.name.startswith("."):
+                    continue
+                if job_dir.name in pending_jobs:
                     continue
 
                 # Skip active jobs (unless marker is stale)
@@ -724,7 +796,7 @@ def clear_all_outputs():
     
     deleted_count = 0
     for job_dir in OUTPUTS_DIR.iterdir():
-        if job_dir.is_dir():
+        if job_dir.is_dir() and not job_dir.name.startswith("."):
             try:
                 shutil.rmtree(job_dir)
                 deleted_count += 1
@@ -758,17 +830,12 @@ def get_session_consecutive_failures(session_id: str) -> int:
         return 0
     
     try:
-        session_file = LOGS_DIR / "sessions" / f"{session_id}.json"
-        if not session_file.exists():
-            return 0
-        
-        session_data = json.loads(session_file.read_text(encoding="utf-8"))
-        attempts = session_data.get("attempts", [])
+        statuses = get_log_store(LOGS_DIR).session_statuses(session_id)
         
         # Count consecutive failures from the end
         consecutive_failures = 0
-        for attempt in reversed(attempts):
-            if attempt.get("status") == "failure":
+        for status in reversed(statuses):
+            if status == "failed":
                 consecutive_failures += 1
             else:
                 break
@@ -879,6 +946,16 @@ async def periodic_cleanup():
         await asyncio.sleep(5 * 60)  # Wait 5 minutes
         cleanup_old_outputs(max_age_minutes=30)
 
+async def periodic_log_compaction():
+    """Background task that archives cold execution logs and applies log retention"""
+    interval = int(os.getenv("LOG_COMPACT_INTERVAL_SECONDS", "3600"))
+    while True:
+        try:
+            await asyncio.to_thread(script_logger.store.compact)
+        except Exception as e:
+            print(f"⚠ Execution log compaction failed: {e}")
+        await asyncio.sleep(interval)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Initialize database and seed if needed
@@ -902,14 +979,51 @@ async def lifespan(app: FastAPI):
     # Startup: Start periodic cleanup task
     cleanup_task = asyncio.create_task(periodic_cleanup())
     
+    # Startup: Archive cold execution logs now and then every LOG_COMPACT_INTERVAL_SECONDS
+    compaction_task = asyncio.create_task(periodic_log_compaction())
+    
+    # Startup: Hash images stored before upload de-duplication (in the background)
+    backfill_task = asyncio.create_task(asyncio.to_thread(_backfill_content_hashes))
+    
+    # Startup: Queue thumbnails/previews that are missing or older than their image
+    if pregenerate_enabled():
+        try:
+            queued = await asyncio.to_thread(_queue_stale_thumbnails)
+            if queued:
+                print(f"[Startup] Queued {queued} image(s) for thumbnail generation")
+        except Exception as e:
+            print(f"[Init] Warning: Thumbnail pre-generation failed: {e}")
+    
+    # Startup: Resume the persistent job queue (requeues jobs interrupted by a restart)
+    try:
+        await job_scheduler.start()
+    except Exception as e:
+        print(f"[Init] Warning: Job scheduler failed to start: {e}")
+        traceback.print_exc()
+    
     yield
     
+    # Shutdown: Stop dispatching jobs (running jobs are requeued on next start)
+    await job_scheduler.stop()
+    
     # Shutdown: Cancel cleanup task
+    backfill_task.cancel()
     cleanup_task.cancel()
+    compaction_task.cancel()
     try:
         await cleanup_task
     except asyncio.CancelledError:
         pass
+    
+    # Shutdown: Stop thumbnail worker processes
+    thumbnail_pipeline.shutdown()
+    
+    # Shutdown: Write queued execution logs
+    await asyncio.to_thread(script_logger.close)
+    
+    # Shutdown: Stop pooled sandbox workers (warm pool runtime only)
+    if hasattr(script_runner, "shutdown"):
+        script_runner.shutdown()
 
 app = FastAPI(title="Python Image Sandbox MVP", lifespan=lifespan)
 
@@ -945,11 +1059,687 @@ def clamp(v, lo, hi, default):
     except Exception:
         return default
 
+class JobSetupError(Exception):
+    """Raised while preparing a job workspace; carries the error response for the client."""
+
+    def __init__(self, payload: dict, status_code: int):
+        super().__init__(payload.get("error", "Job setup failed"))
+        self.payload = payload
+        self.status_code = status_code
+
+def _create_execution_record(db: Session, user_id: str, session_id: Optional[str], user_prompt: Optional[str]):
+    """Create the analytics ExecutionSession row for a run (registered users only)."""
+    user_exists = db.query(User).filter(User.id == user_id).first()
+    if not user_exists:
+        return None
+    execution_record = ExecutionSession(
+        id=session_id or str(uuid.uuid4()),
+        user_id=user_id,
+        script_name=user_prompt[:100] if user_prompt else "Untitled",
+        status="running",
+        started_at=datetime.utcnow()
+    )
+    db.add(execution_record)
+    db.commit()
+    print(f"[RUN] Created execution session record: {execution_record.id}")
+    return execution_record
+
+def _create_job_workspace(job_id: str) -> pathlib.Path:
+    """Create outputs/{job_id}/{input,result,code} and mark the job as active."""
+    job_dir = OUTPUTS_DIR / job_id
+    in_dir = job_dir / "input"
+    out_dir = job_dir / "result"
+    code_dir = job_dir / "code"
+    matplotlib_dir = out_dir / ".matplotlib"
+    for d in (in_dir, out_dir, code_dir):
+        d.mkdir(parents=True, exist_ok=True)
+
+    # Mark this job as active (cleanup will skip it)
+    active_marker_path = job_dir / ACTIVE_MARKER_NAME
+    try:
+        active_marker_path.write_text(str(time.time()), encoding="utf-8")
+    except Exception as e:
+        print(f"Warning: Failed to write active marker in {job_dir}: {e}")
+
+    # Create matplotlib config directory with world-writable permissions
+    # This must exist before the container runs, as the runner user may not have
+    # permission to create directories in the mounted volume. We make it world-writable
+    # so the container user can write to it regardless of UID/GID mismatch.
+    matplotlib_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        # Set permissions to 777 (world-writable) so container user can write
+        # This is safe because it's inside the job-specific output directory
+        os.chmod(str(matplotlib_dir), 0o777)
+        print(f"Created matplotlib directory: {matplotlib_dir} with permissions 777")
+    except Exception as e:
+        print(f"Warning: Could not set permissions on {matplotlib_dir}: {e}")
+        pass  # If chmod fails, continue anyway - directory exists, container will handle permissions
+
+    # The sandbox runs as an unprivileged user: let it write its results
+    try:
+        os.chmod(str(out_dir), 0o777)
+    except Exception as e:
+        print(f"Warning: Could not set permissions on {out_dir}: {e}")
+
+    # Verify directory exists and is writable
+    if not matplotlib_dir.exists():
+        print(f"ERROR: matplotlib_dir does not exist after creation: {matplotlib_dir}")
+    elif not os.access(str(matplotlib_dir), os.W_OK):
+        print(f"WARNING: matplotlib_dir is not writable: {matplotlib_dir}")
+
+    return job_dir
+
+def _write_job_code(job_dir: pathlib.Path, code: str) -> pathlib.Path:
+    """Write the user script to code/main.py."""
+    main_py_path = job_dir / "code" / "main.py"
+    print(f"[RUN] Writing code to: {main_py_path}")
+    print(f"[RUN] Code to write length: {len(code) if code else 0} characters")
+
+    if not code or len(code) == 0:
+        print(f"[RUN] ✗ ERROR: Code is empty!")
+        raise JobSetupError({"error": "No code provided. Code parameter is empty."}, 400)
+
+    main_py_path.write_text(code, encoding="utf-8")
+
+    # Verify file was created and has content
+    if not main_py_path.exists():
+        print(f"[RUN] ✗ ERROR: File does not exist after write: {main_py_path}")
+        raise JobSetupError({"error": f"Failed to create code file at {main_py_path}"}, 500)
+
+    file_size = main_py_path.stat().st_size
+    print(f"[RUN] ✓ Created code file: {main_py_path} ({file_size} bytes)")
+
+    if file_size == 0:
+        print(f"[RUN] ✗ ERROR: File is empty after write!")
+        raise JobSetupError({"error": "Code file is empty after write"}, 500)
+    return main_py_path
+
+TILESET_CONFIG_NAME = "tileset.json"  # read by MapsBridge.ScriptTileSetRequest.from_stdin
+TILE_ARCHIVE_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif"}
+MAX_TILE_ARCHIVE_FILES = int(os.getenv("MAX_TILE_ARCHIVE_FILES", "5000"))
+MAX_TILE_ARCHIVE_BYTES = int(os.getenv("MAX_TILE_ARCHIVE_BYTES", str(4 * 1024 ** 3)))
+
+def _tileset_options(tile_mode: Optional[str], tile_columns: Optional[int], tile_rows: Optional[int],
+                     tile_overlap: Optional[float], tile_workers: Optional[int] = None) -> Optional[dict]:
+    """tileset.json contents for a multi-tile run, or None for the default single tile.
+
+    tile_workers > 1 splits the tiles across that many parallel sandboxes
+    (see tile_fanout). It also applies to .zip tile archives.
+    """
+    options = {}
+    if tile_workers and tile_workers > 1:
+        options["workers"] = clamp(tile_workers, 1, MAX_TILE_WORKERS, 1)
+    if (tile_mode or "single").lower() != "grid":
+        return options or None
+    options["mode"] = "grid"
+    if tile_columns:
+        options["columns"] = clamp(tile_columns, 1, 1000, 1)
+    if tile_rows:
+        options["rows"] = clamp(tile_rows, 1, 1000, 1)
+    if tile_overlap:
+        options["overlap"] = min(max(float(tile_overlap), 0.0), 0.9)
+    return options
+
+def _extract_tile_archive(archive_path: pathlib.Path, in_dir: pathlib.Path) -> pathlib.Path:
+    """Unpack the images of an uploaded .zip (a folder of tiles) flat into input/."""
+    import zipfile
+    try:
+        archive = zipfile.ZipFile(archive_path)
+    except zipfile.BadZipFile:
+        raise JobSetupError({"error": "Uploaded .zip file is not a valid archive"}, 400)
+    members = [
+        m for m in archive.infolist()
+        if not m.is_dir()
+        and pathlib.Path(m.filename).suffix.lower() in TILE_ARCHIVE_IMAGE_EXTENSIONS
+        and not pathlib.PurePosixPath(m.filename).name.startswith(".")
+        and "__MACOSX" not in m.filename
+    ]
+    if not members:
+        raise JobSetupError({"error": "The .zip file contains no images"}, 400)
+    if len(members) > MAX_TILE_ARCHIVE_FILES:
+        raise JobSetupError({"error": f"The .zip file has more than {MAX_TILE_ARCHIVE_FILES} images"}, 413)
+    if sum(m.file_size for m in members) > MAX_TILE_ARCHIVE_BYTES:
+        raise JobSetupError({"error": "The .zip file is too large once extracted"}, 413)
+
+    written = []
+    for member in members:
+        # Flatten: only the base name is used, so entries cannot escape input/
+        target = in_dir / pathlib.PurePosixPath(member.filename).name
+        if target.exists():
+            raise JobSetupError({"error": f"Duplicate image name in .zip: {target.name}"}, 400)
+        with archive.open(member) as src, open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        written.append(target)
+    print(f"[RUN] ✓ Extracted {len(written)} tile image(s) from archive")
+    return sorted(written)[0]
+
+def _resolve_stored_image(db: Session, user_id: Optional[str], library_image_id: Optional[str],
+                          user_image_id: Optional[str]) -> tuple[pathlib.Path, str]:
+    """Find the stored original for an image referenced by id. Returns (path, filename)."""
+    if library_image_id:
+        record = db.query(LibraryImage).filter(LibraryImage.id == library_image_id).first()
+        if not record:
+            raise JobSetupError({"error": "Library image not found"}, 404)
+    else:
+        record = db.query(UserImage).filter(UserImage.id == user_image_id).first()
+        # Own, global, or linked to a community script (anyone may run those)
+        visible = record is not None and (
+            record.is_global or record.user_id == user_id
+            or db.query(UserScript).filter(
+                UserScript.is_community == True,
+                UserScript.community_image_id == record.id,
+            ).first() is not None
+        )
+        if not visible:
+            raise JobSetupError({"error": "Image not found"}, 404)
+
+    # Same lookup order as GET /library/images/{filename}
+    for base_dir in (LIBRARY_IMAGES_DIR, USER_UPLOADS_DIR):
+        image_path = base_dir / record.filename
+        if image_path.is_file():
+            return image_path, record.filename
+    raise JobSetupError({"error": "Image file not found"}, 404)
+
+async def _save_job_input(
+    job_dir: pathlib.Path,
+    use_sample: str,
+    image: Optional[UploadFile],
+    db: Optional[Session] = None,
+    user_id: Optional[str] = None,
+    library_image_id: Optional[str] = None,
+    user_image_id: Optional[str] = None,
+    tileset: Optional[dict] = None,
+    upload_id: Optional[str] = None,
+) -> pathlib.Path:
+    """Place the input image in input/ (EXIF orientation applied, TIFF gets a PNG preview).
+
+    Images referenced by library_image_id / user_image_id are prepared once per
+    content hash and hardlinked from the input cache, so the browser does not
+    have to download and re-upload them for every run.
+
+    Uploads (image, or upload_id of a finished resumable upload) are streamed
+    to disk and hashed on the way; they are never held in memory.
+
+    Multi-tile runs: a .zip upload (a folder of tiles) is unpacked into input/
+    and always runs as a tile grid. tileset (see _tileset_options) is written
+    to input/tileset.json for MapsBridge.
+    """
+    in_dir = job_dir / "input"
+    tileset = dict(tileset or {})
+    input_image_path = await _place_job_input(
+        in_dir, use_sample, image, db, user_id, library_image_id, user_image_id, tileset, upload_id
+    )
+    if tileset:
+        (in_dir / TILESET_CONFIG_NAME).write_text(json.dumps(tileset), encoding="utf-8")
+    return input_image_path
+
+async def _place_job_input(
+    in_dir: pathlib.Path,
+    use_sample: str,
+    image: Optional[UploadFile],
+    db: Optional[Session],
+    user_id: Optional[str],
+    library_image_id: Optional[str],
+    user_image_id: Optional[str],
+    tileset: dict,
+    upload_id: Optional[str] = None,
+) -> pathlib.Path:
+    """Write the run's input into in_dir; tileset may be updated for archives."""
+    # Prepare input image
+    # Determine file extension from uploaded file or default to PNG
+    if (use_sample or "false").lower() == "true":
+      input_image_path = in_dir / "image.png"
+      sample = (ASSETS_DIR / "sample.png")
+      if not sample.exists():
+        raise JobSetupError({"error": "Sample image not found"}, 404)
+      shutil.copyfile(sample, input_image_path)
+      return input_image_path
+
+    if library_image_id or user_image_id:
+      stored_path, stored_name = _resolve_stored_image(db, user_id, library_image_id, user_image_id)
+      file_extension = normalize_extension(stored_name)
+      try:
+        return await asyncio.to_thread(input_cache.materialize_file, stored_path, file_extension, in_dir)
+      except Exception as e:
+        raise JobSetupError({"error": f"Failed to prepare image: {str(e)}"}, 500)
+
+    if image is None and not upload_id:
+      raise JobSetupError({"error": "No image provided. Please select an image from the library or upload a new one."}, 400)
+
+    try:
+      stored = upload_store.take(upload_id) if upload_id else await upload_store.save(image)
+    except UploadError as e:
+      raise JobSetupError({"error": str(e), **e.extra}, e.status_code)
+    # Preserve original file extension (supports PNG, JPG, TIFF, etc.)
+    # skimage.imageio can read various formats including TIFF
+    file_extension = normalize_extension(stored.filename)
+    try:
+      if file_extension == ".zip":
+        tileset.setdefault("mode", "grid")
+        # Identifies the whole archive (for the result cache)
+        tileset["source_sha256"] = stored.sha256
+        return await asyncio.to_thread(_extract_tile_archive, stored.path, in_dir)
+      return await asyncio.to_thread(
+          input_cache.materialize_upload, stored.path, stored.sha256, file_extension, in_dir
+      )
+    except JobSetupError:
+      raise
+    except Exception as e:
+      raise JobSetupError({"error": f"Failed to save image: {str(e)}"}, 500)
+    finally:
+      stored.path.unlink(missing_ok=True)
+
+def _result_cache_key(code: str, input_image_path: Optional[pathlib.Path], script_parameters: Optional[str]) -> str:
+    """Result cache key for a run (blocking: may hash the input and query the runner image)."""
+    input_digest = None
+    if input_image_path is not None and input_image_path.exists():
+        input_digest = input_cache.file_digest(input_image_path)
+        # The tile grid layout (and, for archives, the archive hash) changes the result too
+        tileset_path = input_image_path.parent / TILESET_CONFIG_NAME
+        if tileset_path.exists():
+            input_digest += ":" + tileset_path.read_text(encoding="utf-8")
+    if hasattr(script_runner, "image_digest"):
+        runner_digest = script_runner.image_digest()
+    else:
+        runner_digest = _execution_runtime
+    return result_cache.make_key(code, input_digest, script_parameters, runner_digest)
+
+async def _run_in_sandbox(job_id: str, code: str, request_json: str, script_parameters: Optional[str],
+                          on_line) -> dict:
+    """Run outputs/{job_id}/code/main.py with the detected runtime and return the runner result."""
+    job_dir = OUTPUTS_DIR / job_id
+    if _execution_runtime == "kubernetes":
+        return await script_runner.run_script_async(
+            job_id=job_id,
+            script_content=code,
+            request_json=request_json,
+            input_path=str(job_dir / "input"),
+            output_path=str(job_dir / "result"),
+            timeout=60,
+            script_parameters=script_parameters or "",
+            on_line=on_line
+        )
+    # Docker runner uses file paths
+    return await script_runner.run_script_async(
+        job_id=job_id,
+        script_path=str(job_dir / "code" / "main.py"),
+        request_path=str(job_dir / "code" / "request.json"),
+        input_path=str(job_dir / "input"),
+        output_path=str(job_dir / "result"),
+        timeout=60,
+        script_parameters=script_parameters or "",
+        on_line=on_line
+    )
+
+async def _execute_job(
+    db: Session,
+    job_id: str,
+    code: str,
+    user_id: str,
+    session_id: Optional[str] = None,
+    previous_attempt_id: Optional[str] = None,
+    user_prompt: Optional[str] = None,
+    ai_model: Optional[str] = None,
+    script_parameters: Optional[str] = "",
+    input_image_path: Optional[pathlib.Path] = None,
+    execution_record=None,
+    debug_mode_activated: bool = False,
+    execution_start_time: Optional[float] = None,
+    slot_wait: Optional[float] = -1,
+    event_key: Optional[str] = None,
+    use_result_cache: bool = True,
+) -> tuple[dict, int]:
+    """Run a prepared job workspace and collect its results.
+
+    Shared by /run and the job queue. Returns (payload, status_code) where
+    payload is the /run response body. The head of the output is written to
+    logs/stdout.log and a bounded tail is kept in memory (both up to
+    MAX_CAPTURED_OUTPUT_BYTES).
+
+    Args:
+        slot_wait: Passed to ExecutionLimiter.slot (-1 = default timeout, None = wait indefinitely)
+        event_key: If set, output lines and progress markers are published on job_events under this key
+        use_result_cache: Reuse/record the result in result_cache when it is enabled
+    """
+    if execution_start_time is None:
+        execution_start_time = time.time()
+    job_dir = OUTPUTS_DIR / job_id
+    in_dir = job_dir / "input"
+    out_dir = job_dir / "result"
+    code_dir = job_dir / "code"
+    image_filename = input_image_path.name if input_image_path else None
+    debug_mode_deactivated = False
+    stdout_log_url = f"/outputs/{job_id}/logs/stdout.log"
+    output_log = JobOutputLog(
+        job_dir / "logs" / "stdout.log",
+        publish=(lambda event, data: job_events.publish(event_key, event, data)) if event_key else None
+    )
+
+    # Execute script using detected runtime
+    print(f"Using {_execution_runtime} runtime for script execution")
+
+    # Define ProcResult class outside try block so it's available in except block
+    class ProcResult:
+        def __init__(self, returncode, stdout, stderr, truncated=False):
+            self.returncode = returncode
+            self.stdout = stdout
+            self.stderr = stderr
+            self.truncated = truncated
+
+    cache_key = None
+    cached = None
+    fanout = None
+    try:
+        # Prepare request JSON
+        request_data = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "user_prompt": user_prompt
+        }
+        request_json = json.dumps(request_data)
+
+        # Write request.json to code_dir (needed for Docker runner, harmless for K8s)
+        request_json_path = code_dir / "request.json"
+        request_json_path.write_text(request_json, encoding="utf-8")
+
+        # Memoized result: same code, input, parameters and runner image
+        if result_cache is not None and use_result_cache:
+            try:
+                cache_key = await asyncio.to_thread(_result_cache_key, code, input_image_path, script_parameters)
+                cached = await asyncio.to_thread(result_cache.lookup, cache_key, out_dir)
+            except Exception as e:
+                print(f"⚠ Result cache lookup failed: {e}")
+                cache_key = None
+
+        if cached is not None:
+            print(f"[RUN] ✓ Result cache hit ({cache_key[:12]}), skipping execution")
+            for line in cached.get("stdout", "").splitlines():
+                output_log("stdout", line)
+            result = {
+                "status": "success",
+                "logs": cached.get("stdout", ""),
+                "output_truncated": cached.get("stdout_truncated", False),
+            }
+        else:
+            # Run script using the detected runtime (off the event loop, within concurrency limits)
+            workers = requested_workers(in_dir)
+            try:
+                if workers > 1:
+                    # Tile fan-out: one user slot for the job, one global slot per shard
+                    async def run_shard(shard_id, on_line):
+                        async with execution_limiter.slot(user_id, wait=None, user=False):
+                            return await _run_in_sandbox(shard_id, code, request_json, script_parameters, on_line)
+
+                    async with execution_limiter.slot(user_id, wait=slot_wait, global_=False):
+                        result = await run_tile_fanout(job_dir, workers, _create_job_workspace, run_shard, output_log)
+                else:
+                    async with execution_limiter.slot(user_id, wait=slot_wait):
+                        result = await _run_in_sandbox(job_id, code, request_json, script_parameters, output_log)
+            except ExecutionLimitExceeded as e:
+                if execution_record:
+                    execution_record.status = "rejected"
+                    execution_record.error_message = str(e)
+                    execution_record.completed_at = datetime.utcnow()
+                    db.commit()
+                return {
+                    "error": str(e),
+                    "message": "Too many scripts are running right now. Please try again in a moment.",
+                    "limit_scope": e.scope,
+                }, 429
+
+        # Check for timeout status
+        if result.get("status") == "timeout":
+            # Log timeout failure
+            log_id = script_logger.log_failure(
+                code=code,
+                error_message="Execution timed out",
+                stderr="Script execution exceeded the 60 second timeout limit",
+                return_code=-1,
+                session_id=session_id,
+                user_prompt=user_prompt,
+                ai_model=ai_model,
+                image_filename=image_filename,
+                previous_attempt_id=previous_attempt_id,
+                error_category="timeout"
+            )
+
+            # Update execution record
+            if execution_record:
+                execution_record.status = "timeout"
+                execution_record.error_message = "Script execution exceeded the 60 second timeout limit"
+                execution_record.completed_at = datetime.utcnow()
+                db.commit()
+
+            return {
+                "error": "Execution timed out",
+                "message": "Script execution exceeded the 60 second timeout limit",
+                "timeout": 60,
+                "log_id": log_id,
+                "session_id": session_id or log_id
+            }, 504
+
+        fanout = result.get("fanout")
+        proc = ProcResult(
+            returncode=0 if result["status"] == "success" else 1,
+            stdout=result.get("logs", ""),
+            stderr=result.get("error", "") if result["status"] == "error" else "",
+            truncated=bool(result.get("output_truncated"))
+        )
+    except Exception as e:
+        print(f"Script execution failed ({_execution_runtime}): {e}")
+        traceback.print_exc()
+        proc = ProcResult(returncode=1, stdout="", stderr=str(e))
+    finally:
+        output_log.close()
+
+    if proc.returncode != 0:
+        # Provide detailed error information for debugging
+        error_details = {
+            "error": "Execution failed",
+            "return_code": proc.returncode,
+            "stdout": proc.stdout if proc.stdout else "(no output)",
+            "stderr": proc.stderr if proc.stderr else "(no error output)",
+            "stdout_truncated": proc.truncated,
+            "stdout_log_url": stdout_log_url,
+            "message": f"Script exited with code {proc.returncode}"
+        }
+        # If stderr is empty but stdout has content, include it in the error message
+        if not proc.stderr and proc.stdout:
+            error_details["message"] = f"Script exited with code {proc.returncode}. Check stdout for details."
+        elif proc.stderr:
+            error_details["message"] = f"Script exited with code {proc.returncode}. Error: {proc.stderr[:200]}"
+
+        # Log failure
+        log_id = script_logger.log_failure(
+            code=code,
+            error_message=error_details["message"],
+            stderr=proc.stderr or "",
+            return_code=proc.returncode,
+            session_id=session_id,
+            user_prompt=user_prompt,
+            ai_model=ai_model,
+            image_filename=image_filename,
+            stdout=proc.stdout,
+            previous_attempt_id=previous_attempt_id
+        )
+
+        # Update execution record
+        if execution_record:
+            execution_record.status = "error"
+            execution_record.error_message = error_details["message"]
+            execution_record.completed_at = datetime.utcnow()
+            db.commit()
+
+        error_details["log_id"] = log_id
+        error_details["session_id"] = session_id or log_id
+        if fanout:
+            error_details["fanout"] = fanout
+
+        return error_details, 400
+
+    # Collect all output files, with the metadata and previews the runner recorded (see output_manifest)
+    output_files = []
+    if out_dir.exists():
+        manifest = read_manifest(out_dir)
+        for file_path in out_dir.iterdir():
+            if file_path.is_file():
+                file_info = {
+                    "name": file_path.name,
+                    "url": f"/outputs/{job_id}/result/{file_path.name}",
+                    "type": file_path.suffix.lower() if file_path.suffix else "unknown"
+                }
+                if file_path.name in manifest:
+                    file_info.update(output_metadata(manifest[file_path.name], out_dir, f"/outputs/{job_id}/result"))
+                else:
+                    file_info["size"] = file_path.stat().st_size
+                if file_info["type"] in DEEP_ZOOM_EXTENSIONS:
+                    # Size from the header only; the viewer switches to tiles for large images
+                    try:
+                        if "width" not in file_info:
+                            header = read_header(file_path)
+                            file_info["width"], file_info["height"] = header.width, header.height
+                        file_info["dzi_url"] = f"/tiles/outputs/{job_id}/result/{file_path.name}.dzi"
+                    except Exception:
+                        pass
+                output_files.append(file_info)
+
+    # Check if any output files were produced
+    if not output_files:
+        return {"error": "No output files produced"}, 400
+
+    # Some tile workers failed: the outputs are partial, so they are neither
+    # cached nor logged as a success
+    partial = bool(fanout and fanout.get("failed"))
+
+    if cache_key and cached is None and not partial:
+        try:
+            await asyncio.to_thread(result_cache.store, cache_key, out_dir, proc.stdout, proc.truncated)
+        except Exception as e:
+            print(f"⚠ Could not store result in cache: {e}")
+
+    # Check if result.png exists (for backward compatibility)
+    result_path = out_dir / "result.png"
+    result_url = f"/outputs/{job_id}/result/result.png" if result_path.exists() else None
+
+    # Find original image URL (check for common image extensions)
+    # For TIFF files, prefer PNG version if it exists (for browser display)
+    # Otherwise check all formats
+    original_url = None
+    # First check if PNG exists (might be converted from TIFF)
+    png_path = job_dir / "input" / "image.png"
+    if png_path.exists():
+      original_url = f"/outputs/{job_id}/input/image.png"
+      print(f"✓ Found original image (PNG): {original_url}")
+    else:
+      # Check other formats
+      for ext in [".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff"]:
+        image_path = job_dir / "input" / f"image{ext}"
+        if image_path.exists():
+          original_url = f"/outputs/{job_id}/input/image{ext}"
+          print(f"✓ Found original image ({ext}): {original_url}")
+          break
+
+    if not original_url:
+      print(f"⚠ Warning: No original image found in {job_dir / 'input'}")
+      # List what files actually exist for debugging
+      if (job_dir / "input").exists():
+        existing_files = list((job_dir / "input").iterdir())
+        print(f"  Files in input directory: {[f.name for f in existing_files]}")
+
+    # Check if we should remove debug logging (successful execution with debug code)
+    cleaned_code = None
+    if not partial and has_debug_logging(code):
+        print(f"[RUN] ✓ SUCCESS with debug logging - preparing cleanup")
+        cleaned_code = remove_debug_logging(code)
+        debug_mode_deactivated = True
+        print(f"[RUN] 🧹 Debug logging removed from code")
+
+    execution_time = time.time() - execution_start_time
+    if partial:
+        shard_errors = result.get("error", "")
+        partial_message = f"{fanout['failed']} of {fanout['workers']} tile workers failed"
+        log_id = script_logger.log_failure(
+            code=code,
+            error_message=partial_message,
+            stderr=shard_errors,
+            return_code=1,
+            session_id=session_id,
+            user_prompt=user_prompt,
+            ai_model=ai_model,
+            image_filename=image_filename,
+            stdout=proc.stdout,
+            previous_attempt_id=previous_attempt_id,
+            error_category="partial_fanout"
+        )
+    else:
+        # Log successful execution
+        log_id = script_logger.log_success(
+            code=code,
+            output_files=[f["name"] for f in output_files],
+            session_id=session_id,
+            user_prompt=user_prompt,
+            ai_model=ai_model,
+            image_filename=image_filename,
+            stdout=proc.stdout,
+            execution_time=execution_time,
+            previous_attempt_id=previous_attempt_id
+        )
+
+    # Update execution record
+    if execution_record:
+        execution_record.status = "error" if partial else "success"
+        if partial:
+            execution_record.error_message = partial_message
+        execution_record.completed_at = datetime.utcnow()
+        db.commit()
+
+    response_data = {
+        "job_id": job_id,
+        "user_id": user_id,  # Return user_id so frontend can store it
+        "original_url": original_url,
+        "result_url": result_url,
+        "output_files": output_files,
+        "stdout": proc.stdout,
+        "stdout_truncated": proc.truncated,
+        "stdout_log_url": stdout_log_url,
+        "log_id": log_id,
+        "session_id": session_id or log_id,
+        "cached": cached is not None
+    }
+    if fanout:
+        # Per-shard status; failed shards are listed here while the others' outputs are returned
+        response_data["fanout"] = fanout
+        response_data["partial"] = partial
+
+    # Add diagnostic mode information
+    if debug_mode_activated:
+        response_data["diagnostic_mode"] = {
+            "activated": True,
+            "message": "🔍 Diagnostic mode activated: Verbose logging added to help identify the issue."
+        }
+
+    if debug_mode_deactivated and cleaned_code:
+        response_data["diagnostic_mode"] = {
+            "deactivated": True,
+            "message": "✓ Issue resolved! Diagnostic logging has been removed.",
+            "cleaned_code": cleaned_code
+        }
+
+    return response_data, 200
+
 @app.post("/run")
 async def run_code(
     code: str = Form(...),
     image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     use_sample: Optional[str] = Form("false"),
+    library_image_id: Optional[str] = Form(None),
+    user_image_id: Optional[str] = Form(None),
+    tile_mode: Optional[str] = Form("single"),
+    tile_columns: Optional[int] = Form(None),
+    tile_rows: Optional[int] = Form(None),
+    tile_overlap: Optional[float] = Form(None),
+    tile_workers: Optional[int] = Form(None),
     user_id: Optional[str] = Form(None),
     session_id: Optional[str] = Form(None),
     previous_attempt_id: Optional[str] = Form(None),
@@ -957,13 +1747,36 @@ async def run_code(
     ai_model: Optional[str] = Form(None),
     inject_debug: Optional[str] = Form("false"),
     script_parameters: Optional[str] = Form(""),
+    stream_id: Optional[str] = Form(None),
+    use_cache: Optional[str] = Form("true"),
     db: Session = Depends(get_db),
 ):
     """
     Receives Python source code + optional image.
     Runs the code inside a sandbox container and returns the result URL.
     If user_id is provided, cleans up previous files for that user.
-    
+
+    Input image: upload it as `image`, or reference a stored one with
+    library_image_id / user_image_id (preferred: nothing is re-uploaded and
+    the prepared input is reused across runs). Very large files can be sent
+    through the resumable /uploads API first and passed as upload_id.
+
+    Multi-tile runs: tile_mode=grid turns the input into a MAPS tile grid
+    (a multi-page TIFF gives one tile per page; tile_columns / tile_rows /
+    tile_overlap set the layout). A .zip of tile images always runs as a grid.
+    tile_workers=N runs the tiles in N parallel sandboxes and merges their
+    outputs; the response's "fanout" entry reports each worker's status.
+    When only some workers succeed, the response is marked "partial": their
+    outputs are returned, but the run is logged as a failure and not cached.
+
+    Result cache: when RESULT_CACHE_ENABLED is set, an identical earlier run
+    (same code, image, parameters and runner image) is returned without
+    executing; pass use_cache=false to force a fresh run.
+
+    Live output: pass a client-generated stream_id and open
+    GET /run/events/{stream_id} to receive output lines and progress while
+    the request is in flight.
+
     Logging parameters:
     - session_id: Groups related attempts (failures -> success)
     - previous_attempt_id: Links to previous failed attempt
@@ -975,16 +1788,20 @@ async def run_code(
     print(f"[RUN] Received /run request")
     print(f"[RUN] Code length: {len(code) if code else 0} characters")
     print(f"[RUN] First 200 chars of code: {code[:200] if code else 'NO CODE'}")
-    print(f"[RUN] Image provided: {image is not None}")
+    print(f"[RUN] Image provided: {image is not None or bool(upload_id)}")
+    print(f"[RUN] Image reference: library={library_image_id} user={user_image_id}")
     print(f"[RUN] Use sample: {use_sample}")
     print(f"[RUN] User ID: {user_id}")
     print(f"[RUN] Script parameters: {script_parameters!r}")
     print(f"{'='*80}\n")
     active_marker_path = None
     execution_record = None
-    original_code = code  # Store original code for cleanup detection
     debug_mode_activated = False
-    debug_mode_deactivated = False
+    if stream_id and not STREAM_ID_PATTERN.match(stream_id):
+        stream_id = None
+    if stream_id:
+        job_events.open(stream_id)
+    status_code = 500
 
     try:
       # Check if user explicitly requested debug injection
@@ -993,428 +1810,52 @@ async def run_code(
           code = inject_debug_logging(code)
           debug_mode_activated = True
           print(f"[RUN] ✓ Diagnostic logging injected")
-      
+
       # Generate user_id if not provided
       if not user_id:
           user_id = str(uuid.uuid4())
-      
+
       # Create execution session record in database (if user exists)
-      if user_id:
-          user_exists = db.query(User).filter(User.id == user_id).first()
-          if user_exists:
-              execution_record = ExecutionSession(
-                  id=session_id or str(uuid.uuid4()),
-                  user_id=user_id,
-                  script_name=user_prompt[:100] if user_prompt else "Untitled",
-                  status="running",
-                  started_at=datetime.utcnow()
-              )
-              db.add(execution_record)
-              db.commit()
-              print(f"[RUN] Created execution session record: {execution_record.id}")
-      
+      execution_record = _create_execution_record(db, user_id, session_id, user_prompt)
+
       job_id = str(uuid.uuid4())
-      job_dir = OUTPUTS_DIR / job_id
-      in_dir = job_dir / "input"
-      out_dir = job_dir / "result"
-      code_dir = job_dir / "code"
-      matplotlib_dir = out_dir / ".matplotlib"
-      for d in (in_dir, out_dir, code_dir):
-          d.mkdir(parents=True, exist_ok=True)
-      
-      # Mark this job as active (cleanup will skip it)
+      job_dir = _create_job_workspace(job_id)
       active_marker_path = job_dir / ACTIVE_MARKER_NAME
+
       try:
-          active_marker_path.write_text(str(time.time()), encoding="utf-8")
-      except Exception as e:
-          print(f"Warning: Failed to write active marker in {job_dir}: {e}")
-      
-      # Create matplotlib config directory with world-writable permissions
-      # This must exist before the container runs, as the runner user may not have
-      # permission to create directories in the mounted volume. We make it world-writable
-      # so the container user can write to it regardless of UID/GID mismatch.
-      matplotlib_dir.mkdir(parents=True, exist_ok=True)
-      try:
-          # Set permissions to 777 (world-writable) so container user can write
-          # This is safe because it's inside the job-specific output directory
-          os.chmod(str(matplotlib_dir), 0o777)
-          print(f"Created matplotlib directory: {matplotlib_dir} with permissions 777")
-      except Exception as e:
-          print(f"Warning: Could not set permissions on {matplotlib_dir}: {e}")
-          pass  # If chmod fails, continue anyway - directory exists, container will handle permissions
-      
-      # Verify directory exists and is writable
-      if not matplotlib_dir.exists():
-          print(f"ERROR: matplotlib_dir does not exist after creation: {matplotlib_dir}")
-      elif not os.access(str(matplotlib_dir), os.W_OK):
-          print(f"WARNING: matplotlib_dir is not writable: {matplotlib_dir}")
-
-      # Write code
-      main_py_path = code_dir / "main.py"
-      print(f"[RUN] Writing code to: {main_py_path}")
-      print(f"[RUN] Code to write length: {len(code)} characters")
-      
-      if not code or len(code) == 0:
-          print(f"[RUN] ✗ ERROR: Code is empty!")
-          return JSONResponse({"error": "No code provided. Code parameter is empty."}, status_code=400)
-      
-      main_py_path.write_text(code, encoding="utf-8")
-      
-      # Verify file was created and has content
-      if not main_py_path.exists():
-          print(f"[RUN] ✗ ERROR: File does not exist after write: {main_py_path}")
-          return JSONResponse({"error": f"Failed to create code file at {main_py_path}"}, status_code=500)
-      
-      file_size = main_py_path.stat().st_size
-      print(f"[RUN] ✓ Created code file: {main_py_path} ({file_size} bytes)")
-      
-      if file_size == 0:
-          print(f"[RUN] ✗ ERROR: File is empty after write!")
-          return JSONResponse({"error": "Code file is empty after write"}, status_code=500)
-
-      # Prepare input image
-      # Determine file extension from uploaded file or default to PNG
-      if use_sample.lower() == "true":
-        input_image_path = in_dir / "image.png"
-        sample = (ASSETS_DIR / "sample.png")
-        if not sample.exists():
-          return JSONResponse({"error": "Sample image not found"}, status_code=404)
-        shutil.copyfile(sample, input_image_path)
-      elif image is None:
-        return JSONResponse({"error": "No image provided. Please select an image from the library or upload a new one."}, status_code=400)
-      else:
-        # Preserve original file extension (supports PNG, JPG, TIFF, etc.)
-        # skimage.imageio can read various formats including TIFF
-        file_extension = pathlib.Path(image.filename).suffix.lower() if image.filename else ".png"
-        # Normalize common extensions
-        if file_extension in [".jpg", ".jpeg"]:
-          file_extension = ".jpg"
-        elif file_extension in [".tiff", ".tif"]:
-          file_extension = ".tif"
-        elif not file_extension:
-          file_extension = ".png"
-        
-        input_image_path = in_dir / f"image{file_extension}"
-        try:
-          content = await image.read()
-          
-          # Apply EXIF orientation to pixel data, then strip EXIF
-          # This ensures both browser and script see the same orientation
-          from PIL import ImageOps
-          import io as img_io
-          
-          # Load image from bytes
-          img = Image.open(img_io.BytesIO(content))
-          
-          # Apply EXIF orientation if present (rotates the actual pixels)
-          img = ImageOps.exif_transpose(img)
-          
-          # Save with orientation applied and EXIF stripped
-          with open(input_image_path, "wb") as f:
-            if file_extension == ".png":
-              img.save(f, format="PNG")
-            elif file_extension == ".jpg":
-              img.save(f, format="JPEG", quality=95, exif=b'')
-            elif file_extension in [".tif", ".tiff"]:
-              img.save(f, format="TIFF")
-            else:
-              # For other formats, save as PNG
-              img.save(f, format="PNG")
-          
-          # Convert TIFF to PNG for browser display (browsers can't display TIFF natively)
-          # Keep the original TIFF for processing, but also create a PNG version for display
-          if file_extension in [".tiff", ".tif"]:
-            png_path = in_dir / "image.png"
-            try:
-              import numpy as np
-              
-              print(f"Converting TIFF to PNG: {input_image_path} -> {png_path}")
-              img = Image.open(input_image_path)
-              img_array = np.array(img)
-              print(f"  Original: mode={img.mode}, size={img.size}, dtype={img_array.dtype}")
-              
-              # Normalize different bit depths to 8-bit (0-255)
-              needs_normalization = False
-              
-              # Check for 16-bit, 32-bit, or float images
-              if img_array.dtype in [np.uint16, np.uint32, np.int16, np.int32]:
-                needs_normalization = True
-              elif img_array.dtype in [np.float32, np.float64]:
-                needs_normalization = True
-              elif img_array.dtype == np.uint8:
-                # Check if it's a low-range image (like labeled data)
-                max_val = img_array.max()
-                if max_val < 100 and max_val > 1:
-                  needs_normalization = True
-              
-              if needs_normalization and img_array.size > 0:
-                # Normalize to 0-255 range
-                min_val = img_array.min()
-                max_val = img_array.max()
-                
-                print(f"  Normalizing: dtype={img_array.dtype}, min={min_val}, max={max_val}")
-                
-                if max_val > min_val:
-                  # Scale to 0-255
-                  normalized = ((img_array - min_val) / (max_val - min_val) * 255).astype(np.uint8)
-                  img = Image.fromarray(normalized)
-                else:
-                  # All same value - create blank image
-                  img = Image.fromarray(np.zeros_like(img_array, dtype=np.uint8))
-              
-              # Convert to appropriate mode for PNG
-              if img.mode not in ('RGB', 'RGBA', 'L'):
-                if img.mode in ('LA',):
-                  img = img.convert('RGBA')
-                elif img.mode in ('P', 'I', 'F'):
-                  img = img.convert('RGB')
-                elif len(img.getbands()) == 1:
-                  img = img.convert('L')  # Keep as grayscale
-                else:
-                  img = img.convert('RGB')
-              
-              img.save(png_path, "PNG")
-              
-              # Verify the PNG was created
-              if png_path.exists():
-                file_size = png_path.stat().st_size
-                print(f"✓ Converted TIFF to PNG: {png_path} ({file_size} bytes)")
-              else:
-                print(f"⚠ Warning: PNG conversion completed but file not found at {png_path}")
-            except Exception as e:
-              print(f"⚠ Warning: Failed to convert TIFF to PNG: {e}")
-              traceback.print_exc()
-              # Continue anyway - the TIFF file is still available for processing
-        except Exception as e:
-          return JSONResponse({"error": f"Failed to save image: {str(e)}"}, status_code=500)
-
-      # Execute script using detected runtime
-      print(f"Using {_execution_runtime} runtime for script execution")
-      
-      # Define ProcResult class outside try block so it's available in except block
-      class ProcResult:
-          def __init__(self, returncode, stdout, stderr):
-              self.returncode = returncode
-              self.stdout = stdout
-              self.stderr = stderr
-      
-      try:
-          # Prepare request JSON
-          request_data = {
-              "user_id": user_id,
-              "session_id": session_id,
-              "user_prompt": user_prompt
-          }
-          request_json = json.dumps(request_data)
-          
-          # Write request.json to code_dir (needed for Docker runner, harmless for K8s)
-          request_json_path = code_dir / "request.json"
-          request_json_path.write_text(request_json, encoding="utf-8")
-          
-          # Run script using the detected runtime
-          if _execution_runtime == "kubernetes":
-              result = script_runner.run_script(
-                  job_id=job_id,
-                  script_content=code,
-                  request_json=request_json,
-                  input_path=str(in_dir),
-                  output_path=str(out_dir),
-                  timeout=60,
-                  script_parameters=script_parameters or ""
-              )
-          else:
-              # Docker runner uses file paths
-              result = script_runner.run_script(
-                  job_id=job_id,
-                  script_path=str(main_py_path),
-                  request_path=str(request_json_path),
-                  input_path=str(in_dir),
-                  output_path=str(out_dir),
-                  timeout=60,
-                  script_parameters=script_parameters or ""
-              )
-          
-          # Check for timeout status
-          if result.get("status") == "timeout":
-              # Log timeout failure
-              log_id = script_logger.log_failure(
-                  code=code,
-                  error_message="Execution timed out",
-                  stderr="Script execution exceeded the 60 second timeout limit",
-                  return_code=-1,
-                  session_id=session_id,
-                  user_prompt=user_prompt,
-                  ai_model=ai_model,
-                  image_filename=input_image_path.name if 'input_image_path' in locals() else None,
-                  previous_attempt_id=previous_attempt_id,
-                  error_category="timeout"
-              )
-              
-              # Update execution record
-              if execution_record:
-                  execution_record.status = "timeout"
-                  execution_record.error_message = "Script execution exceeded the 60 second timeout limit"
-                  execution_record.completed_at = datetime.utcnow()
-                  db.commit()
-              
-              return JSONResponse({
-                  "error": "Execution timed out",
-                  "message": "Script execution exceeded the 60 second timeout limit",
-                  "timeout": 60,
-                  "log_id": log_id,
-                  "session_id": session_id or log_id
-              }, status_code=504)
-          
-          proc = ProcResult(
-              returncode=0 if result["status"] == "success" else 1,
-              stdout=result.get("logs", ""),
-              stderr=result.get("error", "") if result["status"] == "error" else ""
-          )
-      except Exception as e:
-          print(f"Script execution failed ({_execution_runtime}): {e}")
-          traceback.print_exc()
-          proc = ProcResult(returncode=1, stdout="", stderr=str(e))
-
-      if proc.returncode != 0:
-          # Provide detailed error information for debugging
-          error_details = {
-              "error": "Execution failed",
-              "return_code": proc.returncode,
-              "stdout": proc.stdout if proc.stdout else "(no output)",
-              "stderr": proc.stderr if proc.stderr else "(no error output)",
-              "message": f"Script exited with code {proc.returncode}"
-          }
-          # If stderr is empty but stdout has content, include it in the error message
-          if not proc.stderr and proc.stdout:
-              error_details["message"] = f"Script exited with code {proc.returncode}. Check stdout for details."
-          elif proc.stderr:
-              error_details["message"] = f"Script exited with code {proc.returncode}. Error: {proc.stderr[:200]}"
-          
-          # Log failure
-          log_id = script_logger.log_failure(
-              code=code,
-              error_message=error_details["message"],
-              stderr=proc.stderr or "",
-              return_code=proc.returncode,
-              session_id=session_id,
-              user_prompt=user_prompt,
-              ai_model=ai_model,
-              image_filename=input_image_path.name if 'input_image_path' in locals() else None,
-              stdout=proc.stdout,
-              previous_attempt_id=previous_attempt_id
-          )
-          
-          # Update execution record
-          if execution_record:
-              execution_record.status = "error"
-              execution_record.error_message = error_details["message"]
-              execution_record.completed_at = datetime.utcnow()
-              db.commit()
-          
-          error_details["log_id"] = log_id
-          error_details["session_id"] = session_id or log_id
-          
-          return JSONResponse(error_details, status_code=400)
-
-      # Collect all output files
-      output_files = []
-      if out_dir.exists():
-          for file_path in out_dir.iterdir():
-              if file_path.is_file():
-                  file_info = {
-                      "name": file_path.name,
-                      "url": f"/outputs/{job_id}/result/{file_path.name}",
-                      "type": file_path.suffix.lower() if file_path.suffix else "unknown"
-                  }
-                  output_files.append(file_info)
-      
-      # Check if any output files were produced
-      if not output_files:
-          return JSONResponse({"error": "No output files produced"}, status_code=400)
-      
-      # Check if result.png exists (for backward compatibility)
-      result_path = out_dir / "result.png"
-      result_url = f"/outputs/{job_id}/result/result.png" if result_path.exists() else None
-      
-      # Find original image URL (check for common image extensions)
-      # For TIFF files, prefer PNG version if it exists (for browser display)
-      # Otherwise check all formats
-      original_url = None
-      # First check if PNG exists (might be converted from TIFF)
-      png_path = job_dir / "input" / "image.png"
-      if png_path.exists():
-        original_url = f"/outputs/{job_id}/input/image.png"
-        print(f"✓ Found original image (PNG): {original_url}")
-      else:
-        # Check other formats
-        for ext in [".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff"]:
-          image_path = job_dir / "input" / f"image{ext}"
-          if image_path.exists():
-            original_url = f"/outputs/{job_id}/input/image{ext}"
-            print(f"✓ Found original image ({ext}): {original_url}")
-            break
-      
-      if not original_url:
-        print(f"⚠ Warning: No original image found in {job_dir / 'input'}")
-        # List what files actually exist for debugging
-        if (job_dir / "input").exists():
-          existing_files = list((job_dir / "input").iterdir())
-          print(f"  Files in input directory: {[f.name for f in existing_files]}")
-
-      # Check if we should remove debug logging (successful execution with debug code)
-      cleaned_code = None
-      if has_debug_logging(code):
-          print(f"[RUN] ✓ SUCCESS with debug logging - preparing cleanup")
-          cleaned_code = remove_debug_logging(code)
-          debug_mode_deactivated = True
-          print(f"[RUN] 🧹 Debug logging removed from code")
-      
-      # Log successful execution
-      execution_time = time.time() - execution_start_time
-      log_id = script_logger.log_success(
+        _write_job_code(job_dir, code)
+        input_image_path = await _save_job_input(
+            job_dir, use_sample, image, db=db, user_id=user_id,
+            library_image_id=library_image_id, user_image_id=user_image_id,
+            tileset=_tileset_options(tile_mode, tile_columns, tile_rows, tile_overlap, tile_workers),
+            upload_id=upload_id,
+        )
+      except JobSetupError as e:
+        status_code = e.status_code
+        return JSONResponse(e.payload, status_code=e.status_code)
+
+      payload, status_code = await _execute_job(
+          db,
+          job_id=job_id,
           code=code,
-          output_files=[f["name"] for f in output_files],
+          user_id=user_id,
           session_id=session_id,
+          previous_attempt_id=previous_attempt_id,
           user_prompt=user_prompt,
           ai_model=ai_model,
-          image_filename=input_image_path.name if 'input_image_path' in locals() else None,
-          stdout=proc.stdout,
-          execution_time=execution_time,
-          previous_attempt_id=previous_attempt_id
+          script_parameters=script_parameters,
+          input_image_path=input_image_path,
+          execution_record=execution_record,
+          debug_mode_activated=debug_mode_activated,
+          execution_start_time=execution_start_time,
+          event_key=stream_id,
+          use_result_cache=(use_cache or "true").lower() != "false",
       )
-      
-      # Update execution record
-      if execution_record:
-          execution_record.status = "success"
-          execution_record.completed_at = datetime.utcnow()
-          db.commit()
-      
-      response_data = {
-          "job_id": job_id,
-          "user_id": user_id,  # Return user_id so frontend can store it
-          "original_url": original_url,
-          "result_url": result_url,
-          "output_files": output_files,
-          "stdout": proc.stdout,
-          "log_id": log_id,
-          "session_id": session_id or log_id
-      }
-      
-      # Add diagnostic mode information
-      if debug_mode_activated:
-          response_data["diagnostic_mode"] = {
-              "activated": True,
-              "message": "🔍 Diagnostic mode activated: Verbose logging added to help identify the issue."
-          }
-      
-      if debug_mode_deactivated and cleaned_code:
-          response_data["diagnostic_mode"] = {
-              "deactivated": True,
-              "message": "✓ Issue resolved! Diagnostic logging has been removed.",
-              "cleaned_code": cleaned_code
-          }
-      
-      return response_data
+      if status_code == 429:
+          return JSONResponse(payload, status_code=429, headers={"Retry-After": "5"})
+      if status_code != 200:
+          return JSONResponse(payload, status_code=status_code)
+      return payload
     except Exception as e:
       return JSONResponse(
           {"error": f"Failed to execute code: {str(e)}", "detail": traceback.format_exc()},
@@ -1426,12 +1867,276 @@ async def run_code(
           active_marker_path.unlink(missing_ok=True)
         except Exception:
           pass
+      if stream_id:
+        job_events.publish(stream_id, "done", {"status_code": status_code})
+        job_events.close(stream_id)
+
+STREAM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+# The page opens the event stream just before posting /run, which only opens
+# the stream once its upload has been received
+RUN_STREAM_WAIT_SECONDS = 30
+
+@app.get("/run/events/{stream_id}")
+async def stream_run_events(stream_id: str):
+    """Server-sent events for an in-flight /run call started with the same stream_id.
+
+    Events: "output" per line, "progress" / "activity" / "log" for MapsBridge
+    markers, and "done" when /run has finished (its response carries the result).
+    A run that has already finished gets its "done" event only; a stream_id
+    no /run has opened within RUN_STREAM_WAIT_SECONDS is a 404.
+    """
+    if not STREAM_ID_PATTERN.match(stream_id):
+        raise HTTPException(status_code=400, detail="Invalid stream_id")
+    deadline = time.monotonic() + RUN_STREAM_WAIT_SECONDS
+    while not job_events.is_open(stream_id) and job_events.finished_event(stream_id) is None:
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=404, detail="Unknown stream_id")
+        await asyncio.sleep(0.2)
+
+    def snapshot():
+        done = job_events.finished_event(stream_id)
+        return ([done], True) if done is not None else ([], False)
+
+    return StreamingResponse(
+        _sse_event_stream(stream_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Job queue API: submit a run and return immediately, then poll or stream.
+# Jobs are persisted in execution_jobs and dispatched by job_queue.JobScheduler.
+async def _run_queued_job(db: Session, job: ExecutionJob) -> tuple[dict, int]:
+    """JobScheduler executor: run one queued job through the /run pipeline."""
+    job_dir = OUTPUTS_DIR / job.id
+    if not (job_dir / "code" / "main.py").exists():
+        return {"error": "Job workspace expired before the job could run"}, 410
+    active_marker_path = job_dir / ACTIVE_MARKER_NAME
+    try:
+        active_marker_path.write_text(str(time.time()), encoding="utf-8")
+    except Exception:
+        pass
+    try:
+        execution_record = _create_execution_record(db, job.user_id, job.session_id, job.user_prompt)
+        input_image_path = job_dir / "input" / job.input_filename if job.input_filename else None
+        return await _execute_job(
+            db,
+            job_id=job.id,
+            code=job.code,
+            user_id=job.user_id,
+            session_id=job.session_id,
+            previous_attempt_id=job.previous_attempt_id,
+            user_prompt=job.user_prompt,
+            ai_model=job.ai_model,
+            script_parameters=job.script_parameters,
+            input_image_path=input_image_path,
+            execution_record=execution_record,
+            debug_mode_activated=bool(job.debug_mode_activated),
+            slot_wait=None,
+            event_key=job.id,
+        )
+    finally:
+        try:
+            active_marker_path.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+job_scheduler = create_job_scheduler(SessionLocal, _run_queued_job)
+
+@app.post("/jobs")
+async def submit_job(
+    code: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    use_sample: Optional[str] = Form("false"),
+    library_image_id: Optional[str] = Form(None),
+    user_image_id: Optional[str] = Form(None),
+    tile_mode: Optional[str] = Form("single"),
+    tile_columns: Optional[int] = Form(None),
+    tile_rows: Optional[int] = Form(None),
+    tile_overlap: Optional[float] = Form(None),
+    tile_workers: Optional[int] = Form(None),
+    user_id: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    previous_attempt_id: Optional[str] = Form(None),
+    user_prompt: Optional[str] = Form(None),
+    ai_model: Optional[str] = Form(None),
+    inject_debug: Optional[str] = Form("false"),
+    script_parameters: Optional[str] = Form(""),
+    priority: Optional[int] = Form(0),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue a script run and return its job_id immediately.
+    Takes the same form fields as /run plus an optional priority (higher runs first).
+    Poll GET /jobs/{job_id} or stream GET /jobs/{job_id}/events for the result.
+    """
+    debug_mode_activated = False
+    if (inject_debug or "false").lower() == "true" and not has_debug_logging(code):
+        code = inject_debug_logging(code)
+        debug_mode_activated = True
+    if not user_id:
+        user_id = str(uuid.uuid4())
+
+    try:
+        job_scheduler.check_capacity(db, user_id)
+    except JobQueueFull as e:
+        return JSONResponse(
+            {"error": str(e), "limit_scope": e.scope},
+            status_code=429,
+            headers={"Retry-After": "10"}
+        )
+
+    job_id = str(uuid.uuid4())
+    job_dir = _create_job_workspace(job_id)
+    try:
+        _write_job_code(job_dir, code)
+        input_image_path = await _save_job_input(
+            job_dir, use_sample, image, db=db, user_id=user_id,
+            library_image_id=library_image_id, user_image_id=user_image_id,
+            tileset=_tileset_options(tile_mode, tile_columns, tile_rows, tile_overlap, tile_workers),
+            upload_id=upload_id,
+        )
+    except JobSetupError as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return JSONResponse(e.payload, status_code=e.status_code)
+
+    job = ExecutionJob(
+        id=job_id,
+        user_id=user_id,
+        session_id=session_id,
+        status="queued",
+        priority=clamp(priority, -10, 10, 0),
+        code=code,
+        script_parameters=script_parameters or "",
+        user_prompt=user_prompt,
+        ai_model=ai_model,
+        previous_attempt_id=previous_attempt_id,
+        debug_mode_activated=debug_mode_activated,
+        input_filename=input_image_path.name,
+    )
+    db.add(job)
+    db.commit()
+    job_scheduler.notify_submitted(job)
+
+    return JSONResponse({
+        "job_id": job_id,
+        "user_id": user_id,
+        "status": job.status,
+        "queue_position": job_scheduler.queue_position(db, job),
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events",
+    }, status_code=202)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Job status; includes the /run response payload once the job has finished."""
+    job = db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    data = job.to_dict()
+    data["queue_position"] = job_scheduler.queue_position(db, job)
+    return data
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    """Cancel a job that has not started yet."""
+    job = db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_scheduler.cancel(db, job):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status} and can no longer be cancelled")
+    shutil.rmtree(OUTPUTS_DIR / job_id, ignore_errors=True)
+    return job.to_dict()
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _sse_event_stream(key: str, initial_events=None):
+    """Yield job_events for key as server-sent events until a "done" event.
+
+    initial_events(): optional callable returning (events, finished) that is
+    evaluated after subscribing, so no transition between the snapshot and
+    the live stream is missed.
+    """
+    queue = job_events.subscribe(key)
+    try:
+        if initial_events is not None:
+            events, finished = initial_events()
+            for event, data in events:
+                yield _sse_event(event, data)
+            if finished:
+                return
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse_event(event, data)
+            if event == "done":
+                return
+    finally:
+        job_events.unsubscribe(key, queue)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events for a job.
+
+    Events: "status" on every state change, "output" per line, "progress" /
+    "activity" / "log" for MapsBridge markers, then "done" with the result.
+    """
+    db = SessionLocal()
+    try:
+        if not db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first():
+            raise HTTPException(status_code=404, detail="Job not found")
+    finally:
+        db.close()
+
+    def snapshot():
+        db = SessionLocal()
+        try:
+            job = db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first()
+            status = job.to_dict(include_result=False)
+            status["queue_position"] = job_scheduler.queue_position(db, job)
+            if job.status in JOB_TERMINAL_STATUSES:
+                return [("status", status), ("done", job.to_dict())], True
+            return [("status", status)], False
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        _sse_event_stream(job_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Health check (optional)
 @app.get("/health")
 def health():
     return {"ok": True, "version": API_VERSION}
 
+# Script runtime statistics (warm pool occupancy and latency)
+@app.get("/api/runtime/stats")
+def runtime_stats():
+    stats = {"runtime": _execution_runtime}
+    if hasattr(script_runner, "get_stats"):
+        stats["pool"] = script_runner.get_stats()
+    stats["limits"] = execution_limiter.get_stats()
+    stats["jobs"] = job_scheduler.get_stats()
+    stats["input_cache"] = input_cache.get_stats()
+    stats["derived_cache"] = derived_cache.get_stats()
+    stats["tile_pyramids"] = tile_pyramids.get_stats()
+    stats["uploads"] = upload_store.get_stats()
+    stats["blobs"] = blob_store.get_stats()
+    if result_cache is not None:
+        stats["result_cache"] = result_cache.get_stats()
+    return stats
+
+# Thumbnail/preview generation backlog
+@app.get("/api/thumbnails/status")
+def thumbnail_status():
+    return thumbnail_pipeline.get_stats()
+
 # Version endpoint
 @app.get("/version")
 def version():
@@ -2513,9 +3218,43 @@ Your goal: Generate scripts that work on the first try using these proven patter
             status_code=500
         )
 
+@app.post("/uploads")
+def create_upload(filename: str = Form(...), size: Optional[int] = Form(None)):
+    """Start a resumable upload; send the bytes with PUT /uploads/{upload_id}."""
+    try:
+        return upload_store.create(filename, size)
+    except UploadError as e:
+        return JSONResponse({"error": str(e), **e.extra}, status_code=e.status_code)
+
+@app.put("/uploads/{upload_id}")
+async def append_upload(upload_id: str, request: Request, offset: int = 0):
+    """Append the request body at offset (the "received" count of the upload so far)."""
+    try:
+        return await upload_store.append(upload_id, offset, request.stream())
+    except UploadError as e:
+        return JSONResponse({"error": str(e), **e.extra}, status_code=e.status_code)
+
+@app.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    """Progress of a resumable upload: resume from "received" after a dropped connection."""
+    try:
+        return upload_store.status(upload_id)
+    except UploadError as e:
+        return JSONResponse({"error": str(e), **e.extra}, status_code=e.status_code)
+
+@app.delete("/uploads/{upload_id}")
+def delete_upload(upload_id: str):
+    try:
+        upload_store.discard(upload_id)
+    except UploadError as e:
+        return JSONResponse({"error": str(e), **e.extra}, status_code=e.status_code)
+    return {"deleted": upload_id}
+
 @app.post("/library/upload")
 async def upload_library_image(
-    image: UploadFile = File(...),
+    image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),  # finished resumable upload, instead of image
+    content_hash: Optional[str] = Form(None),  # SHA-256 of the file: no upload needed if already stored
     name: str = Form(...),
     description: str = Form(""),
     image_type: str = Form(...),  # SEM, SDB, TEM, or OPTICAL
@@ -2523,7 +3262,18 @@ async def upload_library_image(
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional),
 ):
-    """Upload an image to the library. Requires login; anonymous users get a message to create an account."""
+    """Upload an image to the library. Requires login; anonymous users get a message to create an account.
+
+    The file is streamed to disk (or taken over from a resumable upload_id) and
+    only its header is read for the dimensions. Content that is already stored
+    (by anyone, or as a library image) is not stored again: the new image
+    shares the existing file (see blob_store). Sending only content_hash
+    creates the image instantly when the content is one the user can already
+    see (a library image, a global image or their own), and otherwise
+    returns 404 with unknown_content so the client sends the file. Content
+    stored only by other users gets the same 404, so a hash neither grants
+    access to their files nor tells whether they exist.
+    """
     if not current_user:
         return JSONResponse(
             {"error": "Create an account to upload images.", "require_auth": True},
@@ -2531,47 +3281,73 @@ async def upload_library_image(
         )
     if image_type not in ["SEM", "SDB", "TEM", "OPTICAL"]:
         return JSONResponse({"error": "Image type must be SEM, SDB, TEM, or OPTICAL"}, status_code=400)
+    if image is None and not upload_id and not content_hash:
+        return JSONResponse({"error": "No image provided"}, status_code=400)
     user_id = current_user.id
 
     # Generate unique ID
     image_id = str(uuid.uuid4())
+
+    known = None
+    if content_hash and image is None and not upload_id:
+        known = blob_store.find(db, content_hash.lower(), visible_to=user_id)
+    if known is None and image is None and not upload_id:
+        # The client offered a hash first; it has to send the file
+        return JSONResponse({"error": "Content not stored yet, send the file", "unknown_content": True},
+                            status_code=404)
     
-    # Save image file to user uploads directory (PVC-backed, persistent)
-    file_extension = pathlib.Path(image.filename).suffix.lower() or ".png"
-    image_filename = f"{image_id}{file_extension}"
-    image_path = USER_UPLOADS_DIR / image_filename
-    
-    content = await image.read()
-    with open(image_path, "wb") as f:
-        f.write(content)
-    
-    # Get image dimensions
-    width, height, file_size = None, None, None
-    try:
-        from PIL import Image as PILImage
-        with PILImage.open(image_path) as img:
-            width, height = img.size
-        file_size = image_path.stat().st_size
-    except:
-        pass
-    
-    # Generate thumbnail eagerly so first display is fast
-    _get_or_create_thumbnail(image_path, USER_THUMBNAILS_DIR, image_filename)
+    # Save image file to user uploads directory (PVC-backed, persistent), once per content
+    stored = None
+    if known is None:
+        try:
+            stored = upload_store.take(upload_id) if upload_id else await upload_store.save(image)
+        except UploadError as e:
+            return JSONResponse({"error": str(e), **e.extra}, status_code=e.status_code)
+        if content_hash and content_hash.lower() != stored.sha256:
+            stored.path.unlink(missing_ok=True)
+            return JSONResponse({"error": "The file does not match content_hash"}, status_code=400)
+        if blob_store.find(db, stored.sha256) is None:
+            # Copy next to the blobs before taking the lock (may cross filesystems)
+            try:
+                stored = await asyncio.to_thread(blob_store.stage, stored)
+            except Exception as e:
+                stored.path.unlink(missing_ok=True)
+                return JSONResponse({"error": f"Failed to save image: {e}"}, status_code=500)
 
-    # Create user image in database
-    new_image = UserImage(
-        id=image_id,
-        user_id=user_id,
-        name=name,
-        filename=image_filename,
-        description=description,
-        image_type=image_type,
-        width=width,
-        height=height,
-        file_size=file_size
-    )
-    db.add(new_image)
-    db.commit()
+    with blob_store.lock:
+        if stored is not None:
+            image_filename, existing = blob_store.adopt(db, stored, pathlib.Path(stored.filename or "").suffix.lower() or ".png")
+            digest = stored.sha256
+        else:
+            image_filename, existing, digest = known.filename, known, known.content_hash
+        if existing is not None:
+            # Same content as a stored image: share its file, renditions and metadata
+            width, height, file_size = existing.width, existing.height, existing.file_size
+        else:
+            width, height, file_size = None, None, stored.size
+            try:
+                header = read_header(USER_UPLOADS_DIR / image_filename)
+                width, height = header.width, header.height
+            except:
+                pass
+            # Render thumbnail + preview in the background so first display is fast
+            thumbnail_pipeline.submit(USER_UPLOADS_DIR / image_filename, USER_THUMBNAILS_DIR)
+
+        # Create user image in database (committed under the lock so the file cannot be released meanwhile)
+        new_image = UserImage(
+            id=image_id,
+            user_id=user_id,
+            name=name,
+            filename=image_filename,
+            description=description,
+            image_type=image_type,
+            width=width,
+            height=height,
+            file_size=file_size,
+            content_hash=digest
+        )
+        db.add(new_image)
+        db.commit()
     
     return {
         "id": image_id,
@@ -2583,7 +3359,9 @@ async def upload_library_image(
         "thumbnail_url": f"/uploads/images/{image_filename}?thumbnail=true",
         "width": width,
         "height": height,
-        "file_size": file_size
+        "file_size": file_size,
+        "sha256": digest,
+        "deduplicated": existing is not None
     }
 
 @app.get("/library/images")
@@ -2629,112 +3407,46 @@ def list_library_images(user_id: Optional[str] = None, db: Session = Depends(get
     images.sort(key=lambda x: x["name"].lower())
     return {"images": images}
 
-THUMBNAIL_MAX_SIZE = 200  # px (longest edge)
+def _get_or_create_thumbnail(image_path: pathlib.Path, thumbnail_dir: pathlib.Path, filename: str,
+                             level: str = "thumb") -> pathlib.Path | None:
+    """Return the thumbnail (or preview) path, rendering it in the thumbnail pool if missing or stale."""
+    return thumbnail_pipeline.ensure(image_path, thumbnail_dir, level)
 
-def _generate_thumbnail(image_path: pathlib.Path, thumbnail_path: pathlib.Path) -> bool:
-    """Generate a thumbnail PNG for the given image. Returns True on success."""
-    try:
-        import numpy as np
-        from PIL import Image as PILImage
-        img = PILImage.open(image_path)
-        img_array = np.array(img)
-
-        # Normalize high bit-depth images (same logic as _serve_image_file)
-        needs_norm = img_array.dtype in [np.uint16, np.uint32, np.int16, np.int32, np.float32, np.float64]
-        if not needs_norm and img_array.dtype == np.uint8:
-            mv = img_array.max()
-            if 1 < mv < 100:
-                needs_norm = True
-        if needs_norm and img_array.size > 0:
-            mn, mx = img_array.min(), img_array.max()
-            if mx > mn:
-                img = PILImage.fromarray(((img_array - mn) / (mx - mn) * 255).astype(np.uint8))
-            else:
-                img = PILImage.fromarray(np.zeros_like(img_array, dtype=np.uint8))
-
-        if img.mode not in ('RGB', 'RGBA', 'L'):
-            if img.mode == 'LA':
-                img = img.convert('RGBA')
-            elif img.mode in ('P', 'I', 'F'):
-                img = img.convert('RGB')
-            elif len(img.getbands()) == 1:
-                img = img.convert('L')
-            else:
-                img = img.convert('RGB')
 
-        img.thumbnail((THUMBNAIL_MAX_SIZE, THUMBNAIL_MAX_SIZE), PILImage.LANCZOS)
-        img.save(thumbnail_path, format='PNG', optimize=True)
-        return True
+def _backfill_content_hashes():
+    """Record content_hash for images stored before de-duplication, so uploads match them."""
+    try:
+        with get_db_session() as db:
+            updated = blob_store.backfill_hashes(db)
+        if updated:
+            print(f"[Init] ✓ Recorded content hashes for {updated} stored image(s)")
     except Exception as e:
-        print(f"[Thumbnail] Failed to generate for {image_path}: {e}")
-        return False
-
-
-def _get_or_create_thumbnail(image_path: pathlib.Path, thumbnail_dir: pathlib.Path, filename: str) -> pathlib.Path | None:
-    """Return the thumbnail path, generating it on demand if it doesn't exist."""
-    thumb_name = pathlib.Path(filename).stem + ".thumb.png"
-    thumb_path = thumbnail_dir / thumb_name
-    if thumb_path.exists():
-        return thumb_path
-    if _generate_thumbnail(image_path, thumb_path):
-        return thumb_path
-    return None
+        print(f"[Init] Warning: Content hash backfill failed: {e}")
 
 
-def _serve_image_file(image_path: pathlib.Path, filename: str, raw: bool = False):
+def _queue_stale_thumbnails() -> int:
+    """Queue renditions for every stored image that lacks them or whose source changed."""
+    images = [(path, LIBRARY_THUMBNAILS_DIR) for path in LIBRARY_IMAGES_DIR.iterdir()]
+    images += [(path, USER_THUMBNAILS_DIR) for path in USER_UPLOADS_DIR.iterdir()]
+    return thumbnail_pipeline.enqueue_stale(images)
+
+
+def _serve_image_file(image_path: pathlib.Path, filename: str, raw: bool = False,
+                      if_none_match: Optional[str] = None):
     """Shared helper to serve an image file, with TIFF-to-PNG conversion for browsers.
     
     Args:
         image_path: Full filesystem path to the image file
         filename: The filename (used for Content-Disposition and extension detection)
         raw: If True, serve raw TIFF files without conversion (for script execution)
+        if_none_match: The request's If-None-Match header (answered with 304 on a match)
     """
-    # Check if it's a TIFF file and raw=False - convert to PNG for browser display
+    # Check if it's a TIFF file and raw=False - serve the cached PNG version for browser display
     file_ext = pathlib.Path(filename).suffix.lower()
     if file_ext in ['.tiff', '.tif'] and not raw:
         try:
-            import numpy as np
-            
-            img = Image.open(image_path)
-            img_array = np.array(img)
-            
-            needs_normalization = False
-            if img_array.dtype in [np.uint16, np.uint32, np.int16, np.int32]:
-                needs_normalization = True
-            elif img_array.dtype in [np.float32, np.float64]:
-                needs_normalization = True
-            elif img_array.dtype == np.uint8:
-                max_val = img_array.max()
-                if max_val < 100 and max_val > 1:
-                    needs_normalization = True
-            
-            if needs_normalization and img_array.size > 0:
-                min_val = img_array.min()
-                max_val = img_array.max()
-                print(f"Normalizing TIFF: dtype={img_array.dtype}, min={min_val}, max={max_val}")
-                if max_val > min_val:
-                    normalized = ((img_array - min_val) / (max_val - min_val) * 255).astype(np.uint8)
-                    img = Image.fromarray(normalized)
-                else:
-                    img = Image.fromarray(np.zeros_like(img_array, dtype=np.uint8))
-            
-            if img.mode not in ('RGB', 'RGBA', 'L'):
-                if img.mode in ('LA',):
-                    img = img.convert('RGBA')
-                elif img.mode in ('P', 'I', 'F'):
-                    img = img.convert('RGB')
-                elif len(img.getbands()) == 1:
-                    img = img.convert('L')
-                else:
-                    img = img.convert('RGB')
-            
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format='PNG', optimize=True)
-            img_buffer.seek(0)
-            
-            return StreamingResponse(
-                img_buffer,
-                media_type="image/png",
+            return derived_cache.serve(
+                image_path, "display-png", tiff_display_png, if_none_match,
                 headers={
                     "Content-Disposition": f"inline; filename={filename}",
                     "Cache-Control": "public, max-age=3600"
@@ -2744,37 +3456,46 @@ def _serve_image_file(image_path: pathlib.Path, filename: str, raw: bool = False
             print(f"⚠ Failed to convert TIFF for display: {e}")
             import traceback
             traceback.print_exc()
-            return FileResponse(image_path)
     
     # For other formats or raw=True, serve directly
-    return FileResponse(image_path)
+    return serve_file(image_path, if_none_match)
 
 @app.get("/uploads/images/{filename:path}")
-def get_uploaded_image(filename: str, raw: bool = False, thumbnail: bool = False):
+def get_uploaded_image(filename: str, raw: bool = False, thumbnail: bool = False, preview: bool = False,
+                       if_none_match: Optional[str] = Header(None)):
     """Get a user-uploaded image file by filename (from PVC-backed storage)
     
     Args:
         filename: The image filename
         raw: If True, serve raw TIFF files without conversion (for script execution)
         thumbnail: If True, serve a small thumbnail version (200px max)
+        preview: If True, serve a mid-size PNG preview (PREVIEW_MAX_SIZE px max)
     """
     image_path = USER_UPLOADS_DIR / filename
+    thumb_dir = USER_THUMBNAILS_DIR
+    if not image_path.exists():
+        # An upload of a library image's content shares the library file
+        image_path, thumb_dir = LIBRARY_IMAGES_DIR / filename, LIBRARY_THUMBNAILS_DIR
     if not image_path.exists():
         return JSONResponse({"error": "Uploaded image file not found"}, status_code=404)
-    if thumbnail:
-        thumb = _get_or_create_thumbnail(image_path, USER_THUMBNAILS_DIR, filename)
+    if thumbnail or preview:
+        thumb = _get_or_create_thumbnail(image_path, thumb_dir, filename,
+                                         "thumb" if thumbnail else "preview")
         if thumb:
-            return FileResponse(thumb, media_type="image/png", headers={"Cache-Control": "public, max-age=86400"})
-    return _serve_image_file(image_path, filename, raw)
+            return serve_file(thumb, if_none_match, media_type="image/png",
+                              headers={"Cache-Control": "public, max-age=86400"})
+    return _serve_image_file(image_path, filename, raw, if_none_match)
 
 @app.get("/library/images/{filename:path}")
-def get_library_image(filename: str, raw: bool = False, thumbnail: bool = False):
+def get_library_image(filename: str, raw: bool = False, thumbnail: bool = False, preview: bool = False,
+                      if_none_match: Optional[str] = Header(None)):
     """Get a specific library image file by filename
     
     Args:
         filename: The image filename
         raw: If True, serve raw TIFF files without conversion (for script execution)
         thumbnail: If True, serve a small thumbnail version (200px max)
+        preview: If True, serve a mid-size PNG preview (PREVIEW_MAX_SIZE px max)
     """
     image_path = LIBRARY_IMAGES_DIR / filename
     # Also check user uploads directory for backward compatibility
@@ -2782,13 +3503,66 @@ def get_library_image(filename: str, raw: bool = False, thumbnail: bool = False)
         image_path = USER_UPLOADS_DIR / filename
     if not image_path.exists():
         return JSONResponse({"error": "Image file not found"}, status_code=404)
-    if thumbnail:
+    if thumbnail or preview:
         # Determine correct thumbnail dir based on where the original was found
         thumb_dir = LIBRARY_THUMBNAILS_DIR if (LIBRARY_IMAGES_DIR / filename).exists() else USER_THUMBNAILS_DIR
-        thumb = _get_or_create_thumbnail(image_path, thumb_dir, filename)
+        thumb = _get_or_create_thumbnail(image_path, thumb_dir, filename, "thumb" if thumbnail else "preview")
         if thumb:
-            return FileResponse(thumb, media_type="image/png", headers={"Cache-Control": "public, max-age=86400"})
-    return _serve_image_file(image_path, filename, raw)
+            return serve_file(thumb, if_none_match, media_type="image/png",
+                              headers={"Cache-Control": "public, max-age=86400"})
+    return _serve_image_file(image_path, filename, raw, if_none_match)
+
+DEEP_ZOOM_EXTENSIONS = {".tif", ".tiff", ".png", ".jpg", ".jpeg"}
+DZI_TILE_PATTERN = re.compile(r"^(?P<source>.+)_files/(?P<level>\d+)/(?P<column>\d+)_(?P<row>\d+)\.png$")
+
+def _resolve_tile_source(kind: str, relative: str) -> Optional[pathlib.Path]:
+    """Map /tiles/{kind}/{relative} to the image it is cut from (None if unknown or outside the store)."""
+    if kind == "library":
+        bases = [LIBRARY_IMAGES_DIR, USER_UPLOADS_DIR]  # same fallback as /library/images
+    elif kind == "uploads":
+        bases = [USER_UPLOADS_DIR, LIBRARY_IMAGES_DIR]  # same fallback as /uploads/images
+    elif kind == "outputs":
+        bases = [OUTPUTS_DIR]
+    else:
+        return None
+    for base in bases:
+        path = (base / relative).resolve()
+        if path.is_relative_to(base.resolve()) and path.is_file() and not relative.startswith("."):
+            return path
+    return None
+
+@app.get("/tiles/{kind}/{path:path}")
+async def get_image_tiles(kind: str, path: str, if_none_match: Optional[str] = Header(None)):
+    """Deep Zoom access to a large image: only the tiles in view are downloaded.
+
+    kind is library, uploads or outputs (path then is {job_id}/{folder}/{file}).
+    GET /tiles/{kind}/{file}.dzi returns the descriptor; tiles are at
+    /tiles/{kind}/{file}_files/{level}/{column}_{row}.png. The pyramid is
+    built on first request (see tile_pyramid).
+    """
+    tile = DZI_TILE_PATTERN.match(path)
+    relative = tile.group("source") if tile else (path[:-4] if path.endswith(".dzi") else None)
+    source = _resolve_tile_source(kind, relative) if relative else None
+    if source is None:
+        return JSONResponse({"error": "Image not found"}, status_code=404)
+
+    try:
+        if not tile:
+            _, info = await asyncio.to_thread(tile_pyramids.get, source)
+            return Response(dzi_descriptor(info), media_type="application/xml",
+                            headers={"Cache-Control": "no-cache"})
+        tile_path = await asyncio.to_thread(
+            tile_pyramids.tile_path, source,
+            int(tile.group("level")), int(tile.group("column")), int(tile.group("row"))
+        )
+    except Exception as e:
+        print(f"⚠ Failed to build tile pyramid for {source}: {e}")
+        traceback.print_exc()
+        return JSONResponse({"error": f"Failed to build image tiles: {str(e)}"}, status_code=500)
+    if tile_path is None:
+        return JSONResponse({"error": "Tile not found"}, status_code=404)
+    return serve_file(tile_path, if_none_match, media_type="image/png",
+                      headers={"Cache-Control": "public, max-age=3600"})
 
 @app.delete("/library/images/{image_id}")
 def delete_library_image(
@@ -2808,23 +3582,13 @@ def delete_library_image(
                 status_code=403
             )
         
-        # Delete image file (check user uploads first, then library dir for backward compat)
-        image_path = USER_UPLOADS_DIR / user_image.filename
-        if not image_path.exists():
-            image_path = LIBRARY_IMAGES_DIR / user_image.filename
-        if image_path.exists():
-            image_path.unlink()
-        
-        # Clean up thumbnail if it exists
-        thumb_name = pathlib.Path(user_image.filename).stem + ".thumb.png"
-        for thumb_dir in [USER_THUMBNAILS_DIR, LIBRARY_THUMBNAILS_DIR]:
-            thumb_path = thumb_dir / thumb_name
-            if thumb_path.exists():
-                thumb_path.unlink()
-        
-        # Delete from database
-        db.delete(user_image)
-        db.commit()
+        # Delete from database; the file (and its thumbnail and preview) goes
+        # with the last image referencing it
+        with blob_store.lock:
+            db.delete(user_image)
+            db.flush()
+            blob_store.release(db, user_image.filename)
+            db.commit()
         
         return {"success": True}
     
@@ -4128,15 +4892,14 @@ def reset_user_data(
         # 1. Delete all user-uploaded images from database and filesystem (before users to avoid FK issues)
         user_images = db.query(UserImage).all()
         deleted_counts["images"] = len(user_images)
-        for image in user_images:
-            # Check user uploads first, then library dir for backward compat
-            image_path = USER_UPLOADS_DIR / image.filename
-            if not image_path.exists():
-                image_path = LIBRARY_IMAGES_DIR / image.filename
-            if image_path.exists():
-                image_path.unlink()
-                print(f"[RESET] Deleted user image file: {image.filename}")
-            db.delete(image)
+        with blob_store.lock:
+            for image in user_images:
+                db.delete(image)
+            db.flush()
+            # Files shared with library images stay
+            for filename in {image.filename for image in user_images}:
+                if blob_store.release(db, filename):
+                    print(f"[RESET] Deleted user image file: {filename}")
         print(f"[RESET] Deleted {deleted_counts['images']} user images")
         
         # 2. Delete all user scripts
@@ -4708,6 +5471,27 @@ def get_log(log_id: str):
             status_code=500
         )
 
+@app.get("/api/logs/search")
+def search_logs(q: str, status: Optional[str] = None, limit: int = 50):
+    """Full-text search over logged error messages and stderr (FTS5 query syntax)"""
+    try:
+        results = script_logger.search(q, status=status, limit=min(max(limit, 1), 500))
+    except sqlite3.OperationalError as e:
+        return JSONResponse(
+            {"error": f"Invalid search query: {str(e)}"},
+            status_code=400
+        )
+    except Exception as e:
+        return JSONResponse(
+            {"error": f"Failed to search logs: {str(e)}"},
+            status_code=500
+        )
+    return {
+        "success": True,
+        "logs": results,
+        "count": len(results)
+    }
+
 @app.get("/api/logs/ai-context")
 def get_ai_context(max_examples: int = 10):
     """Get AI-readable context about common errors"""
@@ -4730,13 +5514,13 @@ def get_ai_context(max_examples: int = 10):
 def get_error_patterns():
     """Get analysis of common error patterns"""
     try:
-        analysis = log_analyzer.analyze_all()
+        # Served from the analysis counters kept by the log store
         return {
             "success": True,
-            "error_patterns": analysis["error_patterns"],
-            "common_errors": analysis["common_errors"],
-            "library_issues": analysis["library_issues"],
-            "mapbridge_issues": analysis["mapbridge_issues"]
+            "error_patterns": log_analyzer._analyze_error_patterns(),
+            "common_errors": log_analyzer._find_common_errors(),
+            "library_issues": log_analyzer._analyze_library_issues(),
+            "mapbridge_issues": log_analyzer._analyze_mapbridge_issues()
         }
     except Exception as e:
         return JSONResponse(
@@ -4748,11 +5532,10 @@ def get_error_patterns():
 def get_recommendations():
     """Get recommendations for improving system_context"""
     try:
-        analysis = log_analyzer.analyze_all()
         return {
             "success": True,
-            "recommendations": analysis["recommendations"],
-            "ai_learning_summary": analysis["ai_learning_summary"]
+            "recommendations": log_analyzer._generate_recommendations(),
+            "ai_learning_summary": log_analyzer._generate_ai_summary()
         }
     except Exception as e:
         return JSONResponse(
@@ -4835,81 +5618,32 @@ async def deploy_script(request: DeployRequest):
 
 # Serve output files with TIFF conversion support
 @app.get("/outputs/{job_id}/{folder}/{filename:path}")
-async def get_output_file(job_id: str, folder: str, filename: str):
-    """Get output files with automatic TIFF to PNG conversion for browser display"""
+async def get_output_file(job_id: str, folder: str, filename: str,
+                          if_none_match: Optional[str] = Header(None),
+                          range_header: Optional[str] = Header(None, alias="Range"),
+                          if_range: Optional[str] = Header(None)):
+    """Get output files with automatic TIFF to PNG conversion for browser display.
+
+    Converted variants are cached (see derived_cache), so only the first view
+    of a file pays for the conversion. Other files (PDFs, CSVs, ...) are served
+    as-is and support Range requests.
+    """
     file_path = OUTPUTS_DIR / job_id / folder / filename
     
     if not file_path.exists():
         return JSONResponse({"error": "File not found"}, status_code=404)
+
+    # Previews rendered by the runner are already display-ready PNGs
+    if folder == "result" and is_manifest_path(filename):
+        return serve_file(file_path, if_none_match, headers={"Cache-Control": "public, max-age=3600"})
     
     # Check if it's a TIFF file - convert to PNG for browser display
+    # DO NOT apply EXIF orientation: script outputs are displayed exactly as created
     file_ext = pathlib.Path(filename).suffix.lower()
     if file_ext in ['.tiff', '.tif']:
         try:
-            # Open TIFF - DO NOT apply EXIF orientation
-            # Script outputs should be displayed exactly as created
-            img = Image.open(file_path)
-            
-            # Import numpy for advanced handling
-            import numpy as np
-            
-            # Convert to numpy array to check data type and range
-            img_array = np.array(img)
-            
-            # Determine if we need to normalize the pixel values
-            needs_normalization = False
-            
-            # Check for 16-bit, 32-bit, or float images
-            if img_array.dtype in [np.uint16, np.uint32, np.int16, np.int32]:
-                needs_normalization = True
-            elif img_array.dtype in [np.float32, np.float64]:
-                needs_normalization = True
-            elif img_array.dtype == np.uint8:
-                # Check if it's a labeled image (values are small integers like 0, 1, 2, 3...)
-                max_val = img_array.max()
-                if max_val < 100 and max_val > 1:
-                    # Likely a labeled image - normalize to full range
-                    needs_normalization = True
-            
-            if needs_normalization and img_array.size > 0:
-                # Normalize to 0-255 range
-                min_val = img_array.min()
-                max_val = img_array.max()
-                
-                if max_val > min_val:
-                    # Scale to 0-255
-                    normalized = ((img_array - min_val) / (max_val - min_val) * 255).astype(np.uint8)
-                    img = Image.fromarray(normalized)
-                else:
-                    # All same value - just convert to uint8
-                    img = Image.fromarray((img_array * 0).astype(np.uint8))
-            
-            # Handle different image modes
-            if img.mode == 'RGBA':
-                # Keep RGBA for PNG (supports transparency)
-                pass
-            elif img.mode == 'LA':
-                # Convert LA (grayscale + alpha) to RGBA
-                img = img.convert('RGBA')
-            elif img.mode == 'P':
-                # Convert palette mode to RGBA
-                img = img.convert('RGBA')
-            elif img.mode in ('L', '1'):
-                # Convert grayscale to RGB
-                img = img.convert('RGB')
-            elif img.mode != 'RGB':
-                # Convert any other mode to RGB
-                img = img.convert('RGB')
-            
-            # Save to bytes buffer as PNG
-            # PNG format doesn't preserve EXIF by default, which is what we want
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format='PNG', optimize=True)
-            img_buffer.seek(0)
-            
-            return StreamingResponse(
-                img_buffer,
-                media_type="image/png",
+            return await asyncio.to_thread(
+                derived_cache.serve, file_path, "output-png", output_tiff_png, if_none_match,
                 headers={
                     "Content-Disposition": f"inline; filename={filename.rsplit('.', 1)[0]}.png",
                     "Cache-Control": "public, max-age=3600"
@@ -4925,45 +5659,33 @@ async def get_output_file(job_id: str, folder: str, filename: str):
     # For PNG/JPG output images, strip EXIF orientation to prevent unwanted rotation
     if file_ext in ['.png', '.jpg', '.jpeg'] and '/result/' in str(file_path):
         try:
-            # Read and re-save without EXIF orientation
-            img = Image.open(file_path)
-            
-            # Convert to bytes without EXIF
-            img_buffer = io.BytesIO()
-            if file_ext == '.png':
-                img.save(img_buffer, format='PNG', optimize=True)
-                media_type = "image/png"
-            else:
-                # Save JPEG without EXIF
-                img.save(img_buffer, format='JPEG', quality=95, exif=b'')
-                media_type = "image/jpeg"
-            
-            img_buffer.seek(0)
-            return StreamingResponse(
-                img_buffer,
-                media_type=media_type,
+            return await asyncio.to_thread(
+                derived_cache.serve, file_path, "strip-exif", strip_exif, if_none_match,
+                media_type="image/png" if file_ext == '.png' else "image/jpeg",
                 headers={
                     "Content-Disposition": f"inline; filename={filename}",
                     "Cache-Control": "public, max-age=3600"
-                }
+                },
+                suffix=file_ext
             )
         except Exception:
             # If stripping EXIF fails, serve file directly
             pass
     
     # For other formats, serve directly
-    return FileResponse(file_path)
-
-# Middleware to disable caching for development
-@app.middleware("http")
-async def add_no_cache_headers(request, call_next):
-    response = await call_next(request)
-    # Disable caching for HTML and JS files in development
-    if request.url.path.endswith(('.html', '.jsx', '.js')):
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
-    return response
-
-# Serve the frontend as static content
-app.mount("/", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="frontend")
+    return serve_file(file_path, if_none_match, range_header=range_header, if_range=if_range)
+
+# Middleware to disable caching for development (production serves hashed, cacheable assets)
+if not static_production():
+    @app.middleware("http")
+    async def add_no_cache_headers(request, call_next):
+        response = await call_next(request)
+        # Disable caching for HTML and JS files in development
+        if request.url.path.endswith(('.html', '.jsx', '.js')):
+            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+            response.headers["Pragma"] = "no-cache"
+            response.headers["Expires"] = "0"
+        return response
+
+# Serve the frontend as static content (see static_assets for STATIC_MODE=production)
+app.mount("/", frontend_static_files(FRONTEND_DIR), name="frontend")
@@ -0,0 +1,170 @@
+"""
+Content-addressed storage of uploaded images.
+
+Users upload the same SEM images again and again, and each upload used to
+get its own copy under assets/uploads/ plus its own thumbnail and preview.
+Uploaded files are now stored once per content: a new file is named after
+its SHA-256 ({sha256}{ext}) and every UserImage / LibraryImage row records
+the hash in content_hash. Uploading content that is already stored - by any
+user, or a copy of a library image - only adds a row pointing at the
+existing file, so nothing is written or decoded and the existing
+renditions (named after the file) are shared.
+
+A file's reference count is the number of UserImage and LibraryImage rows
+naming it. release() removes a file and its renditions once that count is
+zero; files of library images always keep their LibraryImage reference.
+
+Images stored before this keep their {uuid}{ext} names; backfill_hashes()
+fills in their content_hash so new uploads are de-duplicated against them.
+"""
+
+import os
+import uuid
+import shutil
+import hashlib
+import pathlib
+import threading
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+try:
+    from backend.models import LibraryImage, UserImage
+    from backend.upload_stream import StoredUpload
+    from backend.thumbnail_worker import LEVELS, rendition_path
+except ImportError:
+    from models import LibraryImage, UserImage
+    from upload_stream import StoredUpload
+    from thumbnail_worker import LEVELS, rendition_path
+
+
+ImageRow = Union[LibraryImage, UserImage]
+
+
+def blob_filename(digest: str, file_extension: str) -> str:
+    return f"{digest}{file_extension}"
+
+
+def hash_file(path: pathlib.Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class BlobStore:
+    """Uploaded image files, one per content hash, shared by the rows that reference them.
+
+    Hold `lock` from adopt() until the new row is committed, and around
+    deleting rows + release(), so a file cannot be removed between being
+    found and being referenced.
+    """
+
+    def __init__(self, upload_dir: pathlib.Path, library_dir: pathlib.Path,
+                 thumbnail_dirs: Iterable[pathlib.Path]):
+        self.upload_dir = pathlib.Path(upload_dir)
+        self.library_dir = pathlib.Path(library_dir)
+        self.thumbnail_dirs = [pathlib.Path(d) for d in thumbnail_dirs]
+        self.lock = threading.RLock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.released = 0
+
+    def path_for(self, filename: str) -> Optional[pathlib.Path]:
+        """Where a referenced file lives (uploads first, then the library, like GET /library/images)."""
+        for base in (self.upload_dir, self.library_dir):
+            path = base / filename
+            if path.is_file():
+                return path
+        return None
+
+    def find(self, db: Session, digest: str, visible_to: Optional[str] = None) -> Optional[ImageRow]:
+        """A stored image with this content whose file still exists (library images first).
+
+        With visible_to (a user id), only images that user can already see
+        count: library images, global images and the user's own. A client
+        that only knows a hash must not get at anyone else's private file.
+        """
+        for model in (LibraryImage, UserImage):
+            query = db.query(model).filter(model.content_hash == digest)
+            if visible_to is not None and model is UserImage:
+                query = query.filter(or_(UserImage.is_global.is_(True), UserImage.user_id == visible_to))
+            for row in query.limit(10):
+                if self.path_for(row.filename) is not None:
+                    return row
+        return None
+
+    def stage(self, stored: StoredUpload) -> StoredUpload:
+        """Move an upload next to the blobs (blocking; may copy across filesystems), ready for adopt()."""
+        target = self.upload_dir / f".{uuid.uuid4().hex}.part"
+        shutil.move(str(stored.path), str(target))
+        return StoredUpload(target, stored.sha256, stored.size, stored.filename)
+
+    def adopt(self, db: Session, stored: StoredUpload,
+              file_extension: str) -> Tuple[str, Optional[ImageRow]]:
+        """Store an upload, or drop it if its content is already stored.
+
+        Returns (filename to reference, existing row with the same content or None).
+        Call with `lock` held.
+        """
+        existing = self.find(db, stored.sha256)
+        if existing is not None:
+            stored.path.unlink(missing_ok=True)
+            self.deduplicated += 1
+            return existing.filename, existing
+        filename = blob_filename(stored.sha256, file_extension)
+        target = self.upload_dir / filename
+        if target.exists():
+            # Same content under the same name, but no row yet (e.g. an interrupted upload)
+            stored.path.unlink(missing_ok=True)
+        elif stored.path.parent == self.upload_dir:
+            os.replace(stored.path, target)
+        else:
+            shutil.move(str(stored.path), str(target))
+        self.stored += 1
+        return filename, None
+
+    def references(self, db: Session, filename: str) -> int:
+        return (db.query(UserImage).filter(UserImage.filename == filename).count()
+                + db.query(LibraryImage).filter(LibraryImage.filename == filename).count())
+
+    def release(self, db: Session, filename: str) -> bool:
+        """Remove filename and its renditions if no row references it any more.
+
+        Call after the deleting rows are flushed, with `lock` held.
+        """
+        if self.references(db, filename) > 0:
+            return False
+        path = self.path_for(filename)
+        if path is not None:
+            path.unlink(missing_ok=True)
+        for thumbnail_dir in self.thumbnail_dirs:
+            for level in LEVELS:
+                rendition_path(thumbnail_dir, filename, level).unlink(missing_ok=True)
+        self.released += 1
+        return True
+
+    def backfill_hashes(self, db: Session) -> int:
+        """Fill in content_hash for rows stored before de-duplication (hashes each file once)."""
+        hashes: Dict[str, str] = {}
+        updated = 0
+        for model in (LibraryImage, UserImage):
+            for row in db.query(model).filter(model.content_hash.is_(None)):
+                if row.filename not in hashes:
+                    path = self.path_for(row.filename)
+                    if path is None:
+                        continue
+                    hashes[row.filename] = hash_file(path)
+                row.content_hash = hashes[row.filename]
+                updated += 1
+        db.commit()
+        return updated
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "released": self.released,
+        }
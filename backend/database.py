@@ -138,6 +138,29 @@ def migrate_add_script_parameters():
             print(f"[Database] Note: migrate_add_script_parameters: {e}")
 
 
+def migrate_add_image_content_hash():
+    """Add content_hash columns (upload de-duplication) to the image tables if missing."""
+    from sqlalchemy import text
+    for table in ("library_images", "user_images"):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN content_hash VARCHAR(64)"))
+                conn.commit()
+            print(f"[Database] ✓ Added content_hash column to {table}")
+        except Exception as e:
+            msg = str(e).lower()
+            if "duplicate" in msg or "already exists" in msg:
+                pass
+            else:
+                print(f"[Database] Note: migrate_add_image_content_hash ({table}): {e}")
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_content_hash ON {table} (content_hash)"))
+                conn.commit()
+        except Exception as e:
+            print(f"[Database] Note: migrate_add_image_content_hash ({table} index): {e}")
+
+
 def migrate_create_password_reset_tokens():
     """Create password_reset_tokens table if it doesn't exist."""
     from sqlalchemy import text
@@ -260,6 +283,7 @@ def ensure_database():
     migrate_add_user_email_display_name()
     migrate_add_script_parameters()
     migrate_create_password_reset_tokens()
+    migrate_add_image_content_hash()
 
 
 # Initialize database on import
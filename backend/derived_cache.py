@@ -0,0 +1,317 @@
+"""
+Cached display variants of stored and output images.
+
+Browsers cannot show TIFFs, and result PNG/JPEGs are re-encoded to drop EXIF
+orientation, so several GET endpoints serve a converted copy rather than the
+file on disk. DerivedImageCache computes each variant once per
+(source path, mtime, size, transform), keeps it on disk and serves it as a
+plain file: a repeat view of a 16-bit TIFF becomes a file read instead of a
+decode + normalise + PNG encode. The file is opened before it is handed to
+the response, so evicting it meanwhile cannot break a response.
+
+Responses carry a strong ETag derived from the same key, and a matching
+If-None-Match is answered with 304. file_response() / serve_file() also
+answer single-range requests (Range: bytes=...) with 206, so large outputs
+such as PDFs and CSVs can be resumed and paged through by the browser
+instead of downloaded whole; If-Range falls back to the full file when the
+ETag no longer matches.
+
+Configuration (environment):
+    DERIVED_CACHE_DIR        Where variants are kept (default outputs/.derived)
+    DERIVED_CACHE_MAX_BYTES  Size limit before LRU eviction (default 1 GB)
+"""
+
+import os
+import hashlib
+import mimetypes
+import pathlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import Response
+from fastapi.responses import FileResponse, StreamingResponse
+from PIL import Image
+
+try:
+    from backend.image_reader import load_display_image
+except ImportError:
+    from image_reader import load_display_image
+
+
+# Builds a variant: (source file, destination file) -> None, raising on failure
+Transform = Callable[[pathlib.Path, pathlib.Path], None]
+
+
+def tiff_display_png(source: pathlib.Path, dest: pathlib.Path):
+    """8-bit PNG of a stored TIFF (library images, uploads)."""
+    load_display_image(source).save(dest, format='PNG', optimize=True)
+
+
+def output_tiff_png(source: pathlib.Path, dest: pathlib.Path):
+    """PNG of a script's TIFF output. Orientation is kept exactly as created."""
+    # PNG format doesn't preserve EXIF by default, which is what we want
+    load_display_image(source).save(dest, format='PNG', optimize=True)
+
+
+def strip_exif(source: pathlib.Path, dest: pathlib.Path):
+    """Re-encode a result PNG/JPEG without EXIF so browsers don't rotate it."""
+    img = Image.open(source)
+    if source.suffix.lower() == '.png':
+        img.save(dest, format='PNG', optimize=True)
+    else:
+        img.save(dest, format='JPEG', quality=95, exif=b'')
+
+
+def _etag_for(key: str) -> str:
+    return f'"{key[:40]}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def source_key(source: pathlib.Path, transform: str) -> str:
+    """Cache key of a variant: changes whenever the source file is replaced or rewritten."""
+    stat = source.stat()
+    material = f"{source.resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{transform}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# Bytes read per chunk of a 206 response
+_RANGE_CHUNK = 256 * 1024
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte of a single-range header, or None to serve the whole file.
+
+    Raises ValueError when the range cannot be satisfied (answered with 416).
+    Malformed and multi-range headers are ignored, which RFC 9110 allows.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[6:].strip().partition("-")
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+    if not first:
+        # bytes=-N: the last N bytes
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range starts past the end of the file")
+    return start, end
+
+
+def _read_range(path: pathlib.Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(_RANGE_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _read_open(f) -> Iterator[bytes]:
+    with f:
+        while True:
+            chunk = f.read(_RANGE_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+def file_response(path: pathlib.Path, etag: str, if_none_match: Optional[str] = None,
+                  media_type: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                  range_header: Optional[str] = None, if_range: Optional[str] = None) -> Response:
+    """FileResponse with an ETag, an empty 304 when the client already has it,
+    or a 206 with the requested byte range."""
+    headers = dict(headers or {})
+    headers["ETag"] = etag
+    if _etag_matches(if_none_match, etag):
+        headers.pop("Content-Disposition", None)
+        return Response(status_code=304, headers=headers)
+    headers["Accept-Ranges"] = "bytes"
+    if range_header and (not if_range or if_range.strip() == etag):
+        size = path.stat().st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", "ETag": etag})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if media_type is None:
+                media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            return StreamingResponse(_read_range(path, start, end), status_code=206,
+                                     media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def serve_file(path: pathlib.Path, if_none_match: Optional[str] = None,
+               media_type: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+               range_header: Optional[str] = None, if_range: Optional[str] = None) -> Response:
+    """Serve a file as-is with an ETag derived from its path, mtime and size."""
+    return file_response(path, _etag_for(source_key(path, "raw")), if_none_match, media_type, headers,
+                         range_header, if_range)
+
+
+class DerivedImageCache:
+    """On-disk store of converted images, evicted least-recently-used first."""
+
+    def __init__(self, root: pathlib.Path, max_bytes: int = 1024 ** 3):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # file name -> size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        found = []
+        for path in self.root.iterdir():
+            if path.name.startswith("."):
+                # Leftover from an interrupted conversion
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            found.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def _key_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(name)
+            if lock is None:
+                lock = self._key_locks[name] = threading.Lock()
+            return lock
+
+    def get(self, source: pathlib.Path, transform_name: str, transform: Transform,
+            suffix: str = ".png") -> tuple[pathlib.Path, str]:
+        """Return (variant path, ETag), building the variant on first request."""
+        return self._get(source, transform_name, transform, suffix, open_file=False)
+
+    def open(self, source: pathlib.Path, transform_name: str, transform: Transform,
+             suffix: str = ".png") -> tuple:
+        """Like get(), but returns the variant opened for reading.
+
+        It is opened under its key lock, which eviction needs, so unlike a
+        path it cannot be taken away before the response has sent it.
+        """
+        return self._get(source, transform_name, transform, suffix, open_file=True)
+
+    def _get(self, source: pathlib.Path, transform_name: str, transform: Transform,
+             suffix: str, open_file: bool) -> tuple:
+        key = source_key(source, transform_name)
+        name = key + suffix
+        path = self.root / name
+        with self._key_lock(name):
+            if path.exists():
+                self.hits += 1
+                with self._lock:
+                    if name in self._entries:
+                        self._entries.move_to_end(name)
+            else:
+                self.misses += 1
+                fd, tmp_name = tempfile.mkstemp(prefix=".tmp-", suffix=suffix, dir=self.root)
+                os.close(fd)
+                tmp = pathlib.Path(tmp_name)
+                try:
+                    transform(source, tmp)
+                    os.replace(tmp, path)
+                except BaseException:
+                    tmp.unlink(missing_ok=True)
+                    raise
+                size = path.stat().st_size
+                with self._lock:
+                    self._entries[name] = size
+                    self._total_bytes += size
+            result = open(path, "rb") if open_file else path
+        self._evict(keep=name)
+        return result, _etag_for(key)
+
+    def serve(self, source: pathlib.Path, transform_name: str, transform: Transform,
+              if_none_match: Optional[str] = None, media_type: str = "image/png",
+              headers: Optional[Dict[str, str]] = None, suffix: str = ".png") -> Response:
+        """Serve a variant of source, answering 304 without any conversion when the ETag matches."""
+        etag = _etag_for(source_key(source, transform_name))
+        if _etag_matches(if_none_match, etag):
+            return file_response(source, etag, if_none_match, media_type, headers)
+        fh, etag = self.open(source, transform_name, transform, suffix)
+        headers = dict(headers or {})
+        headers["ETag"] = etag
+        headers["Content-Length"] = str(os.fstat(fh.fileno()).st_size)
+        return StreamingResponse(_read_open(fh), media_type=media_type, headers=headers)
+
+    def _evict(self, keep: str):
+        while True:
+            with self._lock:
+                if self._total_bytes <= self.max_bytes:
+                    return
+                victim = victim_lock = None
+                for name in self._entries:
+                    if name == keep:
+                        continue
+                    lock = self._key_locks.setdefault(name, threading.Lock())
+                    # Skip variants that are being built or looked up right now
+                    if lock.acquire(blocking=False):
+                        victim, victim_lock = name, lock
+                        break
+                if victim is None:
+                    return
+                self._total_bytes -= self._entries.pop(victim)
+            # serve() sends from a handle opened under the key lock (see open()),
+            # which keeps the file readable once it is unlinked
+            try:
+                (self.root / victim).unlink(missing_ok=True)
+            finally:
+                victim_lock.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Singleton instance
+_cache: Optional[DerivedImageCache] = None
+
+
+def get_derived_cache(default_root: pathlib.Path) -> DerivedImageCache:
+    """Get or create the derived image cache singleton."""
+    global _cache
+    if _cache is None:
+        _cache = DerivedImageCache(
+            pathlib.Path(os.getenv("DERIVED_CACHE_DIR", str(default_root))),
+            max_bytes=int(os.getenv("DERIVED_CACHE_MAX_BYTES", str(1024 ** 3))),
+        )
+    return _cache
@@ -4,10 +4,16 @@ Used for local development with Docker Desktop.
 """
 
 import os
+import asyncio
 import subprocess
 import json
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
+
+try:
+    from backend.output_stream import LineCallback, TailBuffer, stream_process_output, MAX_CAPTURED_OUTPUT_BYTES
+except ImportError:
+    from output_stream import LineCallback, TailBuffer, stream_process_output, MAX_CAPTURED_OUTPUT_BYTES
 
 
 class DockerRunner:
@@ -17,6 +23,7 @@ class DockerRunner:
         """Initialize Docker runner."""
         self.runner_image = runner_image
         self.default_timeout = timeout
+        self._image_digest: Optional[tuple] = None  # (digest, checked_at)
         
         # Verify Docker is available
         try:
@@ -31,6 +38,22 @@ class DockerRunner:
         except Exception as e:
             raise RuntimeError(f"Docker is not available: {e}")
     
+    @staticmethod
+    def _to_host_path(path: str) -> str:
+        """Translate a backend path to the Docker host path for volume mounting.
+        
+        When the backend itself runs in a container (Docker-in-Docker), the
+        docker daemon resolves mounts against the host filesystem, so /app must
+        be rewritten to HOST_PROJECT_DIR.
+        """
+        host_project_dir = os.getenv("HOST_PROJECT_DIR", "")
+        if host_project_dir and os.path.exists("/app"):
+            # Running in Docker container - use host paths
+            # Convert Windows paths to forward slashes for Docker
+            return path.replace("/app", host_project_dir).replace("\\", "/")
+        # Running directly on host
+        return path
+    
     def run_script(
         self,
         job_id: str,
@@ -39,7 +62,8 @@ class DockerRunner:
         input_path: str,
         output_path: str,
         timeout: Optional[int] = None,
-        script_parameters: str = ""
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
     ) -> Dict[str, Any]:
         """
         Execute a script in a Docker container.
@@ -52,67 +76,42 @@ class DockerRunner:
             output_path: Path to output directory on host
             timeout: Execution timeout in seconds
             script_parameters: Free-form parameters string passed to the script via env var
+            on_line: Called with (stream, line) for each output line as it is printed
         
         Returns:
-            Dict with status, exit_code, stdout, stderr
+            Dict with status, exit_code, stdout, stderr (tails of at most
+            MAX_CAPTURED_OUTPUT_BYTES each) and output_truncated
         """
         timeout = timeout or self.default_timeout
-        
-        # Get host paths for volume mounting (for Docker-in-Docker)
-        host_project_dir = os.getenv("HOST_PROJECT_DIR", "")
-        
-        # Build volume mount paths
-        if host_project_dir and os.path.exists("/app"):
-            # Running in Docker container - use host paths
-            script_host = script_path.replace("/app", host_project_dir)
-            request_host = request_path.replace("/app", host_project_dir)
-            input_host = input_path.replace("/app", host_project_dir)
-            output_host = output_path.replace("/app", host_project_dir)
-            
-            # Convert Windows paths to forward slashes for Docker
-            script_host = script_host.replace("\\", "/")
-            request_host = request_host.replace("\\", "/")
-            input_host = input_host.replace("\\", "/")
-            output_host = output_host.replace("\\", "/")
-        else:
-            # Running directly on host
-            script_host = script_path
-            request_host = request_path
-            input_host = input_path
-            output_host = output_path
-        
-        # Build Docker command
-        # Note: job_runner.py expects the script at /code/main.py (not /code/script.py)
-        docker_cmd = [
-            "docker", "run",
-            "--rm",
-            "--name", f"runner-{job_id}",
-            "-v", f"{script_host}:/code/main.py:ro",
-            "-v", f"{request_host}:/code/request.json:ro",
-            "-v", f"{input_host}:/input:ro",
-            "-v", f"{output_host}:/output",
-            "-e", f"JOB_ID={job_id}",
-            "-e", f"MAPS_SCRIPT_PARAMETERS={script_parameters}",
-            self.runner_image
-        ]
+        docker_cmd = self._build_command(job_id, script_path, request_path, input_path,
+                                         output_path, script_parameters)
         
         print(f"Executing Docker command: {' '.join(docker_cmd)}")
         
         try:
-            # Run the container
-            result = subprocess.run(
+            # Run the container, streaming its output as it is printed
+            process = subprocess.Popen(
                 docker_cmd,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                timeout=timeout
+                encoding="utf-8",
+                errors="replace",
+                bufsize=1
             )
+            try:
+                stdout, stderr, truncated = stream_process_output(process, timeout, on_line)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                raise
             
             return {
-                "status": "success" if result.returncode == 0 else "failed",
-                "exit_code": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "logs": result.stdout + result.stderr
+                "status": "success" if process.returncode == 0 else "failed",
+                "exit_code": process.returncode,
+                "stdout": stdout,
+                "stderr": stderr,
+                "logs": stdout + stderr,
+                "output_truncated": truncated
             }
             
         except subprocess.TimeoutExpired:
@@ -143,6 +142,170 @@ class DockerRunner:
                 "logs": f"Docker execution error: {str(e)}"
             }
     
+    async def run_script_async(
+        self,
+        job_id: str,
+        script_path: str,
+        request_path: str,
+        input_path: str,
+        output_path: str,
+        timeout: Optional[int] = None,
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a script in a Docker container without blocking the event loop.
+        
+        Same arguments and result as run_script, but the docker CLI runs as an
+        asyncio subprocess and on_line is called on the event loop. Falls back to
+        running run_script in a worker thread when the event loop cannot spawn
+        subprocesses (e.g. selector loop on Windows).
+        """
+        timeout = timeout or self.default_timeout
+        docker_cmd = self._build_command(job_id, script_path, request_path, input_path,
+                                         output_path, script_parameters)
+        
+        print(f"Executing Docker command (async): {' '.join(docker_cmd)}")
+        
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *docker_cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=MAX_CAPTURED_OUTPUT_BYTES
+            )
+        except NotImplementedError:
+            loop = asyncio.get_running_loop()
+            threadsafe_on_line = None
+            if on_line is not None:
+                threadsafe_on_line = lambda stream, line: loop.call_soon_threadsafe(on_line, stream, line)
+            return await asyncio.to_thread(
+                self.run_script, job_id, script_path, request_path, input_path,
+                output_path, timeout, script_parameters, threadsafe_on_line
+            )
+        except Exception as e:
+            return {
+                "status": "failed",
+                "exit_code": -1,
+                "stdout": "",
+                "stderr": f"Docker execution error: {str(e)}",
+                "logs": f"Docker execution error: {str(e)}"
+            }
+        
+        tails = {"stdout": TailBuffer(), "stderr": TailBuffer()}
+        
+        async def pump(reader: asyncio.StreamReader, stream: str):
+            while True:
+                try:
+                    raw = await reader.readline()
+                except ValueError:
+                    # Line longer than the stream limit: take what is buffered
+                    raw = await reader.read(MAX_CAPTURED_OUTPUT_BYTES)
+                if not raw:
+                    return
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                tails[stream].append(line)
+                if on_line is not None:
+                    try:
+                        on_line(stream, line)
+                    except Exception:
+                        pass
+        
+        async def communicate():
+            await asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"))
+            return await process.wait()
+        
+        try:
+            await asyncio.wait_for(communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Try to stop the container, then reap the docker CLI process
+            try:
+                stop = await asyncio.create_subprocess_exec(
+                    "docker", "stop", f"runner-{job_id}",
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                await asyncio.wait_for(stop.wait(), timeout=10)
+            except Exception:
+                pass
+            try:
+                process.kill()
+                await process.wait()
+            except Exception:
+                pass
+            
+            return {
+                "status": "timeout",
+                "exit_code": -1,
+                "stdout": "",
+                "stderr": f"Script execution timed out after {timeout} seconds",
+                "logs": f"Script execution timed out after {timeout} seconds"
+            }
+        
+        stdout = tails["stdout"].text()
+        stderr = tails["stderr"].text()
+        return {
+            "status": "success" if process.returncode == 0 else "failed",
+            "exit_code": process.returncode,
+            "stdout": stdout,
+            "stderr": stderr,
+            "logs": stdout + stderr,
+            "output_truncated": tails["stdout"].truncated or tails["stderr"].truncated
+        }
+    
+    def _build_command(
+        self,
+        job_id: str,
+        script_path: str,
+        request_path: str,
+        input_path: str,
+        output_path: str,
+        script_parameters: str = ""
+    ) -> List[str]:
+        """Build the `docker run` command line for a single job."""
+        # Build volume mount paths (host paths when running Docker-in-Docker)
+        script_host = self._to_host_path(script_path)
+        request_host = self._to_host_path(request_path)
+        input_host = self._to_host_path(input_path)
+        output_host = self._to_host_path(output_path)
+        
+        # Note: job_runner.py expects the script at /code/main.py (not /code/script.py)
+        return [
+            "docker", "run",
+            "--rm",
+            "--name", f"runner-{job_id}",
+            "-v", f"{script_host}:/code/main.py:ro",
+            "-v", f"{request_host}:/code/request.json:ro",
+            "-v", f"{input_host}:/input:ro",
+            "-v", f"{output_host}:/output",
+            "-e", f"JOB_ID={job_id}",
+            "-e", f"MAPS_SCRIPT_PARAMETERS={script_parameters}",
+            self.runner_image
+        ]
+    
+    def image_digest(self) -> str:
+        """Id of the runner image (re-checked at most once a minute), or its name if unknown.
+
+        Used to key cached results, so rebuilding the image invalidates them.
+        """
+        now = time.time()
+        if self._image_digest and now - self._image_digest[1] < 60:
+            return self._image_digest[0]
+        digest = self.runner_image
+        try:
+            result = subprocess.run(
+                ["docker", "image", "inspect", "--format", "{{.Id}}", self.runner_image],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode == 0 and result.stdout.strip():
+                digest = result.stdout.strip()
+        except Exception:
+            pass
+        self._image_digest = (digest, now)
+        return digest
+
     def cleanup(self, job_id: str):
         """Clean up any remaining containers."""
         try:
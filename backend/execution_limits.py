@@ -0,0 +1,142 @@
+"""
+Concurrency limits for script execution.
+
+/run awaits the runner's async path, so many runs can be in flight on one
+uvicorn worker. ExecutionLimiter caps how many run at once, both globally
+and per user, so one user queueing a batch of scripts cannot starve everyone
+else and the host does not start more sandboxes than it can handle.
+
+Configuration (environment):
+    MAX_CONCURRENT_RUNS           Global cap on concurrent runs (default 8)
+    MAX_CONCURRENT_RUNS_PER_USER  Cap per user_id (default 2)
+    RUN_QUEUE_TIMEOUT             Seconds a run may wait for a slot (default 30)
+"""
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Any
+
+
+class ExecutionLimitExceeded(Exception):
+    """Raised when a run could not get an execution slot in time."""
+
+    def __init__(self, message: str, scope: str):
+        super().__init__(message)
+        self.scope = scope  # "user" or "global"
+
+
+class ExecutionLimiter:
+    """Global + per-user semaphores guarding script execution."""
+
+    def __init__(self, max_concurrent: int = 8, max_per_user: int = 2, queue_timeout: float = 30):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max(1, max_per_user)
+        self.queue_timeout = queue_timeout
+        self._global = asyncio.Semaphore(self.max_concurrent)
+        self._per_user: Dict[str, asyncio.Semaphore] = {}
+        self._user_refs: Dict[str, int] = {}
+        self._running = 0
+        self._waiting = 0
+
+    def _user_semaphore(self, user_key: str) -> asyncio.Semaphore:
+        sem = self._per_user.get(user_key)
+        if sem is None:
+            sem = asyncio.Semaphore(self.max_per_user)
+            self._per_user[user_key] = sem
+        self._user_refs[user_key] = self._user_refs.get(user_key, 0) + 1
+        return sem
+
+    def _release_user(self, user_key: str):
+        refs = self._user_refs.get(user_key, 1) - 1
+        if refs <= 0:
+            # Nobody holds or waits on this user's semaphore: drop it
+            self._user_refs.pop(user_key, None)
+            self._per_user.pop(user_key, None)
+        else:
+            self._user_refs[user_key] = refs
+
+    async def _acquire(self, sem: asyncio.Semaphore, deadline: Optional[float], scope: str):
+        remaining = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise ExecutionLimitExceeded(
+                "Too many concurrent runs for this user" if scope == "user"
+                else "Server is busy running other scripts",
+                scope
+            )
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str], wait: Optional[float] = -1,
+                   user: bool = True, global_: bool = True):
+        """Hold one execution slot for the duration of the block.
+
+        The per-user slot is taken first so a user over their limit does not
+        occupy a global slot while waiting.
+
+        Args:
+            wait: Max seconds to wait for a slot; -1 uses queue_timeout and
+                None waits indefinitely (used by the job queue scheduler).
+            user / global_: Which limits to take. A tile fan-out holds the
+                user slot for the whole job and one global slot per worker.
+        """
+        user_key = user_id or "anonymous"
+        if wait is not None and wait < 0:
+            wait = self.queue_timeout
+        deadline = None if wait is None else asyncio.get_running_loop().time() + wait
+        user_sem = self._user_semaphore(user_key) if user else None
+        self._waiting += 1
+        try:
+            try:
+                if user_sem is not None:
+                    await self._acquire(user_sem, deadline, "user")
+                if global_:
+                    try:
+                        await self._acquire(self._global, deadline, "global")
+                    except BaseException:
+                        if user_sem is not None:
+                            user_sem.release()
+                        raise
+            finally:
+                self._waiting -= 1
+
+            if global_:
+                self._running += 1
+            try:
+                yield
+            finally:
+                if global_:
+                    self._running -= 1
+                    self._global.release()
+                if user_sem is not None:
+                    user_sem.release()
+        finally:
+            if user_sem is not None:
+                self._release_user(user_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "queue_timeout": self.queue_timeout,
+            "running": self._running,
+            "waiting": self._waiting,
+            "active_users": len(self._per_user),
+        }
+
+
+# Singleton instance
+_limiter: Optional[ExecutionLimiter] = None
+
+
+def get_limiter() -> ExecutionLimiter:
+    """Get or create the execution limiter singleton."""
+    global _limiter
+    if _limiter is None:
+        _limiter = ExecutionLimiter(
+            max_concurrent=int(os.getenv("MAX_CONCURRENT_RUNS", "8")),
+            max_per_user=int(os.getenv("MAX_CONCURRENT_RUNS_PER_USER", "2")),
+            queue_timeout=float(os.getenv("RUN_QUEUE_TIMEOUT", "30")),
+        )
+    return _limiter
@@ -0,0 +1,219 @@
+"""
+Conversion of scientific images to 8-bit for display.
+
+Every display path (input previews, thumbnails, library/upload TIFF views and
+script output views) needs the same thing: 16/32-bit, float and low-range
+uint8 data stretched to 0-255, then a PIL mode a PNG can hold.
+to_display_image() is that one implementation (image_reader.load_display_image()
+streams files through the same BlockStats passes).
+
+It is written to avoid whole-image temporaries:
+- 8 and 16-bit data are mapped through a 256/65536 entry lookup table
+  (percentiles come from a histogram), so the output is the only
+  image-sized allocation.
+- Other types are scaled in float32 blocks written into a preallocated
+  uint8 output, instead of building float64 copies of the whole image.
+
+The work is split in two passes over blocks of pixels - BlockStats collects
+the range, then its stretch function maps each block - so image_reader can
+feed rows of a memory-mapped TIFF without ever holding the full frame.
+
+contrast=(low, high) clips to those percentiles before stretching, which
+shows dim features in images with a few very bright pixels.
+"""
+
+from typing import Callable, Iterable, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Pixels per block of scratch space (16 MB of float32, 32 MB of intp indices)
+_BLOCK_PIXELS = 4 * 1024 * 1024
+# Values kept per image for float/32-bit percentiles
+_PERCENTILE_SAMPLES = 1_000_000
+
+Contrast = Optional[Tuple[float, float]]
+Stretch = Callable[[np.ndarray], np.ndarray]
+
+_NORMALIZED_TYPES = (np.uint16, np.uint32, np.int16, np.int32, np.float32, np.float64)
+
+
+def needs_normalization(arr: np.ndarray, max_value: Optional[float] = None) -> bool:
+    """True for high bit depth / float data, and for uint8 data that only uses a low range (label images)."""
+    if arr.dtype in _NORMALIZED_TYPES:
+        return True
+    if arr.dtype == np.uint8:
+        if max_value is None:
+            max_value = arr.max() if arr.size else 0
+        return 1 < max_value < 100
+    return False
+
+
+def _lut_index(block: np.ndarray) -> np.ndarray:
+    """Lookup table index of 8/16-bit values (int16 shifted onto 0..65535, order preserved)."""
+    if block.dtype == np.int16:
+        return block.view(np.uint16) ^ np.uint16(0x8000)
+    return block
+
+
+def _stretch_lut(bins: int, lo: int, hi: int) -> np.ndarray:
+    """uint8 lookup table mapping bin lo..hi linearly to 0..255 (clipped outside)."""
+    if hi <= lo:
+        # Percentile clipping collapsed the range: threshold instead
+        lut = np.zeros(bins, dtype=np.uint8)
+        lut[hi + 1:] = 255
+        return lut
+    ramp = (np.arange(bins, dtype=np.float32) - lo) * (255.0 / (hi - lo))
+    return np.clip(ramp, 0, 255).astype(np.uint8)
+
+
+def iter_blocks(arr: np.ndarray) -> Iterable[np.ndarray]:
+    """Flat blocks of _BLOCK_PIXELS values (views when arr is contiguous)."""
+    flat = arr.reshape(-1)
+    for start in range(0, flat.size, _BLOCK_PIXELS):
+        yield flat[start:start + _BLOCK_PIXELS]
+
+
+class BlockStats:
+    """Value range of an image, accumulated one block at a time.
+
+    8/16-bit data keeps min/max (plus a histogram when contrast is set); other
+    types keep min/max and, for contrast, a strided sample.
+    """
+
+    def __init__(self, dtype, total_pixels: int, contrast: Contrast = None):
+        self.dtype = np.dtype(dtype)
+        self.contrast = contrast
+        self.use_lut = self.dtype in (np.uint8, np.uint16, np.int16)
+        self.bins = 256 if self.dtype == np.uint8 else 65536
+        self.lo = None
+        self.hi = None
+        self.has_nan = False
+        self._hist = np.zeros(self.bins, dtype=np.int64) if (self.use_lut and contrast) else None
+        self._sample_step = max(1, total_pixels // _PERCENTILE_SAMPLES)
+        self._samples = []
+
+    def update(self, block: np.ndarray):
+        """Add a block of pixels (any shape)."""
+        if block.size == 0:
+            return
+        if self.use_lut:
+            index = _lut_index(block).reshape(-1)
+            for start in range(0, index.size, _BLOCK_PIXELS):
+                chunk = index[start:start + _BLOCK_PIXELS]
+                if self._hist is not None:
+                    # numpy widens the indices to intp, hence the sub-blocks
+                    self._hist += np.bincount(chunk, minlength=self.bins)
+                lo, hi = int(chunk.min()), int(chunk.max())
+                self.lo = lo if self.lo is None else min(self.lo, lo)
+                self.hi = hi if self.hi is None else max(self.hi, hi)
+            return
+        lo, hi = block.min(), block.max()
+        if self.dtype.kind == "f" and (np.isnan(lo) or np.isnan(hi)):
+            self.has_nan = True
+            if np.isnan(block).all():
+                return
+            lo, hi = np.nanmin(block), np.nanmax(block)
+        self.lo = lo if self.lo is None else min(self.lo, lo)
+        self.hi = hi if self.hi is None else max(self.hi, hi)
+        if self.contrast is not None:
+            self._samples.append(np.array(block.reshape(-1)[::self._sample_step]))
+
+    def needs_normalization(self) -> bool:
+        if self.lo is None:
+            return False
+        if self.dtype == np.uint8 and self.contrast is None:
+            # lo/hi are lookup indexes, which for uint8 are the values
+            return 1 < self.hi < 100
+        return self.dtype in _NORMALIZED_TYPES or self.contrast is not None
+
+    def stretcher(self) -> Optional[Stretch]:
+        """Function mapping a block to uint8 with this image's range, or None for an all-black image."""
+        if self.lo is None:
+            return None
+        if self.use_lut:
+            lo, hi = self.lo, self.hi
+            if self._hist is not None:
+                cumulative = np.cumsum(self._hist)
+                total = cumulative[-1]
+                lo = int(np.searchsorted(cumulative, total * self.contrast[0] / 100.0, side="right"))
+                hi = max(lo, int(np.searchsorted(cumulative, total * self.contrast[1] / 100.0, side="left")))
+            elif hi == lo:
+                # All same value - blank image
+                return None
+            lut = _stretch_lut(self.bins, lo, hi)
+            return lambda block: lut[_lut_index(block)]
+
+        lo, hi = self.lo, self.hi
+        if self.contrast is not None and self._samples:
+            sample = np.concatenate(self._samples)
+            lo, hi = (np.nanpercentile if self.dtype.kind == "f" else np.percentile)(sample, self.contrast)
+        if not hi > lo:
+            return None
+        lo32 = np.float32(lo)
+        scale = np.float32(255.0 / (float(hi) - float(lo)))
+        has_nan = self.has_nan
+
+        def stretch(block: np.ndarray) -> np.ndarray:
+            scaled = block.astype(np.float32)
+            scaled -= lo32
+            scaled *= scale
+            np.clip(scaled, 0, 255, out=scaled)
+            if has_nan:
+                np.nan_to_num(scaled, copy=False, nan=0.0)
+            return scaled.astype(np.uint8)
+        return stretch
+
+
+def normalize_array(arr: np.ndarray, contrast: Contrast = None) -> Optional[np.ndarray]:
+    """Stretch arr to uint8, or None when it should be displayed as-is.
+
+    Args:
+        contrast: Optional (low, high) percentiles to clip to, e.g. (0.5, 99.5)
+    """
+    if arr.size == 0:
+        return None
+    if not arr.dtype.isnative:
+        # e.g. big-endian 16-bit TIFFs (PIL mode I;16B)
+        arr = arr.astype(arr.dtype.newbyteorder("="))
+    if arr.dtype == np.uint8 and contrast is None:
+        # Cheap pre-check: most 8-bit images are shown unchanged
+        if not needs_normalization(arr, int(arr.max())):
+            return None
+    stats = BlockStats(arr.dtype, arr.size, contrast)
+    for block in iter_blocks(arr):
+        stats.update(block)
+    if not stats.needs_normalization():
+        return None
+
+    out = np.zeros(arr.shape, dtype=np.uint8)
+    stretch = stats.stretcher()
+    if stretch is None:
+        return out
+    flat_out = out.reshape(-1)
+    start = 0
+    for block in iter_blocks(arr):
+        flat_out[start:start + block.size] = stretch(block)
+        start += block.size
+    return out
+
+
+def display_mode(img: Image.Image) -> Image.Image:
+    """Convert img to a mode PNG/browsers handle (RGB, RGBA or L)."""
+    if img.mode in ('RGB', 'RGBA', 'L'):
+        return img
+    if img.mode == 'LA' or (img.mode == 'P' and 'transparency' in img.info):
+        return img.convert('RGBA')
+    if img.mode in ('P', 'I', 'F'):
+        return img.convert('RGB')
+    if len(img.getbands()) == 1:
+        return img.convert('L')
+    return img.convert('RGB')
+
+
+def to_display_image(img: Image.Image, contrast: Contrast = None) -> Image.Image:
+    """8-bit version of img for display (first page of multi-page files)."""
+    normalized = normalize_array(np.asarray(img), contrast)
+    if normalized is not None:
+        img = Image.fromarray(normalized)
+    return display_mode(img)
@@ -0,0 +1,272 @@
+"""
+Header-only metadata and streamed pixel access for stored images.
+
+Two things the display paths used to do with a full decode:
+
+- read_header() reports size, mode, dtype, pixel format and TIFF layout from
+  the file header (PIL opens lazily; nothing is decoded).
+- load_display_image() builds the 8-bit display image of a file. For
+  uncompressed TIFFs (what MAPS exports) the strips/tiles are memory-mapped
+  and streamed in row bands through image_normalize.BlockStats, so no
+  full-frame array is built: the pages come from the shared page cache (one
+  copy however many requests view the same file) and the only private
+  allocation is the output - or, with max_size, a reduced output that is box
+  averaged while streaming. Compressed and non-TIFF images fall back to
+  decoding with PIL.
+"""
+
+import math
+import mmap
+import pathlib
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    from backend.image_normalize import BlockStats, Contrast, display_mode, to_display_image
+except ImportError:
+    from image_normalize import BlockStats, Contrast, display_mode, to_display_image
+
+
+# Rows per streamed band are chosen so a band holds about this many pixels
+_BAND_PIXELS = 4 * 1024 * 1024
+
+# PIL raw decoder mode -> (numpy dtype, samples per pixel) for layouts that can be mapped
+_RAW_DTYPES = {
+    "L": ("u1", 1),
+    "I;16": ("<u2", 1),
+    "I;16B": (">u2", 1),
+    "I;16N": ("=u2", 1),
+    "I;16S": ("<i2", 1),
+    "I;16BS": (">i2", 1),
+    "I;32S": ("<i4", 1),
+    "I;32BS": (">i4", 1),
+    "F;32F": ("<f4", 1),
+    "F;32BF": (">f4", 1),
+    "RGB": ("u1", 3),
+    "RGBA": ("u1", 4),
+}
+
+# PIL mode -> (numpy dtype, MAPS pixel format)
+_MODE_FORMATS = {
+    "L": ("uint8", "Gray8"),
+    "I;16": ("uint16", "Gray16"),
+    "I;16B": ("uint16", "Gray16"),
+    "I;16L": ("uint16", "Gray16"),
+    "I": ("int32", "Gray32"),
+    "F": ("float32", "Gray32Float"),
+    "RGB": ("uint8", "Bgr24"),
+    "RGBA": ("uint8", "Bgra32"),
+}
+
+_TIFF_COMPRESSION = 259
+_TIFF_TILE_WIDTH = 322
+
+
+@dataclass
+class ImageHeader:
+    """What an image file holds, read without decoding pixels."""
+    width: int
+    height: int
+    mode: str
+    format: Optional[str]
+    pages: int = 1
+    dtype: Optional[str] = None
+    pixel_format: Optional[str] = None
+    compression: Optional[int] = None  # TIFF compression tag (1 = none)
+    tiled: bool = False
+    memory_mappable: bool = False
+
+
+@dataclass
+class _Band:
+    """Rows y0..y1 of the image and the raw runs covering them."""
+    y0: int
+    y1: int
+    # (x0, x1, file offset, bytes per stored row)
+    runs: List[Tuple[int, int, int, int]]
+
+
+def _raw_layout(img: Image.Image) -> Optional[Tuple[np.dtype, int, List[_Band]]]:
+    """(dtype, samples per pixel, row bands) of an uncompressed image, or None if it must be decoded."""
+    if img.format != "TIFF" or not img.tile:
+        return None
+    rawmode = img.tile[0][3][0] if img.tile[0][3] else None
+    if rawmode not in _RAW_DTYPES:
+        return None
+    dtype, samples = _RAW_DTYPES[rawmode]
+    dtype = np.dtype(dtype)
+    pixel_bytes = dtype.itemsize * samples
+
+    bands: List[_Band] = []
+    for decoder, (x0, y0, x1, y1), offset, args in img.tile:
+        if decoder != "raw" or args[0] != rawmode or (len(args) > 2 and args[2] != 1):
+            return None
+        row_bytes = args[1] or (x1 - x0) * pixel_bytes
+        band = bands[-1] if bands else None
+        if band is not None and band.y0 == y0 and band.y1 == y1:
+            # Another tile of the same tile row
+            band.runs.append((x0, x1, offset, row_bytes))
+        elif (band is not None and x0 == 0 and x1 == img.width and len(band.runs) == 1
+              and band.runs[0][:2] == (0, img.width) and band.y1 == y0 and band.runs[0][3] == row_bytes
+              and band.runs[0][2] + (band.y1 - band.y0) * row_bytes == offset):
+            # Strip stored right after the previous one: extend it
+            band.y1 = y1
+        else:
+            bands.append(_Band(y0, y1, [(x0, x1, offset, row_bytes)]))
+    return dtype, samples, bands
+
+
+def read_header(path: pathlib.Path) -> ImageHeader:
+    """Size, mode, dtype and layout of an image from its header."""
+    with Image.open(path) as img:
+        dtype, pixel_format = _MODE_FORMATS.get(img.mode, (None, None))
+        compression = tiled = None
+        if img.format == "TIFF":
+            compression = img.tag_v2.get(_TIFF_COMPRESSION, 1)
+            tiled = _TIFF_TILE_WIDTH in img.tag_v2
+        return ImageHeader(
+            width=img.width,
+            height=img.height,
+            mode=img.mode,
+            format=img.format,
+            pages=getattr(img, "n_frames", 1),
+            dtype=dtype,
+            pixel_format=pixel_format,
+            compression=compression,
+            tiled=bool(tiled),
+            memory_mappable=_raw_layout(img) is not None,
+        )
+
+
+def iter_row_bands(path: pathlib.Path) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (first row, rows) covering the first page top to bottom.
+
+    Uncompressed TIFFs are read through a memory map in bands of about
+    _BAND_PIXELS pixels (tiles of one tile row are assembled into a band);
+    anything else is decoded by PIL and yielded as a single band.
+    """
+    with Image.open(path) as img:
+        layout = _raw_layout(img)
+        if layout is None:
+            yield 0, np.asarray(img)
+            return
+        width = img.width
+
+    dtype, samples, bands = layout
+    native = dtype.newbyteorder("=")
+    pixel_shape = (samples,) if samples > 1 else ()
+    pixel_bytes = dtype.itemsize * samples
+    rows_per_band = max(1, _BAND_PIXELS // max(1, width))
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        data = np.frombuffer(buffer, dtype=np.uint8)
+
+        def run_rows(x0, x1, offset, row_bytes, r0, r1):
+            # Rows r0..r1 (relative to the run) as an array view of the mapping
+            start = offset + r0 * row_bytes
+            raw = data[start:start + (r1 - r0) * row_bytes].reshape(r1 - r0, row_bytes)
+            raw = raw[:, :(x1 - x0) * pixel_bytes]
+            return raw.view(dtype).reshape((r1 - r0, x1 - x0) + pixel_shape)
+
+        for band in bands:
+            for r0 in range(0, band.y1 - band.y0, rows_per_band):
+                r1 = min(r0 + rows_per_band, band.y1 - band.y0)
+                if len(band.runs) == 1 and band.runs[0][:2] == (0, width):
+                    rows = run_rows(*band.runs[0], r0, r1)
+                    # Non-native byte order is swapped band by band
+                    yield band.y0 + r0, rows.astype(native, copy=False)
+                else:
+                    rows = np.empty((r1 - r0, width) + pixel_shape, dtype=native)
+                    for run in band.runs:
+                        rows[:, run[0]:run[1]] = run_rows(*run, r0, r1)
+                    yield band.y0 + r0, rows
+    finally:
+        # Drop the view of the mapping first; run_rows closes over it
+        data = None
+        try:
+            buffer.close()
+        except BufferError:
+            # A caller still holds a view (e.g. stopped iterating early); the GC unmaps it
+            pass
+
+
+class _BoxReducer:
+    """Accumulates streamed uint8 rows into an image `factor` times smaller (box average)."""
+
+    def __init__(self, height: int, width: int, pixel_shape: tuple, factor: int):
+        self.factor = factor
+        self.height, self.width = height, width
+        self.sums = np.zeros((math.ceil(height / factor), math.ceil(width / factor)) + pixel_shape,
+                             dtype=np.uint32)
+        self._columns = np.arange(0, width, factor)
+
+    def add(self, y0: int, rows: np.ndarray):
+        f = self.factor
+        column_sums = np.add.reduceat(rows, self._columns, axis=1, dtype=np.uint32)
+        # Row groups start at every row that begins an output row
+        starts = np.arange((-y0) % f, rows.shape[0], f)
+        if starts.size == 0 or starts[0] != 0:
+            starts = np.concatenate(([0], starts))
+        self.sums[(y0 + starts) // f] += np.add.reduceat(column_sums, starts, axis=0, dtype=np.uint32)
+
+    def result(self) -> np.ndarray:
+        f = self.factor
+        row_counts = np.minimum(f, self.height - np.arange(self.sums.shape[0]) * f)
+        column_counts = np.minimum(f, self.width - np.arange(self.sums.shape[1]) * f)
+        counts = np.outer(row_counts, column_counts).astype(np.uint32)
+        if self.sums.ndim == 3:
+            counts = counts[:, :, None]
+        return ((self.sums + counts // 2) // counts).astype(np.uint8)
+
+
+def load_display_image(path: pathlib.Path, contrast: Contrast = None,
+                       max_size: Optional[int] = None) -> Image.Image:
+    """8-bit display image of path (first page), streamed for uncompressed TIFFs.
+
+    Args:
+        contrast: Optional (low, high) percentiles, as for to_display_image()
+        max_size: Longest edge wanted by the caller. Streamed images are box
+            reduced by a whole factor that keeps them at least this large;
+            callers still resize to the exact size.
+    """
+    header = read_header(path)
+    if not header.memory_mappable:
+        with Image.open(path) as img:
+            if max_size:
+                # JPEG can decode at reduced scale directly
+                img.draft("RGB", (max_size, max_size))
+            return to_display_image(img, contrast)
+
+    width, height = header.width, header.height
+    # Pass 1: value range
+    stats = None
+    for _, rows in iter_row_bands(path):
+        if stats is None:
+            stats = BlockStats(rows.dtype, width * height, contrast)
+        stats.update(rows)
+        pixel_shape = rows.shape[2:]
+        del rows
+    normalize = stats.needs_normalization()
+    stretch = stats.stretcher() if normalize else None
+
+    # Pass 2: stretch each band into the (possibly reduced) output
+    factor = max(1, max(width, height) // max_size) if max_size else 1
+    reducer = _BoxReducer(height, width, pixel_shape, factor) if factor > 1 else None
+    out = None if reducer else np.zeros((height, width) + pixel_shape, dtype=np.uint8)
+    if not normalize or stretch is not None:
+        for y0, rows in iter_row_bands(path):
+            if normalize:
+                rows = stretch(rows)
+            if reducer is not None:
+                reducer.add(y0, rows)
+            else:
+                out[y0:y0 + rows.shape[0]] = rows
+            del rows
+    if reducer is not None:
+        out = reducer.result()
+    return display_mode(Image.fromarray(out))
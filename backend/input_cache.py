@@ -0,0 +1,316 @@
+"""
+Prepared input images for script runs.
+
+Every run needs its input in outputs/{job_id}/input/: the original with EXIF
+orientation applied (and EXIF stripped), plus image.png for the browser when
+the original is a TIFF. prepare_input_image() does that work.
+
+PreparedInputCache keeps the prepared files per content hash (SHA-256 of the
+original, whether it is a stored library/user image or a streamed upload) so an
+image is decoded and re-encoded once, then hardlinked into each job directory:
+re-running a script on the same image does no PIL work and writes no image
+data. The hardlinks are only safe because no sandbox can write to them:
+every runtime mounts a job's input read-only (the Docker runner's /input,
+the warm pool's and warm slots' /job, the input subPath of a Kubernetes
+pod), and outputs/.prepared itself is never mounted. Cached files are also
+chmod 0o444, but that does not stop a process running as root.
+
+Configuration (environment):
+    INPUT_CACHE_DIR          Where prepared inputs are kept (default outputs/.prepared;
+                             keep it on the same filesystem as outputs/ so job
+                             inputs can be hardlinked instead of copied)
+    INPUT_CACHE_MAX_BYTES    Size limit before LRU eviction (default 2 GB)
+    INPUT_CACHE_MAX_ENTRIES  Entry limit before LRU eviction (default 500)
+"""
+
+import os
+import shutil
+import hashlib
+import pathlib
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+try:
+    from backend.image_reader import load_display_image, read_header
+except ImportError:
+    from image_reader import load_display_image, read_header
+
+
+def normalize_extension(filename: Optional[str]) -> str:
+    """Map an image filename to the extension used inside the job (".png", ".jpg", ".tif", ...)."""
+    file_extension = pathlib.Path(filename).suffix.lower() if filename else ".png"
+    if file_extension in [".jpg", ".jpeg"]:
+        return ".jpg"
+    if file_extension in [".tiff", ".tif"]:
+        return ".tif"
+    return file_extension or ".png"
+
+
+def write_display_png(tiff_path: pathlib.Path, png_path: pathlib.Path) -> bool:
+    """Convert a TIFF to an 8-bit PNG for browser display (browsers can't show TIFF)."""
+    try:
+        print(f"Converting TIFF to PNG: {tiff_path} -> {png_path}")
+        header = read_header(tiff_path)
+        print(f"  Original: mode={header.mode}, size={(header.width, header.height)}")
+        load_display_image(tiff_path).save(png_path, "PNG")
+
+        if png_path.exists():
+            print(f"✓ Converted TIFF to PNG: {png_path} ({png_path.stat().st_size} bytes)")
+            return True
+        print(f"⚠ Warning: PNG conversion completed but file not found at {png_path}")
+    except Exception as e:
+        print(f"⚠ Warning: Failed to convert TIFF to PNG: {e}")
+        traceback.print_exc()
+    return False
+
+
+def prepare_input_image(source: Union[pathlib.Path, BinaryIO], file_extension: str,
+                        out_dir: pathlib.Path) -> pathlib.Path:
+    """Write out_dir/image{ext} with EXIF orientation applied, plus image.png for TIFFs.
+
+    Args:
+        source: Path or file-like object with the original image
+        file_extension: Extension from normalize_extension()
+
+    Returns the path of image{ext}. The TIFF preview is best effort: the TIFF
+    itself is still available for processing if the conversion fails.
+    """
+    input_image_path = out_dir / f"image{file_extension}"
+
+    img = Image.open(source)
+    multi_page = file_extension == ".tif" and getattr(img, "n_frames", 1) > 1
+    if not multi_page:
+        # Apply EXIF orientation to pixel data, then strip EXIF
+        # This ensures both browser and script see the same orientation
+        img = ImageOps.exif_transpose(img)
+
+    if multi_page:
+        # Multi-page TIFFs (tile stacks) keep every page; the preview shows the first
+        img.save(input_image_path, format="TIFF", save_all=True)
+    else:
+        with open(input_image_path, "wb") as f:
+            if file_extension == ".png":
+                img.save(f, format="PNG")
+            elif file_extension == ".jpg":
+                img.save(f, format="JPEG", quality=95, exif=b'')
+            elif file_extension == ".tif":
+                img.save(f, format="TIFF")
+            else:
+                # For other formats, save as PNG
+                img.save(f, format="PNG")
+
+    # Keep the original TIFF for processing, but also create a PNG version for display
+    if file_extension == ".tif":
+        write_display_png(input_image_path, out_dir / "image.png")
+    return input_image_path
+
+
+def link_or_copy(src: pathlib.Path, dst: pathlib.Path):
+    """Hardlink src to dst, copying when the filesystem does not allow it."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def move_tree(src: pathlib.Path, dst: pathlib.Path):
+    """Move the contents of src into dst, merging directories that exist in both."""
+    dst.mkdir(parents=True, exist_ok=True)
+    for entry in src.iterdir():
+        target = dst / entry.name
+        if entry.is_dir() and not entry.is_symlink() and target.is_dir() and not target.is_symlink():
+            move_tree(entry, target)
+        else:
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            os.replace(entry, target)
+
+
+class PreparedInputCache:
+    """Prepared job inputs stored once per (content hash, extension).
+
+    Entries are evicted least-recently-used first once the cache holds more
+    than max_bytes or max_entries. A job keeps its hardlinks after eviction.
+    """
+
+    def __init__(self, root: pathlib.Path, max_bytes: int = 2 * 1024 ** 3, max_entries: int = 500):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        # key -> lock serializing its preparation; dropped when the entry is evicted
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # (device, inode, size, mtime_ns) -> sha256, least recently used first.
+        # Keyed by inode so a prepared input hardlinked into a job dir is not
+        # hashed again
+        self._digests: "OrderedDict[Tuple[int, int, int, int], str]" = OrderedDict()
+        self.max_digests = 4 * self.max_entries
+        # key -> entry size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the entries on disk (oldest mtime first)."""
+        found = []
+        for entry in self.root.iterdir():
+            if entry.name.startswith("."):
+                # Leftover from an interrupted prepare
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            if entry.is_dir():
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                found.append((entry.stat().st_mtime, entry.name, size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def _memo_key(path: pathlib.Path) -> Tuple[int, int, int, int]:
+        stat = path.stat()
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def file_digest(self, path: pathlib.Path) -> str:
+        """SHA-256 of a file's contents, memoized per inode."""
+        memo_key = self._memo_key(path)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+                return digest
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._digests[memo_key] = digest
+            while len(self._digests) > self.max_digests:
+                self._digests.popitem(last=False)
+        return digest
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _materialize_entry(self, key: str, source: Union[pathlib.Path, BinaryIO], label: str,
+                           file_extension: str, in_dir: pathlib.Path) -> pathlib.Path:
+        entry = self.root / key
+        with self._key_lock(key):
+            if entry.is_dir():
+                self.hits += 1
+                try:
+                    os.utime(entry)
+                except OSError:
+                    pass
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+                tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.root))
+                try:
+                    prepare_input_image(source, file_extension, tmp_dir)
+                    size = 0
+                    for path in tmp_dir.iterdir():
+                        size += path.stat().st_size
+                        path.chmod(0o444)
+                        # Hashed now so later runs can identify the input by inode
+                        self.file_digest(path)
+                    os.replace(tmp_dir, entry)
+                except OSError:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    if not entry.is_dir():
+                        raise
+                    # Prepared meanwhile by a caller holding the key's newer lock (after an eviction)
+                    size = None
+                except BaseException:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+                if size is not None:
+                    with self._lock:
+                        self._entries[key] = size
+                        self._total_bytes += size
+                    print(f"[InputCache] ✓ Prepared {label} -> {key[:12]}")
+
+            # Link while holding the key lock so eviction cannot remove the entry mid-way
+            for path in entry.iterdir():
+                link_or_copy(path, in_dir / path.name)
+        self._evict()
+        return in_dir / f"image{file_extension}"
+
+    def materialize_file(self, source: pathlib.Path, file_extension: str, in_dir: pathlib.Path) -> pathlib.Path:
+        """Place a stored original in in_dir, preparing it on first use."""
+        key = self.file_digest(source) + file_extension
+        return self._materialize_entry(key, source, source.name, file_extension, in_dir)
+
+    def materialize_upload(self, source: pathlib.Path, digest: str, file_extension: str,
+                           in_dir: pathlib.Path) -> pathlib.Path:
+        """Place a staged upload in in_dir; repeat uploads skip all image work.
+
+        digest is the SHA-256 computed while the upload was written, so the
+        file is only read again when it has to be prepared.
+        """
+        return self._materialize_entry(digest + file_extension, source, "upload", file_extension, in_dir)
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is within its limits."""
+        while True:
+            with self._lock:
+                if self._total_bytes <= self.max_bytes and len(self._entries) <= self.max_entries:
+                    return
+                victim = victim_lock = None
+                for key in list(self._entries)[:-1]:
+                    lock = self._key_locks.setdefault(key, threading.Lock())
+                    # Skip entries that are being linked into a job right now
+                    if lock.acquire(blocking=False):
+                        victim, victim_lock = key, lock
+                        break
+                if victim is None:
+                    return
+                self._total_bytes -= self._entries.pop(victim)
+            try:
+                shutil.rmtree(self.root / victim, ignore_errors=True)
+            finally:
+                with self._lock:
+                    # Anyone already waiting on the old lock finds the entry gone and prepares it again
+                    if self._key_locks.get(victim) is victim_lock:
+                        del self._key_locks[victim]
+                victim_lock.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Singleton instance
+_cache: Optional[PreparedInputCache] = None
+
+
+def get_input_cache(default_root: pathlib.Path) -> PreparedInputCache:
+    """Get or create the prepared input cache singleton."""
+    global _cache
+    if _cache is None:
+        _cache = PreparedInputCache(
+            pathlib.Path(os.getenv("INPUT_CACHE_DIR", str(default_root))),
+            max_bytes=int(os.getenv("INPUT_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+            max_entries=int(os.getenv("INPUT_CACHE_MAX_ENTRIES", "500")),
+        )
+    return _cache
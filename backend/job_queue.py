@@ -0,0 +1,364 @@
+"""
+Persistent job queue and scheduler for the /jobs API.
+
+Jobs are stored in the execution_jobs table (see models.ExecutionJob), so the
+queue survives a backend restart: on startup, jobs that were running when the
+process stopped are put back in the queue (up to MAX_JOB_ATTEMPTS).
+
+The scheduler picks the next job by priority first and then fair share: among
+jobs with the same priority, users with fewer running jobs go first, so one
+user submitting a whole class worth of jobs cannot starve the others. When
+the queue is full, submission raises JobQueueFull and the API answers 429
+instead of piling up blocked requests.
+
+Configuration (environment):
+    MAX_CONCURRENT_RUNS           Jobs dispatched at once (default 8)
+    MAX_CONCURRENT_RUNS_PER_USER  Jobs dispatched at once per user (default 2)
+    MAX_QUEUED_JOBS               Queued jobs across all users (default 200)
+    MAX_QUEUED_JOBS_PER_USER      Queued jobs per user (default 20)
+    MAX_JOB_ATTEMPTS              Dispatches per job, including restarts (default 2)
+"""
+
+import os
+import json
+import asyncio
+import traceback
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    from backend.models import ExecutionJob
+except ImportError:
+    from models import ExecutionJob
+
+
+TERMINAL_STATUSES = ("success", "error", "timeout", "cancelled")
+
+
+class JobQueueFull(Exception):
+    """Raised when a submission would exceed the queue limits."""
+
+    def __init__(self, message: str, scope: str):
+        super().__init__(message)
+        self.scope = scope  # "user" or "global"
+
+
+class JobEventBus:
+    """In-process fan-out of job events to stream subscribers.
+
+    While a job is open (between open() and close()) its recent events are
+    kept so a subscriber that connects mid-run still sees the latest output.
+    The "done" event of the last max_finished closed jobs is kept as well, so
+    a subscriber that connects after the end can be told so.
+    """
+
+    def __init__(self, max_buffer: int = 500, history: int = 200, max_finished: int = 1000):
+        self.max_buffer = max_buffer
+        self.history = history
+        self.max_finished = max_finished
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._history: Dict[str, deque] = {}
+        self._finished: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+    def open(self, job_id: str):
+        self._finished.pop(job_id, None)
+        self._history.setdefault(job_id, deque(maxlen=self.history))
+
+    def close(self, job_id: str):
+        history = self._history.pop(job_id, None)
+        if history is None:
+            return
+        done = next((item for item in reversed(history) if item[0] == "done"), ("done", {}))
+        self._finished[job_id] = done
+        while len(self._finished) > self.max_finished:
+            self._finished.popitem(last=False)
+
+    def is_open(self, job_id: str) -> bool:
+        return job_id in self._history
+
+    def finished_event(self, job_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """The ("done", data) event of a recently closed job, or None."""
+        return self._finished.get(job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_buffer)
+        for item in self._history.get(job_id, ()):
+            queue.put_nowait(item)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[job_id]
+
+    def publish(self, job_id: str, event: str, data: Dict[str, Any]):
+        history = self._history.get(job_id)
+        if history is not None:
+            history.append((event, data))
+        for queue in list(self._subscribers.get(job_id, ())):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Slow consumer: drop the event rather than block the scheduler
+                pass
+
+
+# Shared by the scheduler and /run so both can be streamed the same way
+job_events = JobEventBus()
+
+
+# Runs one job; returns (payload, status_code) as /run would respond
+JobExecutor = Callable[[Any, ExecutionJob], Awaitable[Tuple[Dict[str, Any], int]]]
+
+
+class JobScheduler:
+    """Dispatches queued ExecutionJob rows to the script runner."""
+
+    def __init__(
+        self,
+        session_factory,
+        execute: JobExecutor,
+        max_running: int = 8,
+        max_running_per_user: int = 2,
+        max_queued: int = 200,
+        max_queued_per_user: int = 20,
+        max_attempts: int = 2,
+        poll_interval: float = 2.0,
+        events: Optional[JobEventBus] = None,
+    ):
+        """
+        Args:
+            session_factory: Callable returning a new SQLAlchemy session
+            execute: Coroutine that runs one job (see JobExecutor); it may
+                publish progress on self.events under the job id
+        """
+        self.session_factory = session_factory
+        self.execute = execute
+        self.max_running = max(1, max_running)
+        self.max_running_per_user = max(1, max_running_per_user)
+        self.max_queued = max(1, max_queued)
+        self.max_queued_per_user = max(1, max_queued_per_user)
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+
+        self.events = events or job_events
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_by_user: Dict[str, int] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._recover()
+        self._task = asyncio.create_task(self._dispatch_loop())
+        print(f"✓ Job scheduler started (running={self.max_running}, per_user={self.max_running_per_user})")
+
+    async def stop(self):
+        """Stop dispatching. Running jobs are cancelled and requeued on next start."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for task in list(self._running.values()):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def _recover(self):
+        """Requeue jobs left running by a previous process."""
+        db = self.session_factory()
+        try:
+            interrupted = db.query(ExecutionJob).filter(ExecutionJob.status == "running").all()
+            for job in interrupted:
+                if job.attempts >= self.max_attempts:
+                    job.status = "error"
+                    job.status_code = 500
+                    job.error_message = "Job was interrupted by a backend restart"
+                    job.completed_at = datetime.utcnow()
+                else:
+                    job.status = "queued"
+                    job.started_at = None
+            db.commit()
+            queued = db.query(ExecutionJob).filter(ExecutionJob.status == "queued").count()
+            if interrupted or queued:
+                print(f"[Jobs] Recovered queue: {len(interrupted)} interrupted, {queued} queued")
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    def check_capacity(self, db, user_id: str):
+        """Raise JobQueueFull if a new job for user_id would exceed the limits."""
+        queued = db.query(ExecutionJob).filter(ExecutionJob.status == "queued")
+        if queued.filter(ExecutionJob.user_id == user_id).count() >= self.max_queued_per_user:
+            raise JobQueueFull("You already have too many queued jobs", "user")
+        if queued.count() >= self.max_queued:
+            raise JobQueueFull("The job queue is full", "global")
+
+    def notify_submitted(self, job: ExecutionJob):
+        """Wake the dispatcher after a job row has been committed."""
+        self.events.publish(job.id, "status", job.to_dict(include_result=False))
+        if self._wake is not None:
+            self._wake.set()
+
+    def cancel(self, db, job: ExecutionJob) -> bool:
+        """Cancel a queued job. Running jobs are left to finish."""
+        if job.status != "queued":
+            return False
+        job.status = "cancelled"
+        job.completed_at = datetime.utcnow()
+        db.commit()
+        self.events.publish(job.id, "status", job.to_dict(include_result=False))
+        self.events.publish(job.id, "done", job.to_dict())
+        return True
+
+    def queue_position(self, db, job: ExecutionJob) -> Optional[int]:
+        """1-based position among queued jobs (priority, then age), or None."""
+        if job.status != "queued":
+            return None
+        ahead = db.query(ExecutionJob).filter(
+            ExecutionJob.status == "queued",
+            (ExecutionJob.priority > job.priority)
+            | ((ExecutionJob.priority == job.priority) & (ExecutionJob.created_at < job.created_at))
+        ).count()
+        return ahead + 1
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def _select_next(self, db) -> Optional[ExecutionJob]:
+        """Pick the next queued job by priority, then fair share, then age."""
+        candidates: List[ExecutionJob] = (
+            db.query(ExecutionJob)
+            .filter(ExecutionJob.status == "queued")
+            .order_by(ExecutionJob.priority.desc(), ExecutionJob.created_at.asc())
+            .limit(self.max_queued)
+            .all()
+        )
+        best = None
+        best_key = None
+        for job in candidates:
+            running = self._running_by_user.get(job.user_id, 0)
+            if running >= self.max_running_per_user:
+                continue
+            key = (-(job.priority or 0), running, job.created_at)
+            if best_key is None or key < best_key:
+                best, best_key = job, key
+        return best
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                self._dispatch_available()
+            except Exception as e:
+                print(f"[Jobs] Dispatch error: {e}")
+                traceback.print_exc()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _dispatch_available(self):
+        if len(self._running) >= self.max_running:
+            return
+        db = self.session_factory()
+        try:
+            while len(self._running) < self.max_running:
+                job = self._select_next(db)
+                if job is None:
+                    break
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+                job.attempts = (job.attempts or 0) + 1
+                db.commit()
+                self._running_by_user[job.user_id] = self._running_by_user.get(job.user_id, 0) + 1
+                self._running[job.id] = asyncio.create_task(self._run_job(job.id, job.user_id))
+                self.events.publish(job.id, "status", job.to_dict(include_result=False))
+        finally:
+            db.close()
+
+    async def _run_job(self, job_id: str, user_id: str):
+        db = self.session_factory()
+        try:
+            job = db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first()
+            if job is None:
+                return
+            self.events.open(job_id)
+            try:
+                payload, status_code = await self.execute(db, job)
+            except asyncio.CancelledError:
+                # Backend shutting down: leave the row as "running" so it is requeued
+                raise
+            except Exception as e:
+                traceback.print_exc()
+                payload, status_code = {"error": f"Failed to execute code: {str(e)}"}, 500
+
+            job.status_code = status_code
+            job.result_json = json.dumps(payload)
+            if status_code == 200:
+                job.status = "success"
+            elif status_code == 504:
+                job.status = "timeout"
+            else:
+                job.status = "error"
+            if status_code != 200:
+                job.error_message = payload.get("message") or payload.get("error")
+            job.completed_at = datetime.utcnow()
+            db.commit()
+            self.events.publish(job.id, "status", job.to_dict(include_result=False))
+            self.events.publish(job.id, "done", job.to_dict())
+        finally:
+            self.events.close(job_id)
+            db.close()
+            self._running.pop(job_id, None)
+            remaining = self._running_by_user.get(user_id, 1) - 1
+            if remaining <= 0:
+                self._running_by_user.pop(user_id, None)
+            else:
+                self._running_by_user[user_id] = remaining
+            if self._wake is not None:
+                self._wake.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        db = self.session_factory()
+        try:
+            queued = db.query(ExecutionJob).filter(ExecutionJob.status == "queued").count()
+        finally:
+            db.close()
+        return {
+            "queued": queued,
+            "running": len(self._running),
+            "running_users": len(self._running_by_user),
+            "max_running": self.max_running,
+            "max_running_per_user": self.max_running_per_user,
+            "max_queued": self.max_queued,
+            "max_queued_per_user": self.max_queued_per_user,
+        }
+
+
+def create_scheduler(session_factory, execute: JobExecutor) -> JobScheduler:
+    """Create a scheduler configured from the environment."""
+    return JobScheduler(
+        session_factory,
+        execute,
+        max_running=int(os.getenv("MAX_CONCURRENT_RUNS", "8")),
+        max_running_per_user=int(os.getenv("MAX_CONCURRENT_RUNS_PER_USER", "2")),
+        max_queued=int(os.getenv("MAX_QUEUED_JOBS", "200")),
+        max_queued_per_user=int(os.getenv("MAX_QUEUED_JOBS_PER_USER", "20")),
+        max_attempts=int(os.getenv("MAX_JOB_ATTEMPTS", "2")),
+    )
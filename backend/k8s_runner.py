@@ -1,24 +1,111 @@
 """
 Kubernetes runner module for executing user scripts in pods instead of Docker containers.
 This replaces the Docker-in-Docker pattern with Kubernetes Pod API.
+
+Pod state changes are followed with a watch (no fixed polling interval), and
+every pod/ConfigMap this runner creates is labelled app=maps-runner so that
+finished jobs are deleted right away and anything left behind (backend crash,
+K8S_KEEP_FINISHED_PODS) is removed by a background reaper after a TTL.
+
+Optional warm slots (K8S_WARM_PODS > 0) keep long-lived runner pods around and
+execute each job in one of them with `kubectl exec` semantics instead of
+creating a ConfigMap plus Pod per job. Each slot is annotated with the full
+name and namespace of the backend pod that owns it (POD_NAME / POD_NAMESPACE
+from the downward API, else HOSTNAME and the service account's namespace);
+other backends' reapers delete a slot only once that exact pod is gone.
 """
 
 import os
+import re
 import json
 import time
-from typing import Optional, Dict, Any
-from kubernetes import client, config
+import queue
+import shlex
+import codecs
+import shutil
+import pathlib
+import asyncio
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, Callable
+from kubernetes import client, config, watch
 from kubernetes.client.rest import ApiException
+from kubernetes.stream import stream as k8s_stream
+
+try:
+    from backend.input_cache import link_or_copy, move_tree
+    from backend.output_stream import LineCallback, TailBuffer
+except ImportError:
+    from input_cache import link_or_copy, move_tree
+    from output_stream import LineCallback, TailBuffer
+
+
+RUNNER_APP_LABEL = "maps-runner"
+ROLE_LABEL = "maps-runner/role"
+OWNER_LABEL = "maps-runner/owner"
+# Full name and namespace of the backend pod that owns a warm slot
+OWNER_POD_ANNOTATION = "maps-runner/owner-pod"
+OWNER_NAMESPACE_ANNOTATION = "maps-runner/owner-namespace"
+# Namespace of the pod we run in, when running in a cluster
+SERVICE_ACCOUNT_NAMESPACE_FILE = "/var/run/secrets/kubernetes.io/serviceaccount/namespace"
+JOB_LABEL_SELECTOR = f"app={RUNNER_APP_LABEL},{ROLE_LABEL}!=warm-slot"
+WARM_SLOT_LABEL_SELECTOR = f"app={RUNNER_APP_LABEL},{ROLE_LABEL}=warm-slot"
+TERMINAL_PHASES = ("Succeeded", "Failed")
+# Per-slot staging directories of warm slots, relative to the outputs PVC
+SLOTS_DIR_NAME = ".k8s-slots"
+# Run in a warm slot after each job (see WarmPodSlots._reset_slot)
+SLOT_RESET_COMMAND = (
+    'kill -9 -1 2>/dev/null; '
+    'rm -rf /tmp/* /tmp/.[!.]* "$HOME"/* "$HOME"/.[!.]* 2>/dev/null; '
+    'exit 0'
+)
+
+
+def _label_value(value: str) -> str:
+    """Make a string usable as a label value / name fragment (<=63 chars, [a-z0-9-])."""
+    value = re.sub(r"[^a-z0-9-]", "-", value.lower()).strip("-")
+    return value[-40:].strip("-") or "backend"
+
+
+def _own_namespace(default: str) -> str:
+    """Namespace of the backend pod: POD_NAMESPACE, else the service account's, else default."""
+    namespace = os.getenv("POD_NAMESPACE")
+    if namespace:
+        return namespace
+    try:
+        return pathlib.Path(SERVICE_ACCOUNT_NAMESPACE_FILE).read_text(encoding="utf-8").strip() or default
+    except OSError:
+        return default
 
 
 class KubernetesRunner:
     """Manages script execution using Kubernetes Pods instead of Docker containers."""
     
-    def __init__(self, namespace: str = "maps-python", runner_image: str = "py-exec:latest", timeout: int = 600):
-        """Initialize Kubernetes client."""
+    def __init__(self, namespace: str = "maps-python", runner_image: str = "py-exec:latest", timeout: int = 600,
+                 max_workers: int = 8, reap_ttl: int = 300, reap_interval: int = 60,
+                 keep_finished: bool = False, warm_pods: int = 0):
+        """Initialize Kubernetes client.
+        
+        Args:
+            reap_ttl: Seconds a finished pod / orphaned ConfigMap is kept before the reaper deletes it
+            reap_interval: Seconds between reaper passes (0 disables the reaper)
+            keep_finished: Skip the immediate cleanup after each job (debugging); the reaper still applies
+            warm_pods: Number of long-lived runner pods to exec jobs in (0 = one pod per job)
+        """
         self.namespace = namespace
         self.runner_image = runner_image
         self.default_timeout = timeout
+        self.reap_ttl = reap_ttl
+        self.reap_interval = reap_interval
+        self.keep_finished = keep_finished
+        # The label is shortened to fit; the annotations name the backend pod exactly
+        self.owner_pod = os.getenv("POD_NAME") or os.getenv("HOSTNAME", "backend")
+        self.owner_namespace = _own_namespace(namespace)
+        self.owner = _label_value(self.owner_pod)
+        # The kubernetes client is synchronous; async callers run jobs on this bounded pool
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="k8s-runner")
+        self._stop = threading.Event()
         
         # Try in-cluster config first, fall back to kubeconfig
         try:
@@ -33,13 +120,27 @@ class KubernetesRunner:
         
         self.core_v1 = client.CoreV1Api()
         self.batch_v1 = client.BatchV1Api()
+        
+        self.warm_slots: Optional[WarmPodSlots] = WarmPodSlots(self, warm_pods) if warm_pods > 0 else None
+        
+        if self.reap_interval > 0:
+            threading.Thread(target=self._reaper_loop, name="k8s-reaper", daemon=True).start()
+    
+    def _job_labels(self, job_id: str) -> Dict[str, str]:
+        return {
+            "app": RUNNER_APP_LABEL,
+            "job-id": job_id,
+            ROLE_LABEL: "job",
+            OWNER_LABEL: self.owner,
+        }
     
     def create_script_configmap(self, job_id: str, script_content: str, request_json: str) -> str:
         """Create a ConfigMap containing the script and request data."""
         configmap_name = f"job-code-{job_id}"
         
         configmap = client.V1ConfigMap(
-            metadata=client.V1ObjectMeta(name=configmap_name, namespace=self.namespace),
+            metadata=client.V1ObjectMeta(name=configmap_name, namespace=self.namespace,
+                                         labels=self._job_labels(job_id)),
             data={
                 "main.py": script_content,
                 "request.json": request_json
@@ -78,10 +179,7 @@ class KubernetesRunner:
             metadata=client.V1ObjectMeta(
                 name=pod_name,
                 namespace=self.namespace,
-                labels={
-                    "app": "maps-runner",
-                    "job-id": job_id
-                }
+                labels=self._job_labels(job_id)
             ),
             spec=client.V1PodSpec(
                 restart_policy="Never",
@@ -103,9 +201,18 @@ class KubernetesRunner:
                                 mount_path="/code",
                                 read_only=True
                             ),
+                            # Only this job's directory, with its input read-only: the
+                            # input files are hardlinks into the shared prepared-input cache
+                            client.V1VolumeMount(
+                                name="outputs",
+                                mount_path=f"/outputs/{job_dir}",
+                                sub_path=job_dir
+                            ),
                             client.V1VolumeMount(
                                 name="outputs",
-                                mount_path="/outputs"
+                                mount_path=f"/outputs/{job_dir}/input",
+                                sub_path=f"{job_dir}/input",
+                                read_only=True
                             )
                         ],
                         working_dir=f"/outputs/{job_dir}",
@@ -146,36 +253,135 @@ class KubernetesRunner:
         except ApiException as e:
             raise RuntimeError(f"Failed to create Pod: {e}")
     
-    def wait_for_pod_completion(self, pod_name: str, timeout: Optional[int] = None) -> Dict[str, Any]:
-        """Wait for pod to complete and return status."""
-        timeout = timeout or self.default_timeout
-        start_time = time.time()
+    def _watch_pod(self, pod_name: str, deadline: float, check: Callable[[Any], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Follow a pod with a watch until check(pod) returns a result or the deadline passes.
         
-        while time.time() - start_time < timeout:
+        check receives the V1Pod (or None once the pod is gone). The pod is read
+        once first, so states reached before the watch starts are not missed,
+        and the watch resumes from that resourceVersion. Falls back to reading
+        the pod once a second if the watch cannot be established.
+        """
+        while time.time() < deadline:
             try:
-                pod = self.core_v1.read_namespaced_pod(
-                    name=pod_name,
-                    namespace=self.namespace
-                )
-                
-                phase = pod.status.phase
-                
-                if phase == "Succeeded":
-                    return {"status": "success", "exit_code": 0}
-                elif phase == "Failed":
-                    container_status = pod.status.container_statuses[0] if pod.status.container_statuses else None
-                    exit_code = container_status.state.terminated.exit_code if container_status and container_status.state.terminated else 1
-                    return {"status": "failed", "exit_code": exit_code}
-                
-                # Still running
-                time.sleep(2)
-                
+                pod = self.core_v1.read_namespaced_pod(name=pod_name, namespace=self.namespace)
             except ApiException as e:
                 if e.status == 404:
-                    return {"status": "failed", "exit_code": -1, "error": "Pod not found"}
+                    return check(None)
                 raise
+            result = check(pod)
+            if result is not None:
+                return result
+            
+            w = watch.Watch()
+            try:
+                for event in w.stream(
+                    self.core_v1.list_namespaced_pod,
+                    namespace=self.namespace,
+                    field_selector=f"metadata.name={pod_name}",
+                    resource_version=pod.metadata.resource_version,
+                    timeout_seconds=max(1, int(deadline - time.time()))
+                ):
+                    obj = None if event["type"] == "DELETED" else event["object"]
+                    result = check(obj)
+                    if result is not None:
+                        return result
+                    if time.time() >= deadline:
+                        break
+            except ApiException as e:
+                # 410 Gone: resourceVersion too old, re-read and watch again
+                if e.status != 410:
+                    print(f"Warning: Watch on {pod_name} failed ({e.status}), polling instead")
+                    time.sleep(1)
+            except Exception as e:
+                print(f"Warning: Watch on {pod_name} failed ({e}), polling instead")
+                time.sleep(1)
+            finally:
+                w.stop()
+        return None
+    
+    @staticmethod
+    def _completion_result(pod) -> Optional[Dict[str, Any]]:
+        if pod is None:
+            return {"status": "failed", "exit_code": -1, "error": "Pod not found"}
+        phase = pod.status.phase if pod.status else None
+        if phase == "Succeeded":
+            return {"status": "success", "exit_code": 0}
+        if phase == "Failed":
+            container_status = pod.status.container_statuses[0] if pod.status.container_statuses else None
+            exit_code = container_status.state.terminated.exit_code if container_status and container_status.state.terminated else 1
+            return {"status": "failed", "exit_code": exit_code}
+        return None
+    
+    def wait_for_pod_completion(self, pod_name: str, timeout: Optional[int] = None) -> Dict[str, Any]:
+        """Wait for pod to complete and return status."""
+        timeout = timeout or self.default_timeout
+        result = self._watch_pod(pod_name, time.time() + timeout, self._completion_result)
+        return result or {"status": "timeout", "exit_code": -1}
+    
+    def wait_for_pod_start(self, pod_name: str, deadline: float) -> Optional[str]:
+        """Wait until the runner container has started (or the pod already finished).
+        
+        Returns the pod phase, or None if the pod is gone or the deadline passed first.
+        """
+        def started(pod):
+            if pod is None:
+                return {"phase": None}
+            phase = pod.status.phase if pod.status else None
+            return {"phase": phase} if phase in ("Running",) + TERMINAL_PHASES else None
+        
+        result = self._watch_pod(pod_name, deadline, started)
+        return result["phase"] if result else None
+    
+    def follow_pod_logs(
+        self,
+        pod_name: str,
+        deadline: float,
+        on_line: Optional[LineCallback] = None
+    ) -> Tuple[str, bool]:
+        """Stream the runner container's log until it exits or the deadline passes.
         
-        return {"status": "timeout", "exit_code": -1}
+        Each line is handed to on_line as it arrives (stdout and stderr are
+        merged by the kubelet, so the stream is always reported as "stdout").
+        Returns (log_tail, truncated).
+        """
+        tail = TailBuffer()
+        
+        def emit(line: str):
+            tail.append(line)
+            if on_line is not None:
+                try:
+                    on_line("stdout", line)
+                except Exception:
+                    pass
+        
+        response = self.core_v1.read_namespaced_pod_log(
+            name=pod_name,
+            namespace=self.namespace,
+            container="runner",
+            follow=True,
+            _preload_content=False,
+            _request_timeout=max(1, deadline - time.time())
+        )
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        try:
+            for chunk in response.stream(4096):
+                pending += decoder.decode(chunk)
+                *lines, pending = pending.split("\n")
+                for line in lines:
+                    emit(line.rstrip("\r"))
+                if time.time() >= deadline:
+                    break
+        except Exception as e:
+            # Read timeout at the deadline, or the connection dropped
+            if time.time() < deadline:
+                print(f"Warning: Log stream for {pod_name} ended early: {e}")
+        finally:
+            response.release_conn()
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            emit(pending.rstrip("\r"))
+        return tail.text(), tail.truncated
     
     def get_pod_logs(self, pod_name: str) -> str:
         """Retrieve logs from a pod."""
@@ -189,29 +395,129 @@ class KubernetesRunner:
         except ApiException as e:
             return f"Error retrieving logs: {e}"
     
-    def cleanup_pod(self, pod_name: str, configmap_name: str):
+    def cleanup_pod(self, pod_name: Optional[str], configmap_name: Optional[str]):
         """Delete pod and associated ConfigMap."""
-        try:
-            # Delete pod
-            self.core_v1.delete_namespaced_pod(
-                name=pod_name,
-                namespace=self.namespace,
-                body=client.V1DeleteOptions()
-            )
-            print(f"✓ Deleted Pod: {pod_name}")
-        except ApiException as e:
-            print(f"Warning: Failed to delete Pod {pod_name}: {e}")
+        delete_options = client.V1DeleteOptions(propagation_policy="Background", grace_period_seconds=0)
+        if pod_name:
+            try:
+                # Delete pod
+                self.core_v1.delete_namespaced_pod(
+                    name=pod_name,
+                    namespace=self.namespace,
+                    body=delete_options
+                )
+                print(f"✓ Deleted Pod: {pod_name}")
+            except ApiException as e:
+                if e.status != 404:
+                    print(f"Warning: Failed to delete Pod {pod_name}: {e}")
         
-        try:
-            # Delete ConfigMap
-            self.core_v1.delete_namespaced_config_map(
-                name=configmap_name,
-                namespace=self.namespace,
-                body=client.V1DeleteOptions()
-            )
-            print(f"✓ Deleted ConfigMap: {configmap_name}")
-        except ApiException as e:
-            print(f"Warning: Failed to delete ConfigMap {configmap_name}: {e}")
+        if configmap_name:
+            try:
+                # Delete ConfigMap
+                self.core_v1.delete_namespaced_config_map(
+                    name=configmap_name,
+                    namespace=self.namespace,
+                    body=delete_options
+                )
+                print(f"✓ Deleted ConfigMap: {configmap_name}")
+            except ApiException as e:
+                if e.status != 404:
+                    print(f"Warning: Failed to delete ConfigMap {configmap_name}: {e}")
+    
+    # ------------------------------------------------------------------
+    # Background reaper
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _age_seconds(timestamp: Optional[datetime], now: datetime) -> float:
+        if timestamp is None:
+            return 0.0
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return (now - timestamp).total_seconds()
+    
+    @staticmethod
+    def _finished_at(pod) -> Optional[datetime]:
+        for status in (pod.status.container_statuses or []) if pod.status else []:
+            if status.state and status.state.terminated and status.state.terminated.finished_at:
+                return status.state.terminated.finished_at
+        return pod.status.start_time if pod.status else None
+    
+    def reap_once(self) -> Dict[str, int]:
+        """Delete finished/stuck job pods and orphaned ConfigMaps older than the TTL."""
+        now = datetime.now(timezone.utc)
+        reaped = {"pods": 0, "configmaps": 0}
+        live_jobs = set()
+        
+        pods = self.core_v1.list_namespaced_pod(namespace=self.namespace, label_selector=JOB_LABEL_SELECTOR).items
+        for pod in pods:
+            phase = pod.status.phase if pod.status else None
+            if phase in TERMINAL_PHASES:
+                expired = self._age_seconds(self._finished_at(pod), now) > self.reap_ttl
+            else:
+                # Stuck (e.g. Pending forever, or its job gave up): allow the full script timeout first
+                expired = self._age_seconds(pod.metadata.creation_timestamp, now) > self.default_timeout + self.reap_ttl
+            if expired:
+                self.cleanup_pod(pod.metadata.name, None)
+                reaped["pods"] += 1
+            else:
+                live_jobs.add((pod.metadata.labels or {}).get("job-id"))
+        
+        # Job ConfigMaps are named job-code-{job_id}; older ones predate the labels
+        for configmap in self.core_v1.list_namespaced_config_map(namespace=self.namespace).items:
+            name = configmap.metadata.name
+            labels = configmap.metadata.labels or {}
+            if not name.startswith("job-code-") and labels.get("app") != RUNNER_APP_LABEL:
+                continue
+            job_id = labels.get("job-id") or name[len("job-code-"):]
+            if job_id in live_jobs:
+                continue
+            if self._age_seconds(configmap.metadata.creation_timestamp, now) > self.reap_ttl:
+                self.cleanup_pod(None, name)
+                reaped["configmaps"] += 1
+        
+        # Warm slots whose backend pod is gone
+        for pod in self.core_v1.list_namespaced_pod(namespace=self.namespace, label_selector=WARM_SLOT_LABEL_SELECTOR).items:
+            annotations = pod.metadata.annotations or {}
+            owner_pod = annotations.get(OWNER_POD_ANNOTATION)
+            owner_namespace = annotations.get(OWNER_NAMESPACE_ANNOTATION)
+            if not owner_pod or not owner_namespace:
+                continue
+            if (owner_pod, owner_namespace) == (self.owner_pod, self.owner_namespace):
+                continue
+            try:
+                self.core_v1.read_namespaced_pod(name=owner_pod, namespace=owner_namespace)
+            except ApiException as e:
+                # Anything but a 404 (e.g. no access to that namespace) keeps the slot
+                if e.status == 404 and self._age_seconds(pod.metadata.creation_timestamp, now) > self.reap_ttl:
+                    self.cleanup_pod(pod.metadata.name, None)
+                    reaped["pods"] += 1
+        
+        if reaped["pods"] or reaped["configmaps"]:
+            print(f"[K8s reaper] Deleted {reaped['pods']} pod(s), {reaped['configmaps']} ConfigMap(s)")
+        return reaped
+    
+    def _reaper_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap_once()
+            except Exception as e:
+                print(f"Warning: K8s reaper pass failed: {e}")
+    
+    def image_digest(self) -> str:
+        """Runner image reference, used to key cached results.
+
+        Tags like :latest are not resolved here; pin RUNNER_IMAGE to a digest
+        or a per-build tag so a new image invalidates cached results.
+        """
+        return self.runner_image
+
+    def shutdown(self):
+        """Stop the reaper and remove this backend's warm slots."""
+        self._stop.set()
+        if self.warm_slots is not None:
+            self.warm_slots.shutdown()
+        self._executor.shutdown(wait=False)
     
     def run_script(
         self,
@@ -221,20 +527,29 @@ class KubernetesRunner:
         input_path: str,
         output_path: str,
         timeout: Optional[int] = None,
-        script_parameters: str = ""
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
     ) -> Dict[str, Any]:
         """
         Execute a script in a Kubernetes pod.
         
+        The pod log is followed while the script runs and each line is passed
+        to on_line (if given) as it is printed.
+        
         Returns a dict with:
         - status: "success", "failed", or "timeout"
         - exit_code: int
-        - logs: str
+        - logs: str (last MAX_CAPTURED_OUTPUT_BYTES of output)
+        - output_truncated: bool
         """
         timeout = timeout or self.default_timeout
         configmap_name = None
         pod_name = None
         
+        if self.warm_slots is not None:
+            return self.warm_slots.run_script(job_id, script_content, input_path, timeout,
+                                              script_parameters, on_line)
+        
         try:
             # Create directories in PVC for this job
             job_dir = os.path.basename(input_path.rstrip('/'))  # Extract job-id from path
@@ -253,19 +568,348 @@ class KubernetesRunner:
             # Create and run pod
             pod_name = self.create_runner_pod(job_id, configmap_name, input_path, output_path, script_parameters=script_parameters)
             
-            # Wait for completion
-            result = self.wait_for_pod_completion(pod_name, timeout)
+            # Follow the log while the script runs
+            deadline = time.time() + timeout
+            logs, truncated = None, False
+            try:
+                if self.wait_for_pod_start(pod_name, deadline) is not None:
+                    logs, truncated = self.follow_pod_logs(pod_name, deadline, on_line)
+            except Exception as e:
+                print(f"Warning: Failed to follow logs for {pod_name}: {e}")
+            
+            # Wait for completion (the phase update lags the end of the log slightly)
+            result = self.wait_for_pod_completion(pod_name, max(1, int(deadline - time.time())))
             
-            # Get logs
-            result["logs"] = self.get_pod_logs(pod_name)
+            # Fall back to fetching the whole log if following it failed
+            result["logs"] = logs if logs is not None else self.get_pod_logs(pod_name)
+            result["output_truncated"] = truncated
             
             return result
             
         finally:
-            # Cleanup - TEMPORARILY DISABLED FOR DEBUGGING
-            print(f"[DEBUG] Cleanup disabled. Pod: {pod_name}, ConfigMap: {configmap_name}")
-            # if pod_name and configmap_name:
-            #     self.cleanup_pod(pod_name, configmap_name)
+            if self.keep_finished:
+                print(f"[DEBUG] Keeping Pod: {pod_name}, ConfigMap: {configmap_name} (reaped after {self.reap_ttl}s)")
+            else:
+                self.cleanup_pod(pod_name, configmap_name)
+
+    
+    async def run_script_async(
+        self,
+        job_id: str,
+        script_content: str,
+        request_json: str,
+        input_path: str,
+        output_path: str,
+        timeout: Optional[int] = None,
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
+    ) -> Dict[str, Any]:
+        """Execute a script in a Kubernetes pod without blocking the event loop.
+        
+        on_line is called on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        threadsafe_on_line = None
+        if on_line is not None:
+            threadsafe_on_line = lambda stream, line: loop.call_soon_threadsafe(on_line, stream, line)
+        return await loop.run_in_executor(
+            self._executor, self.run_script, job_id, script_content, request_json,
+            input_path, output_path, timeout, script_parameters, threadsafe_on_line
+        )
+
+
+class WarmPodSlots:
+    """Long-lived runner pods that jobs are exec'd into, one job per slot at a time.
+    
+    A slot pod does not see the outputs PVC as a whole: it mounts its own
+    staging directory, .k8s-slots/<slot>/job read-only at /job and
+    .k8s-slots/<slot>/result at /output. For each job the backend stages the
+    job's code and input into job/ (hard links where possible; the mount is
+    read-only, so the shared prepared inputs cannot be changed through them),
+    runs job_runner.py in the pod via the exec API with MAPS_CODE_PATH
+    pointing at /job/code/main.py, and then moves result/ into the job's
+    result directory. No ConfigMap or Pod is created per job. Every job still
+    gets a fresh Python process, and after each job the slot is reset: every
+    process the job left behind is killed and /tmp and the home directory are
+    emptied. A slot whose job times out, fails to run or cannot be reset is
+    deleted and recreated. The staging directories themselves are only ever
+    emptied, as the running pod's mounts refer to them.
+    """
+    
+    def __init__(self, runner: KubernetesRunner, size: int):
+        self.runner = runner
+        self.names = [f"maps-slot-{runner.owner}-{i}" for i in range(size)]
+        self._free: "queue.Queue[str]" = queue.Queue()
+        for name in self.names:
+            self._free.put(name)
+        # Create the slot pods in the background so startup is not blocked
+        threading.Thread(target=self._prestart, name="k8s-warm-slots", daemon=True).start()
+        print(f"✓ Kubernetes warm slots enabled ({size} pod(s))")
+    
+    def _slot_pod(self, name: str):
+        return client.V1Pod(
+            metadata=client.V1ObjectMeta(
+                name=name,
+                namespace=self.runner.namespace,
+                labels={"app": RUNNER_APP_LABEL, ROLE_LABEL: "warm-slot", OWNER_LABEL: self.runner.owner},
+                annotations={OWNER_POD_ANNOTATION: self.runner.owner_pod,
+                             OWNER_NAMESPACE_ANNOTATION: self.runner.owner_namespace}
+            ),
+            spec=client.V1PodSpec(
+                restart_policy="Always",
+                service_account_name="tfstack-maps-data-analysis",
+                containers=[
+                    client.V1Container(
+                        name="runner",
+                        image=self.runner.runner_image,
+                        image_pull_policy="IfNotPresent",
+                        # Idle until jobs are exec'd in; pre-import the heavy libraries into the page cache
+                        command=["python", "-c", "import skimage, matplotlib, time\nwhile True: time.sleep(3600)"],
+                        volume_mounts=[
+                            client.V1VolumeMount(
+                                name="outputs",
+                                mount_path="/job",
+                                sub_path=f"{SLOTS_DIR_NAME}/{name}/job",
+                                read_only=True
+                            ),
+                            client.V1VolumeMount(
+                                name="outputs",
+                                mount_path="/output",
+                                sub_path=f"{SLOTS_DIR_NAME}/{name}/result"
+                            )
+                        ],
+                        working_dir="/job",
+                        resources=client.V1ResourceRequirements(
+                            requests={"memory": "256Mi", "cpu": "100m"},
+                            limits={"memory": "1Gi", "cpu": "500m"}
+                        )
+                    )
+                ],
+                volumes=[
+                    client.V1Volume(
+                        name="outputs",
+                        persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+                            claim_name="maps-outputs"
+                        )
+                    )
+                ]
+            )
+        )
+    
+    def _prestart(self):
+        for name in self.names:
+            try:
+                self._ensure_ready(name, time.time() + 120)
+            except Exception as e:
+                print(f"Warning: Failed to start warm slot {name}: {e}")
+    
+    def _ensure_ready(self, name: str, deadline: float) -> bool:
+        """Make sure the slot pod exists and is Running; (re)create it if not."""
+        core_v1 = self.runner.core_v1
+        try:
+            pod = core_v1.read_namespaced_pod(name=name, namespace=self.runner.namespace)
+            phase = pod.status.phase if pod.status else None
+            if phase == "Running" and not pod.metadata.deletion_timestamp:
+                return True
+            if phase in TERMINAL_PHASES or pod.metadata.deletion_timestamp:
+                self.runner.cleanup_pod(name, None)
+                self.runner._watch_pod(name, deadline, lambda p: {"gone": True} if p is None else None)
+                pod = None
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            pod = None
+        
+        if pod is None:
+            try:
+                core_v1.create_namespaced_pod(namespace=self.runner.namespace, body=self._slot_pod(name))
+                print(f"✓ Created warm slot Pod: {name}")
+            except ApiException as e:
+                if e.status != 409:  # Already being created
+                    raise
+        return self.runner.wait_for_pod_start(name, deadline) == "Running"
+    
+    def run_script(
+        self,
+        job_id: str,
+        script_content: str,
+        input_path: str,
+        timeout: int,
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
+    ) -> Dict[str, Any]:
+        """Execute one job in a free slot (same result shape as KubernetesRunner.run_script)."""
+        deadline = time.time() + timeout
+        job_path = pathlib.Path(input_path.rstrip("/")).parent
+        
+        code_path = job_path / "code" / "main.py"
+        if not code_path.exists():
+            code_path.parent.mkdir(parents=True, exist_ok=True)
+            code_path.write_text(script_content, encoding="utf-8")
+        
+        try:
+            name = self._free.get(timeout=max(1, deadline - time.time()))
+        except queue.Empty:
+            return {"status": "timeout", "exit_code": -1, "logs": "Timed out waiting for a free runner slot"}
+        
+        slot = job_path.parent / SLOTS_DIR_NAME / name
+        try:
+            self._stage_job(slot, job_path)
+            if not self._ensure_ready(name, deadline):
+                return {"status": "failed", "exit_code": -1, "logs": f"Runner slot {name} did not become ready"}
+            try:
+                result = self._exec_job(name, job_id, deadline, script_parameters, on_line)
+            except Exception:
+                # State of the slot unknown: replace it
+                self.runner.cleanup_pod(name, None)
+                raise
+            if result["status"] != "timeout":
+                # Before the outputs are collected, so nothing left running can still write them
+                self._reset_slot(name)
+            return result
+        finally:
+            try:
+                move_tree(slot / "result", job_path / "result")
+            except Exception as e:
+                print(f"⚠ Warm slot {name}: failed to collect outputs of job {job_id}: {e}")
+            self._clear_slot(slot)
+            self._free.put(name)
+    
+    def _reset_slot(self, name: str) -> bool:
+        """Kill what the last job left running in a slot pod and clear its scratch space.
+
+        kill -1 reaches every process of the runner user except the pod's
+        PID 1 (the idle process, which a pid namespace shields from it) and
+        the shell itself. Deletes the pod if the reset does not succeed.
+        """
+        try:
+            resp = k8s_stream(
+                self.runner.core_v1.connect_get_namespaced_pod_exec,
+                name,
+                self.runner.namespace,
+                container="runner",
+                command=["sh", "-c", SLOT_RESET_COMMAND],
+                stdin=False, stdout=True, stderr=True, tty=False,
+                _preload_content=False
+            )
+            try:
+                resp.run_forever(timeout=30)
+                exit_code = resp.returncode
+            finally:
+                resp.close()
+        except Exception as e:
+            print(f"Warning: Failed to reset warm slot {name}: {e}")
+            exit_code = None
+        if exit_code == 0:
+            return True
+        print(f"Warning: Warm slot {name} could not be reset (exit code {exit_code}), replacing it")
+        self.runner.cleanup_pod(name, None)
+        return False
+    
+    @staticmethod
+    def _clear_slot(slot: pathlib.Path):
+        """Empty a slot's staging directories (kept: the slot pod mounts them)."""
+        for part in ("job", "result"):
+            directory = slot / part
+            directory.mkdir(parents=True, exist_ok=True)
+            for entry in directory.iterdir():
+                if entry.is_dir() and not entry.is_symlink():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink(missing_ok=True)
+    
+    @classmethod
+    def _stage_job(cls, slot: pathlib.Path, job_path: pathlib.Path):
+        """Lay out code/ and input/ of a job in the slot's /job mount, with an empty /output."""
+        cls._clear_slot(slot)
+        shutil.copytree(job_path / "code", slot / "job" / "code", copy_function=link_or_copy, dirs_exist_ok=True)
+        shutil.copytree(job_path / "input", slot / "job" / "input", copy_function=link_or_copy, dirs_exist_ok=True)
+        # The runner is unprivileged: let it write its results
+        os.chmod(slot / "result", 0o777)
+        (slot / "result" / ".matplotlib").mkdir(exist_ok=True)
+        os.chmod(slot / "result" / ".matplotlib", 0o777)
+    
+    def _exec_job(
+        self,
+        name: str,
+        job_id: str,
+        deadline: float,
+        script_parameters: str,
+        on_line: Optional[LineCallback]
+    ) -> Dict[str, Any]:
+        env = {
+            "JOB_ID": job_id,
+            "MAPS_SCRIPT_PARAMETERS": script_parameters or "",
+            "MAPS_CODE_PATH": "/job/code/main.py",
+            "MPLCONFIGDIR": "/output/.matplotlib",
+        }
+        shell_cmd = (
+            "cd /job && exec env "
+            + " ".join(f"{key}={shlex.quote(value)}" for key, value in env.items())
+            + " python -u /work/job_runner.py"
+        )
+        print(f"Dispatching job {job_id} to warm slot {name}")
+        
+        tail = TailBuffer()
+        pending = {"stdout": "", "stderr": ""}
+        
+        def emit(stream: str, data: str, final: bool = False):
+            pending[stream] += data
+            *lines, pending[stream] = pending[stream].split("\n")
+            if final and pending[stream]:
+                lines.append(pending[stream])
+                pending[stream] = ""
+            for line in lines:
+                line = line.rstrip("\r")
+                tail.append(line)
+                if on_line is not None:
+                    try:
+                        on_line(stream, line)
+                    except Exception:
+                        pass
+        
+        resp = k8s_stream(
+            self.runner.core_v1.connect_get_namespaced_pod_exec,
+            name,
+            self.runner.namespace,
+            container="runner",
+            command=["sh", "-c", shell_cmd],
+            stdin=False, stdout=True, stderr=True, tty=False,
+            _preload_content=False
+        )
+        timed_out = False
+        try:
+            while resp.is_open():
+                if time.time() >= deadline:
+                    timed_out = True
+                    break
+                resp.update(timeout=1)
+                if resp.peek_stdout():
+                    emit("stdout", resp.read_stdout())
+                if resp.peek_stderr():
+                    emit("stderr", resp.read_stderr())
+            emit("stdout", "", final=True)
+            emit("stderr", "", final=True)
+            exit_code = resp.returncode if not timed_out else -1
+        finally:
+            resp.close()
+        
+        if timed_out:
+            # Killing the exec'd process reliably means replacing the slot pod
+            self.runner.cleanup_pod(name, None)
+            return {"status": "timeout", "exit_code": -1, "logs": tail.text(), "output_truncated": tail.truncated}
+        if exit_code is None:
+            exit_code = -1
+        return {
+            "status": "success" if exit_code == 0 else "failed",
+            "exit_code": exit_code,
+            "logs": tail.text(),
+            "output_truncated": tail.truncated
+        }
+    
+    def shutdown(self):
+        for name in self.names:
+            self.runner.cleanup_pod(name, None)
 
 
 # Singleton instance
@@ -279,5 +923,15 @@ def get_runner() -> KubernetesRunner:
         namespace = os.getenv("KUBERNETES_NAMESPACE", "maps-data-analysis")
         runner_image = os.getenv("RUNNER_IMAGE", "py-exec:latest")
         timeout = int(os.getenv("SCRIPT_TIMEOUT", "600"))
-        _runner = KubernetesRunner(namespace, runner_image, timeout)
+        max_workers = int(os.getenv("MAX_CONCURRENT_RUNS", "8"))
+        _runner = KubernetesRunner(
+            namespace,
+            runner_image,
+            timeout,
+            max_workers=max_workers,
+            reap_ttl=int(os.getenv("K8S_REAP_TTL_SECONDS", "300")),
+            reap_interval=int(os.getenv("K8S_REAP_INTERVAL_SECONDS", "60")),
+            keep_finished=os.getenv("K8S_KEEP_FINISHED_PODS", "").lower() in ("1", "true", "yes"),
+            warm_pods=int(os.getenv("K8S_WARM_PODS", "0")),
+        )
     return _runner
@@ -0,0 +1,174 @@
+"""
+Incremental counters behind the execution-log analysis.
+
+LogAnalyzer used to rebuild every section of its analysis (error patterns,
+common errors, library and MapsBridge issues, fix strategies) by scanning
+all failures, several times per request. Instead, each log written to the
+log store is turned into a handful of counter increments here, applied in
+the same transaction as the log row (analysis_counters table, see
+log_store.py). A fix link (a success naming the failure it fixed) adds its
+own increments. log_scan.py applies the same increments in memory for
+one-off scans (date ranges, JSON archives). Serving the analysis then reads a few top-N rows.
+
+A counter is (kind, key) -> count, fixed count and up to N example entries.
+Kinds:
+    status            key "failed"/"success"; fixed = failures fixed so far
+    category          error_category of failures, 3 examples
+    key_error         key error line of failures, 2 examples
+    library           library named in a failure's code/stderr/message, 3 examples
+    mapbridge         MapsBridge failure category; key "" holds 10 examples
+    fix               error_category of failures fixed by a known success
+    fix_change:<cat>  imports added or removed by the fixes of that category
+
+Example "fixed" flags are looked up when the analysis is served. Changing
+how logs are classified needs a rebuild from the logs: bump
+AGGREGATE_VERSION, and stores rebuild their counters when next opened.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+AGGREGATE_VERSION = 2
+
+LIBRARIES = ["matplotlib", "numpy", "scipy", "PIL", "skimage",
+             "cv2", "pandas", "imageio", "MapsBridge"]
+
+
+@dataclass
+class Increment:
+    """One counter update: count/fixed deltas and an example kept while there is room."""
+    kind: str
+    key: str
+    count: int = 1
+    fixed: int = 0
+    example: Optional[Dict[str, Any]] = None
+    max_examples: int = 0
+
+
+def extract_key_error(error_message: str, stderr: str) -> str:
+    """Extract the key error message for grouping"""
+    # Try to find the actual error line in stderr
+    if stderr:
+        lines = stderr.strip().split('\n')
+        for line in reversed(lines):
+            # Look for Python exception lines
+            if re.match(r'\w+Error:', line) or re.match(r'\w+Exception:', line):
+                return line.strip()[:200]
+
+    # Fall back to error_message
+    if error_message:
+        return error_message.strip()[:200]
+
+    return "Unknown error"
+
+
+def code_imports(code: str) -> Set[str]:
+    """Modules named by import/from lines"""
+    return set(re.findall(r'^(?:import|from)\s+(\S+)', code, re.MULTILINE))
+
+
+def analyze_code_changes(old_code: str, new_code: str) -> Dict[str, Any]:
+    """Analyze what changed between failed and successful code"""
+    changes = {
+        "added_imports": [],
+        "removed_imports": [],
+        "added_functions": [],
+        "summary": []
+    }
+
+    # Extract imports
+    old_imports = code_imports(old_code)
+    new_imports = code_imports(new_code)
+
+    changes["added_imports"] = sorted(new_imports - old_imports)
+    changes["removed_imports"] = sorted(old_imports - new_imports)
+
+    # Generate summary
+    if changes["added_imports"]:
+        changes["summary"].append(f"Added imports: {', '.join(changes['added_imports'])}")
+    if changes["removed_imports"]:
+        changes["summary"].append(f"Removed imports: {', '.join(changes['removed_imports'])}")
+
+    # Check for structural changes
+    if "def " in new_code and "def " not in old_code:
+        changes["summary"].append("Added function definitions")
+
+    if len(new_code) > len(old_code) * 1.5:
+        changes["summary"].append("Significant code expansion")
+    elif len(new_code) < len(old_code) * 0.5:
+        changes["summary"].append("Significant code reduction")
+
+    return changes
+
+
+def mapbridge_category(error_message: str, stderr: str) -> str:
+    """Classify a MapsBridge script failure"""
+    error_text = error_message.lower() + " " + stderr.lower()
+    if "stdin" in error_text or "json" in error_text:
+        return "stdin_parsing"
+    if "requesttype" in error_text or "tileset" in error_text or "imagelayer" in error_text:
+        return "request_type"
+    if "channel" in error_text or "createchannel" in error_text:
+        return "channel"
+    if "output" in error_text or "sendsingletileoutput" in error_text:
+        return "output"
+    return "other"
+
+
+def log_increments(log: Dict[str, Any]) -> List[Increment]:
+    """Counter updates for a newly stored log."""
+    increments = [Increment("status", log["status"])]
+    if log["status"] != "failed":
+        return increments
+
+    log_id = log["log_id"]
+    code = log.get("code") or ""
+    error_msg = log.get("error_message") or ""
+    stderr = log.get("stderr") or ""
+    key_error = extract_key_error(error_msg, stderr)
+
+    increments.append(Increment(
+        "category", log.get("error_category") or "unknown",
+        example={"log_id": log_id, "error_message": error_msg[:200], "timestamp": log["timestamp"]},
+        max_examples=3,
+    ))
+    increments.append(Increment(
+        "key_error", key_error,
+        example={"log_id": log_id, "session_id": log["session_id"]},
+        max_examples=2,
+    ))
+    for lib in LIBRARIES:
+        if lib in code or lib in stderr or lib in error_msg:
+            increments.append(Increment(
+                "library", lib, example={"log_id": log_id, "error": key_error[:150]}, max_examples=3,
+            ))
+    if "MapsBridge" in code:
+        category = mapbridge_category(error_msg, stderr)
+        increments.append(Increment("mapbridge", category))
+        increments.append(Increment(
+            "mapbridge", "", count=0,
+            example={"log_id": log_id, "category": category, "error": key_error[:150]},
+            max_examples=10,
+        ))
+    return increments
+
+
+def fixed_increments(failure: Dict[str, Any]) -> List[Increment]:
+    """Counter updates for a failure that has been fixed."""
+    key_error = extract_key_error(failure.get("error_message") or "", failure.get("stderr") or "")
+    return [
+        Increment("status", "failed", count=0, fixed=1),
+        Increment("key_error", key_error, count=0, fixed=1),
+    ]
+
+
+def fix_increments(category: Optional[str], old_imports: Iterable[str],
+                   new_imports: Iterable[str]) -> List[Increment]:
+    """Counter updates for a fix: the failure's category and the imports the fix changed."""
+    category = category or "unknown"
+    old_imports, new_imports = set(old_imports), set(new_imports)
+    increments = [Increment("fix", category)]
+    for name in sorted(new_imports - old_imports) + sorted(old_imports - new_imports):
+        increments.append(Increment(f"fix_change:{category}", name))
+    return increments
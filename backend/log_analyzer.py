@@ -7,27 +7,40 @@ for improving the AI's script generation. Provides:
 - Common failure reasons
 - Successful fix strategies
 - AI-readable summaries for improving system_context
+
+The analysis is served from counters the log store keeps up to date as logs
+are written (see log_aggregate.py), so it costs a few indexed reads rather
+than a scan of every log. rebuild() recomputes the counters from the logs.
 """
 
 import json
 import pathlib
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
-from collections import Counter, defaultdict
-import re
+from typing import Dict, List, Any, Optional
+
+try:
+    from backend.log_store import get_log_store
+    from backend.log_aggregate import analyze_code_changes, extract_key_error
+except ImportError:
+    from log_store import get_log_store
+    from log_aggregate import analyze_code_changes, extract_key_error
 
 
 class LogAnalyzer:
     """Analyzes script execution logs to identify patterns and insights"""
     
-    def __init__(self, logs_dir: pathlib.Path):
+    def __init__(self, logs_dir: pathlib.Path, source=None):
+        """
+        Analyze the logs of the store in logs_dir, or the counters of another
+        source with the same interface (a log_scan.ScanResult; no store is opened)
+        """
         self.logs_dir = logs_dir
-        self.failures_dir = logs_dir / "failures"
-        self.successes_dir = logs_dir / "successes"
-        self.sessions_dir = logs_dir / "sessions"
         self.analysis_dir = logs_dir / "analysis"
+        self.analysis_dir.mkdir(parents=True, exist_ok=True)
+        self.store = get_log_store(logs_dir) if source is None else None
+        self.source = source if source is not None else self.store
     
-    def analyze_all(self) -> Dict[str, Any]:
+    def analyze_all(self, save: bool = True) -> Dict[str, Any]:
         """
         Run complete analysis on all logs
         
@@ -49,6 +62,9 @@ class LogAnalyzer:
             "ai_learning_summary": self._generate_ai_summary()
         }
         
+        if not save:
+            return analysis
+        
         # Save analysis
         analysis_file = self.analysis_dir / "latest_analysis.json"
         with open(analysis_file, 'w', encoding='utf-8') as f:
@@ -56,18 +72,24 @@ class LogAnalyzer:
         
         return analysis
     
+    def rebuild(self):
+        """Recompute the analysis counters from all stored logs"""
+        self.store.rebuild_analysis()
+    
     def _generate_summary(self) -> Dict[str, Any]:
         """Generate high-level statistics"""
-        total_failures = sum(1 for _ in self._iter_all_failures())
-        total_successes = sum(1 for _ in self._iter_all_successes())
-        unfixed_failures = sum(1 for f in self._iter_all_failures() if not f.get("fixed_by"))
+        status = {counter["key"]: counter for counter in self.source.counters("status")}
+        total_failures = status.get("failed", {}).get("count", 0)
+        total_successes = status.get("success", {}).get("count", 0)
+        unfixed_failures = total_failures - status.get("failed", {}).get("fixed", 0)
         
         # Calculate success rate over last 7 days
-        recent_failures = list(self._iter_failures_since(days=7))
-        recent_successes = list(self._iter_successes_since(days=7))
-        recent_total = len(recent_failures) + len(recent_successes)
+        since = (datetime.now() - timedelta(days=7)).isoformat()
+        recent_failures = self.source.count("failed", since=since)
+        recent_successes = self.source.count("success", since=since)
+        recent_total = recent_failures + recent_successes
         recent_success_rate = (
-            len(recent_successes) / recent_total * 100 
+            recent_successes / recent_total * 100 
             if recent_total > 0 else 0
         )
         
@@ -86,167 +108,56 @@ class LogAnalyzer:
     
     def _analyze_error_patterns(self) -> List[Dict[str, Any]]:
         """Identify most common error patterns"""
-        error_categories = Counter()
-        error_types = Counter()
-        error_examples = defaultdict(list)
-        
-        for failure in self._iter_all_failures():
-            category = failure.get("error_category", "unknown")
-            error_type = failure.get("error_type", "unknown")
-            
-            error_categories[category] += 1
-            error_types[error_type] += 1
-            
-            # Store example for each category (up to 3)
-            if len(error_examples[category]) < 3:
-                error_examples[category].append({
-                    "log_id": failure["log_id"],
-                    "error_message": failure.get("error_message", "")[:200],
-                    "timestamp": failure["timestamp"],
-                    "fixed": bool(failure.get("fixed_by"))
-                })
-        
         patterns = []
-        for category, count in error_categories.most_common(10):
+        for counter in self.source.counters("category", limit=10):
             patterns.append({
-                "category": category,
-                "count": count,
-                "examples": error_examples[category]
+                "category": counter["key"],
+                "count": counter["count"],
+                "examples": counter["examples"]
             })
         
-        return patterns
+        return self._with_fixed_flags(patterns)
     
     def _find_common_errors(self) -> List[Dict[str, Any]]:
         """Find most common specific error messages"""
-        error_messages = Counter()
-        error_details = {}
-        
-        for failure in self._iter_all_failures():
-            # Extract first line of error message for grouping
-            error_msg = failure.get("error_message", "")
-            stderr = failure.get("stderr", "")
-            
-            # Try to extract the actual error line
-            key_error = self._extract_key_error(error_msg, stderr)
-            
-            if key_error:
-                error_messages[key_error] += 1
-                
-                if key_error not in error_details:
-                    error_details[key_error] = {
-                        "error": key_error,
-                        "count": 0,
-                        "fixed_count": 0,
-                        "examples": []
-                    }
-                
-                error_details[key_error]["count"] += 1
-                if failure.get("fixed_by"):
-                    error_details[key_error]["fixed_count"] += 1
-                
-                if len(error_details[key_error]["examples"]) < 2:
-                    error_details[key_error]["examples"].append({
-                        "log_id": failure["log_id"],
-                        "session_id": failure["session_id"],
-                        "fixed": bool(failure.get("fixed_by"))
-                    })
-        
         common_errors = []
-        for error, count in error_messages.most_common(15):
-            details = error_details[error]
-            details["fix_rate"] = (
-                details["fixed_count"] / details["count"] * 100
-                if details["count"] > 0 else 0
-            )
-            common_errors.append(details)
+        for counter in self.source.counters("key_error", limit=15):
+            common_errors.append({
+                "error": counter["key"],
+                "count": counter["count"],
+                "fixed_count": counter["fixed"],
+                "examples": counter["examples"],
+                "fix_rate": (
+                    counter["fixed"] / counter["count"] * 100
+                    if counter["count"] > 0 else 0
+                )
+            })
         
-        return common_errors
+        return self._with_fixed_flags(common_errors)
     
     def _analyze_fix_strategies(self) -> List[Dict[str, Any]]:
-        """Analyze how failures were fixed"""
-        fix_strategies = []
-        
-        # Find failures that were fixed
-        for failure in self._iter_all_failures():
-            if not failure.get("fixed_by"):
-                continue
-            
-            success_id = failure["fixed_by"]
-            success = self._get_log_by_id(success_id)
-            
-            if not success:
-                continue
-            
-            # Analyze what changed
-            changes = self._analyze_code_changes(
-                failure["code"],
-                success["code"]
-            )
-            
-            fix_strategies.append({
-                "failure_id": failure["log_id"],
-                "success_id": success_id,
-                "error_category": failure.get("error_category"),
-                "error_type": failure.get("error_type"),
-                "changes": changes,
-                "timestamp": success["timestamp"]
-            })
-        
-        # Group by error type to find common fixes
-        fixes_by_error = defaultdict(list)
-        for fix in fix_strategies:
-            error_type = fix.get("error_category", "unknown")
-            fixes_by_error[error_type].append(fix["changes"])
-        
+        """Analyze how failures were fixed (imports changed by the fixes, per error category)"""
         common_fixes = []
-        for error_type, fixes_list in fixes_by_error.items():
-            # Find common patterns in fixes
-            all_changes = []
-            for fixes in fixes_list:
-                all_changes.extend(fixes.get("added_imports", []))
-                all_changes.extend(fixes.get("removed_imports", []))
-            
-            if all_changes:
+        for counter in self.source.counters("fix"):
+            changes = self.source.counters(f"fix_change:{counter['key']}", limit=5)
+            if changes:
                 common_fixes.append({
-                    "error_type": error_type,
-                    "fix_count": len(fixes_list),
-                    "common_changes": Counter(all_changes).most_common(5)
+                    "error_type": counter["key"],
+                    "fix_count": counter["count"],
+                    "common_changes": [(change["key"], change["count"]) for change in changes]
                 })
         
         return common_fixes
     
     def _analyze_library_issues(self) -> Dict[str, Any]:
         """Analyze issues related to specific libraries"""
-        library_errors = defaultdict(lambda: {"count": 0, "errors": []})
-        
-        for failure in self._iter_all_failures():
-            code = failure.get("code", "")
-            stderr = failure.get("stderr", "")
-            error_msg = failure.get("error_message", "")
-            
-            # Check which libraries are involved
-            libraries = ["matplotlib", "numpy", "scipy", "PIL", "skimage", 
-                        "cv2", "pandas", "imageio", "MapsBridge"]
-            
-            for lib in libraries:
-                if lib in code or lib in stderr or lib in error_msg:
-                    library_errors[lib]["count"] += 1
-                    if len(library_errors[lib]["errors"]) < 3:
-                        library_errors[lib]["errors"].append({
-                            "log_id": failure["log_id"],
-                            "error": self._extract_key_error(error_msg, stderr)[:150],
-                            "fixed": bool(failure.get("fixed_by"))
-                        })
-        
-        # Sort by count
-        sorted_issues = sorted(
-            [{"library": lib, **data} for lib, data in library_errors.items()],
-            key=lambda x: x["count"],
-            reverse=True
-        )
+        sorted_issues = [
+            {"library": counter["key"], "count": counter["count"], "errors": counter["examples"]}
+            for counter in self.source.counters("library")
+        ]
         
         return {
-            "libraries_with_issues": sorted_issues
+            "libraries_with_issues": self._with_fixed_flags(sorted_issues, "errors")
         }
     
     def _analyze_mapbridge_issues(self) -> Dict[str, Any]:
@@ -260,41 +171,13 @@ class LogAnalyzer:
             "examples": []
         }
         
-        for failure in self._iter_all_failures():
-            if "MapsBridge" not in failure.get("code", ""):
-                continue
-            
-            error_msg = failure.get("error_message", "").lower()
-            stderr = failure.get("stderr", "").lower()
-            error_text = error_msg + " " + stderr
-            
-            # Categorize MapsBridge errors
-            if "stdin" in error_text or "json" in error_text:
-                mapbridge_errors["stdin_parsing_errors"] += 1
-                category = "stdin_parsing"
-            elif "requesttype" in error_text or "tileset" in error_text or "imagelayer" in error_text:
-                mapbridge_errors["request_type_errors"] += 1
-                category = "request_type"
-            elif "channel" in error_text or "createchannel" in error_text:
-                mapbridge_errors["channel_errors"] += 1
-                category = "channel"
-            elif "output" in error_text or "sendsingletileoutput" in error_text:
-                mapbridge_errors["output_errors"] += 1
-                category = "output"
+        for counter in self.source.counters("mapbridge"):
+            if counter["key"]:
+                mapbridge_errors[f"{counter['key']}_errors"] = counter["count"]
             else:
-                mapbridge_errors["other_errors"] += 1
-                category = "other"
-            
-            # Store examples
-            if len(mapbridge_errors["examples"]) < 10:
-                mapbridge_errors["examples"].append({
-                    "log_id": failure["log_id"],
-                    "category": category,
-                    "error": self._extract_key_error(error_msg, stderr)[:150],
-                    "fixed": bool(failure.get("fixed_by"))
-                })
+                mapbridge_errors["examples"] = counter["examples"]
         
-        return mapbridge_errors
+        return self._with_fixed_flags([mapbridge_errors])[0]
     
     def _generate_recommendations(self) -> List[str]:
         """Generate recommendations for improving system_context"""
@@ -302,7 +185,6 @@ class LogAnalyzer:
         
         # Analyze error patterns
         error_patterns = self._analyze_error_patterns()
-        common_errors = self._find_common_errors()
         
         # Top 3 error categories
         if error_patterns:
@@ -396,8 +278,8 @@ class LogAnalyzer:
             summary.append("SUCCESSFUL FIX PATTERNS:")
             for i, fix in enumerate(fix_strategies[:3], 1):
                 summary.append(
-                    f"{i}. {fix['error_category']} errors fixed by: "
-                    f"{', '.join(fix['changes'].get('summary', ['code revision']))}"
+                    f"{i}. {fix['error_type']} errors fixed by changing imports: "
+                    f"{', '.join(name for name, _ in fix['common_changes'])}"
                 )
             summary.append("")
         
@@ -409,110 +291,41 @@ class LogAnalyzer:
     
     def _iter_all_failures(self):
         """Iterate over all failure logs"""
-        if not self.failures_dir.exists():
-            return
-        for date_dir in self.failures_dir.iterdir():
-            if not date_dir.is_dir():
-                continue
-            for log_file in date_dir.glob("*.json"):
-                try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        yield json.load(f)
-                except Exception as e:
-                    print(f"Warning: Could not load log file {log_file}: {e}")
+        return self.store.iter_logs(status="failed")
     
     def _iter_all_successes(self):
         """Iterate over all success logs"""
-        if not self.successes_dir.exists():
-            return
-        for date_dir in self.successes_dir.iterdir():
-            if not date_dir.is_dir():
-                continue
-            for log_file in date_dir.glob("*.json"):
-                try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        yield json.load(f)
-                except Exception as e:
-                    print(f"Warning: Could not load log file {log_file}: {e}")
+        return self.store.iter_logs(status="success")
     
     def _iter_failures_since(self, days: int):
         """Iterate over failures from the last N days"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        for failure in self._iter_all_failures():
-            timestamp = datetime.fromisoformat(failure["timestamp"])
-            if timestamp >= cutoff_date:
-                yield failure
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        return self.store.iter_logs(status="failed", since=since)
     
     def _iter_successes_since(self, days: int):
         """Iterate over successes from the last N days"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        for success in self._iter_all_successes():
-            timestamp = datetime.fromisoformat(success["timestamp"])
-            if timestamp >= cutoff_date:
-                yield success
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        return self.store.iter_logs(status="success", since=since)
     
     def _get_log_by_id(self, log_id: str) -> Optional[Dict[str, Any]]:
         """Get a log entry by ID"""
-        for base_dir in [self.failures_dir, self.successes_dir]:
-            for date_dir in base_dir.iterdir():
-                if not date_dir.is_dir():
-                    continue
-                log_file = date_dir / f"{log_id}.json"
-                if log_file.exists():
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-        return None
+        return self.store.get(log_id)
+    
+    def _with_fixed_flags(self, sections: List[Dict[str, Any]], field: str = "examples") -> List[Dict[str, Any]]:
+        """Set the current "fixed" flag on the examples of each section"""
+        examples = [example for section in sections for example in section[field]]
+        fixed = self.source.fixed_log_ids(example["log_id"] for example in examples)
+        for example in examples:
+            example["fixed"] = example["log_id"] in fixed
+        return sections
     
     def _extract_key_error(self, error_message: str, stderr: str) -> str:
         """Extract the key error message for grouping"""
-        # Try to find the actual error line in stderr
-        if stderr:
-            lines = stderr.strip().split('\n')
-            for line in reversed(lines):
-                # Look for Python exception lines
-                if re.match(r'\w+Error:', line) or re.match(r'\w+Exception:', line):
-                    return line.strip()[:200]
-        
-        # Fall back to error_message
-        if error_message:
-            return error_message.strip()[:200]
-        
-        return "Unknown error"
+        return extract_key_error(error_message, stderr)
     
     def _analyze_code_changes(self, old_code: str, new_code: str) -> Dict[str, Any]:
         """Analyze what changed between failed and successful code"""
-        changes = {
-            "added_imports": [],
-            "removed_imports": [],
-            "added_functions": [],
-            "summary": []
-        }
-        
-        # Extract imports
-        old_imports = set(re.findall(r'^(?:import|from)\s+(\S+)', old_code, re.MULTILINE))
-        new_imports = set(re.findall(r'^(?:import|from)\s+(\S+)', new_code, re.MULTILINE))
-        
-        changes["added_imports"] = list(new_imports - old_imports)
-        changes["removed_imports"] = list(old_imports - new_imports)
-        
-        # Generate summary
-        if changes["added_imports"]:
-            changes["summary"].append(f"Added imports: {', '.join(changes['added_imports'])}")
-        if changes["removed_imports"]:
-            changes["summary"].append(f"Removed imports: {', '.join(changes['removed_imports'])}")
-        
-        # Check for structural changes
-        if "def " in new_code and "def " not in old_code:
-            changes["summary"].append("Added function definitions")
-        
-        if len(new_code) > len(old_code) * 1.5:
-            changes["summary"].append("Significant code expansion")
-        elif len(new_code) < len(old_code) * 0.5:
-            changes["summary"].append("Significant code reduction")
-        
-        return changes
+        return analyze_code_changes(old_code, new_code)
     
     def generate_context_for_ai(self, max_examples: int = 10) -> str:
         """
@@ -526,23 +339,17 @@ class LogAnalyzer:
             context.append("## Common Script Errors to Avoid\n")
             context.append("Based on recent script execution failures:\n")
             
-            # Get unfixed failures
-            unfixed = []
-            for failure in self._iter_all_failures():
-                if not failure.get("fixed_by"):
-                    unfixed.append(failure)
+            # Most recent unfixed failures
+            unfixed = self.store.recent("failed", limit=max_examples, unfixed=True)
             
             # If no failures yet, return empty string
             if not unfixed:
                 return ""
             
-            # Sort by timestamp (most recent first)
-            unfixed.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-            
             # Include examples
-            for i, failure in enumerate(unfixed[:max_examples], 1):
+            for i, failure in enumerate(unfixed, 1):
                 context.append(f"\n### Example {i}: {failure.get('error_category', 'unknown')}")
-                context.append(f"Error: {failure.get('error_message', 'No message')[:150]}")
+                context.append(f"Error: {(failure.get('error_message') or 'No message')[:150]}")
                 if failure.get("stderr"):
                     stderr_preview = failure["stderr"][:200]
                     context.append(f"Details: {stderr_preview}")
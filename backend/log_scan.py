@@ -0,0 +1,233 @@
+"""
+Single-pass analysis over a range of logs or a JSON log archive.
+
+The analysis the app serves comes from counters the log store keeps for all
+logs (log_aggregate.py). Reports over part of the logs (a date range), or
+over a JSON archive in the layout of earlier versions
+(failures|successes/YYYY-MM-DD/*.json, e.g. copied from another install),
+are computed here instead. Each log is read once and turned into the same
+counter increments, applied in memory (ScanResult). ScanResult is then
+handed to LogAnalyzer as its counter source, so every report comes out of
+that one pass.
+
+Archives are parsed in parallel, one date directory per task on a process
+pool. Directories outside --since/--until are skipped without being
+opened. Results are cached under logs/analysis/cache/, keyed by the set of
+scanned directories and their mtimes (or the store's state token), the
+range, AGGREGATE_VERSION and the current date (for the 7-day figures).
+"""
+
+import os
+import json
+import pathlib
+import hashlib
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from backend.log_aggregate import (
+        AGGREGATE_VERSION, Increment, code_imports, fix_increments, fixed_increments, log_increments,
+    )
+except ImportError:
+    from log_aggregate import (
+        AGGREGATE_VERSION, Increment, code_imports, fix_increments, fixed_increments, log_increments,
+    )
+
+# Cached reports kept per logs directory
+CACHE_KEEP = 20
+
+
+class ScanResult:
+    """Analysis counters of a set of logs, built in memory.
+
+    Offers the counter-source interface of LogStore that LogAnalyzer uses
+    (counters, fixed_log_ids, count). Partial results of consecutive date
+    directories are combined with merge(), in date order; finish() then
+    links fixed failures to the successes that fixed them. LogStore
+    rebuilds its counters from one too (rows()).
+    """
+
+    def __init__(self, recent_since: str):
+        self.recent_since = recent_since
+        # kind -> key -> [count, fixed, examples, max_examples], in first-seen order
+        self._counters: Dict[str, Dict[str, list]] = {}
+        self.recent = {"failed": 0, "success": 0}
+        # failure id -> (fixed_by, error_category, imports) for fixed failures
+        self.fixed_failures: Dict[str, Tuple[str, Optional[str], List[str]]] = {}
+        # success id -> imports, for successes naming a previous attempt
+        self.fixing_successes: Dict[str, List[str]] = {}
+
+    def apply(self, increments: Iterable[Increment]):
+        for inc in increments:
+            entry = self._counters.setdefault(inc.kind, {}).setdefault(inc.key, [0, 0, [], 0])
+            entry[0] += inc.count
+            entry[1] += inc.fixed
+            entry[3] = max(entry[3], inc.max_examples)
+            if inc.example is not None and len(entry[2]) < inc.max_examples:
+                entry[2].append(inc.example)
+
+    def add(self, log: Dict[str, Any]):
+        """Fold one log into the counters."""
+        status = log.get("status")
+        if status not in self.recent:
+            return
+        self.apply(log_increments(log))
+        if (log.get("timestamp") or "") >= self.recent_since:
+            self.recent[status] += 1
+        if status == "failed" and log.get("fixed_by"):
+            self.apply(fixed_increments(log))
+            self.fixed_failures[log["log_id"]] = (
+                log["fixed_by"], log.get("error_category"), sorted(code_imports(log.get("code") or "")))
+        elif status == "success" and log.get("previous_attempt_id"):
+            self.fixing_successes[log["log_id"]] = sorted(code_imports(log.get("code") or ""))
+
+    def merge(self, other: "ScanResult"):
+        """Append the counters of logs that come after this result's."""
+        for kind, entries in other._counters.items():
+            mine = self._counters.setdefault(kind, {})
+            for key, (count, fixed, examples, max_examples) in entries.items():
+                entry = mine.setdefault(key, [0, 0, [], 0])
+                entry[0] += count
+                entry[1] += fixed
+                entry[3] = max(entry[3], max_examples)
+                entry[2].extend(examples[:max(0, entry[3] - len(entry[2]))])
+        for status, count in other.recent.items():
+            self.recent[status] += count
+        self.fixed_failures.update(other.fixed_failures)
+        self.fixing_successes.update(other.fixing_successes)
+
+    def finish(self) -> "ScanResult":
+        """Count fix strategies for fixed failures whose fixing success was scanned too."""
+        for fixed_by, category, imports in self.fixed_failures.values():
+            success_imports = self.fixing_successes.get(fixed_by)
+            if success_imports is not None:
+                self.apply(fix_increments(category, imports, success_imports))
+        return self
+
+    def rows(self) -> Iterator[Tuple[str, str, int, int, List[Dict[str, Any]]]]:
+        """(kind, key, count, fixed, examples) of every counter, in first-seen order."""
+        for kind, entries in self._counters.items():
+            for key, (count, fixed, examples, _) in entries.items():
+                yield kind, key, count, fixed, examples
+
+    # Counter source for LogAnalyzer
+
+    def counters(self, kind: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        entries = self._counters.get(kind, {})
+        # Stable sort keeps first-seen order among equal counts
+        ordered = sorted(entries.items(), key=lambda item: -item[1][0])
+        return [
+            {"key": key, "count": count, "fixed": fixed, "examples": [dict(e) for e in examples]}
+            for key, (count, fixed, examples, _) in ordered[:limit]
+        ]
+
+    def fixed_log_ids(self, log_ids: Iterable[str]) -> set:
+        return {log_id for log_id in log_ids if log_id in self.fixed_failures}
+
+    def count(self, status: Optional[str] = None, since: Optional[str] = None, **_) -> int:
+        """Logs of a status; with since, those from the last 7 days (the only window kept)."""
+        if since:
+            return sum(n for s, n in self.recent.items() if status in (None, s))
+        return sum(entry[0] for key, entry in self._counters.get("status", {}).items() if status in (None, key))
+
+
+def _in_range(day: str, since: Optional[str], until: Optional[str]) -> bool:
+    return (not since or day >= since) and (not until or day <= until)
+
+
+def scan_date_dir(path: str, recent_since: str, since: Optional[str] = None,
+                  until: Optional[str] = None) -> ScanResult:
+    """Scan one date directory of an archive (runs in a worker process)."""
+    logs = []
+    for log_file in pathlib.Path(path).glob("*.json"):
+        try:
+            log = json.loads(log_file.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"⚠ Skipping unreadable log file {log_file}: {e}")
+            continue
+        if isinstance(log, dict) and log.get("log_id") and \
+                _in_range((log.get("timestamp") or "")[:10], since, until):
+            log.setdefault("session_id", log["log_id"])
+            log.setdefault("timestamp", "")
+            logs.append(log)
+    result = ScanResult(recent_since)
+    for log in sorted(logs, key=lambda log: log["timestamp"]):
+        result.add(log)
+    return result
+
+
+def archive_dirs(archive: pathlib.Path, since: Optional[str] = None,
+                 until: Optional[str] = None) -> List[pathlib.Path]:
+    """Date directories of an archive within [since, until], in date order."""
+    dirs = []
+    for kind in ("failures", "successes"):
+        base = archive / kind
+        if not base.is_dir():
+            continue
+        for date_dir in base.iterdir():
+            if date_dir.is_dir() and _in_range(date_dir.name, since, until):
+                dirs.append(date_dir)
+    return sorted(dirs, key=lambda d: (d.name, d.parent.name))
+
+
+def _recent_since() -> str:
+    return (datetime.now() - timedelta(days=7)).isoformat()
+
+
+def scan_archive(archive: pathlib.Path, since: Optional[str] = None, until: Optional[str] = None,
+                 workers: Optional[int] = None) -> ScanResult:
+    """One pass over a JSON archive, date directories parsed in parallel."""
+    dirs = archive_dirs(archive, since, until)
+    recent_since = _recent_since()
+    result = ScanResult(recent_since)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(dirs) or 1))
+    if workers == 1:
+        partials = (scan_date_dir(str(d), recent_since, since, until) for d in dirs)
+        for partial in partials:
+            result.merge(partial)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() returns results in submission (date) order
+            for partial in pool.map(scan_date_dir, [str(d) for d in dirs],
+                                    [recent_since] * len(dirs), [since] * len(dirs), [until] * len(dirs)):
+                result.merge(partial)
+    return result.finish()
+
+
+def scan_store(store, since: Optional[str] = None, until: Optional[str] = None) -> ScanResult:
+    """One pass over the store's logs from date since through date until."""
+    until_exclusive = (date.fromisoformat(until) + timedelta(days=1)).isoformat() if until else None
+    result = ScanResult(_recent_since())
+    for log in store.iter_logs(since=since, until=until_exclusive):
+        result.add(log)
+    return result.finish()
+
+
+def archive_cache_key(archive: pathlib.Path, since: Optional[str], until: Optional[str]) -> List[Any]:
+    """The scanned directories and their mtimes (an archive is append-only)."""
+    return [str(archive.resolve())] + [
+        [str(d.relative_to(archive)), d.stat().st_mtime_ns] for d in archive_dirs(archive, since, until)
+    ]
+
+
+def cached_report(cache_dir: pathlib.Path, key: List[Any],
+                  compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Return the report cached under key, computing and storing it on a miss."""
+    key = key + [AGGREGATE_VERSION, date.today().isoformat()]
+    digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()[:32]
+    cache_file = cache_dir / f"{digest}.json"
+    try:
+        return json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        pass
+    report = compute()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(report, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, cache_file)
+    # Keep the newest reports only
+    cached = sorted(cache_dir.glob("*.json"), key=lambda f: f.stat().st_mtime, reverse=True)
+    for old in cached[CACHE_KEEP:]:
+        old.unlink(missing_ok=True)
+    return report
@@ -0,0 +1,164 @@
+"""
+Append-only compressed segments for cold execution logs.
+
+The log store (log_store.py) keeps recent attempts whole in SQLite. Once an
+attempt is older than the hot window, LogStore.compact() moves its bulky
+text (stdout, stderr, user prompt) into a segment and keeps only the
+indexed columns in the logs table, so lookups, sessions and the analysis
+counters are unaffected. Script bodies are not repeated in segments: they
+live once per distinct script in the store's codes table and a record names
+its script by code_sha.
+
+Segment layout: logs/segments/YYYY-MM-DD.NNN.jsonl.gz, one JSON object per
+line (all log fields except code, plus code_sha). Each append is a
+complete gzip member, and readers accept concatenated members, so a
+segment is only ever appended to. A day's records start a new file (the
+day is the unit of retention) and a file that has reached its size limit
+is not appended to again (NNN counts up). A member cut short by a crash
+ends its file: readers stop there with a warning, and the next append
+starts a new file. The store only drops its copy of the text after the
+append completed, so those records are appended again.
+
+The store keeps the byte offset of each record's member, so reading one
+archived log decompresses that member only (read_member) rather than the
+whole segment.
+
+The zstd module is not part of the standard library here, so segments are
+gzip-compressed (level 9). Scripts dominate the old JSON files, so dropping
+the repeated copies counts for much more than the compressor.
+"""
+
+import os
+import re
+import gzip
+import json
+import zlib
+import pathlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+# Records without a usable timestamp
+UNDATED = "undated"
+
+_DAY = re.compile(r"\d{4}-\d{2}-\d{2}$")
+# Segments this process wrote or checked, so they are checked once
+_intact: set = set()
+
+
+def record_day(record: Dict[str, Any]) -> str:
+    day = (record.get("timestamp") or "")[:10]
+    return day if _DAY.match(day) else UNDATED
+
+
+def segment_day(path: pathlib.Path) -> str:
+    return path.name.split(".", 1)[0]
+
+
+def list_segments(segments_dir: pathlib.Path, since: Optional[str] = None,
+                  until: Optional[str] = None) -> List[pathlib.Path]:
+    """Segments of the days within [since, until] (dates), oldest first."""
+    if not segments_dir.is_dir():
+        return []
+    segments = []
+    for path in segments_dir.glob(f"*{SEGMENT_SUFFIX}"):
+        day = segment_day(path)
+        if (not since or day >= since) and (not until or day <= until):
+            segments.append(path)
+    return sorted(segments, key=lambda p: (segment_day(p), int(p.name.split(".")[1])))
+
+
+def _current_segment(segments_dir: pathlib.Path, day: str, max_bytes: int) -> pathlib.Path:
+    """The day's segment to append to: its newest, or the next one once that is full."""
+    existing = sorted(segments_dir.glob(f"{day}.*{SEGMENT_SUFFIX}"), key=lambda p: int(p.name.split(".")[1]))
+    if existing and existing[-1].stat().st_size < max_bytes and _is_intact(existing[-1]):
+        return existing[-1]
+    number = int(existing[-1].name.split(".")[1]) + 1 if existing else 0
+    return segments_dir / f"{day}.{number:03d}{SEGMENT_SUFFIX}"
+
+
+def _is_intact(path: pathlib.Path) -> bool:
+    """Whether every member of a segment is complete (appending after a broken one would hide the data)."""
+    key = str(path)
+    if key not in _intact:
+        try:
+            with gzip.open(path, "rb") as fh:
+                while fh.read(1 << 20):
+                    pass
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return False
+        _intact.add(key)
+    return True
+
+
+def append_records(segments_dir: pathlib.Path, records: Iterable[Dict[str, Any]],
+                   max_bytes: int) -> Dict[str, Tuple[str, int]]:
+    """Append records to their days' segments; returns log_id -> (segment file name, member offset).
+
+    Data is fsynced before returning, so callers can drop their copy.
+    """
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        by_day.setdefault(record_day(record), []).append(record)
+    segments_dir.mkdir(parents=True, exist_ok=True)
+    placed = {}
+    for day, day_records in sorted(by_day.items()):
+        path = _current_segment(segments_dir, day, max_bytes)
+        lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in day_records)
+        with open(path, "ab") as fh:
+            offset = fh.tell()
+            fh.write(gzip.compress(lines.encode("utf-8"), compresslevel=9))
+            fh.flush()
+            os.fsync(fh.fileno())
+        _intact.add(str(path))
+        for record in day_records:
+            placed[record["log_id"]] = (path.name, offset)
+    return placed
+
+
+def read_member(path: pathlib.Path, offset: int) -> List[Dict[str, Any]]:
+    """Records of the one gzip member that starts at offset (the complete ones, if it was cut short)."""
+    decoder = zlib.decompressobj(wbits=31)
+    parts, problem = [], "the file ends inside it"
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(offset)
+            while not decoder.eof:
+                chunk = fh.read(1 << 16)
+                if not chunk:
+                    break
+                parts.append(decoder.decompress(chunk))
+    except zlib.error as e:
+        problem = str(e)
+    data = b"".join(parts)
+    if not decoder.eof:
+        print(f"⚠ Segment {path.name} has an incomplete member at {offset} ({problem}), skipped the rest")
+        data = data[:data.rfind(b"\n") + 1]
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+
+def read_segment(path: pathlib.Path) -> Iterator[Dict[str, Any]]:
+    """Records of one segment in append order (stops at a truncated member)."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+    except (EOFError, gzip.BadGzipFile, zlib.error, ValueError) as e:
+        print(f"⚠ Segment {path.name} ends in an incomplete record, skipped the rest: {e}")
+
+
+def iter_segments(segments_dir: pathlib.Path, since: Optional[str] = None,
+                  until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream the archived records of the days within [since, until], oldest first."""
+    for path in list_segments(segments_dir, since, until):
+        yield from read_segment(path)
+
+
+def drop_segments_before(segments_dir: pathlib.Path, day: str) -> int:
+    """Delete the segments of days before day, and of undated records; returns how many were deleted."""
+    dropped = 0
+    for path in list_segments(segments_dir):
+        if segment_day(path) < day or segment_day(path) == UNDATED:
+            path.unlink(missing_ok=True)
+            dropped += 1
+    return dropped
@@ -0,0 +1,884 @@
+"""
+Indexed store of script execution logs.
+
+ScriptLogger used to write every attempt as a pretty-printed JSON file under
+logs/failures|successes/YYYY-MM-DD/ and a read-modify-write session file
+under logs/sessions/, and every lookup by id walked all date directories.
+Attempts now live in one SQLite database (WAL mode):
+
+- logs: one row per attempt (the ScriptExecutionLog fields; list fields as
+  JSON), indexed on log_id, session_id, timestamp, status, error_category
+  and code_hash, so lookups by id or session and "recent N" queries are
+  index seeks instead of O(days x files) directory probes.
+- codes: each distinct script once, zlib-compressed, found by the SHA-256
+  of its exact text (code_hash ignores whitespace, so it cannot key the
+  text); a log row names its script by code_id. Retries and reruns of the
+  same script add no script bytes.
+- logs_fts: FTS5 index over error_message and stderr (search()).
+- sessions: created/updated/resolved timestamps and status of each session;
+  its attempts are the session's log rows in insertion order.
+- analysis_counters: the counters LogAnalyzer serves its analysis from (see
+  log_aggregate.py).
+
+A log row, its session update, the fixed_by link of the failure it fixes and
+the analysis counter updates are written in one transaction, so concurrent
+runs of a session cannot lose an attempt and the counters always match the
+logs. rebuild_analysis() recomputes the counters from the logs (after rows
+were deleted by hand, or when the classification changed).
+
+The JSON tree of earlier versions is imported once, the first time the store
+is opened (see migrate_json_tree(); rerun with
+`python backend/log_store.py migrate`). The files are left in place but no
+longer read or written.
+
+Writes from the app go through LogWriter: a bounded queue drained by a
+background thread that commits batches, so /run never waits on log I/O.
+Reads wait for queued logs first, so a log is readable once logged.
+
+compact() (run periodically by the app) keeps the database small: the
+stdout, stderr and user prompt of logs older than LOG_HOT_DAYS move to
+append-only gzip segments next to the database (see log_segments.py), and
+the row keeps every other column plus the segment and offset of the gzip
+member holding its text. Reads put the text back, decompressing only that
+member (the last few members read are kept decoded), so callers still get
+whole logs, and archived logs keep their search index entries. With
+LOG_RETENTION_DAYS set, logs older than that are deleted along with their
+day's segments, scripts no other log uses and empty sessions, and the
+analysis counters are rebuilt from the logs that remain. Archived rows
+shrink in place, which only a VACUUM gives back to the file system;
+compact() runs one at most every LOG_VACUUM_INTERVAL_HOURS, on its own
+connection, with log writes held back (they queue in LogWriter) while reads
+go on.
+
+Configuration (environment):
+    LOG_STORE_PATH         SQLite file of the store (default logs/execution_logs.db)
+    LOG_QUEUE_SIZE         Logs queued for the writer before callers wait (default 1000)
+    LOG_BATCH_SIZE         Most logs committed per transaction (default 100)
+    LOG_HOT_DAYS           Days a log is kept whole in the database (default 7)
+    LOG_RETENTION_DAYS     Days logs are kept at all; 0 keeps them forever (default 0)
+    LOG_SEGMENT_MAX_BYTES  Size at which a segment file is closed (default 4 MiB)
+    LOG_VACUUM_INTERVAL_HOURS  Least time between two VACUUMs by compact() (default 24)
+"""
+
+import os
+import sys
+import zlib
+import json
+import time
+import queue
+import atexit
+import hashlib
+import pathlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from backend.log_aggregate import (
+        AGGREGATE_VERSION, Increment, code_imports, fix_increments, fixed_increments, log_increments,
+    )
+    from backend.log_scan import ScanResult
+    from backend.log_segments import append_records, drop_segments_before, list_segments, read_member
+except ImportError:
+    from log_aggregate import (
+        AGGREGATE_VERSION, Increment, code_imports, fix_increments, fixed_increments, log_increments,
+    )
+    from log_scan import ScanResult
+    from log_segments import append_records, drop_segments_before, list_segments, read_member
+
+# Columns of the logs table, in ScriptExecutionLog field order
+LOG_FIELDS = [
+    "log_id", "session_id", "timestamp", "status", "code", "code_hash",
+    "user_prompt", "ai_model", "image_filename",
+    "error_message", "error_type", "stderr", "stdout", "return_code",
+    "output_files", "execution_time_seconds",
+    "previous_attempt_id", "fixed_by", "error_category", "tags",
+]
+# Stored as JSON text
+_LIST_FIELDS = {"output_files", "tags"}
+# Columns written for a new log: the script goes to the codes table
+_ROW_FIELDS = [f for f in LOG_FIELDS if f != "code"] + ["code_id"]
+# Text moved out of the database into segments by compact()
+ARCHIVED_FIELDS = ("user_prompt", "stderr", "stdout")
+# Logs archived per transaction
+_COMPACT_BATCH = 500
+# Segment members kept decoded for reads
+_MEMBER_CACHE_SIZE = 16
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    log_id TEXT NOT NULL UNIQUE,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    code_hash TEXT,
+    user_prompt TEXT,
+    ai_model TEXT,
+    image_filename TEXT,
+    error_message TEXT,
+    error_type TEXT,
+    stderr TEXT,
+    stdout TEXT,
+    return_code INTEGER,
+    output_files TEXT,
+    execution_time_seconds REAL,
+    previous_attempt_id TEXT,
+    fixed_by TEXT,
+    error_category TEXT,
+    tags TEXT,
+    code_id INTEGER,
+    segment TEXT,
+    segment_offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_logs_session ON logs (session_id, seq);
+CREATE INDEX IF NOT EXISTS ix_logs_timestamp ON logs (timestamp);
+CREATE INDEX IF NOT EXISTS ix_logs_status ON logs (status, timestamp);
+CREATE INDEX IF NOT EXISTS ix_logs_error_category ON logs (error_category);
+CREATE INDEX IF NOT EXISTS ix_logs_code_hash ON logs (code_hash);
+CREATE INDEX IF NOT EXISTS ix_logs_code_id ON logs (code_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+    error_message, stderr, content='logs', content_rowid='seq'
+);
+-- Archiving a row keeps its index entry (the stderr it was indexed with is in
+-- its segment), so the triggers only follow rows that are not archived;
+-- compact() removes the entries of the archived rows it deletes itself
+CREATE TRIGGER IF NOT EXISTS logs_fts_insert AFTER INSERT ON logs BEGIN
+    INSERT INTO logs_fts (rowid, error_message, stderr) VALUES (new.seq, new.error_message, new.stderr);
+END;
+CREATE TRIGGER IF NOT EXISTS logs_fts_delete AFTER DELETE ON logs WHEN old.segment IS NULL BEGIN
+    INSERT INTO logs_fts (logs_fts, rowid, error_message, stderr)
+    VALUES ('delete', old.seq, old.error_message, old.stderr);
+END;
+CREATE TRIGGER IF NOT EXISTS logs_fts_update AFTER UPDATE OF error_message, stderr ON logs
+WHEN old.segment IS NULL AND new.segment IS NULL BEGIN
+    INSERT INTO logs_fts (logs_fts, rowid, error_message, stderr)
+    VALUES ('delete', old.seq, old.error_message, old.stderr);
+    INSERT INTO logs_fts (rowid, error_message, stderr) VALUES (new.seq, new.error_message, new.stderr);
+END;
+
+CREATE TABLE IF NOT EXISTS codes (
+    code_id INTEGER PRIMARY KEY,
+    sha TEXT NOT NULL UNIQUE,
+    body BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    resolved_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS analysis_counters (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    fixed INTEGER NOT NULL DEFAULT 0,
+    examples TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS ix_analysis_counters_top ON analysis_counters (kind, count);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Log rows with their script
+_SELECT_LOGS = "SELECT logs.*, codes.body AS code_body FROM logs LEFT JOIN codes USING (code_id)"
+
+_JSON_TREE_MIGRATED = "json_tree_migrated_at"
+_VACUUM_PENDING = "vacuum_pending"
+_VACUUMED_AT = "vacuumed_at"
+_AGGREGATE_VERSION = "analysis_version"
+
+
+def _row_fields(row: sqlite3.Row) -> Dict[str, Any]:
+    # The script is kept in the codes table (see _row_to_log)
+    log = {field: None if field == "code" else row[field] for field in LOG_FIELDS}
+    for field in _LIST_FIELDS:
+        if log[field] is not None:
+            log[field] = json.loads(log[field])
+    return log
+
+
+def _row_to_log(row: sqlite3.Row) -> Dict[str, Any]:
+    """A row of _SELECT_LOGS as a log (archived text not included)."""
+    log = _row_fields(row)
+    if row["code_body"] is not None:
+        log["code"] = zlib.decompress(row["code_body"]).decode("utf-8")
+    return log
+
+
+class LogStore:
+    """SQLite-backed execution logs and sessions (thread-safe, one connection)."""
+
+    def __init__(self, db_path: pathlib.Path, segments_dir: Optional[pathlib.Path] = None,
+                 hot_days: int = 7, retention_days: int = 0, segment_max_bytes: int = 4 << 20,
+                 vacuum_interval_hours: float = 24):
+        self.db_path = pathlib.Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.segments_dir = pathlib.Path(segments_dir) if segments_dir else self.db_path.parent / "segments"
+        self.hot_days = hot_days
+        self.retention_days = retention_days
+        self.segment_max_bytes = segment_max_bytes
+        self.vacuum_interval_hours = vacuum_interval_hours
+        self._lock = threading.RLock()
+        # Held by log writes and by a VACUUM, which runs without _lock so reads go on
+        self._write_gate = threading.RLock()
+        self._vacuuming = threading.Event()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Archived text by log_id of the segment members read last, keyed by (segment, offset)
+        self._members: "OrderedDict[Tuple[str, int], Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self._members_lock = threading.Lock()
+        # Set by get_log_store(); reads wait for the logs it has queued
+        self.writer: Optional["LogWriter"] = None
+        version = self._conn.execute("SELECT value FROM meta WHERE key = ?", (_AGGREGATE_VERSION,)).fetchone()
+        if version is None or version[0] != str(AGGREGATE_VERSION):
+            self.rebuild_analysis()
+
+    # Writes
+
+    def _store_code(self, code: str) -> int:
+        """Store a script once; returns the code_id it is referenced by."""
+        data = code.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        row = self._conn.execute("SELECT code_id FROM codes WHERE sha = ?", (sha,)).fetchone()
+        if row:
+            return row[0]
+        return self._conn.execute("INSERT INTO codes (sha, body) VALUES (?, ?)",
+                                  (sha, zlib.compress(data, 9))).lastrowid
+
+    def _insert(self, log: Dict[str, Any], or_ignore: bool = False) -> bool:
+        if or_ignore and self._conn.execute(
+                "SELECT 1 FROM logs WHERE log_id = ?", (log.get("log_id"),)).fetchone():
+            return False
+        code = log.get("code")
+        row = dict(log, code_id=self._store_code(code) if code is not None else None)
+        values = [json.dumps(row.get(f)) if f in _LIST_FIELDS and row.get(f) is not None else row.get(f)
+                  for f in _ROW_FIELDS]
+        cursor = self._conn.execute(
+            f"INSERT {'OR IGNORE ' if or_ignore else ''}INTO logs ({', '.join(_ROW_FIELDS)}) "
+            f"VALUES ({', '.join('?' * len(_ROW_FIELDS))})",
+            values,
+        )
+        return cursor.rowcount > 0
+
+    def _touch_session(self, session_id: str, status: str, timestamp: str):
+        """Create or update a session for an attempt made at timestamp."""
+        resolved = timestamp if status == "success" else None
+        self._conn.execute(
+            "INSERT INTO sessions (session_id, created_at, updated_at, status, resolved_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET updated_at = MAX(sessions.updated_at, excluded.updated_at), "
+            "status = CASE WHEN excluded.status = 'resolved' THEN 'resolved' ELSE sessions.status END, "
+            "resolved_at = COALESCE(excluded.resolved_at, sessions.resolved_at)",
+            (session_id, timestamp, timestamp, "resolved" if resolved else "in_progress", resolved),
+        )
+
+    def _apply(self, increments: Iterable[Increment]):
+        for inc in increments:
+            row = self._conn.execute(
+                "SELECT examples FROM analysis_counters WHERE kind = ? AND key = ?", (inc.kind, inc.key)
+            ).fetchone()
+            examples = json.loads(row[0]) if row else []
+            if inc.example is not None and len(examples) < inc.max_examples:
+                examples.append(inc.example)
+            if row:
+                self._conn.execute(
+                    "UPDATE analysis_counters SET count = count + ?, fixed = fixed + ?, examples = ? "
+                    "WHERE kind = ? AND key = ?",
+                    (inc.count, inc.fixed, json.dumps(examples), inc.kind, inc.key))
+            else:
+                self._conn.execute(
+                    "INSERT INTO analysis_counters (kind, key, count, fixed, examples) VALUES (?, ?, ?, ?, ?)",
+                    (inc.kind, inc.key, inc.count, inc.fixed, json.dumps(examples)))
+
+    def _add(self, log: Dict[str, Any], fixes: Optional[str]):
+        self._insert(log)
+        self._touch_session(log["session_id"], log["status"], log["timestamp"])
+        self._apply(log_increments(log))
+        if fixes:
+            rows = self._conn.execute(
+                f"{_SELECT_LOGS} WHERE log_id = ? AND status = 'failed' AND fixed_by IS NULL", (fixes,)
+            ).fetchall()
+            if rows:
+                failure = self._logs(rows)[0]
+                self._conn.execute("UPDATE logs SET fixed_by = ? WHERE seq = ?", (log["log_id"], rows[0]["seq"]))
+                self._apply(fixed_increments(failure))
+                self._apply(fix_increments(failure["error_category"], code_imports(failure.get("code") or ""),
+                                           code_imports(log.get("code") or "")))
+
+    def add_batch(self, entries: List[Tuple[Dict[str, Any], Optional[str]]]):
+        """Store attempts in one transaction: each (log, id of the failure it fixes or None).
+
+        Updates each log's session and marks the failures fixed; a failure
+        keeps the first success that fixed it.
+        """
+        with self._write_gate, self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for log, fixes in entries:
+                    self._add(log, fixes)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add(self, log: Dict[str, Any], fixes: Optional[str] = None):
+        """Store one attempt now (see add_batch; the app queues them through writer)."""
+        self.add_batch([(log, fixes)])
+
+    def rebuild_analysis(self):
+        """Recompute the analysis counters from all stored logs (archived ones included)."""
+        with self._lock:
+            # One pass over the logs, counted in memory (the recent window is not stored)
+            result = ScanResult(recent_since="")
+            for log in self._iter(None, None, False, None, 500):
+                result.add(log)
+            result.finish()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM analysis_counters")
+                self._conn.executemany(
+                    "INSERT INTO analysis_counters (kind, key, count, fixed, examples) VALUES (?, ?, ?, ?, ?)",
+                    ((kind, key, count, fixed, json.dumps(examples))
+                     for kind, key, count, fixed, examples in result.rows()))
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                   (_AGGREGATE_VERSION, str(AGGREGATE_VERSION)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # Reads
+
+    def _flush_writer(self):
+        """Wait for queued logs, so a log is readable once logged.
+
+        Not while a VACUUM holds writes back: reads then see the logs stored
+        before it instead of waiting for it.
+        """
+        if self.writer is not None and not self._vacuuming.is_set():
+            self.writer.flush(timeout=10)
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        self._flush_writer()
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _archived(self, segment: str, offset: int, log_id: str) -> Optional[Dict[str, Any]]:
+        """The archived text of a log, from its segment member."""
+        key = (segment, offset)
+        with self._members_lock:
+            records = self._members.get(key)
+            if records is not None:
+                self._members.move_to_end(key)
+                return records.get(log_id)
+        path = self.segments_dir / segment
+        records = {}
+        if path.exists():
+            for record in read_member(path, offset):
+                records[record["log_id"]] = {f: record.get(f) for f in ARCHIVED_FIELDS}
+        else:
+            print(f"⚠ Execution log segment {segment} is missing")
+        with self._members_lock:
+            self._members[key] = records
+            while len(self._members) > _MEMBER_CACHE_SIZE:
+                self._members.popitem(last=False)
+        return records.get(log_id)
+
+    def _archived_stderr(self, row: sqlite3.Row) -> Optional[str]:
+        return (self._archived(row["segment"], row["segment_offset"], row["log_id"]) or {}).get("stderr")
+
+    def _logs(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        """Rows of _SELECT_LOGS as whole logs."""
+        logs = [_row_to_log(row) for row in rows]
+        for log, row in zip(logs, rows):
+            if row["segment"]:
+                log.update(self._archived(row["segment"], row["segment_offset"], log["log_id"]) or {})
+        return logs
+
+    def get(self, log_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(f"{_SELECT_LOGS} WHERE log_id = ?", (log_id,))
+        return self._logs(rows)[0] if rows else None
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Session metadata with its attempts (log_id, timestamp, status), oldest first."""
+        rows = self._query("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+        if not rows:
+            return None
+        session = dict(rows[0])
+        if session["resolved_at"] is None:
+            del session["resolved_at"]
+        session["attempts"] = [
+            dict(row) for row in self._query(
+                "SELECT log_id, timestamp, status FROM logs WHERE session_id = ? ORDER BY seq", (session_id,))
+        ]
+        return session
+
+    def recent(self, status: str, limit: int = 50, unfixed: bool = False) -> List[Dict[str, Any]]:
+        rows = self._query(
+            f"{_SELECT_LOGS} WHERE status = ? {'AND fixed_by IS NULL ' if unfixed else ''}"
+            "ORDER BY timestamp DESC LIMIT ?", (status, limit))
+        return self._logs(rows)
+
+    @staticmethod
+    def _where(status: Optional[str], since: Optional[str], until: Optional[str], unfixed: bool):
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if unfixed:
+            clauses.append("fixed_by IS NULL")
+        return clauses, params
+
+    def iter_logs(self, status: Optional[str] = None, since: Optional[str] = None,
+                  unfixed: bool = False, until: Optional[str] = None,
+                  batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Stream logs oldest first, optionally by status, ISO timestamp range [since, until) or only unfixed.
+
+        Archived logs come back whole: their text is read from the segments
+        in order, each segment member once.
+        """
+        self._flush_writer()
+        return self._iter(status, since, unfixed, until, batch_size)
+
+    def _iter(self, status: Optional[str], since: Optional[str], unfixed: bool,
+              until: Optional[str], batch_size: int) -> Iterator[Dict[str, Any]]:
+        clauses, params = self._where(status, since, until, unfixed)
+        where = " AND ".join(clauses + ["seq > ?"])
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"{_SELECT_LOGS} WHERE {where} ORDER BY seq LIMIT ?",
+                    (*params, last_seq, batch_size),
+                ).fetchall()
+            yield from self._logs(rows)
+            if len(rows) < batch_size:
+                return
+            last_seq = rows[-1]["seq"]
+
+    def count(self, status: Optional[str] = None, since: Optional[str] = None,
+              unfixed: bool = False, until: Optional[str] = None) -> int:
+        clauses, params = self._where(status, since, until, unfixed)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT COUNT(*) FROM logs {where}", params)[0][0]
+
+    def state_token(self) -> str:
+        """Changes whenever a log is added, a failure is marked fixed or retention deletes logs."""
+        max_seq = self._query("SELECT MAX(seq) FROM logs")[0][0] or 0
+        total, fixed = self._query(
+            "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(fixed), 0) FROM analysis_counters WHERE kind = 'status'")[0]
+        return f"{max_seq}:{total}:{fixed}"
+
+    def counters(self, kind: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Analysis counters of a kind, highest count first (ties in creation order)."""
+        rows = self._query(
+            "SELECT key, count, fixed, examples FROM analysis_counters WHERE kind = ? "
+            "ORDER BY count DESC, rowid LIMIT ?", (kind, -1 if limit is None else limit))
+        return [{"key": row["key"], "count": row["count"], "fixed": row["fixed"],
+                 "examples": json.loads(row["examples"])} for row in rows]
+
+    def fixed_log_ids(self, log_ids: Iterable[str]) -> set:
+        """The given log ids that have been fixed."""
+        log_ids = list(set(log_ids))
+        fixed = set()
+        for i in range(0, len(log_ids), 500):
+            batch = log_ids[i:i + 500]
+            fixed.update(row[0] for row in self._query(
+                f"SELECT log_id FROM logs WHERE log_id IN ({', '.join('?' * len(batch))}) "
+                "AND fixed_by IS NOT NULL", batch))
+        return fixed
+
+    def session_statuses(self, session_id: str) -> List[str]:
+        """Statuses of a session's attempts, oldest first."""
+        return [row[0] for row in self._query(
+            "SELECT status FROM logs WHERE session_id = ? ORDER BY seq", (session_id,))]
+
+    def search(self, query: str, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Logs whose error message or stderr match an FTS5 query, best match first.
+
+        Archived logs match too: their index entries are kept when their text
+        moves to a segment.
+        """
+        sql = ("SELECT logs.*, codes.body AS code_body "
+               "FROM logs_fts JOIN logs ON logs.seq = logs_fts.rowid "
+               "LEFT JOIN codes USING (code_id) WHERE logs_fts MATCH ?")
+        params: List[Any] = [query]
+        if status:
+            sql += " AND logs.status = ?"
+            params.append(status)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return self._logs(self._query(sql, params))
+
+    # Compaction and retention
+
+    def compact(self, hot_days: Optional[int] = None, retention_days: Optional[int] = None,
+                vacuum: Optional[bool] = None) -> Dict[str, int]:
+        """Archive the text of logs older than hot_days and delete logs older than retention_days.
+
+        Safe to run while logs are written; the app runs it in the background.
+        vacuum: True to VACUUM now, False never, None (default) once the
+        vacuum interval has passed and something was archived or deleted.
+        """
+        hot_days = self.hot_days if hot_days is None else hot_days
+        retention_days = self.retention_days if retention_days is None else retention_days
+        if self.writer is not None:
+            self.writer.flush(timeout=10)
+        stats = {"archived": 0, "deleted": 0, "segments_dropped": 0}
+
+        cutoff = (datetime.now() - timedelta(days=hot_days)).isoformat()
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT logs.*, codes.sha AS code_sha FROM logs LEFT JOIN codes USING (code_id) "
+                    "WHERE segment IS NULL AND timestamp < ? ORDER BY seq LIMIT ?",
+                    (cutoff, _COMPACT_BATCH)).fetchall()
+                if not rows:
+                    break
+                records = [dict(_row_fields(row), code_sha=row["code_sha"]) for row in rows]
+                for record in records:
+                    del record["code"]
+                # Written and synced before the rows give up their copy
+                placed = append_records(self.segments_dir, records, self.segment_max_bytes)
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "UPDATE logs SET segment = ?, segment_offset = ?, "
+                        f"{', '.join(f + ' = NULL' for f in ARCHIVED_FIELDS)} WHERE log_id = ?",
+                        [(segment, offset, log_id) for log_id, (segment, offset) in placed.items()])
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            stats["archived"] += len(rows)
+
+        if retention_days:
+            keep_from = (date.today() - timedelta(days=retention_days)).isoformat()
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # The triggers leave the index entries of archived logs alone;
+                    # removing one takes the stderr it was indexed with
+                    for row in self._conn.execute(
+                            "SELECT seq, log_id, error_message, segment, segment_offset FROM logs "
+                            "WHERE timestamp < ? AND segment IS NOT NULL", (keep_from,)).fetchall():
+                        self._conn.execute(
+                            "INSERT INTO logs_fts (logs_fts, rowid, error_message, stderr) VALUES ('delete', ?, ?, ?)",
+                            (row["seq"], row["error_message"], self._archived_stderr(row)))
+                    stats["deleted"] = self._conn.execute(
+                        "DELETE FROM logs WHERE timestamp < ?", (keep_from,)).rowcount
+                    self._conn.execute(
+                        "DELETE FROM sessions WHERE NOT EXISTS "
+                        "(SELECT 1 FROM logs WHERE logs.session_id = sessions.session_id)")
+                    self._conn.execute(
+                        "DELETE FROM codes WHERE NOT EXISTS (SELECT 1 FROM logs WHERE logs.code_id = codes.code_id)")
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                stats["segments_dropped"] = drop_segments_before(self.segments_dir, keep_from)
+                with self._members_lock:
+                    self._members.clear()
+            if stats["deleted"]:
+                self.rebuild_analysis()
+
+        if stats["archived"] or stats["deleted"]:
+            self._set_meta(_VACUUM_PENDING, "1")
+            print(f"✓ Compacted execution logs: {stats['archived']} archived, {stats['deleted']} deleted, "
+                  f"{stats['segments_dropped']} segment(s) dropped")
+        if vacuum is None:
+            vacuum = self._get_meta(_VACUUM_PENDING) == "1" and self._vacuum_due()
+        stats["vacuumed"] = bool(vacuum)
+        if vacuum:
+            self.vacuum()
+        return stats
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _vacuum_due(self) -> bool:
+        last = self._get_meta(_VACUUMED_AT)
+        return last is None or datetime.now() - datetime.fromisoformat(last) >= timedelta(hours=self.vacuum_interval_hours)
+
+    def vacuum(self):
+        """Rewrite the database file without the space archived and deleted rows left behind.
+
+        Runs on a connection of its own without taking the store lock, so
+        reads go on from their WAL snapshot; log writes wait for it (the
+        app's writes queue in LogWriter meanwhile).
+        """
+        started = time.time()
+        with self._write_gate:
+            self._vacuuming.set()
+            conn = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None)
+            try:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            finally:
+                conn.close()
+                self._vacuuming.clear()
+        self._set_meta(_VACUUM_PENDING, "0")
+        self._set_meta(_VACUUMED_AT, datetime.now().isoformat())
+        print(f"✓ Vacuumed execution log store in {time.time() - started:.1f}s")
+
+    # Migration from the JSON tree
+
+    def migrate_json_tree(self, logs_dir: pathlib.Path, force: bool = False) -> int:
+        """Import logs/failures|successes/*/*.json and logs/sessions/*.json once.
+
+        Already imported logs are skipped, so a forced rerun only adds new files.
+        Returns the number of logs imported.
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = ?", (_JSON_TREE_MIGRATED,)).fetchone()
+        if done and not force:
+            return 0
+
+        logs = []
+        for kind in ("failures", "successes"):
+            for log_file in sorted((logs_dir / kind).glob("*/*.json")):
+                try:
+                    data = json.loads(log_file.read_text(encoding="utf-8"))
+                except Exception as e:
+                    print(f"⚠ Skipping unreadable log file {log_file}: {e}")
+                    continue
+                if isinstance(data, dict) and data.get("log_id"):
+                    data.setdefault("session_id", data["log_id"])
+                    data.setdefault("status", "failed" if kind == "failures" else "success")
+                    data.setdefault("timestamp", "")
+                    logs.append(data)
+        logs.sort(key=lambda log: log["timestamp"])
+
+        sessions = []
+        for session_file in sorted((logs_dir / "sessions").glob("*.json")):
+            try:
+                data = json.loads(session_file.read_text(encoding="utf-8"))
+                sessions.append((data["session_id"], data.get("created_at") or "",
+                                 data.get("updated_at") or data.get("created_at") or "",
+                                 data.get("status") or "in_progress", data.get("resolved_at")))
+            except Exception as e:
+                print(f"⚠ Skipping unreadable session file {session_file}: {e}")
+
+        imported = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for log in logs:
+                    imported += self._insert(log, or_ignore=True)
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO sessions (session_id, created_at, updated_at, status, resolved_at) "
+                    "VALUES (?, ?, ?, ?, ?)", sessions)
+                # Sessions whose file was missing
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, created_at, updated_at, status, resolved_at) "
+                    "SELECT session_id, MIN(timestamp), MAX(timestamp), "
+                    "CASE WHEN SUM(status = 'success') > 0 THEN 'resolved' ELSE 'in_progress' END, "
+                    "MAX(CASE WHEN status = 'success' THEN timestamp END) FROM logs GROUP BY session_id")
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                   (_JSON_TREE_MIGRATED, datetime.now().isoformat()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if imported:
+            self.rebuild_analysis()
+            print(f"✓ Imported {imported} execution logs from {logs_dir} into {self.db_path}")
+        return imported
+
+    def get_stats(self) -> Dict[str, Any]:
+        segments = list_segments(self.segments_dir)
+        db_files = [self.db_path, self.db_path.with_name(self.db_path.name + "-wal")]
+        return {
+            "writer": self.writer.get_stats() if self.writer else None,
+            "logs": self.count(),
+            "failures": self.count("failed"),
+            "successes": self.count("success"),
+            "archived": self._query("SELECT COUNT(*) FROM logs WHERE segment IS NOT NULL")[0][0],
+            "scripts": self._query("SELECT COUNT(*) FROM codes")[0][0],
+            "sessions": self._query("SELECT COUNT(*) FROM sessions")[0][0],
+            "segments": len(segments),
+            "segment_bytes": sum(p.stat().st_size for p in segments),
+            "database_bytes": sum(p.stat().st_size for p in db_files if p.exists()),
+            "path": str(self.db_path),
+        }
+
+
+class LogWriter:
+    """Writes logs to a LogStore from a background thread, in batches.
+
+    submit() only queues the log, so a request never waits on log I/O. The
+    writer thread takes whatever is queued (up to batch_size) and commits it
+    in one transaction, in submission order. The queue is bounded: when it
+    is full, submit() waits for room rather than dropping the log (a batch
+    commits in milliseconds). flush() waits until
+    everything submitted so far is committed; close() flushes and stops the
+    thread (the app calls it on shutdown, atexit covers other exits).
+    """
+
+    _STOP = object()
+
+    def __init__(self, store: "LogStore", max_queue: int = 1000, batch_size: int = 100):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._thread: Optional[threading.Thread] = None
+        self._atexit = False
+        self.batches = 0
+        self.full_waits = 0
+        self.failed = 0
+
+    def _start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.close)
+                    self._atexit = True
+
+    def submit(self, log: Dict[str, Any], fixes: Optional[str] = None):
+        """Queue a log (see LogStore.add_batch) and return immediately."""
+        self._start()
+        with self._cond:
+            self._submitted += 1
+        try:
+            self._queue.put_nowait((log, fixes))
+        except queue.Full:
+            self.full_waits += 1
+            self._queue.put((log, fixes))
+
+    def _write(self, batch: List[Tuple[Dict[str, Any], Optional[str]]]):
+        try:
+            self.store.add_batch(batch)
+        except Exception as e:
+            if len(batch) > 1:
+                # Keep the rest of the batch when one entry is bad
+                for entry in batch:
+                    self._write([entry])
+                return
+            self.failed += 1
+            print(f"⚠ Failed to write execution log {batch[0][0].get('log_id')}: {e}")
+        with self._cond:
+            self._written += len(batch)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, stop = [], item is self._STOP
+            if not stop:
+                batch.append(item)
+            while len(batch) < self.batch_size and not stop:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self.batches += 1
+                self._write(batch)
+            if stop:
+                return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every log submitted before the call is stored."""
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout: Optional[float] = 30):
+        """Write what is queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "submitted": self._submitted,
+            "written": self._written,
+            "batches": self.batches,
+            "full_waits": self.full_waits,
+            "failed": self.failed,
+        }
+
+
+# One store per database file
+_stores: Dict[str, LogStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_log_store(logs_dir: pathlib.Path) -> LogStore:
+    """Get or create the store for logs_dir (importing its JSON tree on first open)."""
+    db_path = pathlib.Path(os.getenv("LOG_STORE_PATH", str(pathlib.Path(logs_dir) / "execution_logs.db")))
+    key = str(db_path.resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = LogStore(
+                db_path,
+                hot_days=int(os.getenv("LOG_HOT_DAYS", "7")),
+                retention_days=int(os.getenv("LOG_RETENTION_DAYS", "0")),
+                segment_max_bytes=int(os.getenv("LOG_SEGMENT_MAX_BYTES", str(4 << 20))),
+                vacuum_interval_hours=float(os.getenv("LOG_VACUUM_INTERVAL_HOURS", "24")),
+            )
+            store.migrate_json_tree(pathlib.Path(logs_dir))
+            store.writer = LogWriter(
+                store,
+                max_queue=int(os.getenv("LOG_QUEUE_SIZE", "1000")),
+                batch_size=int(os.getenv("LOG_BATCH_SIZE", "100")),
+            )
+            _stores[key] = store
+    return store
+
+
+if __name__ == "__main__":
+    # python backend/log_store.py migrate [logs_dir]           - re-import the JSON tree (new files only)
+    # python backend/log_store.py rebuild-analysis [logs_dir]  - recompute the analysis counters
+    # python backend/log_store.py compact [logs_dir]           - archive cold logs, apply retention, vacuum
+    if len(sys.argv) < 2 or sys.argv[1] not in ("migrate", "rebuild-analysis", "compact"):
+        print("Usage: python backend/log_store.py migrate|rebuild-analysis|compact [logs_dir]")
+        sys.exit(1)
+    logs_dir = pathlib.Path(sys.argv[2]) if len(sys.argv) > 2 else pathlib.Path(__file__).parent.parent / "logs"
+    store = get_log_store(logs_dir)
+    if sys.argv[1] == "migrate":
+        store.migrate_json_tree(logs_dir, force=True)
+    elif sys.argv[1] == "compact":
+        store.compact(vacuum=True)
+    else:
+        store.rebuild_analysis()
+    print(json.dumps(store.get_stats(), indent=2))
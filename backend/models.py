@@ -6,6 +6,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
+import json
 
 Base = declarative_base()
 
@@ -141,6 +142,7 @@ class LibraryImage(Base):
     width = Column(Integer)
     height = Column(Integer)
     file_size = Column(Integer)  # In bytes
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file (see blob_store)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     tags = Column(JSON, default=list)
     
@@ -154,9 +156,12 @@ class LibraryImage(Base):
             "category": self.category,
             "url": f"/library/images/{self.filename}",
             "thumbnail_url": f"/library/images/{self.filename}?thumbnail=true",
+            "preview_url": f"/library/images/{self.filename}?preview=true",
+            "dzi_url": f"/tiles/library/{self.filename}.dzi",
             "width": self.width,
             "height": self.height,
             "file_size": self.file_size,
+            "content_hash": self.content_hash,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "tags": self.tags or []
         }
@@ -169,12 +174,13 @@ class UserImage(Base):
     id = Column(String(36), primary_key=True, default=generate_uuid)
     user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     name = Column(String(255), nullable=False, index=True)
-    filename = Column(String(255), nullable=False)  # Points to assets/uploads/{filename}
+    filename = Column(String(255), nullable=False)  # assets/uploads/{filename}, shared by rows with the same content
     description = Column(Text, default="")
     image_type = Column(String(50), index=True)  # SEM, SDB, TEM, OPTICAL
     width = Column(Integer)
     height = Column(Integer)
     file_size = Column(Integer)  # In bytes
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file (see blob_store)
     uploaded_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     is_global = Column(Boolean, default=False, index=True)  # Shared with all users
     
@@ -191,9 +197,12 @@ class UserImage(Base):
             "type": self.image_type,
             "url": f"/uploads/images/{self.filename}",
             "thumbnail_url": f"/uploads/images/{self.filename}?thumbnail=true",
+            "preview_url": f"/uploads/images/{self.filename}?preview=true",
+            "dzi_url": f"/tiles/uploads/{self.filename}.dzi",
             "width": self.width,
             "height": self.height,
             "file_size": self.file_size,
+            "content_hash": self.content_hash,
             "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
             "is_global": self.is_global or False
         }
@@ -230,7 +239,7 @@ class ExecutionSession(Base):
     script_name = Column(String(255))  # Store name in case script is deleted
     started_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     completed_at = Column(DateTime)
-    status = Column(String(50), index=True)  # success, error, timeout, running
+    status = Column(String(50), index=True)  # success, error, timeout, running, rejected
     error_message = Column(Text)
     
     # Relationships
@@ -248,3 +257,51 @@ class ExecutionSession(Base):
             "status": self.status,
             "error_message": self.error_message
         }
+
+
+class ExecutionJob(Base):
+    """Queued script execution submitted through the /jobs API.
+
+    Rows outlive the backend process so queued and interrupted jobs are
+    picked up again after a restart.
+    """
+    __tablename__ = "execution_jobs"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), nullable=False, index=True)  # May be an anonymous id, so no FK
+    session_id = Column(String(36), nullable=True, index=True)
+    status = Column(String(50), nullable=False, default="queued", index=True)  # queued, running, success, error, timeout, cancelled
+    priority = Column(Integer, nullable=False, default=0, index=True)  # Higher runs first
+    code = Column(Text, nullable=False)
+    script_parameters = Column(Text, default="")
+    user_prompt = Column(Text)
+    ai_model = Column(String(100))
+    previous_attempt_id = Column(String(36))
+    debug_mode_activated = Column(Boolean, default=False)
+    input_filename = Column(String(255))  # File name inside outputs/{id}/input
+    attempts = Column(Integer, nullable=False, default=0)
+    status_code = Column(Integer)  # HTTP status /run would have returned
+    result_json = Column(Text)  # /run response payload
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+
+    def to_dict(self, include_result: bool = True):
+        data = {
+            "id": self.id,
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "error_message": self.error_message,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+        }
+        if include_result:
+            data["status_code"] = self.status_code
+            data["result"] = json.loads(self.result_json) if self.result_json else None
+        return data
@@ -0,0 +1,114 @@
+"""
+Per-output metadata written by the sandbox runner.
+
+After the user's code has run, job_runner.py describes every file in result/
+while it is still in the sandbox's page cache: byte size, SHA-256 and, for
+images, dimensions, mode, dtype and page count, plus a PNG preview of at
+most 1024 px (same stretch rules as image_normalize). It writes them to
+result/.maps/manifest.json and result/.maps/previews/.
+
+The run response carries that metadata in output_files, so the frontend gets
+everything in one response and shows the previews (served from disk as-is)
+instead of fetching every output through GET /outputs, which converts TIFFs
+and re-encodes PNG/JPEGs. An entry is only used while its file's size and
+mtime still match. Outputs without one (older runner image, cached results)
+get the header-based metadata as before.
+
+The manifest is written inside the sandbox, so it is display metadata only:
+names are checked against result/ and values against their expected types.
+"""
+
+import os
+import json
+import pathlib
+from typing import Any, Dict, Iterable
+
+MANIFEST_DIR = ".maps"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Entry fields copied into output_files, with their expected types
+_FIELDS = {
+    "size": int,
+    "sha256": str,
+    "width": int,
+    "height": int,
+    "mode": str,
+    "dtype": str,
+    "pages": int,
+}
+# Allowed mtime difference (coarse timestamps on some volume mounts)
+_MTIME_TOLERANCE_NS = 2_000_000_000
+
+
+def preview_name(name: str) -> str:
+    return f"previews/{name}.png"
+
+
+def read_manifest(out_dir: pathlib.Path) -> Dict[str, Dict[str, Any]]:
+    """Manifest entries by file name, for files still as the runner described them."""
+    try:
+        data = json.loads((out_dir / MANIFEST_DIR / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return {}
+    entries = {}
+    for entry in data.get("files") or []:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get("name")
+        if not isinstance(name, str) or not name or name.startswith(".") or "/" in name or "\\" in name:
+            continue
+        try:
+            stat = (out_dir / name).stat()
+        except OSError:
+            continue
+        mtime_ns = entry.get("mtime_ns")
+        if entry.get("size") != stat.st_size or not isinstance(mtime_ns, int) \
+                or abs(mtime_ns - stat.st_mtime_ns) > _MTIME_TOLERANCE_NS:
+            continue
+        entries[name] = entry
+    return entries
+
+
+def output_metadata(entry: Dict[str, Any], out_dir: pathlib.Path, url_prefix: str) -> Dict[str, Any]:
+    """Fields of a manifest entry for output_files, with preview_url when the preview exists."""
+    info = {
+        field: entry[field]
+        for field, expected in _FIELDS.items()
+        if isinstance(entry.get(field), expected) and not isinstance(entry.get(field), bool)
+    }
+    preview = preview_name(entry["name"])
+    if entry.get("preview") == preview and (out_dir / MANIFEST_DIR / preview).is_file():
+        info["preview_url"] = f"{url_prefix}/{MANIFEST_DIR}/{preview}"
+    return info
+
+
+def is_manifest_path(filename: str) -> bool:
+    """True for paths under result/.maps/ (served as-is, never converted)."""
+    return filename.startswith(f"{MANIFEST_DIR}/")
+
+
+def adopt_entry(entry: Dict[str, Any], source_dir: pathlib.Path, target_dir: pathlib.Path,
+                name: str) -> Dict[str, Any]:
+    """Entry for a file moved from source_dir to target_dir as name, moving its preview along."""
+    source_preview = preview_name(entry["name"])
+    had_preview = entry.get("preview") == source_preview
+    entry = dict(entry, name=name)
+    entry.pop("preview", None)
+    if had_preview and (source_dir / MANIFEST_DIR / source_preview).is_file():
+        target = target_dir / MANIFEST_DIR / preview_name(name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source_dir / MANIFEST_DIR / source_preview, target)
+        entry["preview"] = preview_name(name)
+    return entry
+
+
+def write_manifest(out_dir: pathlib.Path, entries: Iterable[Dict[str, Any]]):
+    """Write out_dir/.maps/manifest.json (as the runner does)."""
+    manifest_dir = out_dir / MANIFEST_DIR
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_dir / f".{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps({"version": MANIFEST_VERSION, "files": list(entries)}), encoding="utf-8")
+    os.replace(tmp, manifest_dir / MANIFEST_NAME)
@@ -0,0 +1,204 @@
+"""
+Line-by-line streaming of sandbox output.
+
+Runners hand every stdout/stderr line to an optional on_line(stream, line)
+callback as soon as the sandbox prints it, and keep only a bounded tail in
+memory for the final result. JobOutputLog is the backend-side sink: it appends
+the output to the job's logs/stdout.log and turns MapsBridge markers
+([PROGRESS], [ACTIVITY], [INFO], ...) into structured events. The log keeps
+the head of the output (the result keeps the tail), up to the same limit, and
+is written through a buffer: it is called on the event loop for each line.
+
+Configuration (environment):
+    MAX_CAPTURED_OUTPUT_BYTES  Output kept in memory per stream, and written to
+                               a job's stdout.log (default 256 KB)
+"""
+
+import os
+import re
+import pathlib
+import subprocess
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+MAX_CAPTURED_OUTPUT_BYTES = int(os.getenv("MAX_CAPTURED_OUTPUT_BYTES", str(256 * 1024)))
+
+# on_line(stream, line): stream is "stdout" or "stderr"; line has no trailing newline
+LineCallback = Callable[[str, str], None]
+
+_MARKER_RE = re.compile(r"^\[(PROGRESS|ACTIVITY|INFO|NOTE|WARNING|ERROR)\]\s?(.*)$")
+_PERCENT_RE = re.compile(r"^(-?\d+(?:\.\d+)?)\s*%?$")
+
+
+class TailBuffer:
+    """Keeps the last max_bytes of a line stream."""
+
+    def __init__(self, max_bytes: int = MAX_CAPTURED_OUTPUT_BYTES):
+        self.max_bytes = max_bytes
+        self.truncated = False
+        self._lines: deque = deque()
+        self._size = 0
+
+    def append(self, line: str):
+        self._lines.append(line)
+        self._size += len(line) + 1
+        while self._size > self.max_bytes and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft()) + 1
+            self.truncated = True
+
+    def text(self) -> str:
+        if not self._lines:
+            return ""
+        return "\n".join(self._lines) + "\n"
+
+
+def parse_marker(line: str) -> Optional[Dict[str, Any]]:
+    """Parse a MapsBridge status line into an event, or None for plain output.
+
+    Returns {"type": "progress", "percent": float}, {"type": "activity",
+    "message": str} or {"type": "log", "level": str, "message": str}.
+    """
+    match = _MARKER_RE.match(line.strip())
+    if not match:
+        return None
+    marker, message = match.group(1), match.group(2).strip()
+    if marker == "PROGRESS":
+        percent = _PERCENT_RE.match(message)
+        if not percent:
+            return None
+        return {"type": "progress", "percent": max(0.0, min(100.0, float(percent.group(1))))}
+    if marker == "ACTIVITY":
+        return {"type": "activity", "message": message}
+    return {"type": "log", "level": marker.lower(), "message": message}
+
+
+def _take(raw: str, stream: str, tail: TailBuffer, on_line: Optional[LineCallback]):
+    line = raw.rstrip("\r\n")
+    tail.append(line)
+    if on_line is not None:
+        try:
+            on_line(stream, line)
+        except Exception:
+            # A failing callback loses this line only
+            pass
+
+
+def _pump(pipe, stream: str, tail: TailBuffer, on_line: Optional[LineCallback]):
+    """Read pipe to EOF, whatever its lines contain.
+
+    Stopping early would leave the process blocked on a full pipe until its
+    timeout. If a strictly decoding pipe meets bytes that are not UTF-8, the
+    rest is read from its binary buffer with replacement characters (the
+    chunk the decoder failed on is lost).
+    """
+    try:
+        for raw in pipe:
+            _take(raw, stream, tail, on_line)
+        return
+    except UnicodeDecodeError:
+        tail.append("[output skipped: not UTF-8]")
+    except Exception:
+        pass
+    try:
+        for raw in getattr(pipe, "buffer", pipe):
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8", "replace")
+            _take(raw, stream, tail, on_line)
+    except Exception:
+        pass
+
+
+def stream_process_output(
+    process: subprocess.Popen,
+    timeout: Optional[float],
+    on_line: Optional[LineCallback] = None,
+    max_bytes: int = MAX_CAPTURED_OUTPUT_BYTES,
+) -> Tuple[str, str, bool]:
+    """Read a text-mode Popen's stdout/stderr line by line until it exits.
+
+    Returns (stdout_tail, stderr_tail, truncated). Raises
+    subprocess.TimeoutExpired if the process outlives timeout; the caller is
+    responsible for killing it.
+    """
+    tails = {"stdout": TailBuffer(max_bytes), "stderr": TailBuffer(max_bytes)}
+    threads = []
+    for stream, pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+        if pipe is None:
+            continue
+        thread = threading.Thread(target=_pump, args=(pipe, stream, tails[stream], on_line), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    process.wait(timeout=timeout)
+    for thread in threads:
+        # The pipes close when the process exits; this only drains what is left
+        thread.join(timeout=5)
+    return (tails["stdout"].text(), tails["stderr"].text(),
+            tails["stdout"].truncated or tails["stderr"].truncated)
+
+
+class JobOutputLog:
+    """Per-job output sink: full log on disk, structured events to a publisher.
+
+    Use as the runner's on_line callback. publish(event, data) receives
+    "output" events for every line plus "progress", "activity" and "log"
+    events for MapsBridge markers. The file gets the first max_bytes of the
+    output, then a truncation note; it is complete on disk after close().
+    """
+
+    def __init__(self, path: pathlib.Path, publish: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 max_bytes: int = MAX_CAPTURED_OUTPUT_BYTES):
+        self.path = path
+        self.publish = publish
+        self.max_bytes = max_bytes
+        self.progress: Optional[float] = None
+        self.activity: Optional[str] = None
+        self.line_count = 0
+        self.bytes_written = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(path, "a", encoding="utf-8", buffering=64 * 1024)
+        except Exception as e:
+            print(f"Warning: Could not open output log {path}: {e}")
+            self._fh = None
+
+    def __call__(self, stream: str, line: str):
+        with self._lock:
+            self.line_count += 1
+            if self._fh is not None and not self.truncated:
+                try:
+                    size = len(line.encode("utf-8", "replace")) + 1
+                    if self.bytes_written + size <= self.max_bytes:
+                        self._fh.write(line + "\n")
+                        self.bytes_written += size
+                    else:
+                        self._fh.write(f"[output truncated: the log keeps the first {self.max_bytes} bytes]\n")
+                        self.truncated = True
+                except Exception:
+                    pass
+
+        marker = parse_marker(line)
+        if marker is not None:
+            if marker["type"] == "progress":
+                self.progress = marker["percent"]
+            elif marker["type"] == "activity":
+                self.activity = marker["message"]
+        if self.publish is None:
+            return
+        self.publish("output", {"stream": stream, "line": line})
+        if marker is not None:
+            event_type = marker.pop("type")
+            self.publish(event_type, marker)
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                try:
+                    self._fh.close()
+                except Exception:
+                    pass
+                self._fh = None
@@ -0,0 +1,223 @@
+"""
+Opt-in memoization of script results.
+
+A run is identified by (normalised code, input image content hash,
+script_parameters, runner image). When RESULT_CACHE_ENABLED is set, a
+successful run's result/ files are stored content-addressed under
+blobs/{sha256} with a small JSON manifest per key; a later run with the same
+key gets the files copied into its own result/ directory and the recorded
+stdout instead of starting a sandbox. Scripts whose output depends on time or
+randomness should be run with use_cache=false.
+
+The store must not be reachable from a sandbox: result directories are
+writable by scripts, so blobs are copied rather than hardlinked into them,
+and the default location is outside outputs/ (which the runtimes mount
+parts of). It is bounded by its own size limit and TTL.
+
+Blobs are hashed and copied without holding the cache lock, so one run
+storing large outputs does not hold up other runs' lookups; the blobs a
+store or lookup is working with are pinned so that prune() leaves them be.
+
+Configuration (environment):
+    RESULT_CACHE_ENABLED    Turn memoization on (default off)
+    RESULT_CACHE_DIR        Store location (default result_cache/ next to outputs/)
+    RESULT_CACHE_MAX_BYTES  Blob size limit before oldest entries go (default 5 GB)
+    RESULT_CACHE_TTL        Seconds a cached result stays valid (default 7 days)
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import pathlib
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+def normalize_code(code: str) -> str:
+    """Normalise line endings and trailing whitespace.
+
+    Indentation is kept: unlike ScriptLogger._get_code_hash (which is only
+    used to spot near-duplicates), two scripts here must behave identically.
+    """
+    lines = [line.rstrip() for line in code.replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def _hash_file(path: pathlib.Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed store of successful run outputs."""
+
+    def __init__(self, root: pathlib.Path, max_bytes: int = 5 * 1024 ** 3, ttl: float = 7 * 24 * 3600):
+        self.root = pathlib.Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.entries_dir = self.root / "entries"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Blob digests in use by a store() or lookup() in progress; prune() keeps them
+        self._pinned: Counter = Counter()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(code: str, input_digest: Optional[str], script_parameters: Optional[str],
+                 runner_digest: str) -> str:
+        material = json.dumps([
+            hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest(),
+            input_digest or "",
+            (script_parameters or "").strip(),
+            runner_digest,
+        ])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.entries_dir / f"{key}.json"
+
+    def _unpin(self, digests: Iterable[str]):
+        with self._lock:
+            self._pinned.subtract(digests)
+            self._pinned += Counter()
+
+    def lookup(self, key: str, out_dir: pathlib.Path) -> Optional[Dict[str, Any]]:
+        """Copy a cached result into out_dir and return its manifest, or None on a miss."""
+        entry_path = self._entry_path(key)
+        with self._lock:
+            try:
+                manifest = json.loads(entry_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            if time.time() - manifest.get("created_at", 0) > self.ttl:
+                entry_path.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+            digests = [item["sha256"] for item in manifest["files"]]
+            self._pinned.update(digests)
+        try:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            for item in manifest["files"]:
+                shutil.copyfile(self.blobs_dir / item["sha256"], out_dir / item["name"])
+        except OSError:
+            # A blob went missing: treat as a miss and let the run repopulate it
+            entry_path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        finally:
+            self._unpin(digests)
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return manifest
+
+    def store(self, key: str, out_dir: pathlib.Path, stdout: str, stdout_truncated: bool = False):
+        """Record the top-level files of a successful run's result directory."""
+        files: List[Dict[str, Any]] = []
+        try:
+            for path in sorted(out_dir.iterdir()):
+                # A symlink written by the script could point anywhere on the host
+                if not path.is_file() or path.is_symlink():
+                    continue
+                digest = _hash_file(path)
+                with self._lock:
+                    self._pinned[digest] += 1
+                files.append({"name": path.name, "sha256": digest, "size": path.stat().st_size})
+                blob = self.blobs_dir / digest
+                if not blob.exists():
+                    fd, tmp_name = tempfile.mkstemp(prefix=f".{digest}.", suffix=".tmp", dir=self.blobs_dir)
+                    os.close(fd)
+                    tmp = pathlib.Path(tmp_name)
+                    try:
+                        shutil.copyfile(path, tmp)
+                        tmp.chmod(0o444)
+                        os.replace(tmp, blob)
+                    except BaseException:
+                        tmp.unlink(missing_ok=True)
+                        raise
+            manifest = {
+                "created_at": time.time(),
+                "files": files,
+                "stdout": stdout,
+                "stdout_truncated": stdout_truncated,
+            }
+            with self._lock:
+                tmp_entry = self.entries_dir / f".{key}.tmp"
+                tmp_entry.write_text(json.dumps(manifest), encoding="utf-8")
+                os.replace(tmp_entry, self._entry_path(key))
+        finally:
+            self._unpin(item["sha256"] for item in files)
+        self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the oldest ones until blobs fit in max_bytes."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry_path in self.entries_dir.glob("*.json"):
+                try:
+                    manifest = json.loads(entry_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    entry_path.unlink(missing_ok=True)
+                    continue
+                if now - manifest.get("created_at", 0) > self.ttl:
+                    entry_path.unlink(missing_ok=True)
+                    continue
+                entries.append((entry_path.stat().st_mtime, entry_path, manifest))
+
+            blob_sizes = {p.name: p.stat().st_size for p in self.blobs_dir.iterdir() if not p.name.startswith(".")}
+            referenced = {item["sha256"] for _, _, m in entries for item in m.get("files", [])}
+            total = sum(size for name, size in blob_sizes.items() if name in referenced)
+
+            # Least recently used first (lookup touches the entry)
+            entries.sort(key=lambda e: e[0])
+            while total > self.max_bytes and entries:
+                _, entry_path, _ = entries.pop(0)
+                entry_path.unlink(missing_ok=True)
+                referenced = {item["sha256"] for _, _, m in entries for item in m.get("files", [])}
+                total = sum(size for name, size in blob_sizes.items() if name in referenced)
+
+            for name in blob_sizes:
+                if name not in referenced and not self._pinned[name]:
+                    (self.blobs_dir / name).unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": sum(1 for _ in self.entries_dir.glob("*.json")),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Singleton instance
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache(default_root: pathlib.Path) -> Optional[ResultCache]:
+    """Get the result cache singleton, or None unless RESULT_CACHE_ENABLED is set."""
+    global _cache
+    if os.getenv("RESULT_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        _cache = ResultCache(
+            pathlib.Path(os.getenv("RESULT_CACHE_DIR", str(default_root))),
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(5 * 1024 ** 3))),
+            ttl=float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+    return _cache
@@ -10,17 +10,27 @@ for MAPS run in the helper without modification. All names use snake_case.
 Real MAPS: from_stdin() reads JSON from stdin; output functions send JSON to stdout.
 This helper: from_stdin() builds a request from /input images; output functions
 write files to /output for the UI. Request/response protocol is not used.
+
+Tile sets: by default the input image(s) form a single 1x1 tile. When the input
+directory holds MAPS-named tiles (Tile_RRR-CCC-...) or a tileset.json with
+"mode": "grid", from_stdin() builds a full grid instead: one tile per file (or
+per page of a multi-page TIFF) with real column/row counts, overlap and
+tile_center_pixel_offset. tileset.json may also set "columns", "rows",
+"overlap" and "tiles_to_process" ([[column, row], ...]); the backend's tile
+fan-out adds "shard": {"index", "count"} so each worker gets a slice.
 """
 
 import os
+import re
 import sys
+import math
 import shutil
 import uuid
 import json
 import tempfile
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 try:
     from PIL import Image
@@ -212,6 +222,17 @@ class TileSetInfo:
     vertical_overlap: float
     channels: List[ChannelInfo]
     tiles: List[TileInfo]
+    _tile_index: Optional[Tuple[int, int, Dict[Tuple[int, int], TileInfo]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def get_tile(self, column: int, row: int) -> Optional[TileInfo]:
+        """Tile at (column, row). The (column, row) index is built on first use
+        and rebuilt only if the tiles list is replaced or resized."""
+        key = (id(self.tiles), len(self.tiles))
+        if self._tile_index is None or self._tile_index[:2] != key:
+            self._tile_index = key + ({(t.column, t.row): t for t in self.tiles},)
+        return self._tile_index[2].get((column, row))
 
     @staticmethod
     def from_json(source_tile_layer_data: dict) -> "TileSetInfo":
@@ -405,22 +426,34 @@ class ScriptTileSetRequest(ScriptRequest):
 
         image_files = _scan_input_images(input_dir)
         script_params = os.environ.get("MAPS_SCRIPT_PARAMETERS", "")
+        config = _load_tileset_config(input_dir)
+        grid = _grid_tile_files(image_files, config)
 
         tile_pixel_width = 1024
         tile_pixel_height = 1024
         pixel_format = "Gray8"
 
-        if image_files and HAS_PIL:
+        if grid is not None:
+            data_folder, tile_files, _, _ = grid
+            first_tile = tile_files[min(tile_files, key=lambda cr: (cr[1], cr[0]))]
+            probe_image = data_folder / first_tile[min(first_tile, key=int)]
+        else:
+            data_folder = input_dir
+            probe_image = image_files[0] if image_files else None
+
+        if probe_image is not None and HAS_PIL:
             try:
-                first_image = Image.open(image_files[0])
-                tile_pixel_width, tile_pixel_height = first_image.size
-                if first_image.mode == 'L':
+                # Header only: PIL decodes pixels lazily, and the file is closed right away
+                with Image.open(probe_image) as first_image:
+                    tile_pixel_width, tile_pixel_height = first_image.size
+                    mode = first_image.mode
+                if mode == 'L':
                     pixel_format = "Gray8"
-                elif first_image.mode == 'I;16':
+                elif mode in ('I;16', 'I;16B', 'I;16L'):
                     pixel_format = "Gray16"
-                elif first_image.mode == 'RGB':
+                elif mode == 'RGB':
                     pixel_format = "Bgr24"
-                elif first_image.mode == 'RGBA':
+                elif mode == 'RGBA':
                     pixel_format = "Bgra32"
                 _debug(f"Extracted image metadata: {tile_pixel_width}x{tile_pixel_height}, format={pixel_format}")
             except Exception as e:
@@ -431,9 +464,45 @@ class ScriptTileSetRequest(ScriptRequest):
         tile_height_meters = tile_pixel_height * pixel_size_meters
 
         default_channel = ChannelInfo(index=0, name="Default", color="#FFFFFF")
+        channels = [default_channel]
+        column_count = 1
+        row_count = 1
+        horizontal_overlap = 0.0
+        vertical_overlap = 0.0
+        total_width_meters = tile_width_meters
+        total_height_meters = tile_height_meters
 
         tiles = []
-        if image_files:
+        if grid is not None:
+            _, tile_files, column_count, row_count = grid
+            horizontal_overlap = _clamp_overlap(config.get("horizontal_overlap", config.get("overlap", 0.0)))
+            vertical_overlap = _clamp_overlap(config.get("vertical_overlap", config.get("overlap", 0.0)))
+            first_column = min(c for c, _ in tile_files)
+            first_row = min(r for _, r in tile_files)
+
+            # Same layout calculate_total_pixel_position() assumes
+            spacing_x = tile_pixel_width * (1 - horizontal_overlap)
+            spacing_y = tile_pixel_height * (1 - vertical_overlap)
+            total_pixel_width = spacing_x * column_count + tile_pixel_width * horizontal_overlap
+            total_pixel_height = spacing_y * row_count + tile_pixel_height * vertical_overlap
+            total_width_meters = total_pixel_width * pixel_size_meters
+            total_height_meters = total_pixel_height * pixel_size_meters
+
+            for (column, row) in sorted(tile_files, key=lambda cr: (cr[1], cr[0])):
+                # Offset of this tile's centre from the tile set centre, in pixels (y down)
+                offset_x = (column - first_column) * spacing_x + tile_pixel_width / 2 - total_pixel_width / 2
+                offset_y = (row - first_row) * spacing_y + tile_pixel_height / 2 - total_pixel_height / 2
+                tiles.append(TileInfo(
+                    column=column,
+                    row=row,
+                    stage_position=PointFloat(x=offset_x * pixel_size_meters, y=-offset_y * pixel_size_meters),
+                    tile_center_pixel_offset=PointInt(x=int(round(offset_x)), y=int(round(offset_y))),
+                    image_file_names=tile_files[(column, row)]
+                ))
+
+            channel_indexes = sorted({int(k) for names in tile_files.values() for k in names})
+            channels = [ChannelInfo(index=i, name=f"Channel {i}", color="#FFFFFF") for i in channel_indexes]
+        elif image_files:
             image_file_names = {}
             for idx, img_path in enumerate(image_files):
                 image_file_names[str(idx)] = img_path.name
@@ -456,12 +525,12 @@ class ScriptTileSetRequest(ScriptRequest):
         source_tile_set = TileSetInfo(
             guid=uuid.uuid4(),
             name="LocalTestTileSet",
-            data_folder_path=str(input_dir),
-            column_count=1,
-            row_count=1,
-            channel_count=1,
+            data_folder_path=str(data_folder),
+            column_count=column_count,
+            row_count=row_count,
+            channel_count=len(channels),
             is_completed=True,
-            size=SizeFloat(width=tile_width_meters, height=tile_height_meters),
+            size=SizeFloat(width=total_width_meters, height=total_height_meters),
             tile_size=SizeFloat(width=tile_width_meters, height=tile_height_meters),
             tile_resolution=SizeInt(width=tile_pixel_width, height=tile_pixel_height),
             pixel_format=pixel_format,
@@ -471,13 +540,21 @@ class ScriptTileSetRequest(ScriptRequest):
             acquisition_stage_position=PointFloat(x=0.0, y=0.0),
             acquisition_stage_rotation=0.0,
             acquisition_rotation=0.0,
-            horizontal_overlap=0.0,
-            vertical_overlap=0.0,
-            channels=[default_channel],
+            horizontal_overlap=horizontal_overlap,
+            vertical_overlap=vertical_overlap,
+            channels=channels,
             tiles=tiles
         )
 
-        tiles_to_process = [Tile(column=1, row=1)] if tiles else []
+        tiles_to_process = [Tile(column=t.column, row=t.row) for t in tiles]
+        if config.get("tiles_to_process") is not None:
+            wanted = {(int(c), int(r)) for c, r in config["tiles_to_process"]}
+            tiles_to_process = [t for t in tiles_to_process if (t.column, t.row) in wanted]
+        shard = config.get("shard")
+        if shard:
+            # Parallel fan-out: this worker handles every count-th tile
+            tiles_to_process = tiles_to_process[int(shard["index"])::int(shard["count"])]
+            _write_shard_tiles(tiles_to_process)
 
         request = ScriptTileSetRequest(
             request_type="TileSetRequest",
@@ -488,7 +565,8 @@ class ScriptTileSetRequest(ScriptRequest):
             tiles_to_process=tiles_to_process
         )
 
-        _debug(f"Created ScriptTileSetRequest with {len(tiles)} tiles")
+        _debug(f"Created ScriptTileSetRequest with {len(tiles)} tiles "
+               f"({column_count}x{row_count}), {len(tiles_to_process)} to process")
         return request
 
 
@@ -530,8 +608,8 @@ class ScriptImageLayerRequest(ScriptRequest):
 
         if image_files and HAS_PIL:
             try:
-                first_image = Image.open(image_files[0])
-                layer_pixel_width, layer_pixel_height = first_image.size
+                with Image.open(image_files[0]) as first_image:
+                    layer_pixel_width, layer_pixel_height = first_image.size
                 _debug(f"Extracted image metadata: {layer_pixel_width}x{layer_pixel_height}")
             except Exception as e:
                 _debug(f"Failed to extract image metadata: {e}")
@@ -1036,8 +1114,8 @@ def create_image_layer(
         layer_pixel_width, layer_pixel_height = 1024, 1024
         if source_path.exists() and HAS_PIL:
             try:
-                img = Image.open(source_path)
-                layer_pixel_width, layer_pixel_height = img.size
+                with Image.open(source_path) as img:
+                    layer_pixel_width, layer_pixel_height = img.size
             except Exception:
                 pass
 
@@ -1129,7 +1207,7 @@ def create_annotation_async(
 # ============================================================================
 
 def get_tile_info(tile_column: int, tile_row: int, tile_set: TileSetInfo) -> Optional[TileInfo]:
-    return next((t for t in tile_set.tiles if t.column == tile_column and t.row == tile_row), None)
+    return tile_set.get_tile(tile_column, tile_row)
 
 
 def tile_pixel_to_stage(
@@ -1139,7 +1217,7 @@ def tile_pixel_to_stage(
     tile_row: int,
     tile_set: TileSetInfo
 ) -> PointFloat:
-    tile = next((t for t in tile_set.tiles if t.column == tile_column and t.row == tile_row), None)
+    tile = tile_set.get_tile(tile_column, tile_row)
     if tile is None:
         raise ValueError(f"Tile not found in tile set: [{tile_column}, {tile_row}]")
 
@@ -1282,6 +1360,123 @@ def get_tile_eds_image_file_name(tile_row: int, tile_column: int, channel_index:
 # Internal Helpers
 # ============================================================================
 
+TILESET_CONFIG_NAME = "tileset.json"
+
+# Tile_{row:03d}-{column:03d}-{plane:06d}_{channel}-{time:03d}..., see get_tile_image_file_name()
+_MAPS_TILE_NAME_RE = re.compile(r"^Tile_(\d+)-(\d+)-(\d+)_(\d+)-(\d+)", re.IGNORECASE)
+
+
+def _load_tileset_config(input_dir: Path) -> dict:
+    config_path = input_dir / TILESET_CONFIG_NAME
+    if not config_path.is_file():
+        return {}
+    try:
+        data = json.loads(config_path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        _debug(f"Ignoring invalid {TILESET_CONFIG_NAME}: {e}")
+        return {}
+
+
+SHARD_TILES_FILE_NAME = ".maps_shard_tiles.json"
+
+
+def _write_shard_tiles(tiles: List[Tile]) -> None:
+    """Record which tiles this fan-out worker was given (read by the backend's merge)."""
+    try:
+        output_dir = Path(os.environ.get('OUTPUT_DIR', '/output'))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / SHARD_TILES_FILE_NAME).write_text(
+            json.dumps([[t.column, t.row] for t in tiles]), encoding="utf-8"
+        )
+    except Exception as e:
+        _debug(f"Could not record shard tiles: {e}")
+
+
+def _clamp_overlap(value: Any) -> float:
+    try:
+        return min(max(float(value), 0.0), 0.9)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _grid_shape(count: int, config: dict) -> Tuple[int, int]:
+    columns = int(config.get("columns") or 0)
+    rows = int(config.get("rows") or 0)
+    if columns <= 0 and rows <= 0:
+        columns = math.ceil(math.sqrt(count))
+    elif columns <= 0:
+        columns = math.ceil(count / rows)
+    return columns, max(rows, math.ceil(count / columns))
+
+
+def _split_tiff_pages(tiff_path: Path) -> Optional[Tuple[Path, List[str]]]:
+    """Write each page of a multi-page TIFF to its own file; None if single-page."""
+    if not HAS_PIL:
+        return None
+    try:
+        img = Image.open(tiff_path)
+        page_count = getattr(img, "n_frames", 1)
+    except Exception:
+        return None
+    if page_count <= 1:
+        return None
+    out_dir = Path(tempfile.mkdtemp(prefix="maps_tiles_"))
+    names = []
+    for page in range(page_count):
+        img.seek(page)
+        name = f"page_{page:04d}.tiff"
+        img.save(out_dir / name, format="TIFF")
+        names.append(name)
+    _debug(f"Split {tiff_path.name} into {page_count} tile images in {out_dir}")
+    return out_dir, names
+
+
+def _grid_tile_files(
+    image_files: List[Path], config: dict
+) -> Optional[Tuple[Path, Dict[Tuple[int, int], Dict[str, str]], int, int]]:
+    """Lay the input files out as a tile grid.
+
+    Returns (data_folder, {(column, row): {channel: file_name}}, column_count,
+    row_count), or None for the default single-tile mode.
+    """
+    grid_mode = str(config.get("mode", "")).lower() == "grid"
+    # The helper adds image.png next to an uploaded image.tif for display only
+    tiff_stems = {p.stem for p in image_files if p.suffix.lower() in (".tif", ".tiff")}
+    image_files = [p for p in image_files if not (p.suffix.lower() == ".png" and p.stem in tiff_stems)]
+    if not image_files:
+        return None
+
+    # MAPS-named tiles carry their own position and channel
+    named: Dict[Tuple[int, int], Dict[str, str]] = {}
+    for path in image_files:
+        match = _MAPS_TILE_NAME_RE.match(path.name)
+        if match:
+            row, column, channel = int(match.group(1)), int(match.group(2)), int(match.group(4))
+            named.setdefault((column, row), {})[str(channel)] = path.name
+    if named and (grid_mode or len(named) > 1):
+        columns = [c for c, _ in named]
+        rows = [r for _, r in named]
+        return image_files[0].parent, named, max(columns) - min(columns) + 1, max(rows) - min(rows) + 1
+
+    if not grid_mode:
+        return None
+
+    data_folder = image_files[0].parent
+    names = [p.name for p in image_files]
+    if len(image_files) == 1:
+        pages = _split_tiff_pages(image_files[0])
+        if pages is not None:
+            data_folder, names = pages
+
+    column_count, row_count = _grid_shape(len(names), config)
+    tile_files = {
+        (idx % column_count + 1, idx // column_count + 1): {"0": name}
+        for idx, name in enumerate(names)
+    }
+    return data_folder, tile_files, column_count, row_count
+
+
 def _scan_input_images(input_dir: Path) -> List[Path]:
     image_extensions = ["*.png", "*.jpg", "*.jpeg", "*.tif", "*.tiff", "*.bmp", "*.gif"]
     image_files = []
@@ -1293,7 +1488,7 @@ def _scan_input_images(input_dir: Path) -> List[Path]:
         if not image_files:
             _debug("  No standard image extensions found, checking all files...")
             all_files = [f for f in input_dir.iterdir() if f.is_file()]
-            excluded = {'.gitkeep', '.ds_store', 'thumbs.db', '.matplotlib'}
+            excluded = {'.gitkeep', '.ds_store', 'thumbs.db', '.matplotlib', TILESET_CONFIG_NAME}
             image_files = [f for f in all_files if f.name.lower() not in excluded and not f.name.startswith('.')]
 
     image_files = sorted(set(image_files))
@@ -1,6 +1,41 @@
 import os, sys, json, pathlib
+import tempfile
 import traceback
 
+# Warm worker mode (used by the backend's WarmPoolRunner): import the heavy
+# libraries first, signal readiness, then block until exactly one job spec
+# arrives on stdin. The job spec names the job directory (the worker's
+# read-only /job mount; outputs go to /output) that the rest of this runner
+# then treats as its cwd.
+WARM_WORKER = os.environ.get("MAPS_WARM_WORKER", "") == "1"
+WARM_READY_MARKER = "[WARM] worker ready"
+
+if WARM_WORKER:
+    # The per-job /output/.matplotlib dir doesn't exist yet, so use a private
+    # config dir for the pre-import.
+    _warm_mpl_dir = pathlib.Path(tempfile.gettempdir()) / ".matplotlib"
+    _warm_mpl_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["MPLCONFIGDIR"] = str(_warm_mpl_dir)
+
+    from skimage import io, img_as_ubyte
+    import matplotlib
+    matplotlib.use('Agg')
+    try:
+        import MapsBridge
+    except ImportError:
+        pass
+
+    print(WARM_READY_MARKER, flush=True)
+    _job_line = sys.stdin.readline()
+    if not _job_line.strip():
+        # Pool is shutting down (stdin closed without a job)
+        sys.exit(0)
+    _job_spec = json.loads(_job_line)
+    os.chdir(_job_spec["job_dir"])
+    os.environ["JOB_ID"] = _job_spec.get("job_id", "")
+    os.environ["MAPS_SCRIPT_PARAMETERS"] = _job_spec.get("script_parameters", "") or ""
+    os.environ["MAPS_CODE_PATH"] = str(pathlib.Path(_job_spec["job_dir"]) / "code" / "main.py")
+
 print("=" * 60)
 print("[DEBUG] job_runner.py starting...")
 print(f"[DEBUG] Python version: {sys.version}")
@@ -117,6 +152,107 @@ User code is free to import scikit-image, numpy, imageio, matplotlib as preinsta
 The user code should read from input_dir and write to output_dir (defined above based on runtime)
 """
 
+# Output manifest: describes every file in output_dir right after the user
+# code ran (the files are still in the page cache), so the backend does not
+# have to open each output again. Read by backend/output_manifest.py; keep the
+# format in step with it.
+MANIFEST_DIR = ".maps"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+PREVIEW_MAX_SIZE = int(os.environ.get("PREVIEW_MAX_SIZE", "1024"))
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif"}
+
+
+def _sha256(path):
+    import hashlib
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _preview(img):
+    """(8-bit preview of img, dtype of its pixels); same stretch rules as the backend's image_normalize."""
+    import numpy as np
+    from PIL import Image
+
+    if img.mode in ("1", "P", "PA", "CMYK", "YCbCr", "LAB", "HSV"):
+        img = img.convert("RGBA" if img.mode == "PA" or "transparency" in img.info else "RGB")
+    arr = np.asarray(img)
+    dtype = arr.dtype.name
+    step = max(1, -(-max(img.width, img.height) // (PREVIEW_MAX_SIZE * 2)))
+    if step > 1:
+        # Subsample first: the stretch range and the resize only need a reduced copy
+        arr = arr[::step, ::step]
+    if not arr.dtype.isnative:
+        arr = arr.astype(arr.dtype.newbyteorder("="))
+    stretch = arr.dtype in (np.uint16, np.uint32, np.int16, np.int32, np.float32, np.float64)
+    if arr.dtype == np.uint8 and arr.size:
+        stretch = 1 < int(arr.max()) < 100
+    if stretch and arr.size:
+        values = arr.astype(np.float32)
+        lo, hi = np.nanmin(values), np.nanmax(values)
+        if hi > lo:
+            values = (values - lo) * (255.0 / (hi - lo))
+        else:
+            values = np.zeros_like(values)
+        arr = np.nan_to_num(np.clip(values, 0, 255), nan=0.0).astype(np.uint8)
+    preview = Image.fromarray(np.ascontiguousarray(arr))
+    if preview.mode not in ("RGB", "RGBA", "L"):
+        preview = preview.convert("RGBA" if preview.mode in ("LA", "PA") else
+                                  "L" if len(preview.getbands()) == 1 else "RGB")
+    preview.thumbnail((PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE), Image.LANCZOS)
+    return preview, dtype
+
+
+def _describe_image(path, preview_path):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        info = {
+            "width": img.width,
+            "height": img.height,
+            "mode": img.mode,
+            "format": img.format,
+            "pages": getattr(img, "n_frames", 1),
+        }
+        img.seek(0)
+        preview, info["dtype"] = _preview(img)
+    preview_path.parent.mkdir(parents=True, exist_ok=True)
+    preview.save(preview_path, format="PNG")
+    return info
+
+
+def write_output_manifest(output_dir):
+    """Write {output_dir}/.maps/manifest.json (size, SHA-256, image metadata, preview per output)."""
+    manifest_dir = output_dir / MANIFEST_DIR
+    entries = []
+    for path in sorted(output_dir.iterdir()):
+        if not path.is_file() or path.name.startswith("."):
+            continue
+        stat = path.stat()
+        entry = {
+            "name": path.name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": _sha256(path),
+        }
+        if path.suffix.lower() in IMAGE_EXTENSIONS:
+            preview = f"previews/{path.name}.png"
+            try:
+                entry.update(_describe_image(path, manifest_dir / preview))
+                entry["preview"] = preview
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+        entries.append(entry)
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_dir / f".{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps({"version": MANIFEST_VERSION, "files": entries}), encoding="utf-8")
+    os.replace(tmp, manifest_dir / MANIFEST_NAME)
+    return entries
+
+
 def main():
     print(f"[DEBUG] main() starting...")
     
@@ -139,10 +275,13 @@ def main():
     else:
         print(f"[DEBUG] /work directory does NOT exist")
     
-    # Try both /code (Docker) and /work (K8s) paths
-    code_path = pathlib.Path("/work/main.py") if pathlib.Path("/work/main.py").exists() else pathlib.Path("/code/main.py")
+    # Try both /code (Docker) and /work (K8s) paths; warm workers point at the job dir
+    if os.environ.get("MAPS_CODE_PATH"):
+        code_path = pathlib.Path(os.environ["MAPS_CODE_PATH"])
+    else:
+        code_path = pathlib.Path("/work/main.py") if pathlib.Path("/work/main.py").exists() else pathlib.Path("/code/main.py")
     if not code_path.exists():
-        print("No /code/main.py or /work/main.py found", file=sys.stderr)
+        print(f"No code file found (looked for MAPS_CODE_PATH, /code/main.py, /work/main.py)", file=sys.stderr)
         sys.exit(1)
     
     print(f"[DEBUG] Found code file: {code_path}")
@@ -196,6 +335,13 @@ def main():
                 print(f"[DEBUG]   - {item.name}/ (directory)")
     except Exception as e:
         print(f"[DEBUG]   Error listing {output_dir}: {e}")
+
+    try:
+        entries = write_output_manifest(output_dir)
+        print(f"[DEBUG] Wrote output manifest ({len(entries)} files)")
+    except Exception as e:
+        # Only a shortcut for the backend: it describes the outputs itself without one
+        print(f"[DEBUG] Could not write output manifest: {e}")
     
     print(f"[DEBUG] job_runner.py finished")
 
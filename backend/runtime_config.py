@@ -1,12 +1,13 @@
 """
 Runtime detection and configuration for script execution.
 Auto-detects whether to use Docker or Kubernetes based on environment.
+The warm Docker worker pool ("docker-pool") is opt-in via EXECUTION_RUNTIME.
 """
 
 import os
 from typing import Literal
 
-RuntimeType = Literal["docker", "kubernetes"]
+RuntimeType = Literal["docker", "docker-pool", "kubernetes"]
 
 
 def detect_runtime() -> RuntimeType:
@@ -14,13 +15,14 @@ def detect_runtime() -> RuntimeType:
     Auto-detect the execution runtime.
     
     Priority:
-    1. EXECUTION_RUNTIME env var (explicit override)
+    1. EXECUTION_RUNTIME env var (explicit override; "docker-pool" selects
+       the warm worker pool)
     2. Check for Kubernetes environment (KUBERNETES_SERVICE_HOST)
     3. Default to Docker
     """
     # Explicit override
     runtime = os.getenv("EXECUTION_RUNTIME", "").lower()
-    if runtime in ["docker", "kubernetes"]:
+    if runtime in ["docker", "docker-pool", "kubernetes"]:
         return runtime
     
     # Auto-detect Kubernetes
@@ -41,6 +43,11 @@ def is_docker() -> bool:
     return detect_runtime() == "docker"
 
 
+def is_docker_pool() -> bool:
+    """Check if scripts run in the warm Docker worker pool."""
+    return detect_runtime() == "docker-pool"
+
+
 def get_runtime_config() -> dict:
     """Get runtime-specific configuration."""
     runtime = detect_runtime()
@@ -52,6 +59,16 @@ def get_runtime_config() -> dict:
             "runner_image": os.getenv("RUNNER_IMAGE", "py-exec:latest"),
             "timeout": int(os.getenv("SCRIPT_TIMEOUT", "600")),
         }
+    elif runtime == "docker-pool":
+        return {
+            "runtime": "docker-pool",
+            "runner_image": os.getenv("RUNNER_IMAGE", "py-exec:latest"),
+            "timeout": int(os.getenv("SCRIPT_TIMEOUT", "600")),
+            "docker_socket": os.getenv("DOCKER_SOCKET", "/var/run/docker.sock"),
+            "pool_size": int(os.getenv("WARM_POOL_SIZE", "4")),
+            "low_watermark": int(os.getenv("WARM_POOL_LOW_WATERMARK", "1")),
+            "high_watermark": int(os.getenv("WARM_POOL_HIGH_WATERMARK", "2")),
+        }
     else:
         return {
             "runtime": "docker",
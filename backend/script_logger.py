@@ -10,15 +10,21 @@ for improving AI-generated scripts. Each execution is logged with:
 - Relationships between failed attempts and eventual success
 
 This creates a library of examples that the AI can analyze to improve future scripts.
+Logs are kept in the indexed SQLite log store (see log_store.py); log_failure
+and log_success only queue the entry for its background writer.
 """
 
-import json
 import uuid
 import pathlib
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass, asdict
 
+try:
+    from backend.log_store import get_log_store
+except ImportError:
+    from log_store import get_log_store
+
 
 @dataclass
 class ScriptExecutionLog:
@@ -64,30 +70,15 @@ class ScriptLogger:
         """
         Initialize logger with base logs directory
         
-        Directory structure:
-        logs/
-            failures/           # Failed execution attempts
-                YYYY-MM-DD/     # Organized by date
-                    {log_id}.json
-            successes/          # Successful executions
-                YYYY-MM-DD/
-                    {log_id}.json
-            sessions/           # Session metadata (groups related attempts)
-                {session_id}.json
-            analysis/           # Analysis results and patterns
-                patterns.json
-                common_errors.json
+        Attempts and sessions are stored in logs_dir/execution_logs.db (or
+        LOG_STORE_PATH); a JSON tree from earlier versions (failures/,
+        successes/, sessions/) is imported on first use. analysis/ holds the
+        LogAnalyzer results.
         """
         self.logs_dir = logs_dir
-        self.failures_dir = logs_dir / "failures"
-        self.successes_dir = logs_dir / "successes"
-        self.sessions_dir = logs_dir / "sessions"
         self.analysis_dir = logs_dir / "analysis"
-        
-        # Create directory structure
-        for dir_path in [self.failures_dir, self.successes_dir, 
-                        self.sessions_dir, self.analysis_dir]:
-            dir_path.mkdir(parents=True, exist_ok=True)
+        self.analysis_dir.mkdir(parents=True, exist_ok=True)
+        self.store = get_log_store(logs_dir)
     
     def _get_code_hash(self, code: str) -> str:
         """Generate a simple hash of the code for duplicate detection"""
@@ -96,13 +87,6 @@ class ScriptLogger:
         normalized = '\n'.join(line.strip() for line in code.split('\n') if line.strip())
         return hashlib.md5(normalized.encode()).hexdigest()[:16]
     
-    def _get_date_dir(self, base_dir: pathlib.Path) -> pathlib.Path:
-        """Get today's date subdirectory"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        date_dir = base_dir / today
-        date_dir.mkdir(parents=True, exist_ok=True)
-        return date_dir
-    
     def log_failure(
         self,
         code: str,
@@ -155,15 +139,8 @@ class ScriptLogger:
             tags=tags
         )
         
-        # Save to date-organized directory
-        date_dir = self._get_date_dir(self.failures_dir)
-        log_file = date_dir / f"{log_id}.json"
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(asdict(log_entry), f, indent=2, ensure_ascii=False)
-        
-        # Update session metadata
-        self._update_session(session_id, log_id, "failed")
+        # Queued; the writer stores the log and updates its session in one transaction
+        self.store.writer.submit(asdict(log_entry))
         
         return log_id
     
@@ -209,69 +186,11 @@ class ScriptLogger:
             tags=tags
         )
         
-        # Save to date-organized directory
-        date_dir = self._get_date_dir(self.successes_dir)
-        log_file = date_dir / f"{log_id}.json"
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(asdict(log_entry), f, indent=2, ensure_ascii=False)
-        
-        # Update session metadata
-        self._update_session(session_id, log_id, "success")
-        
-        # Mark previous failures as fixed
-        if previous_attempt_id:
-            self._mark_failure_as_fixed(previous_attempt_id, log_id)
+        # Queued; stored together with the session update and the fixed_by link of the failure
+        self.store.writer.submit(asdict(log_entry), fixes=previous_attempt_id)
         
         return log_id
     
-    def _update_session(self, session_id: str, log_id: str, status: str):
-        """Update session metadata with new attempt"""
-        session_file = self.sessions_dir / f"{session_id}.json"
-        
-        if session_file.exists():
-            with open(session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-        else:
-            session_data = {
-                "session_id": session_id,
-                "created_at": datetime.now().isoformat(),
-                "attempts": [],
-                "status": "in_progress"
-            }
-        
-        session_data["attempts"].append({
-            "log_id": log_id,
-            "timestamp": datetime.now().isoformat(),
-            "status": status
-        })
-        
-        if status == "success":
-            session_data["status"] = "resolved"
-            session_data["resolved_at"] = datetime.now().isoformat()
-        
-        session_data["updated_at"] = datetime.now().isoformat()
-        
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2, ensure_ascii=False)
-    
-    def _mark_failure_as_fixed(self, failure_log_id: str, success_log_id: str):
-        """Mark a failure log as fixed by a successful attempt"""
-        # Find the failure log file
-        for date_dir in self.failures_dir.iterdir():
-            if not date_dir.is_dir():
-                continue
-            failure_file = date_dir / f"{failure_log_id}.json"
-            if failure_file.exists():
-                with open(failure_file, 'r', encoding='utf-8') as f:
-                    failure_data = json.load(f)
-                
-                failure_data["fixed_by"] = success_log_id
-                
-                with open(failure_file, 'w', encoding='utf-8') as f:
-                    json.dump(failure_data, f, indent=2, ensure_ascii=False)
-                break
-    
     def _categorize_error(self, error_message: str, stderr: str) -> str:
         """Categorize error type for analysis"""
         error_text = (error_message + " " + stderr).lower()
@@ -348,84 +267,34 @@ class ScriptLogger:
         
         return tags
     
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all logged attempts are written"""
+        return self.store.writer.flush(timeout)
+    
+    def close(self):
+        """Write queued attempts and stop the background writer (on shutdown)"""
+        self.store.writer.close()
+    
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session metadata including all attempts"""
-        session_file = self.sessions_dir / f"{session_id}.json"
-        if session_file.exists():
-            with open(session_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        return self.store.get_session(session_id)
     
     def get_log(self, log_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve a specific log entry by ID"""
-        # Search in both failures and successes
-        for base_dir in [self.failures_dir, self.successes_dir]:
-            for date_dir in base_dir.iterdir():
-                if not date_dir.is_dir():
-                    continue
-                log_file = date_dir / f"{log_id}.json"
-                if log_file.exists():
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-        return None
+        return self.store.get(log_id)
     
     def get_recent_failures(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get most recent failures"""
-        failures = []
-        
-        # Get all failure files sorted by date (newest first)
-        for date_dir in sorted(self.failures_dir.iterdir(), reverse=True):
-            if not date_dir.is_dir():
-                continue
-            
-            for log_file in sorted(date_dir.glob("*.json"), 
-                                  key=lambda f: f.stat().st_mtime, 
-                                  reverse=True):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    failures.append(json.load(f))
-                
-                if len(failures) >= limit:
-                    return failures
-        
-        return failures
+        return self.store.recent("failed", limit)
     
     def get_recent_successes(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get most recent successes"""
-        successes = []
-        
-        for date_dir in sorted(self.successes_dir.iterdir(), reverse=True):
-            if not date_dir.is_dir():
-                continue
-            
-            for log_file in sorted(date_dir.glob("*.json"),
-                                  key=lambda f: f.stat().st_mtime,
-                                  reverse=True):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    successes.append(json.load(f))
-                
-                if len(successes) >= limit:
-                    return successes
-        
-        return successes
+        return self.store.recent("success", limit)
     
     def get_unfixed_failures(self) -> List[Dict[str, Any]]:
         """Get all failures that haven't been fixed yet"""
-        unfixed = []
-        
-        for date_dir in self.failures_dir.iterdir():
-            if not date_dir.is_dir():
-                continue
-            
-            for log_file in date_dir.glob("*.json"):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    failure = json.load(f)
-                    if not failure.get("fixed_by"):
-                        unfixed.append(failure)
-        
-        return unfixed
-
-
-
-
-
-
+        return list(self.store.iter_logs(status="failed", unfixed=True))
+    
+    def search(self, query: str, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Full-text search over error messages and stderr (FTS5 query syntax)"""
+        return self.store.search(query, status=status, limit=limit)
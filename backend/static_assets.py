@@ -0,0 +1,344 @@
+"""
+Serving of the frontend (index.html, app.jsx, styles.css, admin.html).
+
+In dev mode (the default) frontend/ is served as-is and HTML/JS responses
+are marked no-store, so an edit shows up on the next reload.
+
+In production mode the app serves a build of frontend/ instead:
+- app.jsx is replaced by app.js, compiled and minified ahead of time by
+  esbuild (frontend/build.mjs, run in the Dockerfile's node stage), and the
+  @babel/standalone script is dropped from index.html - the browser no
+  longer downloads Babel and transpiles the whole app on every load. app.js
+  starts with the SHA-256 of the app.jsx it was compiled from; a missing or
+  stale app.js is recompiled when esbuild is installed in frontend/, and
+  otherwise app.jsx is served with in-browser Babel as before (with a
+  warning). Dev mode always uses in-browser Babel.
+- Scripts and styles.css are copied under content-hashed names
+  (app.1f0c2d9ab3e4.jsx) and the HTML pages are rewritten to reference
+  them. Hashed files never change, so they are sent with
+  `Cache-Control: public, max-age=31536000, immutable` and the browser keeps
+  them (and skips the request entirely) until a new build renames them.
+  Pages and other files are sent with `no-cache`: the browser revalidates
+  them by ETag, which is what picks up a new build.
+- Text files are precompressed once at build time: .gz always, .br when
+  the optional `brotli` module is installed. PrecompressedStaticFiles sends
+  the best variant the client accepts (Accept-Encoding) with
+  Content-Encoding and `Vary: Accept-Encoding`, so nothing is compressed
+  per request.
+
+The build runs at image build time (`python -m backend.static_assets`, see
+the Dockerfile) and is checked at startup: if frontend/ changed since the
+last build (e.g. a mounted source tree), it is rebuilt before serving.
+benchmark_frontend_startup.py compares page start-up cost of the two modes.
+
+Configuration (environment):
+    STATIC_MODE       dev (default) or production
+    STATIC_BUILD_DIR  Where the production build is written (default frontend/dist)
+"""
+
+import os
+import re
+import gzip
+import json
+import uuid
+import shutil
+import hashlib
+import pathlib
+import posixpath
+import mimetypes
+import subprocess
+from typing import Dict, List, Optional, Set
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+STATIC_MODE = os.getenv("STATIC_MODE", "dev").strip().lower()
+
+# Files given content-hashed names (referenced from the HTML pages)
+_HASHED_SUFFIXES = {".jsx", ".js", ".css"}
+# Files worth precompressing
+_TEXT_SUFFIXES = {".html", ".jsx", ".js", ".css", ".svg", ".json", ".txt", ".map"}
+_MIN_COMPRESS_BYTES = 1024
+_HASH_LENGTH = 12
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % _HASH_LENGTH)
+_REFERENCE = re.compile(r'((?:src|href)=")([^"#?]+)(")')
+_MANIFEST = "asset-manifest.json"
+# Build tooling kept out of the build (node_modules can be large)
+_EXCLUDED_NAMES = {"node_modules", "package.json", "package-lock.json", "build.mjs"}
+
+_BABEL_SCRIPT = re.compile(r'[ \t]*<script[^>]*src="[^"]*@babel/standalone[^"]*"[^>]*>\s*</script>[ \t]*\n?')
+_BABEL_SOURCE = re.compile(r'<script type="text/babel" src="([^"]+)\.jsx"></script>')
+_COMPILED_BANNER = re.compile(rb"/\* compiled from (\S+) sha256:([0-9a-f]{64}) \*/")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# (Content-Encoding, file suffix), best first
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def is_production() -> bool:
+    return STATIC_MODE == "production"
+
+
+def default_build_dir(source_dir: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(os.getenv("STATIC_BUILD_DIR", str(pathlib.Path(source_dir) / "dist")))
+
+
+def _source_files(source_dir: pathlib.Path, build_dir: pathlib.Path) -> List[pathlib.Path]:
+    files = []
+    for path in sorted(source_dir.rglob("*")):
+        relative = path.relative_to(source_dir)
+        if not path.is_file() or any(part.startswith(".") or part in _EXCLUDED_NAMES
+                                     for part in relative.parts):
+            continue
+        if path == build_dir or build_dir in path.parents:
+            continue
+        files.append(path)
+    return files
+
+
+def source_digest(source_dir: pathlib.Path, build_dir: pathlib.Path) -> str:
+    """Hash of every source file's name and content (what a build is made from)."""
+    sha = hashlib.sha256()
+    for path in _source_files(source_dir, build_dir):
+        sha.update(path.relative_to(source_dir).as_posix().encode("utf-8") + b"\0")
+        sha.update(hashlib.sha256(path.read_bytes()).digest())
+    return sha.hexdigest()
+
+
+def _read_sources(source_dir: pathlib.Path, build_dir: pathlib.Path) -> Dict[str, bytes]:
+    return {path.relative_to(source_dir).as_posix(): path.read_bytes()
+            for path in _source_files(source_dir, build_dir)}
+
+
+def _hashed_name(relative: str, data: bytes) -> str:
+    stem, suffix = posixpath.splitext(relative)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:_HASH_LENGTH]}{suffix}"
+
+
+def _rewrite_references(html: str, page: str, renamed: Dict[str, str]) -> str:
+    """Point src/href attributes of a page at the hashed names of the files they reference."""
+    base = posixpath.dirname(page)
+
+    def replace(match: re.Match) -> str:
+        reference = match.group(2)
+        if "://" in reference or reference.startswith("//"):
+            return match.group(0)
+        if reference.startswith("/"):
+            target = posixpath.normpath(reference.lstrip("/"))
+            prefix = "/"
+        else:
+            target = posixpath.normpath(posixpath.join(base, reference))
+            prefix = ""
+        if target not in renamed:
+            return match.group(0)
+        if prefix:
+            new_reference = prefix + renamed[target]
+        else:
+            new_reference = posixpath.relpath(renamed[target], base or ".")
+        return match.group(1) + new_reference + match.group(3)
+
+    return _REFERENCE.sub(replace, html)
+
+
+def _compiled_bundles(contents: Dict[str, bytes]) -> Dict[str, str]:
+    """{"app.jsx": "app.js"} for each script whose compiled .js matches its current source."""
+    compiled = {}
+    for relative, data in contents.items():
+        if not relative.endswith(".jsx"):
+            continue
+        bundle = contents.get(relative[:-1])
+        banner = _COMPILED_BANNER.match(bundle or b"")
+        if banner and banner.group(2).decode() == hashlib.sha256(data).hexdigest():
+            compiled[relative] = relative[:-1]
+    return compiled
+
+
+def compile_frontend(source_dir: pathlib.Path) -> bool:
+    """Run frontend/build.mjs (esbuild) if node and the build tooling are installed."""
+    if not (source_dir / "node_modules" / "esbuild").is_dir() or shutil.which("node") is None:
+        return False
+    result = subprocess.run(["node", "build.mjs"], cwd=source_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"⚠ Compiling the frontend failed: {result.stderr.strip()[-2000:]}")
+        return False
+    print(result.stdout.strip())
+    return True
+
+
+def _use_compiled_scripts(html: str, page: str, compiled: Dict[str, str]) -> str:
+    """Load compiled bundles instead of text/babel sources; drop Babel once nothing needs it."""
+    base = posixpath.dirname(page)
+
+    def replace(match: re.Match) -> str:
+        source = posixpath.normpath(posixpath.join(base, match.group(1) + ".jsx"))
+        if source not in compiled:
+            return match.group(0)
+        return f'<script src="{match.group(1)}.js"></script>'
+
+    html = _BABEL_SOURCE.sub(replace, html)
+    if 'type="text/babel"' not in html:
+        html = _BABEL_SCRIPT.sub("", html)
+    return html
+
+
+def _precompress(path: pathlib.Path, data: bytes) -> List[str]:
+    """Write .gz (and .br) siblings of path when they are smaller; returns the encodings written."""
+    if path.suffix not in _TEXT_SUFFIXES or len(data) < _MIN_COMPRESS_BYTES:
+        return []
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    written = []
+    for encoding, suffix in _ENCODINGS:
+        compressed = variants.get(encoding)
+        if compressed is not None and len(compressed) < len(data):
+            path.with_name(path.name + suffix).write_bytes(compressed)
+            written.append(encoding)
+    return written
+
+
+def build(source_dir: pathlib.Path, build_dir: Optional[pathlib.Path] = None) -> Dict:
+    """Write the production build of source_dir to build_dir (replacing any previous build).
+
+    Returns the manifest: source digest, hashed names and encodings written.
+    """
+    source_dir = pathlib.Path(source_dir)
+    build_dir = pathlib.Path(build_dir or default_build_dir(source_dir))
+    contents = _read_sources(source_dir, build_dir)
+    compiled = _compiled_bundles(contents)
+    stale = [relative for relative in contents if relative.endswith(".jsx") and relative not in compiled]
+    if stale and compile_frontend(source_dir):
+        contents = _read_sources(source_dir, build_dir)
+        compiled = _compiled_bundles(contents)
+        stale = [relative for relative in contents if relative.endswith(".jsx") and relative not in compiled]
+    for relative in stale:
+        # Never ship a bundle built from another version of the source
+        contents.pop(relative[:-1], None)
+        print(f"⚠ No up-to-date compiled bundle for frontend/{relative}; "
+              f"it will be transpiled in the browser (run `npm run build` in frontend/)")
+
+    for relative in compiled:
+        # Replaced by its compiled bundle
+        del contents[relative]
+
+    renamed = {
+        relative: _hashed_name(relative, data)
+        for relative, data in contents.items()
+        if posixpath.splitext(relative)[1] in _HASHED_SUFFIXES
+    }
+
+    # Build next to the target and swap it in, so a running server never sees half a build
+    staging = build_dir.with_name(f".{build_dir.name}.{uuid.uuid4().hex[:8]}")
+    staging.mkdir(parents=True)
+    try:
+        compressed = {}
+        for relative, data in contents.items():
+            if relative.endswith(".html"):
+                html = _use_compiled_scripts(data.decode("utf-8"), relative, compiled)
+                data = _rewrite_references(html, relative, renamed).encode("utf-8")
+            target = staging / renamed.get(relative, relative)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+            encodings = _precompress(target, data)
+            if encodings:
+                compressed[renamed.get(relative, relative)] = encodings
+        manifest = {
+            "source_digest": source_digest(source_dir, build_dir),
+            "compiled": compiled,
+            "assets": renamed,
+            "compressed": compressed,
+        }
+        (staging / _MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        if build_dir.exists():
+            shutil.rmtree(build_dir)
+        os.replace(staging, build_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def ensure_build(source_dir: pathlib.Path, build_dir: Optional[pathlib.Path] = None) -> pathlib.Path:
+    """Build directory for source_dir, rebuilt first if missing or out of date."""
+    source_dir = pathlib.Path(source_dir)
+    build_dir = pathlib.Path(build_dir or default_build_dir(source_dir))
+    try:
+        manifest = json.loads((build_dir / _MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("source_digest") != source_digest(source_dir, build_dir):
+        manifest = build(source_dir, build_dir)
+        print(f"✓ Built frontend assets in {build_dir} ({len(manifest['assets'])} hashed, "
+              f"{len(manifest['compiled'])} precompiled, brotli {'on' if brotli else 'off'})")
+    return build_dir
+
+
+def _accepted_encodings(accept_encoding: str) -> Set[str]:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles for a production build: precompressed variants and long-lived caching of hashed files."""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope,
+                      status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        media_type = mimetypes.guess_type(name)[0] or "text/plain"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE if _HASHED_NAME.search(name) else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in _ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                compressed_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            full_path, stat_result = f"{full_path}{suffix}", compressed_stat
+            headers["Content-Encoding"] = encoding
+            break
+
+        # The ETag comes from the file actually sent, so each encoding revalidates separately
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def frontend_static_files(frontend_dir: pathlib.Path) -> StaticFiles:
+    """The app mounted at / : frontend/ as-is in dev mode, its precompressed build in production."""
+    if not is_production():
+        return StaticFiles(directory=str(frontend_dir), html=True)
+    return PrecompressedStaticFiles(directory=str(ensure_build(frontend_dir)), html=True)
+
+
+if __name__ == "__main__":
+    frontend = pathlib.Path(__file__).resolve().parent.parent / "frontend"
+    result = build(frontend)
+    print(f"✓ Built {default_build_dir(frontend)}: {json.dumps(result['assets'])}")
@@ -0,0 +1,5 @@
+import sys
+import pathlib
+
+# Import the backend as the app does (backend.<module>)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
@@ -0,0 +1,338 @@
+"""
+A small in-process stand-in for the Kubernetes API server, for k8s_runner tests.
+
+It serves the core/v1 pod and ConfigMap calls KubernetesRunner makes over real
+HTTP: create, read, list (with label / field selectors), delete, watch
+(newline-delimited events resuming from a resourceVersion) and follow-mode pod
+logs. Pods do nothing by themselves: a test drives them with set_phase() and
+append_log(), or by passing on_create, which is called for every pod the
+client creates.
+
+exec (a websocket upgrade) is not served; tests replace k8s_runner.k8s_stream
+instead.
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+TERMINAL_PHASES = ("Succeeded", "Failed")
+
+
+def timestamp(dt: Optional[datetime] = None) -> str:
+    return (dt or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _matches_labels(labels: Dict[str, str], selector: str) -> bool:
+    for term in filter(None, (selector or "").split(",")):
+        if "!=" in term:
+            key, value = term.split("!=", 1)
+            if labels.get(key) == value:
+                return False
+        else:
+            key, value = term.split("=", 1)
+            if labels.get(key) != value:
+                return False
+    return True
+
+
+def _matches_fields(obj: Dict[str, Any], selector: str) -> bool:
+    for term in filter(None, (selector or "").split(",")):
+        key, value = term.split("=", 1)
+        if key == "metadata.name" and obj["metadata"]["name"] != value:
+            return False
+    return True
+
+
+class FakeKubeAPI:
+    """Pods and ConfigMaps, served on 127.0.0.1:<port>.
+
+    Objects are not separated by namespace, except that reading a pod by name
+    only finds it in the namespace of its metadata (if it has one).
+    """
+
+    def __init__(self, on_create: Optional[Callable[["FakeKubeAPI", Dict[str, Any]], None]] = None):
+        self.on_create = on_create
+        self.pods: Dict[str, Dict[str, Any]] = {}
+        self.configmaps: Dict[str, Dict[str, Any]] = {}
+        self.logs: Dict[str, str] = {}
+        # Every pod body the client created, in order
+        self.created: List[Dict[str, Any]] = []
+        self.deleted: List[Tuple[str, str]] = []
+        self.watch_requests = 0
+        self._events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self._version = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeKubeAPI":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def kubeconfig(self) -> str:
+        return json.dumps({
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [{"name": "fake", "cluster": {"server": self.url}}],
+            "users": [{"name": "fake", "user": {"token": "test"}}],
+            "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+            "current-context": "fake",
+        })
+
+    # ------------------------------------------------------------------
+    # State changes (called by handlers and tests)
+    # ------------------------------------------------------------------
+
+    def _record(self, kind: str, obj: Dict[str, Any]):
+        """Bump the resourceVersion and publish a watch event; call with _cond held."""
+        self._version += 1
+        obj["metadata"]["resourceVersion"] = str(self._version)
+        self._events.append((self._version, kind, json.loads(json.dumps(obj))))
+        self._cond.notify_all()
+
+    def add_pod(self, body: Dict[str, Any], phase: str = "Pending") -> Dict[str, Any]:
+        with self._cond:
+            pod = json.loads(json.dumps(body))
+            pod.setdefault("apiVersion", "v1")
+            pod.setdefault("kind", "Pod")
+            pod["metadata"].setdefault("creationTimestamp", timestamp())
+            pod["status"] = dict(pod.get("status") or {}, phase=phase)
+            self.pods[pod["metadata"]["name"]] = pod
+            self.logs.setdefault(pod["metadata"]["name"], "")
+            self._record("ADDED", pod)
+            return pod
+
+    def add_configmap(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._cond:
+            configmap = json.loads(json.dumps(body))
+            configmap.setdefault("apiVersion", "v1")
+            configmap.setdefault("kind", "ConfigMap")
+            configmap["metadata"].setdefault("creationTimestamp", timestamp())
+            self.configmaps[configmap["metadata"]["name"]] = configmap
+            return configmap
+
+    def set_phase(self, name: str, phase: str, exit_code: Optional[int] = None,
+                  finished_at: Optional[datetime] = None):
+        with self._cond:
+            pod = self.pods.get(name)
+            if pod is None:
+                return
+            pod["status"]["phase"] = phase
+            if phase in TERMINAL_PHASES:
+                code = exit_code if exit_code is not None else (0 if phase == "Succeeded" else 1)
+                pod["status"]["containerStatuses"] = [{
+                    "name": "runner", "ready": False, "restartCount": 0, "image": "", "imageID": "",
+                    "state": {"terminated": {"exitCode": code, "finishedAt": timestamp(finished_at)}},
+                }]
+            self._record("MODIFIED", pod)
+
+    def append_log(self, name: str, text: str):
+        with self._cond:
+            self.logs[name] = self.logs.get(name, "") + text
+            self._cond.notify_all()
+
+    def delete_pod(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            pod = self.pods.pop(name, None)
+            if pod is None:
+                return None
+            self.deleted.append(("pod", name))
+            self._record("DELETED", pod)
+            return pod
+
+    def delete_configmap(self, name: str) -> bool:
+        with self._cond:
+            if self.configmaps.pop(name, None) is None:
+                return False
+            self.deleted.append(("configmap", name))
+            return True
+
+    def created_names(self) -> List[str]:
+        return [pod["metadata"]["name"] for pod in self.created]
+
+    # ------------------------------------------------------------------
+    # Streaming endpoints
+    # ------------------------------------------------------------------
+
+    def watch_events(self, field_selector: str, label_selector: str, since: int, timeout: float):
+        """Yield events newer than since until timeout passes (or the server stops)."""
+        deadline = threading.Event()
+        timer = threading.Timer(timeout, lambda: (deadline.set(), self._notify()))
+        timer.daemon = True
+        timer.start()
+        try:
+            while True:
+                with self._cond:
+                    pending = [e for e in self._events if e[0] > since]
+                    if not pending:
+                        if deadline.is_set() or self._closed:
+                            return
+                        self._cond.wait(0.5)
+                        continue
+                for version, kind, obj in pending:
+                    since = version
+                    if _matches_fields(obj, field_selector) and _matches_labels(obj["metadata"].get("labels") or {}, label_selector):
+                        yield {"type": kind, "object": obj}
+        finally:
+            timer.cancel()
+
+    def follow_log(self, name: str):
+        """Yield log text as it is appended until the pod has finished or is gone."""
+        sent = 0
+        while True:
+            with self._cond:
+                text = self.logs.get(name, "")
+                pod = self.pods.get(name)
+                done = pod is None or pod["status"].get("phase") in TERMINAL_PHASES or self._closed
+                if len(text) == sent and not done:
+                    self._cond.wait(0.5)
+                    continue
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+            elif done:
+                return
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+def _handler_for(api: FakeKubeAPI):
+    class Handler(BaseHTTPRequestHandler):
+        # Chunked responses, so watch events and log lines reach the client one by one
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_found(self, kind: str, name: str):
+            self._send_json(404, {"kind": "Status", "apiVersion": "v1", "status": "Failure",
+                                  "reason": "NotFound", "message": f"{kind} \"{name}\" not found", "code": 404})
+
+        def _route(self) -> Tuple[List[str], Dict[str, str]]:
+            parsed = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            # /api/v1/namespaces/{ns}/{kind}[/{name}[/log]]
+            path = parsed.path.strip("/").split("/")
+            self.namespace = path[3] if len(path) > 3 else ""
+            return path[4:], query
+
+        def _read_body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _stream(self, chunks):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def do_GET(self):
+            parts, query = self._route()
+            kind = parts[0] if parts else ""
+            if kind == "pods" and len(parts) == 1:
+                if query.get("watch", "").lower() == "true":
+                    api.watch_requests += 1
+                    events = api.watch_events(query.get("fieldSelector", ""), query.get("labelSelector", ""),
+                                              int(query.get("resourceVersion") or 0),
+                                              float(query.get("timeoutSeconds") or 30))
+                    self._stream(json.dumps(event) + "\n" for event in events)
+                    return
+                with api._cond:
+                    items = [p for p in api.pods.values()
+                             if _matches_labels(p["metadata"].get("labels") or {}, query.get("labelSelector", ""))
+                             and _matches_fields(p, query.get("fieldSelector", ""))]
+                    self._send_json(200, {"kind": "PodList", "apiVersion": "v1",
+                                          "metadata": {"resourceVersion": str(api._version)}, "items": items})
+                return
+            if kind == "pods" and len(parts) == 3 and parts[2] == "log":
+                if parts[1] not in api.pods:
+                    return self._not_found("pods", parts[1])
+                if query.get("follow", "").lower() == "true":
+                    self._stream(api.follow_log(parts[1]))
+                else:
+                    body = api.logs.get(parts[1], "").encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                return
+            if kind == "pods" and len(parts) == 2:
+                with api._cond:
+                    pod = api.pods.get(parts[1])
+                    if pod is None or pod["metadata"].get("namespace", self.namespace) != self.namespace:
+                        return self._not_found("pods", parts[1])
+                    return self._send_json(200, pod)
+            if kind == "configmaps" and len(parts) == 1:
+                with api._cond:
+                    items = list(api.configmaps.values())
+                return self._send_json(200, {"kind": "ConfigMapList", "apiVersion": "v1", "metadata": {}, "items": items})
+            self._not_found(kind, "/".join(parts[1:]))
+
+        def do_POST(self):
+            parts, _ = self._route()
+            body = self._read_body()
+            name = body["metadata"]["name"]
+            if parts == ["pods"]:
+                if name in api.pods:
+                    return self._send_json(409, {"kind": "Status", "apiVersion": "v1", "status": "Failure",
+                                                 "reason": "AlreadyExists", "code": 409})
+                api.created.append(body)
+                pod = api.add_pod(body)
+                self._send_json(201, pod)
+                if api.on_create is not None:
+                    api.on_create(api, pod)
+                return
+            if parts == ["configmaps"]:
+                return self._send_json(201, api.add_configmap(body))
+            self._not_found(parts[0] if parts else "", name)
+
+        def do_DELETE(self):
+            parts, _ = self._route()
+            self._read_body()
+            if len(parts) == 2 and parts[0] == "pods":
+                pod = api.delete_pod(parts[1])
+                if pod is not None:
+                    return self._send_json(200, pod)
+            if len(parts) == 2 and parts[0] == "configmaps" and api.delete_configmap(parts[1]):
+                return self._send_json(200, {"kind": "Status", "apiVersion": "v1", "status": "Success"})
+            self._not_found(parts[0] if parts else "", parts[-1] if parts else "")
+
+    return Handler
@@ -0,0 +1,350 @@
+"""
+KubernetesRunner against a local fake API server (fake_kube_api.py).
+
+Covers the watch-based completion and log following of per-job pods, the
+orphan reaper, and WarmPodSlots (exec is replaced by a scripted fake, since
+the fake server does not speak the websocket exec protocol).
+"""
+
+import time
+import pathlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("kubernetes")
+
+from backend import k8s_runner
+from backend.k8s_runner import (
+    KubernetesRunner, OWNER_NAMESPACE_ANNOTATION, OWNER_POD_ANNOTATION, SLOT_RESET_COMMAND, SLOTS_DIR_NAME,
+)
+from backend.tests.fake_kube_api import FakeKubeAPI
+
+
+def run_job_pod(api: FakeKubeAPI, pod, exit_code: int = 0, lines=("hello", "world")):
+    """Behave like a runner pod: start, print lines, then finish with exit_code."""
+    name = pod["metadata"]["name"]
+
+    def lifecycle():
+        time.sleep(0.05)
+        api.set_phase(name, "Running")
+        for line in lines:
+            time.sleep(0.05)
+            api.append_log(name, line + "\n")
+        time.sleep(0.1)
+        api.set_phase(name, "Succeeded" if exit_code == 0 else "Failed", exit_code=exit_code)
+
+    threading.Thread(target=lifecycle, daemon=True).start()
+
+
+def start_slot_pod(api: FakeKubeAPI, pod):
+    threading.Timer(0.02, api.set_phase, (pod["metadata"]["name"], "Running")).start()
+
+
+@pytest.fixture
+def kube(tmp_path, monkeypatch):
+    api = FakeKubeAPI().start()
+    kubeconfig = tmp_path / "kubeconfig"
+    kubeconfig.write_text(api.kubeconfig(), encoding="utf-8")
+    # KUBECONFIG is read when the kubernetes package is imported
+    monkeypatch.setattr(k8s_runner.config.kube_config, "KUBE_CONFIG_DEFAULT_LOCATION", str(kubeconfig))
+    monkeypatch.delenv("KUBERNETES_SERVICE_HOST", raising=False)
+    monkeypatch.setenv("HOSTNAME", "backend-test")
+    monkeypatch.delenv("POD_NAME", raising=False)
+    monkeypatch.delenv("POD_NAMESPACE", raising=False)
+    runners = []
+
+    def make_runner(**kwargs):
+        kwargs.setdefault("reap_interval", 0)
+        runner = KubernetesRunner(namespace="test", timeout=10, **kwargs)
+        runners.append(runner)
+        return runner
+
+    api.make_runner = make_runner
+    yield api
+    for runner in runners:
+        runner.shutdown()
+    api.stop()
+
+
+def make_job(outputs: pathlib.Path, job_id: str) -> pathlib.Path:
+    job = outputs / job_id
+    for part in ("input", "result", "code"):
+        (job / part).mkdir(parents=True)
+    (job / "code" / "main.py").write_text("print('hi')\n", encoding="utf-8")
+    (job / "input" / "image.png").write_bytes(b"png")
+    return job
+
+
+def mounts_of(pod):
+    container = pod["spec"]["containers"][0]
+    return {m["mountPath"]: m for m in container["volumeMounts"]}
+
+
+# ----------------------------------------------------------------------
+# Per-job pods
+# ----------------------------------------------------------------------
+
+def test_run_script_streams_logs_and_cleans_up(kube, tmp_path):
+    kube.on_create = run_job_pod
+    runner = kube.make_runner()
+    job = make_job(tmp_path / "outputs", "job1")
+    lines = []
+
+    result = runner.run_script("job1", "print('hi')", "{}", str(job / "input"), str(job / "result"),
+                               timeout=10, on_line=lambda stream, line: lines.append((stream, line)))
+
+    assert result["status"] == "success"
+    assert result["exit_code"] == 0
+    assert lines == [("stdout", "hello"), ("stdout", "world")]
+    assert "world" in result["logs"]
+    # Pod and ConfigMap are deleted as soon as the job is done
+    assert kube.pods == {} and kube.configmaps == {}
+
+    # Only the job's own directory is mounted, with its input read-only
+    mounts = mounts_of(kube.created[0])
+    assert "/outputs" not in mounts
+    assert mounts["/outputs/job1"]["subPath"] == "job1"
+    assert mounts["/outputs/job1/input"]["subPath"] == "job1/input"
+    assert mounts["/outputs/job1/input"]["readOnly"] is True
+
+
+def test_run_script_reports_exit_code_of_failed_pod(kube, tmp_path):
+    kube.on_create = lambda api, pod: run_job_pod(api, pod, exit_code=3, lines=("boom",))
+    runner = kube.make_runner()
+    job = make_job(tmp_path / "outputs", "job2")
+
+    result = runner.run_script("job2", "raise SystemExit(3)", "{}", str(job / "input"), str(job / "result"), timeout=10)
+
+    assert result["status"] == "failed"
+    assert result["exit_code"] == 3
+    assert "boom" in result["logs"]
+
+
+def test_completion_is_seen_through_the_watch(kube):
+    runner = kube.make_runner()
+    kube.add_pod({"metadata": {"name": "runner-w", "labels": {}}, "spec": {"containers": []}})
+    threading.Timer(0.3, kube.set_phase, ("runner-w", "Succeeded")).start()
+
+    started = time.time()
+    result = runner.wait_for_pod_completion("runner-w", timeout=5)
+
+    assert result == {"status": "success", "exit_code": 0}
+    # No polling interval: the transition arrives as a watch event
+    assert time.time() - started < 0.9
+    assert kube.watch_requests >= 1
+
+
+def test_wait_for_deleted_pod(kube):
+    runner = kube.make_runner()
+    kube.add_pod({"metadata": {"name": "runner-gone", "labels": {}}, "spec": {"containers": []}})
+    threading.Timer(0.1, kube.delete_pod, ("runner-gone",)).start()
+
+    result = runner.wait_for_pod_completion("runner-gone", timeout=5)
+
+    assert result["status"] == "failed"
+    assert result["error"] == "Pod not found"
+
+
+def test_watch_times_out(kube):
+    runner = kube.make_runner()
+    kube.add_pod({"metadata": {"name": "runner-stuck", "labels": {}}, "spec": {"containers": []}})
+
+    assert runner.wait_for_pod_completion("runner-stuck", timeout=1) == {"status": "timeout", "exit_code": -1}
+
+
+# ----------------------------------------------------------------------
+# Reaper
+# ----------------------------------------------------------------------
+
+def test_reaper_removes_expired_pods_and_orphaned_configmaps(kube):
+    runner = kube.make_runner(reap_ttl=60)
+    now = datetime.now(timezone.utc)
+    old = (now - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    job_labels = lambda job_id: {"app": "maps-runner", "job-id": job_id, "maps-runner/role": "job",
+                                 "maps-runner/owner": runner.owner}
+
+    # Finished an hour ago: reaped
+    kube.add_pod({"metadata": {"name": "runner-done", "labels": job_labels("done")}, "spec": {"containers": []}})
+    kube.set_phase("runner-done", "Succeeded", finished_at=now - timedelta(hours=1))
+    # Just finished: kept until the TTL passes
+    kube.add_pod({"metadata": {"name": "runner-fresh", "labels": job_labels("fresh")}, "spec": {"containers": []}})
+    kube.set_phase("runner-fresh", "Failed", finished_at=now)
+    # Running, within the script timeout: kept, and so is its ConfigMap
+    kube.add_pod({"metadata": {"name": "runner-live", "labels": job_labels("live")}, "spec": {"containers": []}},
+                 phase="Running")
+    # Pending for longer than the script timeout + TTL: stuck, reaped
+    kube.add_pod({"metadata": {"name": "runner-stuck", "labels": job_labels("stuck"),
+                               "creationTimestamp": old}, "spec": {"containers": []}})
+
+    kube.add_configmap({"metadata": {"name": "job-code-live", "labels": job_labels("live"), "creationTimestamp": old}})
+    kube.add_configmap({"metadata": {"name": "job-code-orphan", "labels": job_labels("orphan"), "creationTimestamp": old}})
+    # Predates the labels, recognised by name
+    kube.add_configmap({"metadata": {"name": "job-code-legacy", "creationTimestamp": old}})
+    kube.add_configmap({"metadata": {"name": "job-code-new", "labels": job_labels("new")}})
+    kube.add_configmap({"metadata": {"name": "unrelated", "creationTimestamp": old}})
+
+    # Warm slot of a backend pod that no longer exists: reaped; our own slot: kept
+    kube.add_pod(slot_pod("maps-slot-gone-0", "gone", "test", old), phase="Running")
+    kube.add_pod(slot_pod("maps-slot-mine-0", runner.owner_pod, runner.owner_namespace, old), phase="Running")
+
+    reaped = runner.reap_once()
+
+    assert reaped == {"pods": 3, "configmaps": 2}
+    assert set(kube.pods) == {"runner-fresh", "runner-live", "maps-slot-mine-0"}
+    assert set(kube.configmaps) == {"job-code-live", "job-code-new", "unrelated"}
+
+
+def slot_pod(name: str, owner_pod: str, owner_namespace: str, created: str):
+    labels = {"app": "maps-runner", "maps-runner/role": "warm-slot",
+              "maps-runner/owner": k8s_runner._label_value(owner_pod)}
+    annotations = {OWNER_POD_ANNOTATION: owner_pod, OWNER_NAMESPACE_ANNOTATION: owner_namespace}
+    return {"metadata": {"name": name, "labels": labels, "annotations": annotations, "creationTimestamp": created},
+            "spec": {"containers": []}}
+
+
+def test_reaper_keeps_slots_of_a_live_backend_in_another_namespace(kube):
+    runner = kube.make_runner(reap_ttl=60)
+    old = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    # Longer than the 40 characters kept in the owner label, and not in the runner namespace
+    backend = "maps-backend-7d9f8c6b5-with-a-rather-long-generated-suffix-x1"
+    kube.add_pod({"metadata": {"name": backend, "namespace": "maps-backend"}, "spec": {"containers": []}},
+                 phase="Running")
+    kube.add_pod(slot_pod("maps-slot-other-0", backend, "maps-backend", old), phase="Running")
+
+    assert runner.reap_once() == {"pods": 0, "configmaps": 0}
+    assert "maps-slot-other-0" in kube.pods
+
+    kube.delete_pod(backend)
+    assert runner.reap_once() == {"pods": 1, "configmaps": 0}
+    assert "maps-slot-other-0" not in kube.pods
+
+
+# ----------------------------------------------------------------------
+# Warm slots
+# ----------------------------------------------------------------------
+
+class FakeExec:
+    """Stands in for the websocket returned by kubernetes.stream.stream."""
+
+    def __init__(self, stdout: str = "", returncode: int = 0, hang: bool = False):
+        self._stdout = stdout
+        self.returncode = None if hang else returncode
+        self._final_code = returncode
+        self._hang = hang
+        self._open = True
+
+    def is_open(self):
+        return self._open
+
+    def update(self, timeout=0):
+        if self._hang:
+            time.sleep(min(timeout, 0.05))
+        elif not self._stdout:
+            self._open = False
+            self.returncode = self._final_code
+
+    def peek_stdout(self):
+        return bool(self._stdout)
+
+    def read_stdout(self):
+        data, self._stdout = self._stdout, ""
+        return data
+
+    def peek_stderr(self):
+        return False
+
+    def read_stderr(self):
+        return ""
+
+    def run_forever(self, timeout=None):
+        self.update()
+
+    def close(self):
+        self._open = False
+
+
+@pytest.fixture
+def warm(kube, monkeypatch):
+    """A runner with one warm slot; exec calls go to warm.on_job / warm.reset_code."""
+    kube.on_create = start_slot_pod
+    state = {"commands": [], "on_job": None, "reset_code": 0, "hang": False}
+
+    def fake_stream(func, name, namespace, command=None, **kwargs):
+        script = command[-1]
+        state["commands"].append((name, script))
+        if script == SLOT_RESET_COMMAND:
+            return FakeExec(returncode=state["reset_code"])
+        if state["on_job"] is not None:
+            state["on_job"](name, script)
+        return FakeExec(stdout="done\n", hang=state["hang"])
+
+    monkeypatch.setattr(k8s_runner, "k8s_stream", fake_stream)
+    runner = kube.make_runner(warm_pods=1)
+    state["runner"] = runner
+    state["name"] = runner.warm_slots.names[0]
+    return state
+
+
+def test_warm_slot_stages_the_job_and_resets_after_it(kube, warm, tmp_path):
+    outputs = tmp_path / "outputs"
+    job = make_job(outputs, "job3")
+    slot = outputs / SLOTS_DIR_NAME / warm["name"]
+    seen = {}
+
+    def on_job(name, script):
+        seen["code"] = (slot / "job" / "code" / "main.py").read_text(encoding="utf-8")
+        seen["input"] = sorted(p.name for p in (slot / "job" / "input").iterdir())
+        seen["script"] = script
+        (slot / "result" / "out.png").write_bytes(b"result")
+
+    warm["on_job"] = on_job
+    result = warm["runner"].run_script("job3", "print('hi')", "{}", str(job / "input"), str(job / "result"), timeout=10)
+
+    assert result["status"] == "success"
+    assert "done" in result["logs"]
+    assert seen["code"] == "print('hi')\n"
+    assert seen["input"] == ["image.png"]
+    assert "MAPS_CODE_PATH=/job/code/main.py" in seen["script"]
+    # Outputs are moved to the job; the slot is empty again for the next job
+    assert (job / "result" / "out.png").read_bytes() == b"result"
+    assert list((slot / "job").iterdir()) == [] and list((slot / "result").iterdir()) == []
+    # The slot was reset after the job, and kept
+    assert [script == SLOT_RESET_COMMAND for _, script in warm["commands"]] == [False, True]
+    assert warm["name"] in kube.pods
+
+    # The slot pod only mounts its own staging directories
+    mounts = mounts_of(next(p for p in kube.created if p["metadata"]["name"] == warm["name"]))
+    assert set(mounts) == {"/job", "/output"}
+    assert mounts["/job"]["subPath"] == f"{SLOTS_DIR_NAME}/{warm['name']}/job"
+    assert mounts["/job"]["readOnly"] is True
+    assert mounts["/output"]["subPath"] == f"{SLOTS_DIR_NAME}/{warm['name']}/result"
+    annotations = next(p for p in kube.created if p["metadata"]["name"] == warm["name"])["metadata"]["annotations"]
+    assert annotations == {OWNER_POD_ANNOTATION: "backend-test", OWNER_NAMESPACE_ANNOTATION: "test"}
+
+
+def test_warm_slot_is_recreated_when_the_reset_fails(kube, warm, tmp_path):
+    outputs = tmp_path / "outputs"
+    warm["reset_code"] = 1
+    job = make_job(outputs, "job4")
+    assert warm["runner"].run_script("job4", "", "{}", str(job / "input"), str(job / "result"), timeout=10)["status"] == "success"
+    assert warm["name"] not in kube.pods
+
+    warm["reset_code"] = 0
+    job = make_job(outputs, "job5")
+    assert warm["runner"].run_script("job5", "", "{}", str(job / "input"), str(job / "result"), timeout=10)["status"] == "success"
+    assert kube.created_names().count(warm["name"]) == 2
+    assert warm["name"] in kube.pods
+
+
+def test_warm_slot_is_replaced_after_a_timeout(kube, warm, tmp_path):
+    warm["hang"] = True
+    job = make_job(tmp_path / "outputs", "job6")
+
+    result = warm["runner"].run_script("job6", "", "{}", str(job / "input"), str(job / "result"), timeout=1)
+
+    assert result["status"] == "timeout"
+    assert ("pod", warm["name"]) in kube.deleted
+    # Not reset: the pod is replaced instead
+    assert all(script != SLOT_RESET_COMMAND for _, script in warm["commands"])
@@ -0,0 +1,190 @@
+"""
+Background generation of image thumbnails and previews.
+
+Library and uploaded images are shown at two reduced sizes: a thumbnail for
+galleries ({stem}.thumb.png, 200 px) and a mid-size preview
+({stem}.preview.png, 1024 px) for the selected-image views. Both are rendered
+from one decode in a process pool, since decoding and normalising large
+TIFFs is CPU-bound and would otherwise run on the request path the first
+time a gallery lists them.
+
+Work is queued on upload and, at startup, for every image whose renditions
+are missing or older than the source, so a changed source is re-rendered.
+A request for a rendition that is not ready yet waits for it (joining the
+queued task rather than decoding the image again).
+
+Configuration (environment):
+    THUMBNAIL_WORKERS      Worker processes (default: 2, at most the CPU count)
+    THUMBNAIL_PREGENERATE  Queue missing/stale renditions at startup (default true)
+    PREVIEW_MAX_SIZE       Longest edge of the preview level in px (default 1024)
+"""
+
+import os
+import time
+import pathlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+try:
+    from backend.image_reader import load_display_image
+except ImportError:
+    from image_reader import load_display_image
+
+
+THUMBNAIL_MAX_SIZE = 200  # px (longest edge)
+PREVIEW_MAX_SIZE = int(os.getenv("PREVIEW_MAX_SIZE", "1024"))
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp"}
+
+# level -> (file suffix, longest edge)
+LEVELS = {
+    "thumb": (".thumb.png", THUMBNAIL_MAX_SIZE),
+    "preview": (".preview.png", PREVIEW_MAX_SIZE),
+}
+
+
+def rendition_path(thumbnail_dir: pathlib.Path, filename: str, level: str = "thumb") -> pathlib.Path:
+    return thumbnail_dir / (pathlib.Path(filename).stem + LEVELS[level][0])
+
+
+def is_stale(source: pathlib.Path, rendition: pathlib.Path) -> bool:
+    """True if rendition is missing or older than its source."""
+    try:
+        return rendition.stat().st_mtime < source.stat().st_mtime
+    except FileNotFoundError:
+        return True
+
+
+def render_levels(source: str, thumbnail_dir: str) -> Dict[str, str]:
+    """Write every level for one image (runs in a worker process)."""
+    source_path = pathlib.Path(source)
+    thumb_dir = pathlib.Path(thumbnail_dir)
+    # Streams uncompressed TIFFs at reduced size; JPEGs are drafted at reduced scale
+    img = load_display_image(source_path, max_size=PREVIEW_MAX_SIZE)
+
+    written = {}
+    # Largest level first, each smaller one is resized from the previous
+    for level, (_, size) in sorted(LEVELS.items(), key=lambda item: -item[1][1]):
+        img.thumbnail((size, size), Image.LANCZOS)
+        target = rendition_path(thumb_dir, source_path.name, level)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        img.save(tmp, format="PNG", optimize=True)
+        os.replace(tmp, target)
+        written[level] = str(target)
+    return written
+
+
+class ThumbnailPipeline:
+    """Process pool that renders thumbnails/previews, with de-duplicated queueing."""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # (source, thumbnail_dir) -> future of the render in progress
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self.completed = 0
+        self.failed = 0
+        self._errors: deque = deque(maxlen=20)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs the event loop and DB threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, source: pathlib.Path, thumbnail_dir: pathlib.Path) -> Future:
+        """Queue rendering of all levels for source, or join the render already queued."""
+        key = (str(source), str(thumbnail_dir))
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            try:
+                future = self._get_executor().submit(render_levels, *key)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory on a huge image): start a new pool
+                self._executor = None
+                future = self._get_executor().submit(render_levels, *key)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def _finished(self, key: Tuple[str, str], future: Future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+                self._errors.append({"source": pathlib.Path(key[0]).name, "error": str(error), "at": time.time()})
+                print(f"[Thumbnail] ⚠ Failed to render {key[0]}: {error}")
+
+    def ensure(self, source: pathlib.Path, thumbnail_dir: pathlib.Path, level: str = "thumb",
+               timeout: float = 30.0) -> Optional[pathlib.Path]:
+        """Return an up-to-date rendition, waiting for the pool to render it if needed."""
+        target = rendition_path(thumbnail_dir, source.name, level)
+        if not is_stale(source, target):
+            return target
+        try:
+            self.submit(source, thumbnail_dir).result(timeout=timeout)
+        except Exception as e:
+            print(f"[Thumbnail] Failed to generate for {source}: {e}")
+            return None
+        return target if target.exists() else None
+
+    def enqueue_stale(self, images: Iterable[Tuple[pathlib.Path, pathlib.Path]]) -> int:
+        """Queue every (source, thumbnail_dir) whose renditions are missing or outdated."""
+        queued = 0
+        for source, thumbnail_dir in images:
+            if source.suffix.lower() not in IMAGE_EXTENSIONS or not source.is_file():
+                continue
+            if any(is_stale(source, rendition_path(thumbnail_dir, source.name, level)) for level in LEVELS):
+                self.submit(source, thumbnail_dir)
+                queued += 1
+        return queued
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "backlog": len(self._pending),
+                "completed": self.completed,
+                "failed": self.failed,
+                "recent_errors": list(self._errors),
+                "levels": {level: size for level, (_, size) in LEVELS.items()},
+            }
+
+
+# Singleton instance
+_pipeline: Optional[ThumbnailPipeline] = None
+
+
+def get_thumbnail_pipeline() -> ThumbnailPipeline:
+    """Get or create the thumbnail pipeline singleton."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = ThumbnailPipeline(
+            max_workers=int(os.getenv("THUMBNAIL_WORKERS", str(min(2, os.cpu_count() or 1))))
+        )
+    return _pipeline
+
+
+def pregenerate_enabled() -> bool:
+    return os.getenv("THUMBNAIL_PREGENERATE", "true").lower() in ("1", "true", "yes")
@@ -0,0 +1,193 @@
+"""
+Parallel per-tile fan-out for multi-tile runs.
+
+Real MAPS invokes a script once per tile, so the tiles of a grid run are
+independent. When input/tileset.json (see MapsBridge) asks for "workers": N,
+the job is split into N shard jobs. Each shard gets its own workspace
+(outputs/{job_id}-shard{k}, a sibling of the parent so every runtime's path
+conventions still hold), the parent's code and inputs hardlinked in, and a
+tileset.json whose "shard" entry makes MapsBridge hand it every N-th tile.
+
+Shards run concurrently through the runner's normal run_script contract.
+Their result files are moved into the parent's result/ and
+fanout_report.json records each shard's status, tiles, files and errors, so
+a partial failure still returns the tiles that worked. The shards' output
+manifests (see output_manifest) are merged the same way, previews included.
+
+Configuration (environment):
+    MAX_TILE_WORKERS  Upper bound on workers per job (default 8)
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import pathlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from backend.input_cache import link_or_copy
+    from backend.output_stream import LineCallback, parse_marker
+    from backend.output_manifest import adopt_entry, read_manifest, write_manifest
+except ImportError:
+    from input_cache import link_or_copy
+    from output_stream import LineCallback, parse_marker
+    from output_manifest import adopt_entry, read_manifest, write_manifest
+
+
+MAX_TILE_WORKERS = int(os.getenv("MAX_TILE_WORKERS", "8"))
+TILESET_CONFIG_NAME = "tileset.json"
+FANOUT_REPORT_NAME = "fanout_report.json"
+# Written by MapsBridge in a shard's output dir: the tiles that shard was given
+SHARD_TILES_FILE_NAME = ".maps_shard_tiles.json"
+
+# run_shard(shard_job_id, on_line) -> runner result dict (status, logs, error, ...)
+ShardRunner = Callable[[str, LineCallback], Awaitable[Dict[str, Any]]]
+
+
+def requested_workers(in_dir: pathlib.Path) -> int:
+    """Number of fan-out workers requested by a job's tileset.json (1 = no fan-out)."""
+    try:
+        tileset = json.loads((in_dir / TILESET_CONFIG_NAME).read_text(encoding="utf-8"))
+        if tileset.get("mode") != "grid":
+            return 1
+        return max(1, min(int(tileset.get("workers", 1)), MAX_TILE_WORKERS))
+    except (OSError, ValueError, TypeError, AttributeError):
+        return 1
+
+
+def shard_job_id(job_id: str, index: int) -> str:
+    return f"{job_id}-shard{index + 1}"
+
+
+def _prepare_shards(job_dir: pathlib.Path, workers: int,
+                    create_workspace: Callable[[str], pathlib.Path]) -> List[pathlib.Path]:
+    tileset = json.loads((job_dir / "input" / TILESET_CONFIG_NAME).read_text(encoding="utf-8"))
+    tileset.pop("workers", None)
+    shard_dirs = []
+    for index in range(workers):
+        shard_dir = create_workspace(shard_job_id(job_dir.name, index))
+        for path in (job_dir / "code").iterdir():
+            if path.is_file():
+                link_or_copy(path, shard_dir / "code" / path.name)
+        for path in (job_dir / "input").iterdir():
+            if path.is_file() and path.name != TILESET_CONFIG_NAME:
+                link_or_copy(path, shard_dir / "input" / path.name)
+        shard_tileset = dict(tileset, shard={"index": index, "count": workers})
+        (shard_dir / "input" / TILESET_CONFIG_NAME).write_text(json.dumps(shard_tileset), encoding="utf-8")
+        shard_dirs.append(shard_dir)
+    return shard_dirs
+
+
+def _merge_shards(job_dir: pathlib.Path, shard_dirs: List[pathlib.Path], results: List[Any]) -> Dict[str, Any]:
+    """Move shard outputs into the parent's result/ and build the combined result."""
+    out_dir = job_dir / "result"
+    workers = len(shard_dirs)
+    report: Dict[str, Any] = {"workers": workers, "succeeded": 0, "failed": 0, "shards": []}
+    logs, errors = [], []
+    manifest_entries = []
+    truncated = False
+
+    for index, (shard_dir, result) in enumerate(zip(shard_dirs, results)):
+        if isinstance(result, BaseException):
+            result = {"status": "error", "exit_code": -1, "error": str(result), "logs": ""}
+        status = result.get("status", "error")
+        shard_out = shard_dir / "result"
+
+        tiles = None
+        tiles_file = shard_out / SHARD_TILES_FILE_NAME
+        if tiles_file.exists():
+            try:
+                tiles = json.loads(tiles_file.read_text(encoding="utf-8"))
+            except ValueError:
+                pass
+
+        # Keep outputs of failed shards too: they may have finished some tiles
+        files = []
+        if shard_out.exists():
+            shard_manifest = read_manifest(shard_out)
+            for path in sorted(shard_out.iterdir()):
+                if not path.is_file() or path.name.startswith("."):
+                    continue
+                target = out_dir / path.name
+                if target.exists():
+                    target = out_dir / f"shard{index + 1}_{path.name}"
+                os.replace(path, target)
+                files.append(target.name)
+                if path.name in shard_manifest:
+                    manifest_entries.append(adopt_entry(shard_manifest[path.name], shard_out, out_dir, target.name))
+
+        entry = {"shard": index + 1, "status": status, "exit_code": result.get("exit_code"),
+                 "tiles": tiles, "files": files}
+        if status == "success":
+            report["succeeded"] += 1
+        else:
+            report["failed"] += 1
+            entry["error"] = (result.get("error") or "")[-2000:]
+            errors.append(f"[shard {index + 1}/{workers}] {entry['error'] or status}")
+        report["shards"].append(entry)
+
+        logs.append(f"===== shard {index + 1}/{workers} ({status}) =====\n{result.get('logs', '')}")
+        truncated = truncated or bool(result.get("output_truncated"))
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    (out_dir / FANOUT_REPORT_NAME).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if manifest_entries:
+        write_manifest(out_dir, manifest_entries)
+
+    if report["succeeded"]:
+        status = "success"
+    elif all(s["status"] == "timeout" for s in report["shards"]):
+        status = "timeout"
+    else:
+        status = "error"
+    return {
+        "status": status,
+        "exit_code": 0 if status == "success" else 1,
+        "logs": "\n".join(logs),
+        "error": "\n".join(errors),
+        "output_truncated": truncated,
+        "fanout": report,
+    }
+
+
+async def run_tile_fanout(
+    job_dir: pathlib.Path,
+    workers: int,
+    create_workspace: Callable[[str], pathlib.Path],
+    run_shard: ShardRunner,
+    on_line: Optional[LineCallback] = None,
+) -> Dict[str, Any]:
+    """Run a tile-grid job as `workers` parallel shards and merge the results.
+
+    Returns a runner-style result dict with an extra "fanout" report. status is
+    "success" if at least one shard succeeded; see report["failed"] for
+    partial failures.
+    """
+    shard_dirs = await asyncio.to_thread(_prepare_shards, job_dir, workers, create_workspace)
+    progress = [0.0] * workers
+
+    def shard_on_line(index: int) -> LineCallback:
+        def _on_line(stream: str, line: str):
+            if on_line is None:
+                return
+            marker = parse_marker(line)
+            if marker is not None and marker["type"] == "progress":
+                # Report overall progress instead of each shard's own
+                progress[index] = marker["percent"]
+                on_line("stdout", f"[PROGRESS] {sum(progress) / workers:.1f}%")
+            elif marker is not None:
+                on_line(stream, line)
+            else:
+                on_line(stream, f"[shard {index + 1}/{workers}] {line}")
+        return _on_line
+
+    print(f"[FANOUT] Running {job_dir.name} as {workers} shard(s)")
+    results = await asyncio.gather(
+        *(run_shard(shard_job_id(job_dir.name, index), shard_on_line(index)) for index in range(workers)),
+        return_exceptions=True
+    )
+    merged = await asyncio.to_thread(_merge_shards, job_dir, shard_dirs, results)
+    report = merged["fanout"]
+    print(f"[FANOUT] {job_dir.name}: {report['succeeded']}/{workers} shard(s) succeeded")
+    return merged
@@ -0,0 +1,203 @@
+"""
+Deep Zoom (DZI) tile pyramids for large images.
+
+Stitched MAPS layers can be 20k x 20k pixels; converting one to a single
+browser PNG is slow and memory hungry, and the browser then has to hold it
+all. Instead the image is cut once into 256 px PNG tiles at every zoom level
+(level N is full size, each level below is half the previous one, level 0 is
+1x1), laid out as Deep Zoom expects:
+
+    {key}/info.json
+    {key}/files/{level}/{column}_{row}.png
+
+A viewer (OpenSeadragon in the frontend) reads the .dzi descriptor and then
+fetches only the tiles covering the visible area at the current zoom.
+
+Pyramids are keyed like derived_cache variants (source path, mtime, size), so
+a changed source gets a new pyramid, and are evicted least-recently-used.
+
+Configuration (environment):
+    TILE_PYRAMID_DIR        Where pyramids are kept (default outputs/.pyramids)
+    TILE_PYRAMID_MAX_BYTES  Size limit before LRU eviction (default 4 GB)
+"""
+
+import os
+import json
+import math
+import shutil
+import pathlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+try:
+    from backend.derived_cache import source_key
+    from backend.image_reader import load_display_image
+except ImportError:
+    from derived_cache import source_key
+    from image_reader import load_display_image
+
+
+TILE_SIZE = 256
+TILE_FORMAT = "png"
+
+# Stitched layers are legitimately larger than PIL's decompression-bomb default
+Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, 1_000_000_000)
+
+
+def _dir_size(path: pathlib.Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def build_pyramid(source: pathlib.Path, out_dir: pathlib.Path) -> Dict[str, Any]:
+    """Write every level of source's tile pyramid into out_dir and return its info."""
+    img = load_display_image(source)
+    width, height = img.size
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+
+    files_dir = out_dir / "files"
+    level_img = img
+    for level in range(max_level, -1, -1):
+        level_dir = files_dir / str(level)
+        level_dir.mkdir(parents=True)
+        level_width, level_height = level_img.size
+        for column in range(math.ceil(level_width / TILE_SIZE)):
+            for row in range(math.ceil(level_height / TILE_SIZE)):
+                box = (column * TILE_SIZE, row * TILE_SIZE,
+                       min((column + 1) * TILE_SIZE, level_width), min((row + 1) * TILE_SIZE, level_height))
+                # Low compression: tiles are written once per source but thousands at a time
+                level_img.crop(box).save(level_dir / f"{column}_{row}.{TILE_FORMAT}", compress_level=3)
+        if level > 0:
+            # Next level is exactly ceil(size / 2), as Deep Zoom viewers expect
+            level_img = level_img.resize(
+                (max(1, math.ceil(level_width / 2)), max(1, math.ceil(level_height / 2))), Image.BOX
+            )
+
+    info = {"width": width, "height": height, "levels": max_level + 1,
+            "tile_size": TILE_SIZE, "format": TILE_FORMAT}
+    (out_dir / "info.json").write_text(json.dumps(info), encoding="utf-8")
+    return info
+
+
+def dzi_descriptor(info: Dict[str, Any]) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+        f'TileSize="{info["tile_size"]}" Overlap="0" Format="{info["format"]}">'
+        f'<Size Width="{info["width"]}" Height="{info["height"]}"/></Image>'
+    )
+
+
+class TilePyramidCache:
+    """On-disk tile pyramids per source version, evicted least-recently-used first."""
+
+    def __init__(self, root: pathlib.Path, max_bytes: int = 4 * 1024 ** 3):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # key -> pyramid size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _load_index(self):
+        found = []
+        for entry in self.root.iterdir():
+            if entry.name.startswith(".") or not (entry / "info.json").exists():
+                # Leftover from an interrupted build
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            found.append((entry.stat().st_mtime, entry.name, _dir_size(entry)))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get(self, source: pathlib.Path) -> tuple[pathlib.Path, Dict[str, Any]]:
+        """Return (pyramid dir, info) for source, building the pyramid on first use."""
+        key = source_key(source, "dzi")
+        entry = self.root / key
+        with self._key_lock(key):
+            if (entry / "info.json").exists():
+                info = json.loads((entry / "info.json").read_text(encoding="utf-8"))
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+            else:
+                tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.root))
+                try:
+                    info = build_pyramid(source, tmp_dir)
+                    os.replace(tmp_dir, entry)
+                except BaseException:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+                size = _dir_size(entry)
+                with self._lock:
+                    self._entries[key] = size
+                    self._total_bytes += size
+                print(f"[Tiles] ✓ Built {info['levels']}-level pyramid for {source.name} "
+                      f"({info['width']}x{info['height']}, {size // 1024} KB)")
+        self._evict(keep=key)
+        return entry, info
+
+    def tile_path(self, source: pathlib.Path, level: int, column: int, row: int) -> Optional[pathlib.Path]:
+        entry, info = self.get(source)
+        if not 0 <= level < info["levels"]:
+            return None
+        path = entry / "files" / str(level) / f"{column}_{row}.{info['format']}"
+        return path if path.exists() else None
+
+    def _evict(self, keep: str):
+        while True:
+            with self._lock:
+                if self._total_bytes <= self.max_bytes:
+                    return
+                victim = victim_lock = None
+                for key in self._entries:
+                    if key == keep:
+                        continue
+                    lock = self._key_locks.setdefault(key, threading.Lock())
+                    # Skip pyramids that are being read right now
+                    if lock.acquire(blocking=False):
+                        victim, victim_lock = key, lock
+                        break
+                if victim is None:
+                    return
+                self._total_bytes -= self._entries.pop(victim)
+            try:
+                shutil.rmtree(self.root / victim, ignore_errors=True)
+            finally:
+                victim_lock.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "pyramids": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Singleton instance
+_cache: Optional[TilePyramidCache] = None
+
+
+def get_tile_pyramids(default_root: pathlib.Path) -> TilePyramidCache:
+    """Get or create the tile pyramid cache singleton."""
+    global _cache
+    if _cache is None:
+        _cache = TilePyramidCache(
+            pathlib.Path(os.getenv("TILE_PYRAMID_DIR", str(default_root))),
+            max_bytes=int(os.getenv("TILE_PYRAMID_MAX_BYTES", str(4 * 1024 ** 3))),
+        )
+    return _cache
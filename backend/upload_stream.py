@@ -0,0 +1,288 @@
+"""
+Streaming and resumable image uploads.
+
+Uploads (job inputs, library images) are copied to disk in CHUNK_SIZE pieces
+and hashed (SHA-256) on the way, instead of being read into memory whole -
+a few concurrent multi-hundred-MB TIFFs would otherwise hold their full size
+in RAM each. The digest goes with the file (StoredUpload) so consumers such
+as the input cache can de-duplicate without reading it again.
+
+Very large files can also be sent in pieces, and resumed after a dropped
+connection:
+
+    POST   /uploads                  filename, size -> {"upload_id", "chunk_size", "received": 0}
+    PUT    /uploads/{id}?offset=N    request body = the bytes from offset N on
+    GET    /uploads/{id}             {"received", "size", ...} - where to resume
+    DELETE /uploads/{id}
+
+A finished upload is then referenced as upload_id on /run, /jobs or
+/library/upload, which take it over (once). Upload ids are random and act
+as the capability to use the data. Unfinished uploads live in memory and
+on disk until UPLOAD_TTL_SECONDS of inactivity; they do not survive a
+server restart.
+
+Configuration (environment):
+    UPLOAD_DIR            Where uploads are staged (default outputs/.uploads)
+    UPLOAD_CHUNK_BYTES    Read/write chunk size (default 1 MB)
+    UPLOAD_MAX_BYTES      Largest accepted upload (default 4 GB)
+    UPLOAD_MAX_PENDING    Unfinished resumable uploads kept at once (default 100)
+    UPLOAD_TTL_SECONDS    Idle time before an unfinished upload is discarded (default 24 h)
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import pathlib
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional
+
+from fastapi import UploadFile
+from starlette.requests import ClientDisconnect
+
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(4 * 1024 ** 3)))
+
+
+class UploadError(Exception):
+    """Upload rejected; carries the HTTP status and extra response fields."""
+
+    def __init__(self, message: str, status_code: int = 400, **extra: Any):
+        super().__init__(message)
+        self.status_code = status_code
+        self.extra = extra
+
+
+@dataclass
+class StoredUpload:
+    """An upload written to disk, with the digest computed while writing it."""
+    path: pathlib.Path
+    sha256: str
+    size: int
+    filename: Optional[str] = None
+
+
+def copy_stream(source: BinaryIO, dest: pathlib.Path, max_bytes: int = UPLOAD_MAX_BYTES,
+                filename: Optional[str] = None) -> StoredUpload:
+    """Copy a file object to dest chunk by chunk, hashing as it goes (blocking).
+
+    dest only appears once complete; a rejected or failed copy leaves nothing.
+    """
+    sha = hashlib.sha256()
+    size = 0
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(tmp, "wb") as out:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"Upload is larger than {max_bytes // 1024 ** 2} MB", 413)
+                sha.update(chunk)
+                out.write(chunk)
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return StoredUpload(dest, sha.hexdigest(), size, filename)
+
+
+async def save_upload(upload: UploadFile, dest: pathlib.Path,
+                      max_bytes: int = UPLOAD_MAX_BYTES) -> StoredUpload:
+    """Write an UploadFile to dest without holding it in memory.
+
+    The request body is already spooled to a temporary file by the framework;
+    the copy runs in a worker thread so the event loop is not blocked.
+    """
+    await upload.seek(0)
+    return await asyncio.to_thread(copy_stream, upload.file, dest, max_bytes, upload.filename)
+
+
+@dataclass
+class _PendingUpload:
+    upload_id: str
+    filename: str
+    path: pathlib.Path
+    size: Optional[int]
+    received: int = 0
+    updated: float = 0.0
+    busy: bool = False
+    sha: Any = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "received": self.received,
+            "complete": self.size is not None and self.received == self.size,
+            "chunk_size": CHUNK_SIZE,
+        }
+
+
+class UploadStore:
+    """Staging area for streamed uploads and unfinished resumable ones."""
+
+    def __init__(self, root: pathlib.Path, max_bytes: int = UPLOAD_MAX_BYTES,
+                 max_pending: int = 100, ttl_seconds: float = 24 * 3600):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_pending = max(1, max_pending)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _PendingUpload] = {}
+        self.completed = 0
+        self.bytes_received = 0
+        # Nothing on disk can be resumed after a restart
+        for leftover in self.root.iterdir():
+            leftover.unlink(missing_ok=True)
+
+    def staging_path(self, filename: Optional[str] = None) -> pathlib.Path:
+        """Fresh path in the staging area for a one-shot upload."""
+        suffix = pathlib.Path(filename).suffix.lower() if filename else ""
+        return self.root / f"{uuid.uuid4().hex}{suffix}"
+
+    async def save(self, upload: UploadFile) -> StoredUpload:
+        """Stage a multipart UploadFile (see save_upload)."""
+        stored = await save_upload(upload, self.staging_path(upload.filename), self.max_bytes)
+        self.completed += 1
+        self.bytes_received += stored.size
+        return stored
+
+    def create(self, filename: str, size: Optional[int] = None) -> Dict[str, Any]:
+        """Start a resumable upload of size bytes (None if unknown)."""
+        if size is not None and size > self.max_bytes:
+            raise UploadError(f"Upload is larger than {self.max_bytes // 1024 ** 2} MB", 413)
+        self.expire()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                raise UploadError("Too many unfinished uploads, try again later", 429)
+            upload_id = uuid.uuid4().hex
+            pending = _PendingUpload(
+                upload_id=upload_id,
+                filename=pathlib.Path(filename or "upload").name,
+                path=self.staging_path(filename),
+                size=size,
+                updated=time.time(),
+                sha=hashlib.sha256(),
+            )
+            pending.path.touch()
+            self._pending[upload_id] = pending
+        return pending.status()
+
+    def _get(self, upload_id: str) -> _PendingUpload:
+        pending = self._pending.get(upload_id)
+        if pending is None:
+            raise UploadError("Upload not found or expired", 404)
+        return pending
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._get(upload_id).status()
+
+    async def append(self, upload_id: str, offset: int, body: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Append a request body at offset, which must equal the bytes received so far.
+
+        A dropped connection keeps whatever arrived; the client resumes from
+        the "received" count reported by status().
+        """
+        with self._lock:
+            pending = self._get(upload_id)
+            if pending.busy:
+                raise UploadError("Another request is writing this upload", 409, received=pending.received)
+            if offset != pending.received:
+                raise UploadError("Offset does not match the bytes received", 409, received=pending.received)
+            pending.busy = True
+
+        buffered = bytearray()
+
+        def flush():
+            # Runs in a worker thread: disk write + hash of one chunk
+            with open(pending.path, "ab") as out:
+                out.write(buffered)
+            pending.sha.update(buffered)
+            pending.received += len(buffered)
+            self.bytes_received += len(buffered)
+            buffered.clear()
+
+        try:
+            try:
+                async for data in body:
+                    if pending.received + len(buffered) + len(data) > (pending.size or self.max_bytes):
+                        raise UploadError("Upload is larger than announced", 413, received=pending.received)
+                    buffered += data
+                    if len(buffered) >= CHUNK_SIZE:
+                        await asyncio.to_thread(flush)
+            except ClientDisconnect:
+                pass
+            if buffered:
+                await asyncio.to_thread(flush)
+        finally:
+            with self._lock:
+                pending.busy = False
+                pending.updated = time.time()
+        return pending.status()
+
+    def take(self, upload_id: str) -> StoredUpload:
+        """Hand a finished resumable upload to its consumer (once)."""
+        with self._lock:
+            pending = self._get(upload_id)
+            if pending.busy:
+                raise UploadError("Upload is still being written", 409, received=pending.received)
+            if pending.size is not None and pending.received != pending.size:
+                raise UploadError("Upload is incomplete", 409, received=pending.received, size=pending.size)
+            if pending.received == 0:
+                raise UploadError("Upload is empty", 400)
+            del self._pending[upload_id]
+        self.completed += 1
+        return StoredUpload(pending.path, pending.sha.hexdigest(), pending.received, pending.filename)
+
+    def discard(self, upload_id: str):
+        with self._lock:
+            pending = self._get(upload_id)
+            if pending.busy:
+                raise UploadError("Upload is still being written", 409, received=pending.received)
+            del self._pending[upload_id]
+        pending.path.unlink(missing_ok=True)
+
+    def expire(self) -> int:
+        """Discard unfinished uploads idle for longer than ttl_seconds."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [p for p in self._pending.values() if not p.busy and p.updated < cutoff]
+            for pending in expired:
+                del self._pending[pending.upload_id]
+        for pending in expired:
+            pending.path.unlink(missing_ok=True)
+        return len(expired)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "pending_bytes": sum(p.received for p in self._pending.values()),
+                "completed": self.completed,
+                "bytes_received": self.bytes_received,
+                "chunk_size": CHUNK_SIZE,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Singleton instance
+_store: Optional[UploadStore] = None
+
+
+def get_upload_store(default_root: pathlib.Path) -> UploadStore:
+    """Get or create the upload store singleton."""
+    global _store
+    if _store is None:
+        _store = UploadStore(
+            pathlib.Path(os.getenv("UPLOAD_DIR", str(default_root))),
+            max_bytes=UPLOAD_MAX_BYTES,
+            max_pending=int(os.getenv("UPLOAD_MAX_PENDING", "100")),
+            ttl_seconds=float(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600))),
+        )
+    return _store
@@ -0,0 +1,456 @@
+"""
+Warm pool runner for executing user scripts in pre-started Docker containers.
+
+Each worker is a py-exec container started with MAPS_WARM_WORKER=1: job_runner.py
+imports skimage, matplotlib and MapsBridge up front and then blocks on stdin.
+A job is handed over as a single JSON line on that stdin channel; the worker runs
+it and exits (--rm), so every job still gets a fresh container. The pool keeps a
+number of idle workers between the low and high watermarks so that most jobs skip
+the container start and import cost.
+
+The job directory isn't known when a worker starts, so each worker gets a
+private slot directory (outputs/.warm/<worker>/) instead, mounted as
+/job (read-only) and /output. On dispatch the job's code, request and
+inputs are staged into slot/job (hard links where possible; the mount is
+read-only, so the script cannot change the originals), and once it exits
+everything it wrote to /output is moved into the job's result directory and
+the slot is removed. A script therefore sees only its own job, as with the
+cold docker runner's per-job mounts.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import pathlib
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+
+try:
+    from backend.docker_runner import DockerRunner
+    from backend.input_cache import link_or_copy, move_tree
+    from backend.output_stream import LineCallback, stream_process_output
+except ImportError:
+    from docker_runner import DockerRunner
+    from input_cache import link_or_copy, move_tree
+    from output_stream import LineCallback, stream_process_output
+
+
+WARM_READY_MARKER = "[WARM] worker ready"
+
+
+class WarmWorker:
+    """A single pre-started sandbox container waiting for one job."""
+
+    def __init__(self, name: str, process: subprocess.Popen, slot: pathlib.Path):
+        self.name = name
+        self.process = process
+        self.slot = slot
+        self.started_at = time.time()
+        self.ready = threading.Event()
+        self.failed = False
+
+    def wait_until_ready(self):
+        """Consume stdout until the worker reports it has finished importing."""
+        try:
+            for line in self.process.stdout:
+                if line.strip() == WARM_READY_MARKER:
+                    self.ready.set()
+                    return
+        except Exception:
+            pass
+        # stdout closed before the marker: the container died during startup
+        self.failed = True
+        self.ready.set()
+
+    def is_alive(self) -> bool:
+        return not self.failed and self.process.poll() is None
+
+
+class WarmPoolRunner(DockerRunner):
+    """Drop-in replacement for DockerRunner backed by a pool of warm workers."""
+
+    def __init__(
+        self,
+        runner_image: str = "py-exec:latest",
+        timeout: int = 600,
+        outputs_dir: Optional[str] = None,
+        pool_size: int = 4,
+        low_watermark: int = 1,
+        high_watermark: int = 2,
+        startup_timeout: int = 60,
+    ):
+        """Initialize the pool and start filling it in the background.
+
+        Args:
+            pool_size: Maximum number of worker containers (idle + busy)
+            low_watermark: Refill starts when idle workers drop below this
+            high_watermark: Refill tops idle workers up to this level
+            startup_timeout: Max seconds to wait for a worker to become ready
+        """
+        super().__init__(runner_image, timeout)
+        self.outputs_dir = pathlib.Path(outputs_dir).resolve() if outputs_dir else (
+            pathlib.Path(__file__).resolve().parent.parent / "outputs"
+        )
+        self.pool_size = max(1, pool_size)
+        self.high_watermark = max(0, min(high_watermark, self.pool_size))
+        self.low_watermark = max(0, min(low_watermark, self.high_watermark))
+        self.startup_timeout = startup_timeout
+        # Per-worker job directories; leftovers of a previous backend belong to dead workers
+        self.slots_dir = self.outputs_dir / ".warm"
+        shutil.rmtree(self.slots_dir, ignore_errors=True)
+
+        self._idle: deque = deque()
+        self._starting = 0
+        self._busy = 0
+        self._lock = threading.Condition()
+        self._shutdown = False
+
+        self._stats = {
+            "pool_hits": 0,
+            "cold_starts": 0,
+            "fallbacks": 0,
+            "workers_started": 0,
+            "workers_failed": 0,
+        }
+        # Recent (dispatch_latency, total_latency) samples per kind
+        self._latency = {"pool_hit": deque(maxlen=200), "cold_start": deque(maxlen=200)}
+
+        # Dispatch blocks on the worker's pipes, so async callers run it here
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="warm-pool-dispatch")
+
+        self._refill_thread = threading.Thread(target=self._refill_loop, name="warm-pool-refill", daemon=True)
+        self._refill_thread.start()
+        print(f"✓ Warm pool initialized (size={self.pool_size}, "
+              f"watermarks={self.low_watermark}/{self.high_watermark})")
+
+    # ------------------------------------------------------------------
+    # Worker lifecycle
+    # ------------------------------------------------------------------
+
+    def _start_worker(self) -> WarmWorker:
+        """Start a new worker container and begin watching for readiness."""
+        name = f"warm-{uuid.uuid4().hex[:12]}"
+        slot = self.slots_dir / name
+        (slot / "job").mkdir(parents=True)
+        (slot / "result").mkdir()
+        # The sandbox runs as an unprivileged user
+        os.chmod(slot / "result", 0o777)
+        docker_cmd = [
+            "docker", "run",
+            "-i", "--rm",
+            "--name", name,
+            "-v", f"{self._to_host_path(str(slot / 'job'))}:/job:ro",
+            "-v", f"{self._to_host_path(str(slot / 'result'))}:/output",
+            "-e", "MAPS_WARM_WORKER=1",
+            self.runner_image
+        ]
+        try:
+            process = subprocess.Popen(
+                docker_cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                bufsize=1
+            )
+        except Exception:
+            shutil.rmtree(slot, ignore_errors=True)
+            raise
+        worker = WarmWorker(name, process, slot)
+        threading.Thread(target=worker.wait_until_ready, name=f"{name}-ready", daemon=True).start()
+        with self._lock:
+            self._stats["workers_started"] += 1
+        return worker
+
+    def _discard_worker(self, worker: WarmWorker, keep_slot: bool = False):
+        """Stop a worker that will not be used (dead, slow or pool shutdown)."""
+        try:
+            if worker.process.stdin:
+                worker.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            subprocess.run(["docker", "rm", "-f", worker.name], capture_output=True, timeout=10)
+        except Exception:
+            pass
+        try:
+            worker.process.kill()
+        except Exception:
+            pass
+        if not keep_slot:
+            shutil.rmtree(worker.slot, ignore_errors=True)
+
+    def _total_workers(self) -> int:
+        return len(self._idle) + self._starting + self._busy
+
+    def _refill_loop(self):
+        """Keep the number of idle workers between the watermarks."""
+        while True:
+            with self._lock:
+                while not self._shutdown and not self._needs_refill():
+                    self._lock.wait(timeout=5)
+                if self._shutdown:
+                    return
+                # Drop workers that died while idle
+                for worker in [w for w in self._idle if not w.is_alive()]:
+                    self._idle.remove(worker)
+                # Top up to the high watermark within the size budget
+                target = min(self.high_watermark - len(self._idle) - self._starting,
+                             self.pool_size - self._total_workers())
+                self._starting += max(0, target)
+
+            for _ in range(max(0, target)):
+                try:
+                    worker = self._start_worker()
+                    ready = worker.ready.wait(timeout=self.startup_timeout)
+                except Exception as e:
+                    print(f"⚠ Warm pool: failed to start worker: {e}")
+                    worker, ready = None, False
+
+                with self._lock:
+                    self._starting -= 1
+                    if worker is not None and ready and worker.is_alive() and not self._shutdown:
+                        self._idle.append(worker)
+                    else:
+                        self._stats["workers_failed"] += 1
+                        if worker is not None:
+                            self._discard_worker(worker)
+                    self._lock.notify_all()
+
+            if target <= 0:
+                # Nothing could be started (pool full); wait for a release
+                with self._lock:
+                    self._lock.wait(timeout=5)
+
+    def _needs_refill(self) -> bool:
+        idle_alive = sum(1 for w in self._idle if w.is_alive())
+        return (idle_alive + self._starting) < self.low_watermark or idle_alive != len(self._idle)
+
+    def _acquire_worker(self):
+        """Take an idle worker, or start one on demand (cold start).
+
+        Returns (worker, kind) where kind is "pool_hit" or "cold_start".
+        """
+        deadline = time.time() + self.startup_timeout
+        with self._lock:
+            while True:
+                while self._idle:
+                    worker = self._idle.popleft()
+                    if worker.is_alive():
+                        self._busy += 1
+                        self._lock.notify_all()  # may have dropped below the low watermark
+                        return worker, "pool_hit"
+                if self._total_workers() < self.pool_size:
+                    break
+                # Pool is at capacity: wait for a starting worker or a release
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError("Warm pool is at capacity")
+                self._lock.wait(timeout=remaining)
+            self._busy += 1
+
+        worker = self._start_worker()
+        if not worker.ready.wait(timeout=self.startup_timeout) or not worker.is_alive():
+            self._discard_worker(worker)
+            with self._lock:
+                self._busy -= 1
+                self._stats["workers_failed"] += 1
+            raise RuntimeError("Warm pool worker failed to start")
+        return worker, "cold_start"
+
+    def _release_worker(self):
+        with self._lock:
+            self._busy -= 1
+            self._lock.notify_all()
+
+    # ------------------------------------------------------------------
+    # Public runner interface
+    # ------------------------------------------------------------------
+
+    def run_script(
+        self,
+        job_id: str,
+        script_path: str,
+        request_path: str,
+        input_path: str,
+        output_path: str,
+        timeout: Optional[int] = None,
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a script in a warm worker.
+
+        Same contract as DockerRunner.run_script. Falls back to a cold
+        `docker run` when no worker can be had.
+
+        Returns:
+            Dict with status, exit_code, stdout, stderr, output_truncated
+        """
+        timeout = timeout or self.default_timeout
+        requested_at = time.time()
+
+        try:
+            worker, kind = self._acquire_worker()
+        except Exception as e:
+            print(f"⚠ Warm pool unavailable ({e}), falling back to cold docker run")
+            with self._lock:
+                self._stats["fallbacks"] += 1
+            return super().run_script(job_id, script_path, request_path, input_path,
+                                      output_path, timeout, script_parameters, on_line)
+
+        dispatched_at = time.time()
+        job_spec = {
+            "job_id": job_id,
+            "job_dir": "/job",
+            "script_parameters": script_parameters or ""
+        }
+        print(f"Dispatching job {job_id} to warm worker {worker.name} ({kind})")
+
+        try:
+            self._stage_job(worker.slot / "job", script_path, request_path, input_path)
+            worker.process.stdin.write(json.dumps(job_spec) + "\n")
+            worker.process.stdin.close()
+            stdout, stderr, truncated = stream_process_output(worker.process, timeout, on_line)
+            result = {
+                "status": "success" if worker.process.returncode == 0 else "failed",
+                "exit_code": worker.process.returncode,
+                "stdout": stdout,
+                "stderr": stderr,
+                "logs": stdout + stderr,
+                "output_truncated": truncated
+            }
+        except subprocess.TimeoutExpired:
+            self._discard_worker(worker, keep_slot=True)
+            result = {
+                "status": "timeout",
+                "exit_code": -1,
+                "stdout": "",
+                "stderr": f"Script execution timed out after {timeout} seconds",
+                "logs": f"Script execution timed out after {timeout} seconds"
+            }
+        except Exception as e:
+            self._discard_worker(worker, keep_slot=True)
+            result = {
+                "status": "failed",
+                "exit_code": -1,
+                "stdout": "",
+                "stderr": f"Docker execution error: {str(e)}",
+                "logs": f"Docker execution error: {str(e)}"
+            }
+        finally:
+            try:
+                move_tree(worker.slot / "result", pathlib.Path(output_path))
+            except Exception as e:
+                print(f"⚠ Warm pool: failed to collect outputs of job {job_id}: {e}")
+            shutil.rmtree(worker.slot, ignore_errors=True)
+            self._release_worker()
+
+        finished_at = time.time()
+        with self._lock:
+            self._stats["pool_hits" if kind == "pool_hit" else "cold_starts"] += 1
+            self._latency[kind].append((dispatched_at - requested_at, finished_at - requested_at))
+
+        return result
+
+    @staticmethod
+    def _stage_job(job_root: pathlib.Path, script_path: str, request_path: str, input_path: str):
+        """Lay out code/main.py, code/request.json and input/ for a worker's read-only /job mount."""
+        (job_root / "code").mkdir(exist_ok=True)
+        link_or_copy(script_path, job_root / "code" / "main.py")
+        if os.path.exists(request_path):
+            link_or_copy(request_path, job_root / "code" / "request.json")
+        shutil.copytree(input_path, job_root / "input", copy_function=link_or_copy, dirs_exist_ok=True)
+
+    async def run_script_async(
+        self,
+        job_id: str,
+        script_path: str,
+        request_path: str,
+        input_path: str,
+        output_path: str,
+        timeout: Optional[int] = None,
+        script_parameters: str = "",
+        on_line: Optional[LineCallback] = None
+    ) -> Dict[str, Any]:
+        """Execute a script in a warm worker without blocking the event loop.
+
+        Dispatch runs on a thread pool bounded by the pool size, so at most
+        pool_size jobs are talking to workers at once. on_line is called on
+        the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        threadsafe_on_line = None
+        if on_line is not None:
+            threadsafe_on_line = lambda stream, line: loop.call_soon_threadsafe(on_line, stream, line)
+        return await loop.run_in_executor(
+            self._executor, self.run_script, job_id, script_path, request_path,
+            input_path, output_path, timeout, script_parameters, threadsafe_on_line
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool occupancy plus pool-hit vs cold-start latency (seconds)."""
+        def summarize(samples: List[tuple]) -> Dict[str, Any]:
+            if not samples:
+                return {"count": 0}
+            dispatch = sorted(s[0] for s in samples)
+            total = sorted(s[1] for s in samples)
+            return {
+                "count": len(samples),
+                "dispatch_p50": round(dispatch[len(dispatch) // 2], 3),
+                "dispatch_max": round(dispatch[-1], 3),
+                "total_p50": round(total[len(total) // 2], 3),
+                "total_p95": round(total[min(len(total) - 1, int(len(total) * 0.95))], 3),
+            }
+
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "low_watermark": self.low_watermark,
+                "high_watermark": self.high_watermark,
+                "idle": len(self._idle),
+                "starting": self._starting,
+                "busy": self._busy,
+                **self._stats,
+                "latency": {kind: summarize(list(samples)) for kind, samples in self._latency.items()},
+            }
+
+    def shutdown(self):
+        """Stop the refill thread and remove idle workers."""
+        with self._lock:
+            self._shutdown = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._lock.notify_all()
+        for worker in idle:
+            self._discard_worker(worker)
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+_runner: Optional[WarmPoolRunner] = None
+
+
+def get_runner() -> WarmPoolRunner:
+    """Get or create the warm pool runner instance."""
+    global _runner
+    if _runner is None:
+        runner_image = os.getenv("RUNNER_IMAGE", "py-exec:latest")
+        timeout = int(os.getenv("SCRIPT_TIMEOUT", "600"))
+        _runner = WarmPoolRunner(
+            runner_image,
+            timeout,
+            outputs_dir=os.getenv("WARM_POOL_OUTPUTS_DIR") or None,
+            pool_size=int(os.getenv("WARM_POOL_SIZE", "4")),
+            low_watermark=int(os.getenv("WARM_POOL_LOW_WATERMARK", "1")),
+            high_watermark=int(os.getenv("WARM_POOL_HIGH_WATERMARK", "2")),
+        )
+    return _runner
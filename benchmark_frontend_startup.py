@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Frontend Start-up Benchmark
+
+Compares what a page load costs before the app can render when app.jsx is
+transpiled in the browser (dev mode: @babel/standalone + app.jsx) and when the
+precompiled bundle is served (STATIC_MODE=production: app.js from
+frontend/build.mjs). Reports the bytes downloaded (raw and gzip) and the
+main-thread time to get executable code, measured in node's V8 (the engine
+of Chrome/Edge):
+
+    babel:   load babel.min.js + Babel.transform(app.jsx) + compile the output
+    bundle:  compile app.js
+
+Needs node and the frontend build tooling:
+    cd frontend && npm install && npm run build
+
+Usage:
+    python benchmark_frontend_startup.py
+    python benchmark_frontend_startup.py --repeat 10
+"""
+
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import pathlib
+import argparse
+import subprocess
+
+# Add backend to path
+sys.path.insert(0, str(pathlib.Path(__file__).parent / "backend"))
+
+from static_assets import compile_frontend
+
+FRONTEND_DIR = pathlib.Path(__file__).parent / "frontend"
+BABEL_PATH = FRONTEND_DIR / "node_modules" / "@babel" / "standalone" / "babel.min.js"
+
+# Runs in node from frontend/; prints one JSON object of timings in ms per run
+_DRIVER = r"""
+const fs = require('fs');
+const vm = require('vm');
+const { performance } = require('perf_hooks');
+const [babelPath, sourcePath, bundlePath, repeat] = process.argv.slice(1);
+const babelCode = fs.readFileSync(babelPath, 'utf8');
+const source = fs.readFileSync(sourcePath, 'utf8');
+const bundle = fs.readFileSync(bundlePath, 'utf8');
+const results = { babel_load: [], transform: [], compile_output: [], bundle_compile: [] };
+for (let i = 0; i < Number(repeat); i++) {
+  // A fresh context per run, as on every page load
+  const context = vm.createContext({ console, self: {}, window: {} });
+  let t = performance.now();
+  new vm.Script(babelCode, { filename: `babel-${i}.js` }).runInContext(context);
+  results.babel_load.push(performance.now() - t);
+  const Babel = context.Babel || context.window.Babel || context.self.Babel;
+  // The presets @babel/standalone applies to <script type="text/babel">
+  t = performance.now();
+  const output = Babel.transform(source, { presets: ['env', 'react'], filename: 'app.jsx' }).code;
+  results.transform.push(performance.now() - t);
+  t = performance.now();
+  new vm.Script(output, { filename: `app-${i}.jsx.js` });
+  results.compile_output.push(performance.now() - t);
+  t = performance.now();
+  new vm.Script(bundle, { filename: `app-${i}.js` });
+  results.bundle_compile.push(performance.now() - t);
+}
+console.log(JSON.stringify(results));
+"""
+
+
+def sizes(*paths: pathlib.Path):
+    """Total raw and gzip-9 bytes of the files."""
+    raw = zipped = 0
+    for path in paths:
+        data = path.read_bytes()
+        raw += len(data)
+        zipped += len(gzip.compress(data, compresslevel=9))
+    return raw, zipped
+
+
+def bundle_is_current() -> bool:
+    bundle = FRONTEND_DIR / "app.js"
+    if not bundle.exists():
+        return False
+    digest = hashlib.sha256((FRONTEND_DIR / "app.jsx").read_bytes()).hexdigest()
+    return f"sha256:{digest}" in bundle.read_text(encoding="utf-8", errors="replace").split("\n", 1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Page loads to simulate (best/median reported)")
+    args = parser.parse_args()
+
+    if shutil.which("node") is None or not BABEL_PATH.exists():
+        print("node and the frontend tooling are required: cd frontend && npm install")
+        return 1
+    if not bundle_is_current() and not compile_frontend(FRONTEND_DIR):
+        print("Could not compile frontend/app.js (cd frontend && npm run build)")
+        return 1
+
+    source, bundle = FRONTEND_DIR / "app.jsx", FRONTEND_DIR / "app.js"
+    result = subprocess.run(
+        ["node", "-e", _DRIVER, str(BABEL_PATH), str(source), str(bundle), str(args.repeat)],
+        cwd=FRONTEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        return 1
+    timings = json.loads(result.stdout)
+
+    def stats(values):
+        ordered = sorted(values)
+        return ordered[0], ordered[len(ordered) // 2]
+
+    babel_runs = [sum(run) for run in zip(timings["babel_load"], timings["transform"], timings["compile_output"])]
+    kb = 1024
+    print(f"{'mode':<8} {'raw KB':>9} {'gzip KB':>9} {'best ms':>9} {'median ms':>10}")
+    for mode, files, runs in (
+        ("babel", (BABEL_PATH, source), babel_runs),
+        ("bundle", (bundle,), timings["bundle_compile"]),
+    ):
+        raw, zipped = sizes(*files)
+        best, median = stats(runs)
+        print(f"{mode:<8} {raw / kb:>9.0f} {zipped / kb:>9.0f} {best:>9.1f} {median:>10.1f}")
+
+    print()
+    for step in ("babel_load", "transform", "compile_output"):
+        best, median = stats(timings[step])
+        print(f"  babel {step:<15} best {best:>8.1f} ms   median {median:>8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
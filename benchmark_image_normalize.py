@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Image Normalisation Benchmark
+
+Compares backend/image_normalize.py with the per-endpoint normalisation it
+replaced (float64 whole-image arithmetic) on the library TIFFs and, optionally,
+a synthetic 8k x 8k 16-bit image. Reports wall time and peak extra memory
+(numpy allocations, measured with tracemalloc) per conversion.
+
+Usage:
+    python benchmark_image_normalize.py                # library/images/*.tif*
+    python benchmark_image_normalize.py --synthetic    # also an 8192x8192 uint16 image
+    python benchmark_image_normalize.py --contrast 0.5 99.5
+"""
+
+import sys
+import time
+import pathlib
+import argparse
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+# Add backend to path
+sys.path.insert(0, str(pathlib.Path(__file__).parent / "backend"))
+
+from image_normalize import normalize_array
+
+LIBRARY_IMAGES_DIR = pathlib.Path(__file__).parent / "library" / "images"
+
+
+def legacy_normalize(img_array: np.ndarray):
+    """The normalisation previously copied into each display endpoint."""
+    needs_normalization = False
+    if img_array.dtype in [np.uint16, np.uint32, np.int16, np.int32]:
+        needs_normalization = True
+    elif img_array.dtype in [np.float32, np.float64]:
+        needs_normalization = True
+    elif img_array.dtype == np.uint8:
+        max_val = img_array.max()
+        if max_val < 100 and max_val > 1:
+            needs_normalization = True
+    if needs_normalization and img_array.size > 0:
+        min_val = img_array.min()
+        max_val = img_array.max()
+        if max_val > min_val:
+            return ((img_array - min_val) / (max_val - min_val) * 255).astype(np.uint8)
+        return np.zeros_like(img_array, dtype=np.uint8)
+    return None
+
+
+def measure(fn, arr: np.ndarray, repeat: int):
+    """Best wall time and peak traced memory of fn(arr)."""
+    best = float("inf")
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn(arr)
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def bench(name: str, arr: np.ndarray, repeat: int, contrast):
+    old_t, old_mem, old = measure(legacy_normalize, arr, repeat)
+    new_t, new_mem, new = measure(lambda a: normalize_array(a, contrast), arr, repeat)
+    if contrast is None and old is not None and new is not None:
+        # LUT rounding may differ by one level from float64 truncation
+        diff = int(np.abs(old.astype(np.int16) - new.astype(np.int16)).max())
+    else:
+        diff = "-"
+    mb = 1024 * 1024
+    print(f"{name[:40]:<40} {str(arr.shape):>18} {str(arr.dtype):>8} "
+          f"{old_t * 1000:>9.1f} {new_t * 1000:>9.1f} "
+          f"{old_mem / mb:>9.1f} {new_mem / mb:>9.1f} {diff!s:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--synthetic", action="store_true", help="Include an 8192x8192 uint16 image")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image (best time is reported)")
+    parser.add_argument("--contrast", type=float, nargs=2, metavar=("LOW", "HIGH"),
+                        help="Benchmark percentile contrast for the new path")
+    args = parser.parse_args()
+    contrast = tuple(args.contrast) if args.contrast else None
+
+    images = []
+    for path in sorted(LIBRARY_IMAGES_DIR.glob("*.tif*")):
+        images.append((path.name, np.asarray(Image.open(path))))
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        images.append(("synthetic 8k uint16", rng.integers(0, 65535, (8192, 8192), dtype=np.uint16)))
+        images.append(("synthetic 4k float32", rng.random((4096, 4096), dtype=np.float32)))
+    if not images:
+        print(f"No TIFF images found in {LIBRARY_IMAGES_DIR}")
+        return 1
+
+    print(f"{'image':<40} {'shape':>18} {'dtype':>8} {'old ms':>9} {'new ms':>9} "
+          f"{'old MB':>9} {'new MB':>9} {'diff':>5}")
+    for name, arr in images:
+        bench(name, arr, args.repeat, contrast)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -119,7 +119,11 @@ const FileIcon = ({ file }) => {
   };
 
   return (
-    <div className="file-icon-item" onClick={handleDownload}>
+    <div
+      className="file-icon-item"
+      onClick={handleDownload}
+      title={file.size != null ? `${file.name} (${(file.size / 1024).toFixed(1)} KB)` : file.name}
+    >
       <div className="file-icon-wrapper">
         <span className="material-symbols-outlined file-icon">
           {getFileIcon(file.type)}
@@ -131,12 +135,109 @@ const FileIcon = ({ file }) => {
   );
 };
 
+// Images with more pixels than this open as Deep Zoom tiles (only visible tiles are fetched)
+const DEEP_ZOOM_MIN_PIXELS = 4096 * 4096;
+
+const isDeepZoomImage = (image) => !!(
+  image && image.dzi_url && window.OpenSeadragon &&
+  (image.width || 0) * (image.height || 0) >= DEEP_ZOOM_MIN_PIXELS
+);
+
+// Files larger than this are sent through the resumable /uploads API
+const CHUNKED_UPLOAD_MIN_BYTES = 32 * 1024 * 1024;
+const UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024;
+
+// Send a file in chunks, resuming from the server's byte count after a failed request.
+// Returns the upload_id to pass to /run, /jobs or /library/upload instead of the file.
+const uploadResumable = async (file, maxRetries = 5) => {
+  const createForm = new FormData();
+  createForm.append('filename', file.name);
+  createForm.append('size', String(file.size));
+  const created = await fetch('/uploads', { method: 'POST', body: createForm });
+  if (!created.ok) {
+    const error = await created.json().catch(() => ({}));
+    throw new Error(error.error || 'Could not start upload');
+  }
+  const { upload_id: uploadId } = await created.json();
+
+  let offset = 0;
+  let failures = 0;
+  while (offset < file.size) {
+    try {
+      const response = await fetch(`/uploads/${uploadId}?offset=${offset}`, {
+        method: 'PUT',
+        body: file.slice(offset, offset + UPLOAD_CHUNK_BYTES)
+      });
+      const status = await response.json();
+      if (!response.ok && status.received === undefined) {
+        throw new Error(status.error || 'Upload failed');
+      }
+      offset = status.received;
+      failures = 0;
+    } catch (error) {
+      failures += 1;
+      if (failures > maxRetries) throw error;
+      // Ask the server how much arrived before retrying from there
+      const progress = await fetch(`/uploads/${uploadId}`).then(r => r.json()).catch(() => null);
+      if (progress && progress.received !== undefined) offset = progress.received;
+      await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+    }
+  }
+  return uploadId;
+};
+
+// Files up to this size are hashed in the browser so known content skips the upload
+const CONTENT_HASH_MAX_BYTES = 256 * 1024 * 1024;
+
+// Hex SHA-256 of a file, or null when the browser cannot hash it here
+const sha256Hex = async (file) => {
+  if (!window.crypto || !window.crypto.subtle || file.size > CONTENT_HASH_MAX_BYTES) return null;
+  try {
+    const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+  } catch (error) {
+    return null;
+  }
+};
+
+// Add a file to form data, as an upload_id for large files
+const appendImageFile = async (formData, file) => {
+  if (file.size >= CHUNKED_UPLOAD_MIN_BYTES) {
+    formData.append('upload_id', await uploadResumable(file));
+  } else {
+    formData.append('image', file);
+  }
+};
+
+// Tiled viewer for large images (OpenSeadragon reading the backend's /tiles pyramid)
+const DeepZoomView = ({ dziUrl, viewerRef }) => {
+  const containerRef = useRef(null);
+
+  useEffect(() => {
+    const viewer = window.OpenSeadragon({
+      element: containerRef.current,
+      tileSources: dziUrl,
+      showNavigationControl: false,
+      visibilityRatio: 0.5,
+      maxZoomPixelRatio: 4
+    });
+    viewerRef.current = viewer;
+    return () => {
+      viewer.destroy();
+      viewerRef.current = null;
+    };
+  }, [dziUrl]);
+
+  return <div ref={containerRef} className="deep-zoom-view" />;
+};
+
 // Image Viewer Modal Component with Pan/Zoom
 const ImageViewerModal = ({ isOpen, image, onClose, isDark = false }) => {
   const [scale, setScale] = useState(1);
   const [position, setPosition] = useState({ x: 0, y: 0 });
   const [isDragging, setIsDragging] = useState(false);
   const [dragStart, setDragStart] = useState({ x: 0, y: 0 });
+  const deepZoomRef = useRef(null);
 
   // Reset when image changes
   useEffect(() => {
@@ -148,6 +249,16 @@ const ImageViewerModal = ({ isOpen, image, onClose, isDark = false }) => {
 
   if (!isOpen || !image) return null;
 
+  const deepZoom = isDeepZoomImage(image);
+
+  const zoomBy = (factor, step) => {
+    if (deepZoom) {
+      if (deepZoomRef.current) deepZoomRef.current.viewport.zoomBy(factor);
+    } else {
+      setScale(s => Math.max(0.1, Math.min(5, s + step)));
+    }
+  };
+
   const handleWheel = (e) => {
     e.preventDefault();
     const delta = e.deltaY > 0 ? -0.1 : 0.1;
@@ -174,6 +285,10 @@ const ImageViewerModal = ({ isOpen, image, onClose, isDark = false }) => {
   };
 
   const handleReset = () => {
+    if (deepZoom) {
+      if (deepZoomRef.current) deepZoomRef.current.viewport.goHome();
+      return;
+    }
     setScale(1);
     setPosition({ x: 0, y: 0 });
   };
@@ -187,11 +302,11 @@ const ImageViewerModal = ({ isOpen, image, onClose, isDark = false }) => {
             <h3>{image.name}</h3>
           </div>
           <div className="viewer-controls">
-            <button className="viewer-btn" onClick={() => setScale(s => Math.max(0.1, s - 0.25))} title="Zoom Out">
+            <button className="viewer-btn" onClick={() => zoomBy(0.8, -0.25)} title="Zoom Out">
               <span className="material-symbols-outlined">zoom_out</span>
             </button>
-            <span className="viewer-zoom-level">{Math.round(scale * 100)}%</span>
-            <button className="viewer-btn" onClick={() => setScale(s => Math.min(5, s + 0.25))} title="Zoom In">
+            <span className="viewer-zoom-level">{deepZoom ? 'Tiled' : `${Math.round(scale * 100)}%`}</span>
+            <button className="viewer-btn" onClick={() => zoomBy(1.25, 0.25)} title="Zoom In">
               <span className="material-symbols-outlined">zoom_in</span>
             </button>
             <button className="viewer-btn" onClick={handleReset} title="Reset View">
@@ -204,14 +319,17 @@ const ImageViewerModal = ({ isOpen, image, onClose, isDark = false }) => {
         </div>
         <div 
           className="image-viewer-content"
-          onMouseDown={handleMouseDown}
-          onWheel={handleWheel}
+          onMouseDown={deepZoom ? undefined : handleMouseDown}
+          onWheel={deepZoom ? undefined : handleWheel}
           style={{
             background: isDark 
               ? '#1a1f2e' // Solid dark background for dark mode
               : '#f5f5f5'  // Light gray for light mode
           }}
         >
+          {deepZoom ? (
+            <DeepZoomView dziUrl={image.dzi_url} viewerRef={deepZoomRef} />
+          ) : (
           <img 
             src={image.url}
             alt={image.name}
@@ -222,6 +340,7 @@ const ImageViewerModal = ({ isOpen, image, onClose, isDark = false }) => {
             }}
             draggable={false}
           />
+          )}
         </div>
         <div className="image-viewer-footer">
           <span className="material-symbols-outlined" style={{fontSize: '16px'}}>info</span>
@@ -436,7 +555,6 @@ const UploadModal = ({ isOpen, onClose, onUpload, currentUser }) => {
 
     setUploading(true);
     const formData = new FormData();
-    formData.append('image', file);
     formData.append('name', name);
     formData.append('description', description);
     formData.append('image_type', imageType);
@@ -446,11 +564,25 @@ const UploadModal = ({ isOpen, onClose, onUpload, currentUser }) => {
     if (token) headers['Authorization'] = `Bearer ${token}`;
 
     try {
-      const response = await fetch('/library/upload', {
-        method: 'POST',
-        headers,
-        body: formData
-      });
+      // Offer the content hash first: an image that is already stored is not sent again
+      const digest = await sha256Hex(file);
+      let response = null;
+      if (digest) {
+        formData.append('content_hash', digest);
+        response = await fetch('/library/upload', { method: 'POST', headers, body: formData });
+        if (response.status === 404) {
+          const data = await response.clone().json().catch(() => ({}));
+          if (data.unknown_content) response = null;
+        }
+      }
+      if (!response) {
+        await appendImageFile(formData, file);
+        response = await fetch('/library/upload', {
+          method: 'POST',
+          headers,
+          body: formData
+        });
+      }
 
       if (response.status === 403) {
         const data = await response.json().catch(() => ({}));
@@ -734,7 +866,8 @@ const Thumbnail = ({ file, isSelected, onClick, onView }) => {
       onClick={() => onClick(file.url)}
     >
       <div className="thumbnail-wrapper">
-        <img src={file.url} alt={file.name} className="thumbnail-image" />
+        {/* Outputs come with a small preview rendered by the runner; the full file is only fetched when selected */}
+        <img src={file.preview_url || file.url} alt={file.name} className="thumbnail-image" />
         {isSelected && (
           <div className="thumbnail-overlay">
             <span className="material-symbols-outlined">check_circle</span>
@@ -3294,7 +3427,12 @@ if __name__ == "__main__":
     console.log('[MapsScriptHelper] hasUrl?', imageToUse && imageToUse.url);
     console.log('[MapsScriptHelper] uploadedFile:', uploadedFile);
     console.log('[MapsScriptHelper] ===========================');
-    if (imageToUse && imageToUse.url) {
+    if (imageToUse && imageToUse.id) {
+      // Stored image: pass it by reference, the backend links the original into the job
+      const isUserImage = imageToUse.user_id || (imageToUse.url || '').startsWith('/uploads/');
+      fd.append(isUserImage ? 'user_image_id' : 'library_image_id', imageToUse.id);
+      fd.append('use_sample', 'false');
+    } else if (imageToUse && imageToUse.url) {
       try {
         // Fetch library image and add to form
         // Use ?raw=true to get the actual TIFF file without PNG conversion
@@ -3308,7 +3446,7 @@ if __name__ == "__main__":
         const urlParts = imageToUse.url.split('/');
         const filename = urlParts[urlParts.length - 1];
         const imageFile = new File([imageBlob], filename, { type: imageBlob.type });
-        fd.append('image', imageFile);
+        await appendImageFile(fd, imageFile);
         fd.append('use_sample', 'false');
       } catch (imageError) {
         const fetchError = `❌ Image Fetch Failed\n\nFailed to load the selected image.\n\nError: ${imageError.message}\n\nImage URL: ${imageToUse.url}`;
@@ -3318,7 +3456,13 @@ if __name__ == "__main__":
         return;
       }
     } else if (uploadedFile) {
-      fd.append('image', uploadedFile);
+      try {
+        await appendImageFile(fd, uploadedFile);
+      } catch (uploadError) {
+        setOutput(`❌ Upload Failed\n\n${uploadError.message}`);
+        setIsRunning(false);
+        return;
+      }
       fd.append('use_sample', 'false');
     } else {
       // No image selected - show clear error message
@@ -3335,7 +3479,41 @@ if __name__ == "__main__":
       return;
     }
     
+    // Live output: /run publishes output lines and progress under this stream_id
+    let liveEvents = null;
+    const streamId = window.crypto && window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+    fd.append('stream_id', streamId);
+    
     try {
+      if (window.EventSource) {
+        const liveLines = [];
+        let liveProgress = null;
+        let liveActivity = '';
+        const renderLive = () => {
+          let header = 'Running...';
+          if (liveProgress !== null) header += ` ${Math.round(liveProgress)}%`;
+          if (liveActivity) header += ` - ${liveActivity}`;
+          setOutput(`${header}\n\n${liveLines.join('\n')}`);
+        };
+        liveEvents = new EventSource(`/run/events/${streamId}`);
+        liveEvents.addEventListener('output', (e) => {
+          liveLines.push(JSON.parse(e.data).line);
+          if (liveLines.length > 500) liveLines.shift();
+          renderLive();
+        });
+        liveEvents.addEventListener('progress', (e) => {
+          liveProgress = JSON.parse(e.data).percent;
+          renderLive();
+        });
+        liveEvents.addEventListener('activity', (e) => {
+          liveActivity = JSON.parse(e.data).message;
+          renderLive();
+        });
+        liveEvents.addEventListener('done', () => liveEvents && liveEvents.close());
+      }
+      
       console.log('[MapsScriptHelper] Sending request to /run endpoint');
       console.log('[MapsScriptHelper] FormData entries:');
       for (let pair of fd.entries()) {
@@ -3349,6 +3527,11 @@ if __name__ == "__main__":
       }
       
       const r = await fetch('/run', { method: 'POST', body: fd });
+      // The response carries the full result; stop live updates before rendering it
+      if (liveEvents) {
+        liveEvents.close();
+        liveEvents = null;
+      }
       
       // Check if response is JSON
       const contentType = r.headers.get('content-type');
@@ -3527,6 +3710,8 @@ if __name__ == "__main__":
       // Prompt user to send error details to AI chat
       sendErrorToAI(errorData, newFailureCount);
       setIsRunning(false);
+    } finally {
+      if (liveEvents) liveEvents.close();
     }
   };
 
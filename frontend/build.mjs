@@ -0,0 +1,37 @@
+// Compiles app.jsx (JSX + modern syntax) to a minified app.js, so production
+// browsers do not download Babel and transpile 7k lines on every load.
+// React/ReactDOM stay the UMD globals loaded by index.html, so this is a
+// plain transform, not a bundle.
+//
+// The first line records the SHA-256 of the source; backend/static_assets.py
+// only serves app.js while it matches app.jsx, and falls back to in-browser
+// Babel otherwise.
+//
+// Usage (from frontend/): npm install && npm run build
+
+import { createHash } from 'node:crypto';
+import { readFileSync, writeFileSync } from 'node:fs';
+import { transform } from 'esbuild';
+
+const SOURCE = 'app.jsx';
+const OUTPUT = 'app.js';
+
+const bytes = readFileSync(SOURCE);
+const digest = createHash('sha256').update(bytes).digest('hex');
+const source = bytes.toString('utf8');
+const started = Date.now();
+
+const result = await transform(source, {
+  loader: 'jsx',
+  jsx: 'transform',
+  minify: true,
+  target: 'es2020',
+  legalComments: 'none',
+  sourcefile: SOURCE,
+});
+
+writeFileSync(OUTPUT, `/* compiled from ${SOURCE} sha256:${digest} */\n${result.code}`);
+for (const warning of result.warnings) {
+  console.warn(`⚠ ${warning.text}`);
+}
+console.log(`✓ ${SOURCE} -> ${OUTPUT}: ${source.length} -> ${result.code.length} bytes in ${Date.now() - started} ms`);